@@ -58,6 +58,67 @@ NetworkDetails = collections.namedtuple(
     ]
 )
 
+LINK_TYPE_PHYSICAL = "phy"
+LINK_TYPE_BOND = "bond"
+LINK_TYPE_VLAN = "vlan"
+
+# The richer network model, with any number of addresses and routes for
+# each interface. The netmask of an IPv6 address is its prefix length.
+Interface = collections.namedtuple(
+    "Interface",
+    [
+        "name",
+        "mac",
+        "auto",
+        "hotplug",
+        "addresses",
+        "routes",
+        "dnsnameservers",
+        "type",
+        "mtu",
+        "bond",
+        "vlan",
+    ]
+)
+# The link details are optional, an interface being physical by default.
+Interface.__new__.__defaults__ = (LINK_TYPE_PHYSICAL, None, None, None)
+Address = collections.namedtuple(
+    "Address",
+    [
+        "family",
+        "method",
+        "address",
+        "netmask",
+        "broadcast",
+        "gateway",
+    ]
+)
+Route = collections.namedtuple(
+    "Route",
+    [
+        "family",
+        "network",
+        "netmask",
+        "gateway",
+    ]
+)
+Bond = collections.namedtuple(
+    "Bond",
+    [
+        "links",
+        "mode",
+        "miimon",
+        "xmit_hash_policy",
+    ]
+)
+Vlan = collections.namedtuple(
+    "Vlan",
+    [
+        "id",
+        "link",
+    ]
+)
+
 
 class NotExistingMetadataException(Exception):
     pass
@@ -22,6 +22,7 @@ from oslo_log import log as oslo_logging
 from cloudbaseinit.metadata.services import base
 from cloudbaseinit.utils import debiface
 from cloudbaseinit.utils import encoding
+from cloudbaseinit.utils import networkdata
 from cloudbaseinit.utils import x509constants
 
 
@@ -75,7 +76,26 @@ class BaseOpenStackService(base.BaseMetadataService):
                     public_keys.append(key_dict["data"])
         return list(set((key.strip() for key in public_keys)))
 
+    def _get_network_data(self):
+        path = posixpath.normpath(
+            posixpath.join('openstack', 'latest', 'network_data.json'))
+        return self._get_cache_data(path, decode=True)
+
     def get_network_details(self):
+        # The network_data.json content is preferred, if available, to
+        # the legacy Debian configuration referenced by the metadata.
+        try:
+            network_data = self._get_network_data()
+        except base.NotExistingMetadataException:
+            LOG.debug("network_data.json not available, using "
+                      "network_config instead")
+        else:
+            nics = networkdata.parse(network_data)
+            if nics:
+                return nics
+            LOG.debug("No static network details in network_data.json, "
+                      "using network_config instead")
+
         network_config = self._get_meta_data().get('network_config')
         if not network_config:
             return None
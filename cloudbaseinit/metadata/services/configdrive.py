@@ -21,6 +21,7 @@ from oslo_log import log as oslo_logging
 from cloudbaseinit import exception
 from cloudbaseinit.metadata.services import base
 from cloudbaseinit.metadata.services import baseopenstackservice
+from cloudbaseinit.metadata.services.osconfigdrive import cache
 from cloudbaseinit.metadata.services.osconfigdrive import factory
 
 
@@ -55,6 +56,21 @@ opts = [
                 help='Supported formats of a configuration drive'),
     cfg.ListOpt('config_drive_locations', default=list(CD_LOCATIONS),
                 help='Supported configuration drive locations'),
+    cfg.BoolOpt('config_drive_selective_extraction', default=False,
+                help='Index the configuration drive when found and extract '
+                     'only the files which are actually requested, instead '
+                     'of its entire content'),
+    cfg.StrOpt('config_drive_cache_path', default=None,
+               help='Folder keeping extracted copies of the configuration '
+                    'drive, keyed by a fingerprint of the drive, used '
+                    'instead of extracting an unchanged drive again on the '
+                    'next boots. The folder is restricted to its owner, as '
+                    'the copies contain sensitive data. Caching is disabled '
+                    'when not set and takes precedence over the selective '
+                    'extraction'),
+    cfg.IntOpt('config_drive_cache_max_entries', default=1,
+               help='Number of the most recently used configuration drive '
+                    'copies kept in the cache, the others being purged'),
 ]
 
 CONF = cfg.CONF
@@ -68,6 +84,7 @@ class ConfigDriveService(baseopenstackservice.BaseOpenStackService):
     def __init__(self):
         super(ConfigDriveService, self).__init__()
         self._metadata_path = None
+        self._selective = False
 
     def _preprocess_options(self):
         self._searched_types = set(CONF.config_drive_types)
@@ -97,6 +114,14 @@ class ConfigDriveService(baseopenstackservice.BaseOpenStackService):
 
         self._preprocess_options()
         self._mgr = factory.get_config_drive_manager()
+        self._selective = CONF.config_drive_selective_extraction
+        if CONF.config_drive_cache_path:
+            # A partial copy can't be cached for the next boots.
+            self._selective = False
+            self._mgr.cache = cache.ConfigDriveCache(
+                CONF.config_drive_cache_path,
+                CONF.config_drive_cache_max_entries)
+        self._mgr.selective_extraction = self._selective
         found = self._mgr.get_config_drive_files(
             searched_types=self._searched_types,
             searched_locations=self._searched_locations)
@@ -107,6 +132,8 @@ class ConfigDriveService(baseopenstackservice.BaseOpenStackService):
         return found
 
     def _get_data(self, path):
+        if self._selective:
+            self._mgr.extract_file(path)
         norm_path = os.path.normpath(os.path.join(self._metadata_path, path))
         try:
             with open(norm_path, 'rb') as stream:
@@ -115,6 +142,7 @@ class ConfigDriveService(baseopenstackservice.BaseOpenStackService):
             raise base.NotExistingMetadataException()
 
     def cleanup(self):
+        self._mgr.release()
         LOG.debug('Deleting metadata folder: %r', self._mgr.target_path)
         shutil.rmtree(self._mgr.target_path, ignore_errors=True)
         self._metadata_path = None
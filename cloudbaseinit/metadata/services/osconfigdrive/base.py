@@ -13,16 +13,154 @@
 #    under the License.
 
 import abc
+import hashlib
+import os
+import posixpath
+import shutil
 import tempfile
 
+from oslo_log import log as oslo_logging
 import six
 
+from cloudbaseinit import exception
+from cloudbaseinit.utils import filesystem
+
+
+LOG = oslo_logging.getLogger(__name__)
+
+
+class DirectoryReader(filesystem.BaseReader):
+    """Expose an already accessible config drive folder as a reader.
+
+    It has the same interface as the filesystem readers from
+    :mod:`cloudbaseinit.utils.iso9660` and :mod:`cloudbaseinit.utils.fat`.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._files = None
+
+    def __repr__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self._path)
+
+    def get_files(self):
+        if self._files is None:
+            files = {}
+            for root, _, names in os.walk(self._path):
+                relative_root = os.path.relpath(root, self._path)
+                for name in names:
+                    path = os.path.normpath(os.path.join(relative_root,
+                                                         name))
+                    files[path.replace(os.sep, "/")] = os.path.join(root,
+                                                                    name)
+            self._files = files
+        return self._files
+
+    def fingerprint(self):
+        """Return a digest of the files names, sizes and timestamps."""
+        digest = hashlib.sha256()
+        for path, file_path in sorted(self.get_files().items()):
+            stat = os.stat(file_path)
+            entry = "%s:%d:%d\n" % (path, stat.st_size, stat.st_mtime)
+            digest.update(entry.encode("utf-8"))
+        return digest.hexdigest()
+
+    def read_file(self, path):
+        try:
+            file_path = self.get_files()[path]
+        except KeyError:
+            raise exception.ItemNotFoundException(
+                "File %r not found on %s" % (path, self._path))
+        with open(file_path, "rb") as stream:
+            return stream.read()
+
+    def _write_file(self, path, file_path):
+        shutil.copyfile(self.get_files()[path], file_path)
+
 
 @six.add_metaclass(abc.ABCMeta)
 class BaseConfigDriveManager(object):
 
     def __init__(self):
-        self.target_path = tempfile.mkdtemp()
+        self.target_path = self._extraction_path = tempfile.mkdtemp()
+        # When enabled, the managers keep the found config drive opened
+        # and only the requested files are extracted into `target_path`.
+        self.selective_extraction = False
+        # A `ConfigDriveCache` used for serving unchanged drives.
+        self.cache = None
+        self._reader = None
+        self._reader_device = None
+        self._extracted = set()
+
+    def _get_fingerprint(self, reader):
+        """Fingerprint the drive behind the reader, if caching is used."""
+        if not self.cache or not reader:
+            return None
+        try:
+            return reader.fingerprint()
+        except Exception as exc:
+            LOG.warning("Cannot fingerprint the Config Drive on %(reader)s: "
+                        "%(error)r", {"reader": reader, "error": exc})
+            return None
+
+    def _load_from_cache(self, fingerprint):
+        """Point `target_path` to the cached copy of an unchanged drive."""
+        if not fingerprint:
+            return False
+        cached_path = self.cache.get(fingerprint)
+        if not cached_path:
+            return False
+        LOG.info("Config Drive unchanged, using the cached copy %r",
+                 cached_path)
+        self.target_path = cached_path
+        return True
+
+    def _store_in_cache(self, fingerprint):
+        """Move the content extracted into `target_path` to the cache."""
+        if not fingerprint:
+            return
+        try:
+            self.target_path = self.cache.store(fingerprint,
+                                                self.target_path)
+        except (IOError, OSError) as exc:
+            LOG.warning("Cannot cache the Config Drive content: %r", exc)
+
+    def _set_reader(self, reader, device=None):
+        """Keep the reader used for extracting files on demand.
+
+        The given device, if any, is closed on `release`.
+        """
+        LOG.debug("Config Drive content indexed from %s", reader)
+        self._reader = reader
+        self._reader_device = device
+
+    def extract_file(self, path):
+        """Extract a single file from the config drive, if not already.
+
+        Returns False when the file doesn't exist on the drive or when no
+        drive was kept open for selective extraction.
+        """
+        path = posixpath.normpath(path.replace(os.sep, "/"))
+        if path in self._extracted:
+            return True
+        if not self._reader or path not in self._reader.get_files():
+            return False
+        self._reader.extract(self.target_path, [path])
+        self._extracted.add(path)
+        return True
+
+    def release(self):
+        """Release the config drive kept open for selective extraction.
+
+        A cached copy is kept, `target_path` pointing again to the
+        temporary extraction folder.
+        """
+        self.target_path = self._extraction_path
+        self._reader = None
+        self._extracted.clear()
+        if self._reader_device:
+            self._reader_device.close()
+            self._reader_device = None
 
     @abc.abstractmethod
     def get_config_drive_files(self, check_types=None, check_locations=None):
@@ -0,0 +1,97 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Persistent copies of the config drive content, keyed by fingerprint.
+
+The extracted content holds sensitive data (admin password, user data),
+so the cache folder and its entries are restricted to their owner, and to
+SYSTEM on Windows, and only the most recently used entries are kept.
+"""
+
+import os
+import shutil
+import uuid
+
+from oslo_log import log as oslo_logging
+
+from cloudbaseinit.utils import filesystem
+
+
+LOG = oslo_logging.getLogger(__name__)
+
+STAGING_PREFIX = '.staging-'
+
+
+class ConfigDriveCache(object):
+
+    def __init__(self, path, max_entries=1):
+        self._path = path
+        self._max_entries = max(1, max_entries)
+
+    def _ensure_path(self):
+        if not os.path.isdir(self._path):
+            os.makedirs(self._path)
+        filesystem.restrict_access(self._path)
+
+    def _get_entry_path(self, fingerprint):
+        return os.path.join(self._path, fingerprint)
+
+    def get(self, fingerprint):
+        """Return the path of the cached content, if any."""
+        entry_path = self._get_entry_path(fingerprint)
+        if not os.path.isdir(entry_path):
+            return None
+        # Mark the entry as the most recently used one.
+        os.utime(entry_path, None)
+        return entry_path
+
+    def store(self, fingerprint, source_path):
+        """Move the extracted content into the cache.
+
+        The content is first moved next to the cache entries and then
+        renamed, so an interrupted store never leaves a partial entry.
+        """
+        self._ensure_path()
+        staging_path = os.path.join(self._path,
+                                    STAGING_PREFIX + str(uuid.uuid4()))
+        shutil.move(source_path, staging_path)
+
+        entry_path = self._get_entry_path(fingerprint)
+        if os.path.isdir(entry_path):
+            shutil.rmtree(entry_path)
+        os.rename(staging_path, entry_path)
+        # The moved content keeps the permissions it was extracted with.
+        filesystem.restrict_access(entry_path)
+        LOG.debug('Config Drive content cached in %r', entry_path)
+
+        self.purge()
+        return entry_path
+
+    def purge(self):
+        """Remove the leftovers and the least recently used entries."""
+        if not os.path.isdir(self._path):
+            return
+
+        entries = []
+        for name in os.listdir(self._path):
+            path = os.path.join(self._path, name)
+            if name.startswith(STAGING_PREFIX):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.isdir(path):
+                entries.append((os.path.getmtime(path), path))
+
+        entries.sort(reverse=True)
+        for _, path in entries[self._max_entries:]:
+            LOG.debug('Purging cached Config Drive content %r', path)
+            shutil.rmtree(path, ignore_errors=True)
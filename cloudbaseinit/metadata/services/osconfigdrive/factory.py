@@ -21,6 +21,10 @@ def get_config_drive_manager():
     class_paths = {
         'win32': 'cloudbaseinit.metadata.services.osconfigdrive.windows.'
         'WindowsConfigDriveManager',
+        'linux': 'cloudbaseinit.metadata.services.osconfigdrive.linux.'
+        'LinuxConfigDriveManager',
+        'linux2': 'cloudbaseinit.metadata.services.osconfigdrive.linux.'
+        'LinuxConfigDriveManager',
     }
 
     class_path = class_paths.get(sys.platform)
@@ -0,0 +1,213 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import itertools
+import os
+
+from oslo_log import log as oslo_logging
+
+from cloudbaseinit.metadata.services.osconfigdrive import base
+from cloudbaseinit.utils import fat
+from cloudbaseinit.utils import iso9660
+from cloudbaseinit.utils import partitions
+
+
+LOG = oslo_logging.getLogger(__name__)
+
+CONFIG_DRIVE_LABEL = 'config-2'
+META_DATA_PATH = 'openstack/latest/meta_data.json'
+# SCSI peripheral device type of the optical units.
+SCSI_TYPE_ROM = '5'
+IGNORED_DEVICE_PREFIXES = ('ram', 'zram')
+
+
+class LinuxConfigDriveManager(base.BaseConfigDriveManager):
+    """Config Drive manager reading the block devices directly.
+
+    The filesystems are identified by their label and read by parsing
+    their on-disk structures, so no mounting is needed. Any path to a
+    disk image file can be used as a device as well.
+    """
+
+    sys_block_path = '/sys/block'
+    dev_path = '/dev'
+
+    def _read_sysfs_value(self, device_name, *path):
+        try:
+            with open(os.path.join(self.sys_block_path, device_name,
+                                   *path)) as stream:
+                return stream.read().strip()
+        except (IOError, OSError):
+            return None
+
+    def _get_block_devices(self):
+        """Return (path, is_cdrom) pairs for the whole block devices."""
+        try:
+            device_names = sorted(os.listdir(self.sys_block_path))
+        except OSError as exc:
+            LOG.warning('Cannot list block devices: %r', exc)
+            return []
+
+        devices = []
+        for device_name in device_names:
+            if device_name.startswith(IGNORED_DEVICE_PREFIXES):
+                continue
+            if self._read_sysfs_value(device_name, 'size') in (None, '0'):
+                continue
+            is_cdrom = (device_name.startswith('sr') or
+                        self._read_sysfs_value(device_name, 'device',
+                                               'type') == SCSI_TYPE_ROM)
+            devices.append((os.path.join(self.dev_path, device_name),
+                            is_cdrom))
+        return devices
+
+    def _get_cdrom_devices(self):
+        return [path for path, is_cdrom in self._get_block_devices()
+                if is_cdrom]
+
+    def _get_disk_devices(self):
+        return [path for path, is_cdrom in self._get_block_devices()
+                if not is_cdrom]
+
+    def _get_config_drive_reader(self, device, get_reader):
+        reader = get_reader(device)
+        if not reader or not reader.label:
+            return None
+        if reader.label.lower() != CONFIG_DRIVE_LABEL:
+            return None
+        # This also builds the index of the drive's directory tree.
+        if META_DATA_PATH not in reader.get_files():
+            LOG.debug('Config Drive label found on %s, but no metadata',
+                      device)
+            return None
+
+        LOG.info('Config Drive found on %s', device)
+        return reader
+
+    def _search_device(self, path, get_devices, get_reader):
+        device = partitions.FileDevice(path)
+        device.open()
+        try:
+            for candidate in get_devices(device):
+                reader = self._get_config_drive_reader(candidate, get_reader)
+                if not reader:
+                    continue
+                fingerprint = self._get_fingerprint(reader)
+                if self._load_from_cache(fingerprint):
+                    return True
+                if self.selective_extraction:
+                    # The drive is read on demand until released.
+                    self._set_reader(reader, device)
+                    device = None
+                else:
+                    reader.extract(self.target_path)
+                    self._store_in_cache(fingerprint)
+                return True
+            return False
+        finally:
+            if device:
+                device.close()
+
+    def _extract_from_paths(self, paths, get_reader):
+        for path in paths:
+            try:
+                if self._search_device(path, lambda device: [device],
+                                       get_reader):
+                    return True
+            except Exception as exc:
+                LOG.warning('Config Drive extraction failed on %(path)s '
+                            'with %(error)r', {"path": path, "error": exc})
+        return False
+
+    def _extract_from_partitions(self, paths, get_reader):
+        for path in paths:
+            try:
+                # The partitions share the handle of their disk.
+                if self._search_device(path, partitions.get_partitions,
+                                       get_reader):
+                    return True
+            except Exception as exc:
+                LOG.warning('Config Drive extraction failed on partitions '
+                            'of %(path)s with %(error)r',
+                            {"path": path, "error": exc})
+        return False
+
+    def _get_iso_candidates(self, paths):
+        """Return the paths holding an ISO9660 labeled as a Config Drive.
+
+        The headers of all the devices are read in parallel, so slow
+        optical units don't delay the probing of the other devices.
+        """
+        devices = [partitions.FileDevice(path) for path in paths]
+        return [device.path
+                for device, header in iso9660.scan_devices(devices)
+                if header.label.lower() == CONFIG_DRIVE_LABEL]
+
+    def _get_config_drive_from_cdrom_drive(self):
+        return self._extract_from_paths(
+            self._get_iso_candidates(self._get_cdrom_devices()),
+            iso9660.get_reader)
+
+    def _get_config_drive_from_raw_hdd(self):
+        return self._extract_from_paths(
+            self._get_iso_candidates(self._get_disk_devices()),
+            iso9660.get_reader)
+
+    def _get_config_drive_from_vfat(self):
+        return self._extract_from_paths(self._get_disk_devices(),
+                                        fat.get_reader)
+
+    def _get_config_drive_from_partition(self):
+        return self._extract_from_partitions(self._get_disk_devices(),
+                                             iso9660.get_reader)
+
+    def _get_config_drive_from_volume(self):
+        return self._extract_from_partitions(self._get_disk_devices(),
+                                             fat.get_reader)
+
+    def _get_config_drive_files(self, cd_type, cd_location):
+        get_config_drive = self.config_drive_type_location.get(
+            "{}_{}".format(cd_location, cd_type))
+        if get_config_drive:
+            return get_config_drive()
+        else:
+            LOG.debug("Irrelevant type %(type)s in %(location)s location; "
+                      "skip",
+                      {"type": cd_type, "location": cd_location})
+        return False
+
+    def get_config_drive_files(self, searched_types=None,
+                               searched_locations=None):
+        searched_types = searched_types or []
+        searched_locations = searched_locations or []
+
+        for cd_type, cd_location in itertools.product(searched_types,
+                                                      searched_locations):
+            LOG.debug('Looking for Config Drive %(type)s in %(location)s',
+                      {"type": cd_type, "location": cd_location})
+            if self._get_config_drive_files(cd_type, cd_location):
+                return True
+
+        return False
+
+    @property
+    def config_drive_type_location(self):
+        return {
+            "cdrom_iso": self._get_config_drive_from_cdrom_drive,
+            "hdd_iso": self._get_config_drive_from_raw_hdd,
+            "hdd_vfat": self._get_config_drive_from_vfat,
+            "partition_iso": self._get_config_drive_from_partition,
+            "partition_vfat": self._get_config_drive_from_volume,
+        }
@@ -16,7 +16,6 @@
 import itertools
 import os
 import shutil
-import struct
 import tempfile
 import uuid
 
@@ -26,6 +25,8 @@ from oslo_log import log as oslo_logging
 from cloudbaseinit import exception
 from cloudbaseinit.metadata.services.osconfigdrive import base
 from cloudbaseinit.osutils import factory as osutils_factory
+from cloudbaseinit.utils import iso9660
+from cloudbaseinit.utils import partitions
 from cloudbaseinit.utils.windows import disk
 from cloudbaseinit.utils.windows import vfat
 
@@ -43,14 +44,8 @@ LOG = oslo_logging.getLogger(__name__)
 
 CONFIG_DRIVE_LABEL = 'config-2'
 MAX_SECTOR_SIZE = 4096
-# Absolute offset values and the ISO magic string.
-OFFSET_BOOT_RECORD = 0x8000
-OFFSET_ISO_ID = OFFSET_BOOT_RECORD + 1
-ISO_ID = b'CD001'
-# Little-endian unsigned short size values.
-OFFSET_VOLUME_SIZE = OFFSET_BOOT_RECORD + 80
-OFFSET_BLOCK_SIZE = OFFSET_BOOT_RECORD + 128
-PEEK_SIZE = 2
+# The primary volume descriptor has to fit on the device.
+MIN_ISO_SIZE = iso9660.OFFSET_DESCRIPTORS + iso9660.DESCRIPTOR_SIZE
 
 
 class WindowsConfigDriveManager(base.BaseConfigDriveManager):
@@ -58,6 +53,7 @@ class WindowsConfigDriveManager(base.BaseConfigDriveManager):
     def __init__(self):
         super(WindowsConfigDriveManager, self).__init__()
         self._osutils = osutils_factory.get_os_utils()
+        self._iso_file_path = None
 
     def _check_for_config_drive(self, drive):
         label = self._osutils.get_volume_label(drive)
@@ -69,28 +65,14 @@ class WindowsConfigDriveManager(base.BaseConfigDriveManager):
             return True
         return False
 
-    def _get_iso_file_size(self, device):
+    def _get_iso_header(self, device):
         if not device.fixed:
             return None
 
-        if not device.size > (OFFSET_BLOCK_SIZE + PEEK_SIZE):
+        if not device.size >= MIN_ISO_SIZE:
             return None
 
-        off = device.seek(OFFSET_ISO_ID)
-        magic = device.read(len(ISO_ID), skip=OFFSET_ISO_ID - off)
-        if ISO_ID != magic:
-            return None
-
-        off = device.seek(OFFSET_VOLUME_SIZE)
-        volume_size_bytes = device.read(PEEK_SIZE,
-                                        skip=OFFSET_VOLUME_SIZE - off)
-        off = device.seek(OFFSET_BLOCK_SIZE)
-        block_size_bytes = device.read(PEEK_SIZE,
-                                       skip=OFFSET_BLOCK_SIZE - off)
-        volume_size = struct.unpack("<H", volume_size_bytes)[0]
-        block_size = struct.unpack("<H", block_size_bytes)[0]
-
-        return volume_size * block_size
+        return iso9660.read_header(device)
 
     def _write_iso_file(self, device, iso_file_path, iso_file_size):
         with open(iso_file_path, 'wb') as stream:
@@ -117,36 +99,74 @@ class WindowsConfigDriveManager(base.BaseConfigDriveManager):
                     'exit_code': exit_code,
                     'out': out, 'err': err})
 
+    def _index_iso_file(self, iso_file_path):
+        """Keep the ISO file opened for extracting files on demand."""
+        device = partitions.FileDevice(iso_file_path)
+        device.open()
+        try:
+            reader = iso9660.get_reader(device)
+            if not reader:
+                raise exception.CloudbaseInitException(
+                    'Invalid ISO file: %s' % iso_file_path)
+            reader.get_files()
+        except Exception:
+            device.close()
+            raise
+        self._set_reader(reader, device)
+        self._iso_file_path = iso_file_path
+
     def _extract_iso_from_devices(self, devices):
         """Search across multiple devices for a raw ISO."""
         extracted = False
         iso_file_path = os.path.join(tempfile.gettempdir(),
                                      str(uuid.uuid4()) + '.iso')
 
-        for device in devices:
+        # Only the headers are read in parallel, the first ISO found in
+        # the order of the given devices being the one extracted.
+        for device, header in iso9660.scan_devices(
+                devices, read_header=self._get_iso_header):
             try:
                 with device:
-                    iso_file_size = self._get_iso_file_size(device)
-                    if iso_file_size:
-                        LOG.info('ISO9660 disk found on %s', device)
-                        self._write_iso_file(device, iso_file_path,
-                                             iso_file_size)
-                        self._extract_files_from_iso(iso_file_path)
+                    LOG.info('ISO9660 disk found on %s', device)
+                    fingerprint = None
+                    if self.cache:
+                        fingerprint = self._get_fingerprint(
+                            iso9660.get_reader(device))
+                    if self._load_from_cache(fingerprint):
                         extracted = True
                         break
+                    self._write_iso_file(device, iso_file_path, header.size)
+                    if self.selective_extraction:
+                        self._index_iso_file(iso_file_path)
+                    else:
+                        self._extract_files_from_iso(iso_file_path)
+                        self._store_in_cache(fingerprint)
+                    extracted = True
+                    break
             except Exception as exc:
                 LOG.warning('ISO extraction failed on %(device)s with '
                             '%(error)r', {"device": device, "error": exc})
 
-        if os.path.isfile(iso_file_path):
+        if os.path.isfile(iso_file_path) and not self._iso_file_path:
             os.remove(iso_file_path)
         return extracted
 
+    def _copy_config_drive(self, drive):
+        reader = base.DirectoryReader(drive)
+        fingerprint = self._get_fingerprint(reader)
+        if self._load_from_cache(fingerprint):
+            return
+        if self.selective_extraction:
+            self._set_reader(reader)
+        else:
+            os.rmdir(self.target_path)
+            shutil.copytree(drive, self.target_path)
+            self._store_in_cache(fingerprint)
+
     def _get_config_drive_from_cdrom_drive(self):
         for drive_letter in self._osutils.get_cdrom_drives():
             if self._check_for_config_drive(drive_letter):
-                os.rmdir(self.target_path)
-                shutil.copytree(drive_letter, self.target_path)
+                self._copy_config_drive(drive_letter)
                 return True
 
         return False
@@ -179,11 +199,17 @@ class WindowsConfigDriveManager(base.BaseConfigDriveManager):
         volumes = self._osutils.get_volumes()
         for volume in volumes:
             if self._check_for_config_drive(volume):
-                os.rmdir(self.target_path)
-                shutil.copytree(volume, self.target_path)
+                self._copy_config_drive(volume)
                 return True
         return False
 
+    def release(self):
+        super(WindowsConfigDriveManager, self).release()
+        if self._iso_file_path:
+            if os.path.isfile(self._iso_file_path):
+                os.remove(self._iso_file_path)
+            self._iso_file_path = None
+
     def _get_config_drive_files(self, cd_type, cd_location):
         get_config_drive = self.config_drive_type_location.get(
             "{}_{}".format(cd_location, cd_type))
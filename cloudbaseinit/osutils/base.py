@@ -13,10 +13,43 @@
 #    under the License.
 
 import base64
+import collections
 import os
-import subprocess
 import sys
 
+from cloudbaseinit.utils import process
+
+
+# The current configuration of a network adapter, the IPv6 addresses
+# being listed along with the IPv4 ones, with their prefix length.
+AdapterConfig = collections.namedtuple(
+    "AdapterConfig",
+    [
+        "mac",
+        "dhcp_enabled",
+        "addresses",    # list of (address, netmask) tuples
+        "gateways",
+        "dnsnameservers",
+    ]
+)
+
+# The static configuration to apply to a network adapter, the settings
+# left None being kept as they are.
+StaticNetworkConfig = collections.namedtuple(
+    "StaticNetworkConfig",
+    [
+        "mac",
+        "address",
+        "netmask",
+        "broadcast",
+        "gateway",
+        "dnsnameservers",
+        "address6",
+        "netmask6",
+        "gateway6",
+    ]
+)
+
 
 class BaseOSUtils(object):
     PROTOCOL_TCP = "TCP"
@@ -35,18 +68,21 @@ class BaseOSUtils(object):
         return b64_password.replace(
             b'/', b'').replace(b'+', b'')[:length].decode()
 
-    def execute_process(self, args, shell=True, decode_output=False):
-        p = subprocess.Popen(args,
-                             stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE,
-                             shell=shell)
-        (out, err) = p.communicate()
+    def execute_process(self, args, shell=True, decode_output=False,
+                        **kwargs):
+        """Execute a process, returning its output and its exit code.
+
+        The output is read while the process runs, the additional
+        arguments being passed to :func:`cloudbaseinit.utils.process.execute`
+        for logging it or writing it to a file.
+        """
+        (out, err, returncode) = process.execute(args, shell=shell, **kwargs)
 
         if decode_output and sys.version_info < (3, 0):
             out = out.decode(sys.stdout.encoding)
             err = err.decode(sys.stdout.encoding)
 
-        return out, err, p.returncode
+        return out, err, returncode
 
     def sanitize_shell_input(self, value):
         raise NotImplementedError()
@@ -73,6 +109,34 @@ class BaseOSUtils(object):
                                   broadcast, gateway, dnsnameservers):
         raise NotImplementedError()
 
+    def set_static_network_config_v6(self, mac_address, address6,
+                                     netmask6, gateway6):
+        raise NotImplementedError()
+
+    def get_network_adapters_config(self):
+        """Return the `AdapterConfig` of all the network adapters."""
+        raise NotImplementedError()
+
+    def apply_network_config(self, nic_configs):
+        """Apply the `StaticNetworkConfig` of each network adapter.
+
+        Return True if a reboot is required.
+        """
+        reboot_required = False
+        for nic_config in nic_configs:
+            if any((nic_config.address, nic_config.gateway,
+                    nic_config.dnsnameservers)):
+                reboot = self.set_static_network_config(
+                    nic_config.mac, nic_config.address, nic_config.netmask,
+                    nic_config.broadcast, nic_config.gateway,
+                    nic_config.dnsnameservers)
+                reboot_required = reboot or reboot_required
+            if nic_config.address6 and nic_config.netmask6:
+                self.set_static_network_config_v6(
+                    nic_config.mac, nic_config.address6,
+                    nic_config.netmask6, nic_config.gateway6)
+        return reboot_required
+
     def set_config_value(self, name, value, section=None):
         raise NotImplementedError()
 
@@ -107,6 +171,10 @@ class BaseOSUtils(object):
     def firewall_remove_rule(self, name, port, protocol, allow=True):
         raise NotImplementedError()
 
+    def set_path_owner_only_acls(self, path):
+        """Restrict the access to the path tree to its owner and SYSTEM."""
+        raise NotImplementedError()
+
     def get_maximum_password_length(self):
         """Obtain the maximum password length tailored for each OS."""
         raise NotImplementedError()
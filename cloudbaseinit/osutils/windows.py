@@ -462,7 +462,7 @@ class WindowsUtils(base.BaseOSUtils):
         return True
 
     def get_network_adapters(self):
-        """Return available adapters as a list of tuples of (name, mac)."""
+        """Return available adapters as a list of (name, mac, alias)."""
         conn = wmi.WMI(moniker='//./root/cimv2')
         # Get Ethernet adapters only
         wql = ('SELECT * FROM Win32_NetworkAdapter WHERE '
@@ -472,7 +472,25 @@ class WindowsUtils(base.BaseOSUtils):
             wql += ' AND PhysicalAdapter = True'
 
         q = conn.query(wql)
-        return [(r.Name, r.MACAddress) for r in q]
+        return [(r.Name, r.MACAddress, r.NetConnectionID) for r in q]
+
+    def get_network_adapters_config(self):
+        conn = wmi.WMI(moniker='//./root/cimv2')
+        query = conn.query("SELECT * FROM Win32_NetworkAdapterConfiguration "
+                           "WHERE IPEnabled = True")
+
+        adapters_config = []
+        for config in query:
+            if not config.MACAddress:
+                continue
+            # The IPv6 prefix lengths follow the IPv4 netmasks.
+            addresses = list(zip(config.IPAddress or [],
+                                 config.IPSubnet or []))
+            adapters_config.append(base.AdapterConfig(
+                config.MACAddress, bool(config.DHCPEnabled), addresses,
+                list(config.DefaultIPGateway or []),
+                list(config.DNSServerSearchOrder or [])))
+        return adapters_config
 
     def get_dhcp_hosts_in_use(self):
         dhcp_hosts = []
@@ -546,14 +564,21 @@ class WindowsUtils(base.BaseOSUtils):
 
         adapter_config = query[0].associators(
             wmi_result_class='Win32_NetworkAdapterConfiguration')[0]
+        return self._set_adapter_static_config(
+            adapter_config, address, netmask, gateway, dnsnameservers)
 
-        LOG.debug("Setting static IP address")
-        (ret_val,) = adapter_config.EnableStatic([address], [netmask])
-        if ret_val > 1:
-            raise exception.CloudbaseInitException(
-                "Cannot set static IP address on network adapter (%d)",
-                ret_val)
-        reboot_required = (ret_val == 1)
+    @staticmethod
+    def _set_adapter_static_config(adapter_config, address, netmask,
+                                   gateway, dnsnameservers):
+        reboot_required = False
+        if address:
+            LOG.debug("Setting static IP address")
+            (ret_val,) = adapter_config.EnableStatic([address], [netmask])
+            if ret_val > 1:
+                raise exception.CloudbaseInitException(
+                    "Cannot set static IP address on network adapter (%d)",
+                    ret_val)
+            reboot_required = (ret_val == 1)
 
         if gateway:
             LOG.debug("Setting static gateways")
@@ -583,8 +608,6 @@ class WindowsUtils(base.BaseOSUtils):
         adapters = network.get_adapter_addresses()
         for adapter in adapters:
             if mac_address == adapter["mac_address"]:
-                ifname = adapter["friendly_name"]
-                ifindex = adapter["interface_index"]
                 break
         else:
             raise exception.CloudbaseInitException(
@@ -597,10 +620,18 @@ class WindowsUtils(base.BaseOSUtils):
                         "on this system")
             return
         conn = wmi.WMI(moniker='//./root/StandardCimv2')
-        query = conn.query("SELECT * FROM MSFT_NetIPAddress "
-                           "WHERE InterfaceAlias = '{}'".format(ifname))
-        netip = query[0]
+        query = conn.query("SELECT * FROM MSFT_NetIPAddress WHERE "
+                           "InterfaceAlias = '{}'".format(
+                               adapter["friendly_name"]))
+        self._set_adapter_static_config_v6(query[0], adapter, address6,
+                                           netmask6, gateway6)
 
+    @staticmethod
+    def _set_adapter_static_config_v6(netip, adapter, address6, netmask6,
+                                      gateway6):
+        # The Create method is static, any MSFT_NetIPAddress will do.
+        ifname = adapter["friendly_name"]
+        ifindex = adapter["interface_index"]
         params = {
             "InterfaceIndex": ifindex,
             "InterfaceAlias": ifname,
@@ -626,6 +657,67 @@ class WindowsUtils(base.BaseOSUtils):
         except wmi.x_wmi as exc:
             raise exception.CloudbaseInitException(exc.com_error)
 
+    def apply_network_config(self, nic_configs):
+        """Apply all the configurations through a single WMI session.
+
+        The adapters are queried once. Their COM objects are bound to
+        the thread which obtained them, so the adapters are configured
+        one after another.
+        """
+        if not nic_configs:
+            return False
+
+        conn = wmi.WMI(moniker='//./root/cimv2')
+        adapters_config = {}
+        for adapter_config in conn.query(
+                "SELECT * FROM Win32_NetworkAdapterConfiguration "
+                "WHERE IPEnabled = True"):
+            if adapter_config.MACAddress:
+                adapters_config.setdefault(
+                    adapter_config.MACAddress.upper(), adapter_config)
+
+        reboot_required = False
+        nic_configs6 = []
+        for nic_config in nic_configs:
+            adapter_config = adapters_config.get(nic_config.mac.upper())
+            if adapter_config is None:
+                raise exception.CloudbaseInitException(
+                    "Network adapter not found: %s" % nic_config.mac)
+            LOG.debug("Configuring network adapter %s", nic_config.mac)
+            reboot = self._set_adapter_static_config(
+                adapter_config, nic_config.address, nic_config.netmask,
+                nic_config.gateway, nic_config.dnsnameservers)
+            reboot_required = reboot or reboot_required
+            if nic_config.address6 and nic_config.netmask6:
+                nic_configs6.append(nic_config)
+
+        if nic_configs6:
+            self._apply_network_config_v6(nic_configs6)
+        return reboot_required
+
+    def _apply_network_config_v6(self, nic_configs):
+        # TODO(cpoieana): Extend support for other platforms.
+        #                 Currently windows8 @ ws2012 or above.
+        if not self.check_os_version(6, 2):
+            LOG.warning("Setting IPv6 info not available "
+                        "on this system")
+            return
+
+        adapters = {}
+        for adapter in network.get_adapter_addresses():
+            adapters.setdefault(adapter["mac_address"].upper(), adapter)
+        conn = wmi.WMI(moniker='//./root/StandardCimv2')
+        netip = conn.query("SELECT * FROM MSFT_NetIPAddress")[0]
+        for nic_config in nic_configs:
+            adapter = adapters.get(nic_config.mac.upper())
+            if adapter is None:
+                raise exception.CloudbaseInitException(
+                    "Adapter with MAC {!r} not available".format(
+                        nic_config.mac))
+            self._set_adapter_static_config_v6(
+                netip, adapter, nic_config.address6, nic_config.netmask6,
+                nic_config.gateway6)
+
     def _get_config_key_name(self, section):
         key_name = self._config_key
         if section:
@@ -1082,7 +1174,8 @@ class WindowsUtils(base.BaseOSUtils):
             else:
                 raise
 
-    def execute_powershell_script(self, script_path, sysnative=True):
+    def execute_powershell_script(self, script_path, sysnative=True,
+                                  **kwargs):
         base_dir = self._get_system_dir(sysnative)
         powershell_path = os.path.join(base_dir,
                                        'WindowsPowerShell\\v1.0\\'
@@ -1094,7 +1187,7 @@ class WindowsUtils(base.BaseOSUtils):
                      '-File']
         args.append(script_path)
 
-        return self.execute_process(args, shell=False)
+        return self.execute_process(args, shell=False, **kwargs)
 
     def execute_system32_process(self, args, shell=True, decode_output=False,
                                  sysnative=True):
@@ -1103,6 +1196,18 @@ class WindowsUtils(base.BaseOSUtils):
         return self.execute_process([process_path] + args[1:],
                                     decode_output=decode_output, shell=shell)
 
+    def set_path_owner_only_acls(self, path):
+        # Replace the inherited ACEs of the whole tree with full control
+        # for the OWNER RIGHTS and the LocalSystem SIDs only.
+        args = ["icacls.exe", path, "/inheritance:r", "/grant:r",
+                "*S-1-3-4:(OI)(CI)F", "*S-1-5-18:(OI)(CI)F", "/T", "/Q"]
+        (out, err, ret_val) = self.execute_system32_process(args,
+                                                            shell=False)
+        if ret_val:
+            raise exception.CloudbaseInitException(
+                "Cannot set the ACLs of %(path)r: %(err)s" %
+                {"path": path, "err": err})
+
     def get_maximum_password_length(self):
         return 20
 
@@ -14,6 +14,8 @@
 
 PLUGIN_EXECUTION_DONE = 1
 PLUGIN_EXECUTE_ON_NEXT_BOOT = 2
+# A script timed out, the plugin being executed again on the next boot.
+PLUGIN_EXECUTION_TIMED_OUT = 3
 
 PLUGIN_STAGE_PRE_NETWORKING = "PRE_NETWORKING"
 PLUGIN_STAGE_PRE_METADATA_DISCOVERY = "PRE_METADATA_DISCOVERY"
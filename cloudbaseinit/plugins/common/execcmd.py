@@ -17,13 +17,34 @@ import functools
 import os
 import re
 import tempfile
+import time
 import uuid
 
+from oslo_config import cfg
 from oslo_log import log as oslo_logging
 
+from cloudbaseinit import exception
 from cloudbaseinit.osutils import factory as osutils_factory
 from cloudbaseinit.plugins.common import base
-
+from cloudbaseinit.utils import process
+
+
+opts = [
+    cfg.IntOpt('script_timeout', default=0,
+               help='The number of seconds allowed for each user script, '
+                    'after which its whole process tree is terminated. '
+                    'A script can set its own timeout through a '
+                    '"cloudbase-init: timeout=<seconds>" comment. '
+                    'No timeout if 0.'),
+    cfg.IntOpt('scripts_stage_timeout', default=0,
+               help='The number of seconds allowed for all the user data '
+                    'scripts, and separately for all the local scripts. '
+                    'The scripts left when it expires are skipped. '
+                    'No timeout if 0.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
 
 LOG = oslo_logging.getLogger(__name__)
 
@@ -47,6 +68,15 @@ NO_REBOOT = 0
 # important return values range
 RET_START = 1001
 RET_END = 1003
+# returned in place of the exit code of the commands terminated, or
+# skipped, on timeout, no exit code being mistaken for it
+RET_TIMEOUT = "timeout"
+
+# the timeout directive, looked up in the beginning of the scripts
+TIMEOUT_REGEX = re.compile(
+    br"^\s*(?:#|::|rem\s)\s*cloudbase-init:\s*timeout\s*=\s*(\d+)",
+    re.I | re.M)
+TIMEOUT_DIRECTIVE_SIZE = 4096
 
 
 def _ec2_find_sections(data):
@@ -86,6 +116,9 @@ def get_plugin_return_value(ret_val):
     plugin_status = base.PLUGIN_EXECUTION_DONE
     reboot = False
 
+    if ret_val == RET_TIMEOUT:
+        return base.PLUGIN_EXECUTION_TIMED_OUT, reboot
+
     try:
         ret_val = int(ret_val)
     except (ValueError, TypeError):
@@ -99,6 +132,43 @@ def get_plugin_return_value(ret_val):
     return plugin_status, reboot
 
 
+class StageTimeoutException(exception.CloudbaseInitException):
+    """Raised for the commands left once the time of the stage is up."""
+
+
+class StageTimeout(object):
+    """Bound the time taken by all the commands executed in a stage.
+
+    The commands executed while the context is active get at most the
+    time left of the stage, the ones following its expiry being skipped.
+    """
+
+    _deadline = None
+
+    def __init__(self, timeout):
+        self._timeout = timeout
+        self._previous = None
+
+    def __enter__(self):
+        self._previous = StageTimeout._deadline
+        if self._timeout:
+            deadline = time.time() + self._timeout
+            if self._previous is not None:
+                deadline = min(deadline, self._previous)
+            StageTimeout._deadline = deadline
+        return self
+
+    def __exit__(self, *args):
+        StageTimeout._deadline = self._previous
+
+    @classmethod
+    def get_remaining(cls):
+        """Return the seconds left of the current stage, if bounded."""
+        if cls._deadline is None:
+            return None
+        return max(0, cls._deadline - time.time())
+
+
 class BaseCommand(object):
     """Implements logic for executing an user command.
 
@@ -152,15 +222,75 @@ class BaseCommand(object):
         else:
             return [self.command, self._target_path]
 
+    @property
+    def name(self):
+        """The name under which the output of the command is logged."""
+        return os.path.basename(self._target_path)
+
+    def _get_directive_timeout(self):
+        try:
+            with open(self._target_path, 'rb') as stream:
+                match = TIMEOUT_REGEX.search(
+                    stream.read(TIMEOUT_DIRECTIVE_SIZE))
+        except (IOError, OSError):
+            return None
+        return int(match.group(1)) if match else None
+
+    def get_timeout(self):
+        """Return the seconds allowed for the command, None if unbounded.
+
+        The timeout set by the script itself takes precedence over the
+        configured one, both being capped by the time left of the stage.
+        `StageTimeoutException` is raised once the stage is used up.
+        """
+        timeout = self._get_directive_timeout()
+        if timeout is None:
+            timeout = CONF.script_timeout
+        remaining = StageTimeout.get_remaining()
+        if remaining is None:
+            return timeout or None
+        if not remaining:
+            raise StageTimeoutException(
+                "The scripts stage timed out before %s" % self.name)
+        return min(timeout, remaining) if timeout else remaining
+
+    @property
+    def execute_options(self):
+        """Return the options for executing the command.
+
+        The lines of the output are logged as they are written and the
+        whole output is kept in a file, if enabled. The process tree is
+        terminated once the timeout expires.
+        """
+        return {'name': self.name,
+                'output_path': process.get_output_path(self.name),
+                'timeout': self.get_timeout()}
+
     def get_execute_method(self):
         """Return a callable, which will be called by :meth:`~execute`."""
         return functools.partial(self._osutils.execute_process,
-                                 self.args, shell=self.shell)
+                                 self.args, shell=self.shell,
+                                 **self.execute_options)
 
     def execute(self):
-        """Execute the underlying command."""
+        """Execute the underlying command.
+
+        The commands timing out, or skipped on the expiry of the stage,
+        have no exit code, `RET_TIMEOUT` being returned in its place, as
+        any integer could be returned by the command itself.
+        """
         try:
-            return self.get_execute_method()()
+            try:
+                # The timeout is computed once, along with the method.
+                return self.get_execute_method()()
+            except StageTimeoutException:
+                LOG.error('Skipping %s, the scripts stage timed out',
+                          self.name)
+                return b"", b"", RET_TIMEOUT
+            except process.ProcessTimeoutException as exc:
+                LOG.error('%(name)s timed out after %(timeout)s seconds',
+                          {'name': self.name, 'timeout': exc.timeout})
+                return exc.out, exc.err, RET_TIMEOUT
         finally:
             if self._cleanup:
                 self._cleanup()
@@ -207,7 +337,8 @@ class PowershellSysnative(BaseCommand):
         return functools.partial(
             self._osutils.execute_powershell_script,
             self._target_path,
-            self.sysnative)
+            self.sysnative,
+            **self.execute_options)
 
 
 class Powershell(PowershellSysnative):
@@ -40,13 +40,12 @@ def exec_file(file_path):
         return ret_val
 
     try:
-        out, err, ret_val = command(file_path).execute()
+        # The output is logged while the script runs.
+        _, _, ret_val = command(file_path).execute()
     except Exception as ex:
         LOG.warning('An error occurred during file execution: \'%s\'', ex)
-    else:
-        LOG.debug('User_data stdout:\n%s', out)
-        LOG.debug('User_data stderr:\n%s', err)
 
-    LOG.info('Script "%(file_path)s" ended with exit code: %(ret_val)d',
-             {"file_path": file_path, "ret_val": ret_val})
+    if ret_val != execcmd.RET_TIMEOUT:
+        LOG.info('Script "%(file_path)s" ended with exit code: %(ret_val)d',
+                 {"file_path": file_path, "ret_val": ret_val})
     return ret_val
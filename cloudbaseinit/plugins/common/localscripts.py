@@ -12,9 +12,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
+import itertools
+import json
+from multiprocessing import pool
 import os
+import re
 
 from oslo_config import cfg
+from oslo_log import log as oslo_logging
 
 from cloudbaseinit.plugins.common import base
 from cloudbaseinit.plugins.common import execcmd
@@ -24,11 +30,77 @@ opts = [
     cfg.StrOpt('local_scripts_path', default=None,
                help='Path location containing scripts to be executed when '
                     'the plugin runs'),
+    cfg.IntOpt('local_scripts_max_workers', default=1,
+               help='The number of local scripts sharing the same numeric '
+                    'prefix, like 10-first.ps1 and 10-second.sh, executed '
+                    'in parallel. The groups of scripts are executed in '
+                    'order.'),
+    cfg.StrOpt('local_scripts_manifest_path', default=None,
+               help='File where the digest and the last result of each '
+                    'local script are recorded. The unchanged scripts '
+                    'which already succeeded are skipped. All the scripts '
+                    'are executed on every run if not set.'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(opts)
 
+LOG = oslo_logging.getLogger(__name__)
+
+GROUP_REGEX = re.compile(r"^(\d+)")
+CHUNK_SIZE = 64 * 1024
+# 1001 stands for a script which is done, but requires a reboot.
+SUCCESS_CODES = (0, execcmd.RET_START)
+
+
+def _get_group_key(file_path):
+    """Return the numeric prefix of the script, or its own path."""
+    match = GROUP_REGEX.match(os.path.basename(file_path))
+    return int(match.group(1)) if match else file_path
+
+
+def _get_file_digest(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _Manifest(object):
+    """The digests and the last results of the executed scripts."""
+
+    def __init__(self, path):
+        self._path = path
+        self._entries = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as stream:
+                    self._entries = json.load(stream)
+            except (IOError, ValueError) as exc:
+                LOG.warning('Ignoring the local scripts manifest %(path)s: '
+                            '%(error)s', {'path': path, 'error': exc})
+
+    def is_done(self, name, digest):
+        entry = self._entries.get(name)
+        if not entry:
+            return False
+        return entry['digest'] == digest and entry['result'] in SUCCESS_CODES
+
+    def update(self, name, digest, result):
+        self._entries[name] = {'digest': digest, 'result': result}
+
+    def save(self):
+        if not self._path:
+            return
+        temp_path = self._path + '.tmp'
+        with open(temp_path, 'w') as stream:
+            json.dump(self._entries, stream, indent=2, sort_keys=True)
+        if os.name == 'nt' and os.path.exists(self._path):
+            # Renaming over an existing file is not possible on Windows.
+            os.remove(self._path)
+        os.rename(temp_path, self._path)
+
 
 class LocalScriptsPlugin(base.BasePlugin):
 
@@ -36,18 +108,85 @@ class LocalScriptsPlugin(base.BasePlugin):
         return sorted([os.path.join(path, f) for f in os.listdir(path)
                        if os.path.isfile(os.path.join(path, f))])
 
+    @staticmethod
+    def _get_groups(file_paths):
+        """Group the consecutive scripts sharing the same numeric prefix."""
+        return [list(group) for _, group in
+                itertools.groupby(file_paths, _get_group_key)]
+
+    @staticmethod
+    def _get_result(ret_val):
+        """Return the exit code along with the outcome of the script."""
+        return (ret_val,) + execcmd.get_plugin_return_value(ret_val)
+
+    def _exec_group(self, file_paths):
+        """Execute the scripts of a group, returning their results.
+
+        Each result holds the exit code of the script, the plugin status
+        and whether a reboot is requested. When executed one at a time,
+        the scripts following the one requesting a reboot are left for
+        the run after the reboot.
+        """
+        workers_count = min(len(file_paths), CONF.local_scripts_max_workers)
+        if workers_count <= 1:
+            results = []
+            for path in file_paths:
+                results.append(
+                    self._get_result(fileexecutils.exec_file(path)))
+                if results[-1][2]:
+                    break
+            return results
+
+        workers = pool.ThreadPool(workers_count)
+        try:
+            return [self._get_result(ret_val) for ret_val in
+                    workers.map(fileexecutils.exec_file, file_paths)]
+        finally:
+            workers.close()
+            workers.join()
+
+    @staticmethod
+    def _skip_done(file_paths, digests, manifest):
+        """Return the scripts which changed or did not succeed yet."""
+        pending = []
+        for file_path in file_paths:
+            if manifest.is_done(os.path.basename(file_path),
+                                digests[os.path.basename(file_path)]):
+                LOG.info('Skipping the unchanged script %s', file_path)
+            else:
+                pending.append(file_path)
+        return pending
+
     def execute(self, service, shared_data):
         plugin_status = base.PLUGIN_EXECUTION_DONE
         reboot = False
 
         if CONF.local_scripts_path:
-            for file_path in self._get_files_in_dir(CONF.local_scripts_path):
-                ret_val = fileexecutils.exec_file(file_path)
-                new_plugin_status, new_reboot = \
-                    execcmd.get_plugin_return_value(ret_val)
-                plugin_status = max(plugin_status, new_plugin_status)
-                reboot = reboot or new_reboot
-                if reboot:
-                    break
+            manifest = _Manifest(CONF.local_scripts_manifest_path)
+            file_paths = self._get_files_in_dir(CONF.local_scripts_path)
+            with execcmd.StageTimeout(CONF.scripts_stage_timeout):
+                for group in self._get_groups(file_paths):
+                    digests = {}
+                    if CONF.local_scripts_manifest_path:
+                        digests = dict(
+                            (os.path.basename(path), _get_file_digest(path))
+                            for path in group)
+                        group = self._skip_done(group, digests, manifest)
+
+                    # The whole group is executed before a reboot only
+                    # when executed in parallel.
+                    results = self._exec_group(group)
+                    for file_path, (ret_val, new_plugin_status,
+                                    new_reboot) in zip(group, results):
+                        plugin_status = max(plugin_status, new_plugin_status)
+                        reboot = reboot or new_reboot
+                        name = os.path.basename(file_path)
+                        if name in digests:
+                            manifest.update(name, digests[name], ret_val)
+
+                    if digests:
+                        manifest.save()
+                    if reboot:
+                        break
 
         return plugin_status, reboot
@@ -12,8 +12,6 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import struct
-
 from oslo_config import cfg
 from oslo_log import log as oslo_logging
 
@@ -33,6 +31,9 @@ CONF.register_opts(opts)
 
 LOG = oslo_logging.getLogger(__name__)
 
+# The options are requested once for all the DHCP consumers.
+dhcp.register_options([dhcp.OPTION_MTU])
+
 
 class MTUPlugin(base.BasePlugin):
     execution_stage = base.PLUGIN_STAGE_PRE_METADATA_DISCOVERY
@@ -42,13 +43,17 @@ class MTUPlugin(base.BasePlugin):
             osutils = osutils_factory.get_os_utils()
             dhcp_hosts = osutils.get_dhcp_hosts_in_use()
 
+            # All the DHCP hosts are queried together.
+            all_options_data = dhcp.get_all_cached_dhcp_options(
+                [dhcp_host for (_, dhcp_host) in dhcp_hosts],
+                [dhcp.OPTION_MTU])
+
             for (mac_address, dhcp_host) in dhcp_hosts:
-                options_data = dhcp.get_dhcp_options(dhcp_host,
-                                                     [dhcp.OPTION_MTU])
+                options_data = all_options_data.get(dhcp_host)
                 if options_data:
                     mtu_option_data = options_data.get(dhcp.OPTION_MTU)
                     if mtu_option_data:
-                        mtu = struct.unpack('!H', mtu_option_data)[0]
+                        mtu = dhcp.decode_mtu(mtu_option_data)
                         osutils.set_network_adapter_mtu(mac_address, mtu)
                     else:
                         LOG.debug('Could not obtain the MTU configuration '
@@ -19,6 +19,7 @@ from oslo_log import log as oslo_logging
 
 from cloudbaseinit import exception
 from cloudbaseinit.metadata.services import base as service_base
+from cloudbaseinit.osutils import base as osutils_base
 from cloudbaseinit.osutils import factory as osutils_factory
 from cloudbaseinit.plugins.common import base as plugin_base
 from cloudbaseinit.utils import network
@@ -37,6 +38,17 @@ NET_REQUIRE = {
     "dnsnameservers": False
 }
 
+# The settings applied to an adapter.
+CHANGE_ADDRESS = "address"
+CHANGE_GATEWAY = "gateway"
+CHANGE_DNS = "dnsnameservers"
+CHANGE_ADDRESS6 = "address6"
+
+
+# The groups of fields of which at least one is mandatory.
+_REQUIRED_FIELDS = [fields if isinstance(fields, tuple) else (fields,)
+                    for fields, required in NET_REQUIRE.items() if required]
+
 
 def _name2idx(name):
     """Get the position of a network interface by its name."""
@@ -49,20 +61,63 @@ def _name2idx(name):
     return int(match.group(1))
 
 
+def _normalize_mac(mac):
+    return mac.replace("-", ":").upper()
+
+
+class _AdapterIndex(object):
+    """Lookup of the network adapters by MAC, name, alias or position.
+
+    The adapters are (name, mac) tuples, optionally followed by the
+    alias of the adapter.
+    """
+
+    def __init__(self, network_adapters):
+        # Sort VM adapters by name (assuming that those
+        # from the context are in correct order).
+        # Do this for a better matching by order
+        # if hardware address is missing.
+        self._adapters = sorted(network_adapters, key=lambda arg: arg[0])
+        self._macs = {}
+        self._names = {}
+        for adapter in self._adapters:
+            self._macs.setdefault(_normalize_mac(adapter[1]), adapter[1])
+            self._names.setdefault(adapter[0], adapter[1])
+        # The names take precedence over the aliases.
+        for adapter in self._adapters:
+            for alias in adapter[2:3]:
+                self._names.setdefault(alias, adapter[1])
+
+    def get_mac(self, nic):
+        """Return the MAC of the adapter described by the given NIC."""
+        if nic.mac:
+            # Use the adapter spelling of the given MAC.
+            return self._macs.get(_normalize_mac(nic.mac), nic.mac)
+        # By name or alias...
+        mac = self._names.get(nic.name)
+        if not mac:
+            # ...or by order.
+            idx = _name2idx(nic.name)
+            if idx < len(self._adapters):
+                mac = self._adapters[idx][1]
+        return mac
+
+
+def _is_complete(nic):
+    return all(any(getattr(nic, field) for field in fields)
+               for fields in _REQUIRED_FIELDS)
+
+
 def _preprocess_nics(network_details, network_adapters):
     """Check NICs and fill missing data if possible."""
     # Initial checks.
     if not network_adapters:
         raise exception.CloudbaseInitException(
             "no network adapters available")
-    # Sort VM adapters by name (assuming that those
-    # from the context are in correct order).
-    # Do this for a better matching by order
-    # if hardware address is missing.
-    network_adapters = sorted(network_adapters, key=lambda arg: arg[0])
+    adapters = _AdapterIndex(network_adapters)
     refined_network_details = []    # store here processed interfaces
+    incomplete = []
     # Check and update every NetworkDetails object.
-    total = len(network_adapters)
     for nic in network_details:
         if not isinstance(nic, service_base.NetworkDetails):
             raise exception.CloudbaseInitException(
@@ -70,55 +125,89 @@ def _preprocess_nics(network_details, network_adapters):
                 .format(type(nic))
             )
         # Check requirements.
-        final_status = True
-        for fields, status in NET_REQUIRE.items():
-            if not status:
-                continue    # skip 'not required' entries
-            if not isinstance(fields, tuple):
-                fields = (fields,)
-            final_status = any([getattr(nic, field) for field in fields])
-            if not final_status:
-                break
+        final_status = _is_complete(nic)
         address, netmask = nic.address, nic.netmask
-        if final_status:
+        if final_status and not (address and netmask):
             # Additional check for info version.
-            if not (address and netmask):
-                final_status = nic.address6 and nic.netmask6
-                if final_status:
-                    address = address or network.address6_to_4_truncate(
-                        nic.address6)
-                    netmask = netmask or network.netmask6_to_4_truncate(
-                        nic.netmask6)
+            final_status = nic.address6 and nic.netmask6
+            if final_status:
+                address = address or network.address6_to_4_truncate(
+                    nic.address6)
+                netmask = netmask or network.netmask6_to_4_truncate(
+                    nic.netmask6)
         if not final_status:
-            LOG.error("Incomplete NetworkDetails object %s", nic)
+            incomplete.append(nic)
             continue
         # Complete hardware address if missing by selecting
         # the corresponding MAC in terms of naming, then ordering.
+        mac = adapters.get_mac(nic)
         if not nic.mac:
-            # By name...
-            macs = [adapter[1] for adapter in network_adapters
-                    if adapter[0] == nic.name]
-            mac = macs[0] if macs else None
-            # ...or by order.
-            idx = _name2idx(nic.name)
-            if not mac and idx < total:
-                mac = network_adapters[idx][1]
-            nic = service_base.NetworkDetails(
-                nic.name,
-                mac,
-                address,
-                nic.address6,
-                netmask,
-                nic.netmask6,
-                nic.broadcast,
-                nic.gateway,
-                nic.gateway6,
-                nic.dnsnameservers
-            )
+            nic = nic._replace(mac=mac, address=address, netmask=netmask)
+        elif mac != nic.mac:
+            nic = nic._replace(mac=mac)
         refined_network_details.append(nic)
+    if incomplete:
+        LOG.error("Incomplete NetworkDetails objects: %s", incomplete)
     return refined_network_details
 
 
+def _get_adapters_config(osutils):
+    """Read the current configuration of all the adapters, by MAC."""
+    try:
+        adapters_config = osutils.get_network_adapters_config()
+    except NotImplementedError:
+        LOG.debug("The current network configuration is not available")
+        return {}
+    return {config.mac.upper(): config for config in adapters_config}
+
+
+def _get_changes(nic, config):
+    """Return the settings of the NIC differing from the current ones."""
+    has_address6 = bool(nic.address6 and nic.netmask6)
+    if config is None:
+        changes = [CHANGE_ADDRESS, CHANGE_GATEWAY, CHANGE_DNS]
+        return changes + [CHANGE_ADDRESS6] if has_address6 else changes
+
+    addresses = set((address.lower(), str(netmask))
+                    for address, netmask in config.addresses)
+    changes = []
+    # The IPv4 settings are compared only when the NIC has some, as the
+    # NICs configured with IPv6 alone have no IPv4 address to apply.
+    if nic.address and nic.netmask:
+        has_address = (nic.address, nic.netmask) in addresses
+        if config.dhcp_enabled or not has_address:
+            changes.append(CHANGE_ADDRESS)
+    if nic.gateway and nic.gateway not in config.gateways:
+        changes.append(CHANGE_GATEWAY)
+    dnsnameservers = list(nic.dnsnameservers or [])
+    if dnsnameservers and dnsnameservers != list(config.dnsnameservers):
+        changes.append(CHANGE_DNS)
+    address6 = (nic.address6 or "").lower(), str(nic.netmask6)
+    if has_address6 and address6 not in addresses:
+        changes.append(CHANGE_ADDRESS6)
+    return changes
+
+
+def _get_nic_config(nic, changes):
+    """Return the `StaticNetworkConfig` applying the given changes."""
+    if CHANGE_ADDRESS in changes:
+        # The rest of the IPv4 settings are set along with the address.
+        config = osutils_base.StaticNetworkConfig(
+            nic.mac, nic.address, nic.netmask, nic.broadcast, nic.gateway,
+            nic.dnsnameservers, None, None, None)
+    else:
+        config = osutils_base.StaticNetworkConfig(
+            nic.mac, None, None, None,
+            nic.gateway if CHANGE_GATEWAY in changes else None,
+            nic.dnsnameservers if CHANGE_DNS in changes else None,
+            None, None, None)
+    if CHANGE_ADDRESS6 in changes:
+        config = config._replace(address6=nic.address6,
+                                 netmask6=nic.netmask6,
+                                 gateway6=nic.gateway6)
+    return config
+
+
 class NetworkConfigPlugin(plugin_base.BasePlugin):
 
     def execute(self, service, shared_data):
@@ -136,37 +225,37 @@ class NetworkConfigPlugin(plugin_base.BasePlugin):
             # Assuming that the MAC address is unique.
             macnics[nic.mac] = nic
 
-        # Try configuring all the available adapters.
-        adapter_macs = [pair[1] for pair in network_adapters]
-        reboot_required = False
+        # Try configuring all the available adapters, applying only
+        # the settings differing from their current configuration.
+        adapters_config = _get_adapters_config(osutils)
+        adapter_macs = [adapter[1] for adapter in network_adapters]
+        nic_configs = []
+        missing = []
         configured = False
         for mac in adapter_macs:
             nic = macnics.pop(mac, None)
             if not nic:
-                LOG.warn("Missing details for adapter %s", mac)
+                missing.append(mac)
                 continue
-            LOG.info("Configuring network adapter %s", mac)
-            reboot = osutils.set_static_network_config(
-                mac,
-                nic.address,
-                nic.netmask,
-                nic.broadcast,
-                nic.gateway,
-                nic.dnsnameservers
-            )
-            reboot_required = reboot or reboot_required
-            # Set v6 info too if available.
-            if nic.address6 and nic.netmask6:
-                osutils.set_static_network_config_v6(
-                    mac,
-                    nic.address6,
-                    nic.netmask6,
-                    nic.gateway6
-                )
             configured = True
-        for mac in macnics:
-            LOG.warn("Details not used for adapter %s", mac)
+            changes = _get_changes(nic, adapters_config.get(mac.upper()))
+            if not changes:
+                LOG.info("Network adapter %s is already configured", mac)
+                continue
+            LOG.info("Configuring network adapter %s: %s", mac,
+                     ", ".join(changes))
+            nic_configs.append(_get_nic_config(nic, changes))
+        if missing:
+            LOG.warn("Missing details for adapters: %s", ", ".join(missing))
+        if macnics:
+            LOG.warn("Details not used for adapters: %s",
+                     ", ".join(str(mac) for mac in macnics))
         if not configured:
             LOG.error("No adapters were configured")
 
+        # All the adapters are configured together.
+        reboot_required = False
+        if nic_configs:
+            reboot_required = osutils.apply_network_config(nic_configs)
+
         return plugin_base.PLUGIN_EXECUTION_DONE, reboot_required
@@ -12,8 +12,6 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import socket
-
 from oslo_config import cfg
 from oslo_log import log as oslo_logging
 
@@ -32,6 +30,9 @@ CONF.register_opts(opts)
 
 LOG = oslo_logging.getLogger(__name__)
 
+# The options are requested once for all the DHCP consumers.
+dhcp.register_options([dhcp.OPTION_NTP_SERVERS])
+
 
 class NTPClientPlugin(base.BasePlugin):
     execution_stage = base.PLUGIN_STAGE_PRE_NETWORKING
@@ -45,9 +46,7 @@ class NTPClientPlugin(base.BasePlugin):
 
     @staticmethod
     def _unpack_ntp_hosts(ntp_option_data):
-        chunks = [ntp_option_data[index: index + 4]
-                  for index in range(0, len(ntp_option_data), 4)]
-        return list(map(socket.inet_ntoa, chunks))
+        return dhcp.decode_ip_addresses(ntp_option_data)
 
     def execute(self, service, shared_data):
         if CONF.ntp_use_dhcp_config:
@@ -55,10 +54,12 @@ class NTPClientPlugin(base.BasePlugin):
             dhcp_hosts = osutils.get_dhcp_hosts_in_use()
 
             ntp_option_data = None
+            all_options_data = dhcp.get_all_cached_dhcp_options(
+                [dhcp_host for (_, dhcp_host) in dhcp_hosts],
+                [dhcp.OPTION_NTP_SERVERS])
 
             for (_, dhcp_host) in dhcp_hosts:
-                options_data = dhcp.get_dhcp_options(dhcp_host,
-                                                     [dhcp.OPTION_NTP_SERVERS])
+                options_data = all_options_data.get(dhcp_host)
                 if options_data:
                     ntp_option_data = options_data.get(dhcp.OPTION_NTP_SERVERS)
                     if ntp_option_data:
@@ -12,25 +12,29 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import email
+import collections
 
+from oslo_config import cfg
 from oslo_log import log as oslo_logging
 
 from cloudbaseinit.metadata.services import base as metadata_services_base
 from cloudbaseinit.plugins.common import base
 from cloudbaseinit.plugins.common import execcmd
 from cloudbaseinit.plugins.common.userdataplugins import factory
+from cloudbaseinit.plugins.common import userdatacache
+from cloudbaseinit.plugins.common import userdatainclude
 from cloudbaseinit.plugins.common import userdatautils
-from cloudbaseinit.utils import encoding
 from cloudbaseinit.utils import x509constants
 
 
+CONF = cfg.CONF
 LOG = oslo_logging.getLogger(__name__)
 
 
 class UserDataPlugin(base.BasePlugin):
     _PART_HANDLER_CONTENT_TYPE = "text/part-handler"
     _GZIP_MAGIC_NUMBER = b'\x1f\x8b'
+    _MULTIPART_HEADERS = (b'Content-Type: multipart', b'#include')
 
     def execute(self, service, shared_data):
         try:
@@ -42,32 +46,103 @@ class UserDataPlugin(base.BasePlugin):
             return base.PLUGIN_EXECUTION_DONE, False
 
         LOG.debug('User data content length: %d' % len(user_data))
-        return self._process_user_data(user_data)
+        with execcmd.StageTimeout(CONF.scripts_stage_timeout):
+            return self._process_user_data(user_data)
 
     @staticmethod
     def _parse_mime(user_data):
-        user_data_str = encoding.get_as_string(user_data)
-        LOG.debug('User data content:\n%s', user_data_str)
-        return email.message_from_string(user_data_str).walk()
+        for part in userdatainclude.iter_parts(user_data):
+            LOG.debug('User data part: %(content_type)s, %(filename)s, '
+                      '%(size)d bytes',
+                      {'content_type': part.get_content_type(),
+                       'filename': part.get_filename(),
+                       'size': part.size})
+            yield part
+
+    def _get_parts(self, user_data):
+        """Return the parts iterator and the recorder of the parsed plan."""
+        cache = userdatacache.get_cache()
+        if not cache:
+            return iter(self._parse_mime(user_data)), None
+
+        digest = userdatacache.get_digest(user_data)
+        parts = cache.get_parts(digest)
+        if parts is not None:
+            LOG.info('Using the cached user data plan %s', digest)
+            return self._iter_cached_parts(parts), None
+        return iter(self._parse_mime(user_data)), cache.record_parts(digest)
+
+    @staticmethod
+    def _iter_cached_parts(parts):
+        """Yield the cached parts, closing the ones left unprocessed."""
+        parts = collections.deque(parts)
+        try:
+            while parts:
+                yield parts.popleft()
+        finally:
+            for part in parts:
+                part.close()
 
     def _process_user_data(self, user_data):
         plugin_status = base.PLUGIN_EXECUTION_DONE
         reboot = False
 
-        if user_data.startswith(b'Content-Type: multipart'):
+        if user_data.startswith(self._MULTIPART_HEADERS):
             user_data_plugins = factory.load_plugins()
             user_handlers = {}
-
-            for part in self._parse_mime(user_data):
-                (plugin_status, reboot) = self._process_part(part,
-                                                             user_data_plugins,
-                                                             user_handlers)
-                if reboot:
-                    break
+            parts, recorder = self._get_parts(user_data)
+            fetcher = userdatainclude.IncludeFetcher(
+                userdatacache.get_cache())
+
+            # The parts are processed while the following ones are parsed,
+            # each payload being released once its part is processed. The
+            # include parts are recorded as such, their URLs being fetched
+            # again on every run.
+            try:
+                for part in parts:
+                    try:
+                        if recorder:
+                            recorder.add(part)
+                        for expanded_part in fetcher.expand(part):
+                            try:
+                                (new_plugin_status,
+                                 reboot) = self._process_part(
+                                    expanded_part, user_data_plugins,
+                                    user_handlers)
+                                # A timeout is kept as the status of the
+                                # whole user data.
+                                if (plugin_status !=
+                                        base.PLUGIN_EXECUTION_TIMED_OUT):
+                                    plugin_status = new_plugin_status
+                            finally:
+                                if expanded_part is not part:
+                                    expanded_part.close()
+                            if reboot:
+                                break
+                    finally:
+                        part.close()
+                    if reboot:
+                        break
+            finally:
+                fetcher.close()
+
+            if recorder:
+                # The plan has to be complete for the run after the reboot.
+                for part in parts:
+                    recorder.add(part)
+                    part.close()
+                recorder.commit()
+            else:
+                # Nothing is parsed past the part requesting the reboot.
+                parts.close()
 
             if not reboot:
                 for handler_func in list(set(user_handlers.values())):
                     self._end_part_process_event(handler_func)
+                part_handler_plugin = user_data_plugins.get(
+                    self._PART_HANDLER_CONTENT_TYPE)
+                if part_handler_plugin:
+                    part_handler_plugin.unload()
 
             return plugin_status, reboot
         else:
@@ -138,8 +213,7 @@ class UserDataPlugin(base.BasePlugin):
     def _process_non_multi_part(self, user_data):
         ret_val = None
         if user_data.startswith(b'#cloud-config'):
-            user_data_plugins = factory.load_plugins()
-            cloud_config_plugin = user_data_plugins.get('text/cloud-config')
+            cloud_config_plugin = factory.get_plugin('text/cloud-config')
             ret_val = cloud_config_plugin.process_non_multipart(user_data)
         elif user_data.strip().startswith(x509constants.PEM_HEADER.encode()):
             LOG.debug('Found X509 certificate in userdata')
@@ -0,0 +1,331 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Content addressed cache of the parsed user data.
+
+The decoded MIME parts of a multipart user data are kept as a plan,
+keyed by the digest of the whole user data, and the cloud-config trees
+are kept keyed by the digest of their YAML. The plugin re-runs with an
+unchanged user data skip the parsing and the decoding entirely, the
+cached payloads being checked against their recorded digests. The
+content fetched for the included URLs is kept as well, along with its
+digest, for revalidating it and for using it when the URL fails.
+"""
+
+import base64
+import email
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+from oslo_config import cfg
+from oslo_log import log as oslo_logging
+import six
+
+from cloudbaseinit.utils import filesystem
+from cloudbaseinit.utils import mime
+
+
+opts = [
+    cfg.StrOpt('user_data_cache_path', default=None,
+               help='Folder where the parsed user data is cached, keyed '
+                    'by its digest. The cache is disabled if not set.'),
+    cfg.IntOpt('user_data_cache_max_entries', default=4,
+               help='The number of user data plans and cloud-config '
+                    'trees kept in the cache, each.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
+
+LOG = oslo_logging.getLogger(__name__)
+
+PLAN_VERSION = 2
+PLAN_FILE = 'plan.json'
+PLANS_FOLDER = 'plans'
+CLOUD_CONFIG_FOLDER = 'cloud-config'
+INCLUDES_FOLDER = 'includes'
+INCLUDE_FILE = 'include.json'
+INCLUDE_CONTENT_FILE = 'content'
+# The included URLs are usually more than the user data versions.
+MAX_INCLUDE_ENTRIES = 32
+STAGING_PREFIX = '.staging-'
+# Marks the byte strings, like the !!binary YAML values, in the JSON.
+BYTES_KEY = '__bytes__'
+CHUNK_SIZE = 64 * 1024
+
+
+def get_digest(data):
+    if isinstance(data, six.text_type):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def _digest_payload(source, target=None):
+    """Return the digest of the payload, copying it to the target if any."""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+        if target:
+            target.write(chunk)
+    return digest.hexdigest()
+
+
+def _encode_bytes(value):
+    if isinstance(value, bytes):
+        return {BYTES_KEY: base64.b64encode(value).decode('ascii')}
+    raise TypeError('%r is not JSON serializable' % value)
+
+
+def _decode_bytes(value):
+    if list(value) == [BYTES_KEY]:
+        return base64.b64decode(value[BYTES_KEY])
+    return value
+
+
+def _purge(path, max_entries):
+    """Remove the leftovers and the least recently used entries."""
+    entries = []
+    for name in os.listdir(path):
+        entry_path = os.path.join(path, name)
+        if name.startswith(STAGING_PREFIX):
+            _remove(entry_path)
+        else:
+            entries.append((os.path.getmtime(entry_path), entry_path))
+
+    entries.sort(reverse=True)
+    for _, entry_path in entries[max_entries:]:
+        LOG.debug('Purging cached user data %r', entry_path)
+        _remove(entry_path)
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+class PlanRecorder(object):
+    """Copy the parts of a user data while they are being processed.
+
+    The plan becomes visible in the cache only when committed, after
+    all the parts were recorded.
+    """
+
+    def __init__(self, cache, digest):
+        self._cache = cache
+        self._digest = digest
+        self._staging_path = None
+        self._parts = []
+
+    def _fail(self, exc):
+        # Failing to cache the user data must not prevent its execution.
+        LOG.warning('Cannot cache the user data plan: %r', exc)
+        self.abort()
+
+    def add(self, part):
+        if self._parts is None:
+            return
+        try:
+            if not self._staging_path:
+                self._staging_path = self._cache.get_staging_path(
+                    PLANS_FOLDER)
+                os.makedirs(self._staging_path)
+            payload_name = str(len(self._parts))
+            with open(os.path.join(self._staging_path,
+                                   payload_name), 'wb') as stream:
+                digest = _digest_payload(part.open_payload(), stream)
+            self._parts.append({'headers': part.headers.as_string(),
+                                'payload': payload_name,
+                                'digest': digest})
+        except (IOError, OSError) as exc:
+            self._fail(exc)
+
+    def commit(self):
+        if not self._parts:
+            return
+        try:
+            with open(os.path.join(self._staging_path,
+                                   PLAN_FILE), 'w') as stream:
+                json.dump({'version': PLAN_VERSION, 'parts': self._parts},
+                          stream)
+            self._cache.store(PLANS_FOLDER, self._digest, self._staging_path)
+        except (IOError, OSError) as exc:
+            self._fail(exc)
+
+    def abort(self):
+        self._parts = None
+        if self._staging_path:
+            _remove(self._staging_path)
+
+
+class UserDataCache(object):
+
+    def __init__(self, path, max_entries=4):
+        self._path = path
+        self._max_entries = max(1, max_entries)
+        self._restricted = False
+
+    def _get_folder(self, folder):
+        folder_path = os.path.join(self._path, folder)
+        if not os.path.isdir(folder_path):
+            os.makedirs(folder_path)
+        if not self._restricted:
+            # The user data holds sensitive content. The entries are
+            # staged inside the cache, inheriting its permissions.
+            filesystem.restrict_access(self._path)
+            self._restricted = True
+        return folder_path
+
+    def _get_entry(self, folder, digest):
+        entry_path = os.path.join(self._path, folder, digest)
+        if not os.path.exists(entry_path):
+            return None
+        # Mark the entry as the most recently used one.
+        os.utime(entry_path, None)
+        return entry_path
+
+    def get_staging_path(self, folder):
+        return os.path.join(self._get_folder(folder),
+                            STAGING_PREFIX + str(uuid.uuid4()))
+
+    def store(self, folder, digest, staging_path, max_entries=None):
+        """Rename a staged entry, so that it's never seen partially."""
+        entry_path = os.path.join(self._get_folder(folder), digest)
+        _remove(entry_path)
+        os.rename(staging_path, entry_path)
+        os.utime(entry_path, None)
+        _purge(os.path.dirname(entry_path), max_entries or self._max_entries)
+
+    def get_parts(self, digest):
+        """Return the cached parts of a multipart user data, if any."""
+        entry_path = self._get_entry(PLANS_FOLDER, digest)
+        if not entry_path:
+            return None
+        try:
+            with open(os.path.join(entry_path, PLAN_FILE)) as stream:
+                plan = json.load(stream)
+        except (IOError, OSError, ValueError) as exc:
+            LOG.warning('Invalid cached user data plan %(path)r: %(error)r',
+                        {'path': entry_path, 'error': exc})
+            return None
+        if not isinstance(plan, dict) or plan.get('version') != PLAN_VERSION:
+            return None
+
+        # The payloads are executed, so a damaged entry is parsed again.
+        payloads = []
+        parts = []
+        try:
+            for entry in plan['parts']:
+                payload = open(os.path.join(entry_path, entry['payload']),
+                               'rb')
+                payloads.append(payload)
+                if _digest_payload(payload) != entry['digest']:
+                    raise ValueError('Corrupted payload %r' %
+                                     entry['payload'])
+                payload.seek(0)
+                parts.append(mime.MimePart(
+                    email.message_from_string(entry['headers']),
+                    payload=payload))
+        except (KeyError, TypeError, IOError, OSError, ValueError) as exc:
+            LOG.warning('Invalid cached user data plan %(path)r: %(error)r',
+                        {'path': entry_path, 'error': exc})
+            for payload in payloads:
+                payload.close()
+            return None
+        return parts
+
+    def record_parts(self, digest):
+        return PlanRecorder(self, digest)
+
+    def get_cloud_config(self, payload):
+        """Return the cached cloud-config tree loaded from the payload."""
+        entry_path = self._get_entry(CLOUD_CONFIG_FOLDER,
+                                     get_digest(payload))
+        if not entry_path:
+            return None
+        try:
+            with open(entry_path) as stream:
+                return json.load(stream, object_hook=_decode_bytes)
+        except (IOError, OSError, ValueError) as exc:
+            LOG.warning('Invalid cached cloud-config %(path)r: %(error)r',
+                        {'path': entry_path, 'error': exc})
+
+    def store_cloud_config(self, payload, content):
+        staging_path = None
+        try:
+            staging_path = self.get_staging_path(CLOUD_CONFIG_FOLDER)
+            with open(staging_path, 'w') as stream:
+                json.dump(content, stream, default=_encode_bytes)
+            self.store(CLOUD_CONFIG_FOLDER, get_digest(payload),
+                       staging_path)
+        except (TypeError, ValueError) as exc:
+            # Values like the YAML timestamps have no JSON equivalent.
+            LOG.debug('Cannot cache the cloud-config: %r', exc)
+            _remove(staging_path)
+        except (IOError, OSError) as exc:
+            LOG.warning('Cannot cache the cloud-config: %r', exc)
+            if staging_path:
+                _remove(staging_path)
+
+    def get_include(self, url):
+        """Return the cached (content, etag) of an included URL, if any."""
+        entry_path = self._get_entry(INCLUDES_FOLDER, get_digest(url))
+        if not entry_path:
+            return None
+        try:
+            with open(os.path.join(entry_path, INCLUDE_FILE)) as stream:
+                include = json.load(stream)
+            with open(os.path.join(entry_path,
+                                   INCLUDE_CONTENT_FILE), 'rb') as stream:
+                content = stream.read()
+        except (IOError, OSError, ValueError) as exc:
+            LOG.warning('Invalid cached include %(path)r: %(error)r',
+                        {'path': entry_path, 'error': exc})
+            return None
+        if (include.get('url') != url or
+                include.get('digest') != get_digest(content)):
+            LOG.warning('Corrupted cached include %r', entry_path)
+            return None
+        return content, include.get('etag')
+
+    def store_include(self, url, content, etag=None):
+        staging_path = None
+        try:
+            staging_path = self.get_staging_path(INCLUDES_FOLDER)
+            os.makedirs(staging_path)
+            with open(os.path.join(staging_path,
+                                   INCLUDE_CONTENT_FILE), 'wb') as stream:
+                stream.write(content)
+            with open(os.path.join(staging_path, INCLUDE_FILE), 'w') as stream:
+                json.dump({'url': url, 'etag': etag,
+                           'digest': get_digest(content)}, stream)
+            self.store(INCLUDES_FOLDER, get_digest(url), staging_path,
+                       max(self._max_entries, MAX_INCLUDE_ENTRIES))
+        except (IOError, OSError) as exc:
+            LOG.warning('Cannot cache the include %(url)s: %(error)r',
+                        {'url': url, 'error': exc})
+            if staging_path:
+                _remove(staging_path)
+
+
+def get_cache():
+    """Return the configured user data cache, None if disabled."""
+    if not CONF.user_data_cache_path:
+        return None
+    return UserDataCache(CONF.user_data_cache_path,
+                         CONF.user_data_cache_max_entries)
@@ -0,0 +1,238 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Expansion of the user data parts including the content of URLs.
+
+A `text/x-include-url` part, or an user data starting with `#include`,
+lists an URL per line. The URLs are fetched in parallel through a
+pooled HTTP session and their contents replace the include part, in the
+order in which the URLs are listed, as if they were inlined.
+"""
+
+import contextlib
+from email import message
+import io
+from multiprocessing import pool
+import posixpath
+import time
+
+from oslo_config import cfg
+from oslo_log import log as oslo_logging
+import requests
+from requests import adapters
+from six.moves.urllib import parse
+
+from cloudbaseinit import exception
+from cloudbaseinit.utils import mime
+
+
+opts = [
+    cfg.IntOpt('user_data_include_timeout', default=30,
+               help='The number of seconds allowed for fetching each of '
+                    'the URLs included by the user data.'),
+    cfg.IntOpt('user_data_include_max_size', default=16 * 1024 * 1024,
+               help='The maximum size in bytes of the content of an URL '
+                    'included by the user data.'),
+    cfg.IntOpt('user_data_include_max_workers', default=4,
+               help='The number of included URLs fetched in parallel.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
+
+LOG = oslo_logging.getLogger(__name__)
+
+INCLUDE_CONTENT_TYPE = 'text/x-include-url'
+MULTIPART_HEADER = b'Content-Type: multipart'
+DEFAULT_CONTENT_TYPE = 'text/x-shellscript'
+DEFAULT_FILE_NAME = 'include'
+# The content type of a non multipart user data, by its first line.
+CONTENT_TYPES = (
+    (b'#include', INCLUDE_CONTENT_TYPE),
+    (b'#cloud-config', 'text/cloud-config'),
+    (b'#cloud-boothook', 'text/cloud-boothook'),
+    (b'#part-handler', 'text/part-handler'),
+)
+MAX_DEPTH = 5
+CHUNK_SIZE = 64 * 1024
+
+
+def get_urls(payload):
+    urls = []
+    for line in payload.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            urls.append(line)
+    return urls
+
+
+def _get_file_name(url):
+    return (posixpath.basename(parse.urlparse(url).path) or
+            DEFAULT_FILE_NAME)
+
+
+def _get_part(data, file_name):
+    content_type = DEFAULT_CONTENT_TYPE
+    for header, header_content_type in CONTENT_TYPES:
+        if data.startswith(header):
+            content_type = header_content_type
+            break
+
+    headers = message.Message()
+    headers['Content-Type'] = content_type
+    headers.add_header('Content-Disposition', 'attachment',
+                       filename=file_name)
+    return mime.MimePart(headers, payload=io.BytesIO(data))
+
+
+def iter_parts(data, file_name=DEFAULT_FILE_NAME):
+    """Yield the MIME parts of an user data, multipart or not.
+
+    A non multipart user data becomes a single part, whose content type
+    is given by its first line.
+    """
+    if data.startswith(MULTIPART_HEADER):
+        return mime.iter_parts(data)
+    return iter([_get_part(data, file_name)])
+
+
+class IncludeFetcher(object):
+    """Fetch the included URLs, revalidating the cached contents."""
+
+    def __init__(self, cache=None, timeout=None, max_size=None,
+                 max_workers=None):
+        self._cache = cache
+        self._timeout = timeout or CONF.user_data_include_timeout
+        self._max_size = max_size or CONF.user_data_include_max_size
+        self._max_workers = max(
+            1, max_workers or CONF.user_data_include_max_workers)
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            session = requests.Session()
+            adapter = adapters.HTTPAdapter(pool_maxsize=self._max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session = session
+        return self._session
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def _download(self, url, etag=None):
+        """Return the content and the ETag, no content if not modified."""
+        deadline = time.time() + self._timeout
+        headers = {'If-None-Match': etag} if etag else {}
+        response = self._get_session().get(url, headers=headers, stream=True,
+                                           timeout=self._timeout)
+        with contextlib.closing(response):
+            if etag and response.status_code == 304:
+                return None, etag
+            response.raise_for_status()
+
+            # The announced size is checked before reading anything.
+            size = int(response.headers.get('Content-Length') or 0)
+            if size > self._max_size:
+                raise exception.CloudbaseInitException(
+                    'The content of %s exceeds %d bytes' %
+                    (url, self._max_size))
+            size = 0
+            chunks = []
+            for chunk in response.iter_content(CHUNK_SIZE):
+                size += len(chunk)
+                if size > self._max_size:
+                    raise exception.CloudbaseInitException(
+                        'The content of %s exceeds %d bytes' %
+                        (url, self._max_size))
+                if time.time() > deadline:
+                    raise exception.CloudbaseInitException(
+                        'Fetching %s took more than %d seconds' %
+                        (url, self._timeout))
+                chunks.append(chunk)
+            return b''.join(chunks), response.headers.get('ETag')
+
+    def fetch_all(self, urls):
+        """Fetch the URLs in parallel, returning their contents in order.
+
+        The cached content of an URL is used when it's not modified or
+        when the URL cannot be fetched. The URLs with no content at all
+        get a None content.
+        """
+        cached_items = [self._cache and self._cache.get_include(url)
+                        for url in urls]
+
+        def fetch(args):
+            url, cached_item = args
+            try:
+                return self._download(url, cached_item and cached_item[1])
+            except Exception as exc:
+                return exc
+
+        items = list(zip(urls, cached_items))
+        if len(items) > 1:
+            workers = pool.ThreadPool(min(len(items), self._max_workers))
+            try:
+                results = workers.map(fetch, items)
+            finally:
+                workers.close()
+                workers.join()
+        else:
+            results = [fetch(item) for item in items]
+
+        # The cache is updated from this thread only.
+        contents = []
+        for (url, cached_item), result in zip(items, results):
+            content = None
+            if isinstance(result, Exception):
+                if cached_item:
+                    LOG.warning('Cannot fetch %(url)s, using its cached '
+                                'content: %(error)r',
+                                {'url': url, 'error': result})
+                    content = cached_item[0]
+                else:
+                    LOG.error('Cannot fetch %(url)s: %(error)r',
+                              {'url': url, 'error': result})
+            elif result[0] is None:
+                LOG.debug('The cached content of %s is not modified', url)
+                content = cached_item[0]
+            else:
+                content, etag = result
+                LOG.debug('Fetched %(size)d bytes from %(url)s',
+                          {'size': len(content), 'url': url})
+                if self._cache:
+                    self._cache.store_include(url, content, etag)
+            contents.append(content)
+        return contents
+
+    def expand(self, part, depth=0):
+        """Yield the part itself, or the parts of the URLs it includes."""
+        if part.get_content_type() != INCLUDE_CONTENT_TYPE:
+            yield part
+            return
+        if depth >= MAX_DEPTH:
+            LOG.warning('Ignoring the includes nested more than %d levels '
+                        'deep', MAX_DEPTH)
+            return
+
+        urls = get_urls(part.get_payload())
+        LOG.info('Fetching %d included URLs', len(urls))
+        for url, content in zip(urls, self.fetch_all(urls)):
+            if content is None:
+                continue
+            for included_part in iter_parts(content, _get_file_name(url)):
+                for expanded_part in self.expand(included_part, depth + 1):
+                    yield expanded_part
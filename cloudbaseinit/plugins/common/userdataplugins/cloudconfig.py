@@ -15,13 +15,16 @@
 
 from oslo_config import cfg
 from oslo_log import log as oslo_logging
+import six
 import yaml
 
 from cloudbaseinit.plugins.common import execcmd
+from cloudbaseinit.plugins.common import userdatacache
 from cloudbaseinit.plugins.common.userdataplugins import base
 from cloudbaseinit.plugins.common.userdataplugins.cloudconfigplugins import (
     factory
 )
+from cloudbaseinit.utils import schema
 
 
 LOG = oslo_logging.getLogger(__name__)
@@ -44,6 +47,45 @@ class CloudConfigError(Exception):
     pass
 
 
+class CloudConfigValidationError(CloudConfigError):
+
+    def __init__(self, problems):
+        super(CloudConfigValidationError, self).__init__(
+            "Invalid cloud-config:\n%s" % "\n".join(problems))
+        self.problems = problems
+
+
+def get_problems(content):
+    """Return the problems of a loaded cloud-config, empty if valid.
+
+    Each section is validated against the schema of its plugin, the
+    sections without a plugin being reported only when executed.
+    """
+    if not isinstance(content, dict):
+        return ["<root>: expected object, got %s" % type(content).__name__]
+
+    problems = []
+    for section, value in sorted(content.items(),
+                                 key=lambda item: str(item[0])):
+        if not isinstance(section, six.string_types):
+            problems.append("%r: expected a section name" % section)
+            continue
+        section_schema = factory.get_schema(section)
+        if section_schema is not None:
+            problems.extend(schema.validate(value, section_schema,
+                                            section))
+    return problems
+
+
+def check(stream):
+    """Return the problems of a cloud-config yaml, without running it."""
+    try:
+        content = CloudConfigPluginExecutor._load_yaml(stream)
+    except CloudConfigError as exc:
+        return [str(exc)]
+    return get_problems(content)
+
+
 class CloudConfigPluginExecutor(object):
     """A simple executor class for processing cloud-config plugins.
 
@@ -64,26 +106,50 @@ class CloudConfigPluginExecutor(object):
             plugins.items(),
             key=lambda item: _lookup_priority(item[0]))
 
-    @classmethod
-    def from_yaml(cls, stream):
-        """Initialize an executor from an yaml stream."""
-
-        loader = getattr(yaml, 'CLoader', yaml.Loader)
+    @staticmethod
+    def _load_yaml(stream):
+        """Load the yaml stream, constructing only the standard types."""
+        loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
         try:
-            content = yaml.load(stream, Loader=loader)
-        except (TypeError, ValueError, AttributeError):
+            return yaml.load(stream, Loader=loader)
+        except (TypeError, ValueError, AttributeError, yaml.YAMLError):
             msg = "Invalid yaml stream provided."
             LOG.error(msg)
             raise CloudConfigError(msg)
 
+    @classmethod
+    def from_yaml(cls, stream):
+        """Initialize an executor from an yaml stream.
+
+        The whole content is validated before any plugin is executed and
+        all its problems are reported at once, through a
+        `CloudConfigValidationError`. The loaded content is cached when
+        the user data cache is enabled, keyed by the digest of the given
+        yaml, and it's validated again when served from the cache.
+        """
+        cache = None
+        if isinstance(stream, (bytes, six.text_type)):
+            cache = userdatacache.get_cache()
+
+        content = cache.get_cloud_config(stream) if cache else None
+        cached = content is not None
+        if not cached:
+            content = cls._load_yaml(stream)
+        # The cached content is validated again, as the schemas might
+        # have changed since it was stored.
+        problems = get_problems(content)
+        if problems:
+            raise CloudConfigValidationError(problems)
+        if cache and not cached:
+            cache.store_cloud_config(stream, content)
+
         return cls(**content)
 
     def execute(self):
         """Call each plugin, in the order requested by the user."""
         reboot = execcmd.NO_REBOOT
-        plugins = factory.load_plugins()
         for plugin_name, value in self._expected_plugins:
-            method = plugins.get(plugin_name)
+            method = factory.get_plugin(plugin_name)
             if not method:
                 LOG.error("Plugin %r is currently not supported", plugin_name)
                 continue
@@ -110,6 +176,8 @@ class CloudConfigPlugin(base.BaseUserDataPlugin):
         """
         try:
             executor = CloudConfigPluginExecutor.from_yaml(part)
+        except CloudConfigValidationError as exc:
+            LOG.error(exc)
         except CloudConfigError:
             LOG.error("Could not process the type %r", type(part))
         else:
@@ -21,6 +21,10 @@ import six
 class BaseCloudConfigPlugin(object):
     """Base plugin class for cloud-config plugins."""
 
+    # The schema of the plugin's section, as understood by
+    # `cloudbaseinit.utils.schema`. Any value is accepted by default.
+    schema = {}
+
     @abc.abstractmethod
     def process(self, data):
         """Abstract method for processing the given data."""
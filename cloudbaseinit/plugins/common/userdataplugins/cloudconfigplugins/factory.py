@@ -12,11 +12,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from cloudbaseinit.utils import classloader
+from cloudbaseinit.utils import registry
 
 
-# TODO(cpopa): replace the static list of plugins with something
-# discovered at runtime.
+# The built-in plugins, available even when the package
+# metadata holding the entry points is missing.
 PLUGINS = {
     'write_files': 'cloudbaseinit.plugins.common.userdataplugins.'
                    'cloudconfigplugins.write_files.WriteFilesPlugin',
@@ -27,7 +27,27 @@ PLUGINS = {
 }
 
 
+# Additional sections can be provided through entry points.
+REGISTRY = registry.Registry('cloudbaseinit.cloud_config_plugins', PLUGINS)
+
+
+def get_plugin(section):
+    """Return the method processing the given section, if supported."""
+    if section not in REGISTRY:
+        return None
+    return REGISTRY.get_instance(section).process
+
+
+def get_schema(section):
+    """Return the schema of the given section, None if not supported.
+
+    The plugin class is loaded, but not instantiated.
+    """
+    if section not in REGISTRY:
+        return None
+    return getattr(REGISTRY.get_class(section), 'schema', {})
+
+
 def load_plugins():
-    loader = classloader.ClassLoader()
-    return {section: loader.load_class(class_path)().process
-            for section, class_path in PLUGINS.items()}
+    return {section: get_plugin(section)
+            for section in REGISTRY.list_names()}
@@ -31,6 +31,8 @@ class SetHostnamePlugin(base.BaseCloudConfigPlugin):
 
     """
 
+    schema = {'type': 'string'}
+
     def process(self, data):
         LOG.info("Changing hostname to %r", data)
         osutils = factory.get_os_utils()
@@ -37,6 +37,8 @@ class SetTimezonePlugin(base.BaseCloudConfigPlugin):
 
     """
 
+    schema = {'type': 'string'}
+
     def process(self, data):
         LOG.info("Changing timezone to %r", data)
         osutils = factory.get_os_utils()
@@ -13,10 +13,14 @@
 #    under the License.
 
 import base64
-import gzip
-import io
+import collections
+from multiprocessing import pool
 import os
+import tempfile
+import time
+import zlib
 
+from oslo_config import cfg
 from oslo_log import log as oslo_logging
 import six
 
@@ -26,11 +30,54 @@ from cloudbaseinit.plugins.common.userdataplugins.cloudconfigplugins import (
 )
 
 
+FSYNC_NONE = 'none'
+FSYNC_PER_FILE = 'per-file'
+FSYNC_BATCH = 'batch'
+
+opts = [
+    cfg.IntOpt('write_files_max_workers', default=4,
+               help='The number of files written in parallel by the '
+                    'write_files cloud-config plugin.'),
+    cfg.StrOpt('write_files_fsync', default=FSYNC_NONE,
+               choices=[FSYNC_NONE, FSYNC_PER_FILE, FSYNC_BATCH],
+               help='Control when the files written by the write_files '
+                    'cloud-config plugin are flushed to the disk. If this '
+                    'option is set to `per-file`, each file is flushed '
+                    'before being renamed into place. If it is set to '
+                    '`batch`, the disks are flushed once, after all the '
+                    'files were written. The `none` option leaves it to '
+                    'the operating system.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
+
 DEFAULT_PERMISSIONS = 0o644
 BASE64_MIME = 'application/base64'
 GZIP_MIME = 'application/x-gzip'
+# The size of the chunks in which the content is decoded and written.
+CHUNK_SIZE = 64 * 1024
 LOG = oslo_logging.getLogger(__name__)
 
+FILE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'path': {'type': 'string'},
+        'content': {'type': ['string', 'binary']},
+        'owner': {'type': 'string'},
+        'permissions': {'type': ['string', 'integer', 'number']},
+        'encoding': {'type': 'string'},
+    },
+    'required': ['path', 'content'],
+}
+
+WriteFileResult = collections.namedtuple(
+    'WriteFileResult', ['path', 'success', 'error', 'duration'])
+
+
+class _DecodingError(exception.CloudbaseInitException):
+    pass
+
 
 def _decode_steps(encoding):
     encoding = encoding.lower().strip() if encoding else ''
@@ -56,61 +103,201 @@ def _convert_permissions(permissions):
     return permissions
 
 
-def _process_content(content, encoding):
-    """Decode the content taking into consideration the encoding."""
-    result = content
-    if six.PY3 and not isinstance(result, six.binary_type):
-        # At this point, content will be string, which is wrong for Python 3.
-        result = result.encode()
+def _iter_chunks(content):
+    # Only a chunk of the content is encoded at a time.
+    for index in range(0, len(content), CHUNK_SIZE):
+        chunk = content[index:index + CHUNK_SIZE]
+        if not isinstance(chunk, six.binary_type):
+            chunk = chunk.encode()
+        yield chunk
+
+
+def _b64decode(data):
+    try:
+        return base64.b64decode(data)
+    except (ValueError, TypeError) as exc:
+        raise _DecodingError("Fail to decode base64 content. %s" % exc)
+
+
+def _decode_base64(chunks):
+    # Only whole groups of four characters are decoded at a time.
+    pending = b''
+    for chunk in chunks:
+        data = pending + b''.join(chunk.split())
+        length = len(data) // 4 * 4
+        pending = data[length:]
+        if length:
+            yield _b64decode(data[:length])
+    if pending:
+        yield _b64decode(pending)
+
 
+def _decompress_gzip(chunks):
+    # The decompressed data is bounded to a chunk, whatever the ratio.
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        while chunk:
+            try:
+                data = decompressor.decompress(chunk, CHUNK_SIZE)
+            except zlib.error as exc:
+                raise _DecodingError(
+                    "Fail to decompress gzip content. %s" % exc)
+            if data:
+                yield data
+            chunk = decompressor.unconsumed_tail
+    data = decompressor.flush()
+    if data:
+        yield data
+    if not getattr(decompressor, 'eof', True):
+        raise _DecodingError("Fail to decompress gzip content. "
+                             "The content is truncated.")
+
+
+_DECODERS = {
+    BASE64_MIME: _decode_base64,
+    GZIP_MIME: _decompress_gzip,
+}
+
+
+def _iter_content(content, encoding):
+    """Yield the content decoded taking into consideration the encoding.
+
+    The content is decoded lazily, a chunk at a time, so it's never
+    kept entirely in memory in any of its forms.
+    """
+    chunks = _iter_chunks(content)
     steps = _decode_steps(encoding)
     if not steps:
         LOG.error("Unknown encoding, doing nothing.")
-        return result
-
-    for mime_type in _decode_steps(encoding):
-        if mime_type == GZIP_MIME:
-            bufferio = io.BytesIO(result)
-            with gzip.GzipFile(fileobj=bufferio, mode='rb') as file_handle:
-                try:
-                    result = file_handle.read()
-                except (IOError, ValueError):
-                    LOG.exception("Fail to decompress gzip content.")
-        elif mime_type == BASE64_MIME:
-            try:
-                result = base64.b64decode(result)
-            except (ValueError, TypeError):
-                LOG.exception("Fail to decode base64 content.")
-    return result
+        return chunks
+
+    for mime_type in steps:
+        chunks = _DECODERS[mime_type](chunks)
+    return chunks
+
 
+def _replace(source, destination):
+    if hasattr(os, 'replace'):
+        os.replace(source, destination)
+        return
+    if os.name == 'nt' and os.path.exists(destination):
+        # Renaming over an existing file is not possible on Windows.
+        os.remove(destination)
+    os.rename(source, destination)
+
+
+def _create_dir(dirname):
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
 
-def _write_file(path, content, permissions=DEFAULT_PERMISSIONS,
-                open_mode="wb"):
+
+def _write_file(path, chunks, permissions=DEFAULT_PERMISSIONS, sync=False):
     """Writes a file with the given content.
 
     Also the function sets the file mode as specified.
     The function arguments are the following:
         path: The absolute path to the location on the filesystem where
-        the file should be written.
-        content: The content that should be placed in the file.
+        the file should be written. Its folder has to exist.
+        chunks: An iterable with the content that should be placed in
+        the file.
         permissions:The octal permissions set that should be given for
         this file.
-        open_mode: The open mode used when opening the file.
+        sync: Whether the file should be flushed to the disk.
+
+    The content is written to a temporary file from the same folder,
+    renamed to the given path only when complete, so a failure never
+    leaves a partially written file.
     """
-    dirname = os.path.dirname(path)
-    if not os.path.isdir(dirname):
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix='.%s.' % os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'wb') as file_handle:
+            for chunk in chunks:
+                file_handle.write(chunk)
+            file_handle.flush()
+            if sync:
+                os.fsync(file_handle.fileno())
+
+        os.chmod(temp_path, permissions)
+        _replace(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return True
+
+
+def _sync_files(paths):
+    if hasattr(os, 'sync'):
+        os.sync()
+        return
+    for path in paths:
+        # Flushing a file on Windows requires write access to it.
+        with open(path, 'rb+') as file_handle:
+            os.fsync(file_handle.fileno())
+
+
+def write_files(files, max_workers=None, fsync=None):
+    """Write the given files, returning a result for each of them.
+
+    The files are given as (path, chunks, permissions) tuples. Their
+    folders are created once per folder, then the files are written on
+    a bounded thread pool, the files with the same path being written in
+    the given order. The results are returned in the same order.
+    """
+    max_workers = max(1, max_workers or CONF.write_files_max_workers)
+    fsync = fsync or CONF.write_files_fsync
+    results = [None] * len(files)
+
+    folders = collections.OrderedDict()
+    for index, (path, _, _) in enumerate(files):
+        folders.setdefault(os.path.dirname(path), []).append(index)
+
+    jobs = collections.OrderedDict()
+    for dirname, indexes in folders.items():
         try:
-            os.makedirs(dirname)
+            _create_dir(dirname)
         except OSError as exc:
-            LOG.exception(exc)
-            return False
+            for index in indexes:
+                results[index] = WriteFileResult(files[index][0], False,
+                                                 exc, 0)
+            continue
+        for index in indexes:
+            jobs.setdefault(files[index][0], []).append(index)
 
-    with open(path, open_mode) as file_handle:
-        file_handle.write(content)
-        file_handle.flush()
+    def write(indexes):
+        job_results = []
+        for index in indexes:
+            path, chunks, permissions = files[index]
+            start = time.time()
+            try:
+                _write_file(path, chunks, permissions,
+                            sync=fsync == FSYNC_PER_FILE)
+            except Exception as exc:
+                job_results.append((index, WriteFileResult(
+                    path, False, exc, time.time() - start)))
+            else:
+                job_results.append((index, WriteFileResult(
+                    path, True, None, time.time() - start)))
+        return job_results
 
-    os.chmod(path, permissions)
-    return True
+    jobs = list(jobs.values())
+    if len(jobs) > 1:
+        workers = pool.ThreadPool(min(len(jobs), max_workers))
+        try:
+            job_results = workers.map(write, jobs)
+        finally:
+            workers.close()
+            workers.join()
+    else:
+        job_results = [write(job) for job in jobs]
+
+    for index, result in (item for items in job_results for item in items):
+        results[index] = result
+
+    if fsync == FSYNC_BATCH:
+        _sync_files(sorted(set(result.path for result in results
+                               if result.success)))
+    return results
 
 
 class WriteFilesPlugin(base.BaseCloudConfigPlugin):
@@ -132,17 +319,24 @@ class WriteFilesPlugin(base.BaseCloudConfigPlugin):
     The only required keys in this dictionary are `path` and `content`.
     """
 
-    def _process_item(self, item):
+    schema = {
+        'type': ['object', 'array'],
+        'properties': FILE_SCHEMA['properties'],
+        'required': FILE_SCHEMA['required'],
+        'items': FILE_SCHEMA,
+    }
+
+    @staticmethod
+    def _prepare_item(item):
         if not {'path', 'content'}.issubset(set(item)):
             LOG.warning("Missing required keys from file information %s",
                         item)
             return
 
         path = os.path.abspath(item['path'])
-        content = _process_content(item['content'],
-                                   item.get('encoding'))
+        chunks = _iter_content(item['content'], item.get('encoding'))
         permissions = _convert_permissions(item.get('permissions'))
-        _write_file(path, content, permissions)
+        return path, chunks, permissions
 
     def process(self, data):
         """Process the given data received from the cloud-config userdata.
@@ -157,5 +351,22 @@ class WriteFilesPlugin(base.BaseCloudConfigPlugin):
         if isinstance(data, dict):
             data = [data]
 
-        for item in data:
-            self._process_item(item)
+        files = [self._prepare_item(item) for item in data]
+        files = [file_info for file_info in files if file_info]
+        if not files:
+            return
+
+        start = time.time()
+        results = write_files(files)
+        written = sum(1 for result in results if result.success)
+        for result in results:
+            if result.success:
+                LOG.debug("Wrote %(path)s in %(duration).3f seconds",
+                          {"path": result.path,
+                           "duration": result.duration})
+            else:
+                LOG.error("Failed to write %(path)s: %(error)s",
+                          {"path": result.path, "error": result.error})
+        LOG.info("Wrote %(written)d of %(total)d files in %(duration).3f "
+                 "seconds", {"written": written, "total": len(results),
+                             "duration": time.time() - start})
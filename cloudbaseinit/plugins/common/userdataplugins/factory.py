@@ -14,7 +14,7 @@
 
 from oslo_config import cfg
 
-from cloudbaseinit.utils import classloader
+from cloudbaseinit.utils import registry
 
 opts = [
     cfg.ListOpt(
@@ -40,10 +40,26 @@ CONF = cfg.CONF
 CONF.register_opts(opts)
 
 
+REGISTRY = registry.Registry('cloudbaseinit.user_data_plugins')
+
+
+def _iter_plugins():
+    for class_path in CONF.user_data_plugins:
+        yield REGISTRY.get_instance(class_path)
+
+
 def load_plugins():
     plugins = {}
-    cl = classloader.ClassLoader()
-    for class_path in CONF.user_data_plugins:
-        plugin = cl.load_class(class_path)()
+    for plugin in _iter_plugins():
         plugins[plugin.get_mime_type()] = plugin
     return plugins
+
+
+def get_plugin(mime_type):
+    """Return the plugin handling the given MIME type, if any.
+
+    Only the plugins enabled before the requested one are loaded.
+    """
+    for plugin in _iter_plugins():
+        if plugin.get_mime_type() == mime_type:
+            return plugin
@@ -13,30 +13,50 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import os
-import tempfile
+import re
+
+from oslo_log import log as oslo_logging
 
 from cloudbaseinit.plugins.common.userdataplugins import base
 from cloudbaseinit.utils import classloader
-from cloudbaseinit.utils import encoding
+
+
+LOG = oslo_logging.getLogger(__name__)
+
+DEFAULT_MODULE_NAME = 'part_handler'
+
+
+def _get_module_name(file_name):
+    name = re.sub(r'\W', '_', (file_name or '').rsplit('.', 1)[0])
+    return name or DEFAULT_MODULE_NAME
 
 
 class PartHandlerPlugin(base.BaseUserDataPlugin):
 
     def __init__(self):
         super(PartHandlerPlugin, self).__init__("text/part-handler")
+        self._part_handlers = []
 
     def process(self, part):
-        temp_dir = tempfile.gettempdir()
-        part_handler_path = os.path.join(temp_dir, part.get_filename())
-        encoding.write_file(part_handler_path, part.get_payload())
-
-        part_handler = classloader.ClassLoader().load_module(part_handler_path)
+        loader = classloader.ClassLoader()
+        part_handler = loader.load_source(
+            _get_module_name(part.get_filename()), part.get_payload())
 
         if (part_handler and
                 hasattr(part_handler, "list_types") and
                 hasattr(part_handler, "handle_part")):
+            self._part_handlers.append(part_handler)
             part_handlers_dict = {}
             for handled_type in part_handler.list_types():
                 part_handlers_dict[handled_type] = part_handler.handle_part
             return part_handlers_dict
+        elif part_handler:
+            loader.unload_module(part_handler)
+
+    def unload(self):
+        """Drop the part handlers, once their "__end__" event was sent."""
+        loader = classloader.ClassLoader()
+        for part_handler in self._part_handlers:
+            LOG.debug("Unloading part handler %s", part_handler.__name__)
+            loader.unload_module(part_handler)
+        del self._part_handlers[:]
@@ -46,20 +46,18 @@ def _get_command(data):
 
 def execute_user_data_script(user_data):
     ret_val = 0
-    out = err = None
     command = _get_command(user_data)
     if not command:
         LOG.warning('Unsupported user_data format')
         return ret_val
 
     try:
-        out, err, ret_val = command()
+        # The output is logged while the script runs.
+        _, _, ret_val = command()
     except Exception as exc:
         LOG.warning('An error occurred during user_data execution: \'%s\'',
                     exc)
-    else:
-        LOG.debug('User_data stdout:\n%s', out)
-        LOG.debug('User_data stderr:\n%s', err)
 
-    LOG.info('User_data script ended with return code: %d', ret_val)
+    if ret_val != execcmd.RET_TIMEOUT:
+        LOG.info('User_data script ended with return code: %d', ret_val)
     return ret_val
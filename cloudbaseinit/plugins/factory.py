@@ -15,7 +15,7 @@
 from oslo_config import cfg
 from oslo_log import log as oslo_logging
 
-from cloudbaseinit.utils import classloader
+from cloudbaseinit.utils import registry
 
 
 opts = [
@@ -48,6 +48,9 @@ CONF = cfg.CONF
 CONF.register_opts(opts)
 LOG = oslo_logging.getLogger(__name__)
 
+# The enabled plugins can be given as entry point names as well.
+REGISTRY = registry.Registry('cloudbaseinit.plugins')
+
 # Some plugins were moved to plugins.common, in order to
 # better reflect the fact that they are not platform specific.
 # Unfortunately, there are a lot of users out there with old
@@ -82,7 +85,6 @@ OLD_PLUGINS = {
 
 def load_plugins(stage):
     plugins = []
-    cl = classloader.ClassLoader()
     for class_path in CONF.plugins:
         if class_path in OLD_PLUGINS:
             new_class_path = OLD_PLUGINS[class_path]
@@ -92,10 +94,9 @@ def load_plugins(stage):
             class_path = new_class_path
 
         try:
-            plugin_cls = cl.load_class(class_path)
+            plugin_cls = REGISTRY.get_class(class_path)
             if not stage or plugin_cls.execution_stage == stage:
-                plugin = plugin_cls()
-                plugins.append(plugin)
+                plugins.append(REGISTRY.get_instance(class_path))
         except ImportError:
             LOG.error("Could not import plugin module %r", class_path)
             continue
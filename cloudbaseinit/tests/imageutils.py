@@ -0,0 +1,268 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Builders of small ISO9660 and FAT12 images used by the tests."""
+
+import struct
+
+
+ISO_BLOCK = 2048
+FAT_SECTOR = 512
+FAT_TOTAL_SECTORS = 2880
+FAT_SIZE = 9
+FAT_ROOT_ENTRIES = 224
+FAT_ROOT_SECTORS = FAT_ROOT_ENTRIES * 32 // FAT_SECTOR
+FAT_DATA_SECTOR = 1 + 2 * FAT_SIZE + FAT_ROOT_SECTORS
+FAT_DIR_SIZE = 4 * FAT_SECTOR
+
+
+def _get_tree(files):
+    tree = {}
+    for path, content in files.items():
+        node = tree
+        parts = path.split("/")
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = content
+    return tree
+
+
+def _both_endian(fmt, value):
+    return struct.pack("<" + fmt, value) + struct.pack(">" + fmt, value)
+
+
+def _iso_record(name, extent, size, is_dir, system_use=b""):
+    header_size = 33 + len(name)
+    padding = b"\x00" if len(name) % 2 == 0 else b""
+    length = header_size + len(padding) + len(system_use)
+    length += length % 2
+    record = (struct.pack("<BB", length, 0) + _both_endian("I", extent) +
+              _both_endian("I", size) + b"\x00" * 7 +
+              struct.pack("<BBB", 0x02 if is_dir else 0, 0, 0) +
+              _both_endian("H", 1) + struct.pack("<B", len(name)) +
+              name + padding + system_use)
+    return record + b"\x00" * (length - len(record))
+
+
+def _iso_name(name, joliet, is_dir):
+    if joliet:
+        return name.encode("utf-16-be")
+    name = name.upper().replace("-", "_")
+    return name.encode("ascii") if is_dir else name.encode("ascii") + b";1"
+
+
+def _iso_rock_ridge(name):
+    name = name.encode("utf-8")
+    return b"NM" + struct.pack("<BBB", 5 + len(name), 1, 0) + name
+
+
+class _ISOBuilder(object):
+
+    def __init__(self, files):
+        self._tree = _get_tree(files)
+        self._blocks = {}
+        self._next_block = 0
+
+    def _allocate(self, size):
+        block = self._next_block
+        self._next_block += max(1, (size + ISO_BLOCK - 1) // ISO_BLOCK)
+        return block
+
+    def allocate_files(self, node=None):
+        node = self._tree if node is None else node
+        for name, child in sorted(node.items()):
+            if isinstance(child, dict):
+                self.allocate_files(child)
+            else:
+                extent = self._allocate(len(child))
+                self._blocks[extent] = child
+                node[name] = (extent, child)
+
+    def build_directory(self, joliet, rock_ridge, node=None, parent=None):
+        node = self._tree if node is None else node
+        extent = self._allocate(ISO_BLOCK)
+        children = []
+        for name, child in sorted(node.items()):
+            is_dir = isinstance(child, dict)
+            if is_dir:
+                child_extent = self.build_directory(joliet, rock_ridge,
+                                                    child, extent)
+                child_size = ISO_BLOCK
+            else:
+                child_extent, content = child
+                child_size = len(content)
+            system_use = _iso_rock_ridge(name) if rock_ridge else b""
+            children.append(_iso_record(_iso_name(name, joliet, is_dir),
+                                        child_extent, child_size, is_dir,
+                                        system_use))
+        parent = extent if parent is None else parent
+        data = (_iso_record(b"\x00", extent, ISO_BLOCK, True) +
+                _iso_record(b"\x01", parent, ISO_BLOCK, True) +
+                b"".join(children))
+        self._blocks[extent] = data
+        return extent
+
+    def descriptor(self, vd_type, label, root_extent, escapes=b""):
+        descriptor = bytearray(ISO_BLOCK)
+        descriptor[0:7] = struct.pack("<B5sB", vd_type, b"CD001", 1)
+        descriptor[40:72] = label.encode("ascii").ljust(32)
+        descriptor[80:88] = _both_endian("I", self._next_block)
+        descriptor[88:88 + len(escapes)] = escapes
+        descriptor[128:132] = _both_endian("H", ISO_BLOCK)
+        descriptor[156:190] = _iso_record(b"\x00", root_extent, ISO_BLOCK,
+                                          True)
+        return bytes(descriptor)
+
+    def write(self, path, label, joliet, rock_ridge):
+        # Volume descriptors: primary, supplementary and terminator.
+        self._next_block = 19
+        self.allocate_files()
+        root = self.build_directory(False, rock_ridge)
+        joliet_root = self.build_directory(True, False) if joliet else None
+        descriptors = [self.descriptor(1, label, root)]
+        if joliet:
+            descriptors.append(
+                self.descriptor(2, label, joliet_root, b"%/E"))
+        descriptors.append(struct.pack("<B5sB", 255, b"CD001", 1))
+
+        with open(path, "wb") as stream:
+            stream.truncate(self._next_block * ISO_BLOCK)
+            for index, descriptor in enumerate(descriptors):
+                stream.seek((16 + index) * ISO_BLOCK)
+                stream.write(descriptor)
+            for block, data in self._blocks.items():
+                stream.seek(block * ISO_BLOCK)
+                stream.write(data)
+
+
+def create_iso_image(path, files, label="config-2", joliet=True,
+                     rock_ridge=False):
+    """Write an ISO9660 image containing the given {path: bytes} files."""
+    _ISOBuilder(files).write(path, label, joliet, rock_ridge)
+
+
+def _fat_lfn_checksum(short_name):
+    checksum = 0
+    for char in bytearray(short_name):
+        checksum = (((checksum & 1) << 7) + (checksum >> 1) + char) & 0xFF
+    return checksum
+
+
+def _fat_entries(name, short_name, attributes, cluster, size):
+    """Return the long name entries followed by the short name one."""
+    entries = []
+    if name is not None:
+        encoded = name.encode("utf-16-le") + b"\x00\x00"
+        encoded += b"\xff" * (-len(encoded) % 26)
+        checksum = _fat_lfn_checksum(short_name)
+        chunks = [encoded[index:index + 26]
+                  for index in range(0, len(encoded), 26)]
+        for sequence, chunk in enumerate(chunks, 1):
+            if sequence == len(chunks):
+                sequence |= 0x40
+            entries.insert(0, struct.pack("<B", sequence) + chunk[:10] +
+                           struct.pack("<BBB", 0x0F, 0, checksum) +
+                           chunk[10:22] + b"\x00\x00" + chunk[22:26])
+    entries.append(short_name + struct.pack(
+        "<BB7xH4xHI", attributes, 0, cluster >> 16, cluster & 0xFFFF, size))
+    return b"".join(entries)
+
+
+class _FATBuilder(object):
+
+    def __init__(self, files):
+        self._tree = _get_tree(files)
+        self._fat = bytearray(FAT_SIZE * FAT_SECTOR)
+        self._clusters = {}
+        self._next_cluster = 2
+        self._short_names = 0
+        self._set_fat(0, 0xFF0)
+        self._set_fat(1, 0xFFF)
+
+    def _set_fat(self, cluster, value):
+        offset = cluster + cluster // 2
+        if cluster & 1:
+            self._fat[offset] = (self._fat[offset] & 0x0F) | \
+                ((value << 4) & 0xF0)
+            self._fat[offset + 1] = (value >> 4) & 0xFF
+        else:
+            self._fat[offset] = value & 0xFF
+            self._fat[offset + 1] = (self._fat[offset + 1] & 0xF0) | \
+                ((value >> 8) & 0x0F)
+
+    def _allocate(self, data):
+        count = max(1, (len(data) + FAT_SECTOR - 1) // FAT_SECTOR)
+        first = self._next_cluster
+        for index in range(count):
+            cluster = first + index
+            self._set_fat(cluster, cluster + 1 if index < count - 1
+                          else 0xFFF)
+            self._clusters[cluster] = data[index * FAT_SECTOR:
+                                           (index + 1) * FAT_SECTOR]
+        self._next_cluster += count
+        return first
+
+    def _short_name(self):
+        self._short_names += 1
+        return ("F%07d" % self._short_names).encode("ascii") + b"   "
+
+    def build_directory(self, node, cluster=None):
+        entries = []
+        for name, child in sorted(node.items()):
+            if isinstance(child, dict):
+                cluster = self._allocate(b"\x00" * FAT_DIR_SIZE)
+                data = self.build_directory(child, cluster)
+                for index in range(FAT_DIR_SIZE // FAT_SECTOR):
+                    self._clusters[cluster + index] = data[
+                        index * FAT_SECTOR:(index + 1) * FAT_SECTOR]
+                entries.append(_fat_entries(name, self._short_name(),
+                                            0x10, cluster, 0))
+            else:
+                cluster = self._allocate(child) if child else 0
+                entries.append(_fat_entries(name, self._short_name(),
+                                            0x20, cluster, len(child)))
+        if cluster is not None:
+            entries.insert(0, _fat_entries(None, b".          ", 0x10,
+                                           cluster, 0))
+        return b"".join(entries)
+
+    def write(self, path, label):
+        root = _fat_entries(None, label.upper().encode("ascii").ljust(11),
+                            0x08, 0, 0)
+        root += self.build_directory(self._tree)
+
+        boot = bytearray(FAT_SECTOR)
+        boot[0:36] = struct.pack(
+            "<3s8sHBHBHHBHHHII", b"\xeb\x3c\x90", b"mkfs.fat", FAT_SECTOR,
+            1, 1, 2, FAT_ROOT_ENTRIES, FAT_TOTAL_SECTORS, 0xF0, FAT_SIZE,
+            18, 2, 0, 0)
+        boot[36:62] = struct.pack("<BBBI11s8s", 0, 0, 0x29, 1234,
+                                  label.encode("ascii").ljust(11),
+                                  b"FAT12   ")
+        boot[510:512] = b"\x55\xaa"
+
+        with open(path, "wb") as stream:
+            stream.truncate(FAT_TOTAL_SECTORS * FAT_SECTOR)
+            stream.write(bytes(boot))
+            stream.write(bytes(self._fat))
+            stream.write(bytes(self._fat))
+            stream.write(root)
+            for cluster, data in self._clusters.items():
+                stream.seek((FAT_DATA_SECTOR + cluster - 2) * FAT_SECTOR)
+                stream.write(data)
+
+
+def create_fat_image(path, files, label="config-2"):
+    """Write a FAT12 image containing the given {path: bytes} files."""
+    _FATBuilder(files).write(path, label)
@@ -0,0 +1,66 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import unittest
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+from cloudbaseinit.metadata.services.osconfigdrive import base
+from cloudbaseinit.tests import testutils
+
+
+class FakeConfigDriveManager(base.BaseConfigDriveManager):
+
+    def get_config_drive_files(self, check_types=None, check_locations=None):
+        return False
+
+
+class TestBaseConfigDriveManager(unittest.TestCase):
+
+    def setUp(self):
+        self._manager = FakeConfigDriveManager()
+        self.addCleanup(shutil.rmtree, self._manager.target_path)
+
+    def test_extract_file(self):
+        with testutils.create_tempdir() as source:
+            os.makedirs(os.path.join(source, "openstack", "latest"))
+            with open(os.path.join(source, "openstack", "latest",
+                                   "user_data"), "wb") as stream:
+                stream.write(b"fake data")
+            mock_device = mock.Mock()
+            reader = base.DirectoryReader(source)
+            self._manager._set_reader(reader, mock_device)
+
+            self.assertEqual(["openstack/latest/user_data"],
+                             list(reader.get_files()))
+            self.assertTrue(self._manager.extract_file(
+                os.path.join("openstack", "latest", "user_data")))
+            self.assertTrue(self._manager.extract_file(
+                "openstack/latest/../latest/user_data"))
+            self.assertFalse(self._manager.extract_file("missing"))
+
+        with open(os.path.join(self._manager.target_path, "openstack",
+                               "latest", "user_data"), "rb") as stream:
+            self.assertEqual(b"fake data", stream.read())
+
+        self._manager.release()
+        mock_device.close.assert_called_once_with()
+
+    def test_extract_file_no_reader(self):
+        self.assertFalse(self._manager.extract_file("fake_path"))
@@ -0,0 +1,86 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+from cloudbaseinit.metadata.services.osconfigdrive import cache
+
+
+class TestConfigDriveCache(unittest.TestCase):
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp(prefix="cloudbaseinit-tests")
+        self.addCleanup(shutil.rmtree, self._tempdir)
+        self._cache_path = os.path.join(self._tempdir, "cache")
+        self._cache = cache.ConfigDriveCache(self._cache_path,
+                                             max_entries=2)
+
+    def _get_source(self, content=b"fake data"):
+        source = tempfile.mkdtemp(dir=self._tempdir)
+        with open(os.path.join(source, "meta_data.json"), "wb") as stream:
+            stream.write(content)
+        return source
+
+    def test_get_missing(self):
+        self.assertIsNone(self._cache.get("fake_fingerprint"))
+
+    def test_store_and_get(self):
+        source = self._get_source()
+        entry = self._cache.store("fake_fingerprint", source)
+
+        self.assertFalse(os.path.exists(source))
+        self.assertEqual(entry, self._cache.get("fake_fingerprint"))
+        with open(os.path.join(entry, "meta_data.json"), "rb") as stream:
+            self.assertEqual(b"fake data", stream.read())
+        if sys.platform != "win32":
+            mode = stat.S_IMODE(os.stat(self._cache_path).st_mode)
+            self.assertEqual(0o700, mode)
+
+    @mock.patch('cloudbaseinit.utils.filesystem.restrict_access')
+    def test_store_restricts_access(self, mock_restrict_access):
+        entry = self._cache.store("fake_fingerprint", self._get_source())
+
+        self.assertEqual([mock.call(self._cache_path), mock.call(entry)],
+                         mock_restrict_access.mock_calls)
+
+    def test_store_replaces_entry(self):
+        self._cache.store("fake_fingerprint", self._get_source())
+        entry = self._cache.store("fake_fingerprint",
+                                  self._get_source(b"new data"))
+        with open(os.path.join(entry, "meta_data.json"), "rb") as stream:
+            self.assertEqual(b"new data", stream.read())
+
+    def test_purge(self):
+        os.makedirs(os.path.join(self._cache_path,
+                                 cache.STAGING_PREFIX + "leftover"))
+        for index in range(3):
+            entry = os.path.join(self._cache_path, "entry%d" % index)
+            os.makedirs(entry)
+            os.utime(entry, (index, index))
+        self._cache.get("entry0")
+
+        self._cache.purge()
+
+        self.assertEqual(["entry0", "entry2"],
+                         sorted(os.listdir(self._cache_path)))
@@ -32,10 +32,11 @@ class ClassloaderTest(unittest.TestCase):
         sys.platform = self.original_platform
 
     @mock.patch('cloudbaseinit.utils.classloader.ClassLoader.load_class')
-    def _test_get_config_drive_manager(self, mock_load_class, platform):
+    def _test_get_config_drive_manager(self, mock_load_class, platform,
+                                       class_path=None):
         sys.platform = platform
 
-        if platform is not "win32":
+        if not class_path:
             self.assertRaises(NotImplementedError,
                               factory.get_config_drive_manager)
 
@@ -43,13 +44,17 @@ class ClassloaderTest(unittest.TestCase):
             response = factory.get_config_drive_manager()
 
             mock_load_class.assert_called_once_with(
-                'cloudbaseinit.metadata.services.osconfigdrive.'
-                'windows.WindowsConfigDriveManager')
+                'cloudbaseinit.metadata.services.osconfigdrive.' + class_path)
 
             self.assertIsNotNone(response)
 
     def test_get_config_drive_manager(self):
-        self._test_get_config_drive_manager(platform="win32")
+        self._test_get_config_drive_manager(
+            platform="win32", class_path="windows.WindowsConfigDriveManager")
+
+    def test_get_config_drive_manager_linux(self):
+        self._test_get_config_drive_manager(
+            platform="linux", class_path="linux.LinuxConfigDriveManager")
 
     def test_get_config_drive_manager_exception(self):
         self._test_get_config_drive_manager(platform="other")
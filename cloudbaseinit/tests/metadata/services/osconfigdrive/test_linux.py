@@ -0,0 +1,224 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+from cloudbaseinit.metadata.services.osconfigdrive import cache
+from cloudbaseinit.metadata.services.osconfigdrive import linux
+from cloudbaseinit.tests import imageutils
+from cloudbaseinit.tests import testutils
+from cloudbaseinit.utils import fat
+
+
+MODULE_PATH = "cloudbaseinit.metadata.services.osconfigdrive.linux"
+META_DATA = b'{"uuid": "fake"}'
+FILES = {
+    "openstack/latest/meta_data.json": META_DATA,
+    "openstack/latest/user_data": b"fake user data",
+}
+
+
+class TestLinuxConfigDriveManager(unittest.TestCase):
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp(prefix="cloudbaseinit-tests")
+        self.addCleanup(shutil.rmtree, self._tempdir)
+        self._sys_block = os.path.join(self._tempdir, "sys", "block")
+        self._dev = os.path.join(self._tempdir, "dev")
+        os.makedirs(self._sys_block)
+        os.makedirs(self._dev)
+
+        self._manager = linux.LinuxConfigDriveManager()
+        self.addCleanup(shutil.rmtree, self._manager.target_path, True)
+        self._manager.sys_block_path = self._sys_block
+        self._manager.dev_path = self._dev
+        self.snatcher = testutils.LogSnatcher(MODULE_PATH)
+
+    def _add_device(self, name, size="2880", scsi_type=None):
+        device_dir = os.path.join(self._sys_block, name)
+        os.makedirs(os.path.join(device_dir, "device"))
+        with open(os.path.join(device_dir, "size"), "w") as stream:
+            stream.write(size + "\n")
+        if scsi_type:
+            with open(os.path.join(device_dir, "device", "type"),
+                      "w") as stream:
+                stream.write(scsi_type + "\n")
+        return os.path.join(self._dev, name)
+
+    def _add_partitioned_device(self, name, create_image):
+        partition_path = os.path.join(self._tempdir, "partition")
+        create_image(partition_path, FILES)
+        with open(partition_path, "rb") as stream:
+            content = stream.read()
+
+        sector = bytearray(512)
+        sector[446:462] = struct.pack("<B3sB3sII", 0, b"", 0x83, b"", 2048,
+                                      len(content) // 512)
+        sector[510:512] = b"\x55\xaa"
+        with open(self._add_device(name), "wb") as stream:
+            stream.write(bytes(sector))
+            stream.seek(2048 * 512)
+            stream.write(content)
+
+    def _assert_extracted(self):
+        path = os.path.join(self._manager.target_path,
+                            "openstack", "latest", "meta_data.json")
+        with open(path, "rb") as stream:
+            self.assertEqual(META_DATA, stream.read())
+
+    def test_get_block_devices(self):
+        self._add_device("sr0")
+        self._add_device("sda", scsi_type="5")
+        self._add_device("vda", scsi_type="0")
+        self._add_device("vdb", size="0")
+        self._add_device("ram0")
+
+        self.assertEqual([(os.path.join(self._dev, "sda"), True),
+                          (os.path.join(self._dev, "sr0"), True),
+                          (os.path.join(self._dev, "vda"), False)],
+                         self._manager._get_block_devices())
+
+    def test_get_block_devices_no_sysfs(self):
+        self._manager.sys_block_path = os.path.join(self._tempdir, "missing")
+        self.assertEqual([], self._manager._get_block_devices())
+
+    def test_get_config_drive_from_cdrom_drive(self):
+        imageutils.create_iso_image(self._add_device("sr0"), FILES)
+        with self.snatcher:
+            self.assertTrue(
+                self._manager._get_config_drive_from_cdrom_drive())
+        self.assertEqual(["Config Drive found on <FileDevice: %s>" %
+                          os.path.join(self._dev, "sr0")],
+                         self.snatcher.output)
+        self._assert_extracted()
+
+    def test_get_config_drive_from_raw_hdd(self):
+        imageutils.create_fat_image(self._add_device("vda"), FILES)
+        imageutils.create_iso_image(self._add_device("vdb"), FILES)
+        self.assertTrue(self._manager._get_config_drive_from_raw_hdd())
+        self._assert_extracted()
+
+    def test_get_iso_candidates(self):
+        imageutils.create_iso_image(self._add_device("vda"), FILES)
+        imageutils.create_iso_image(self._add_device("vdb"), FILES,
+                                    label="other")
+        imageutils.create_fat_image(self._add_device("vdc"), FILES)
+        paths = [path for path, _ in self._manager._get_block_devices()]
+        paths.append(os.path.join(self._dev, "missing"))
+
+        self.assertEqual([os.path.join(self._dev, "vda")],
+                         self._manager._get_iso_candidates(paths))
+
+    def test_get_config_drive_from_vfat(self):
+        imageutils.create_fat_image(self._add_device("vda"), FILES)
+        self.assertTrue(self._manager._get_config_drive_from_vfat())
+        self._assert_extracted()
+
+    def test_get_config_drive_from_vfat_wrong_label(self):
+        imageutils.create_fat_image(self._add_device("vda"), FILES,
+                                    label="other")
+        self.assertFalse(self._manager._get_config_drive_from_vfat())
+
+    def test_get_config_drive_from_vfat_no_metadata(self):
+        imageutils.create_fat_image(self._add_device("vda"),
+                                    {"other": b""})
+        self.assertFalse(self._manager._get_config_drive_from_vfat())
+
+    def test_get_config_drive_from_partition(self):
+        self._add_partitioned_device("vda", imageutils.create_iso_image)
+        self.assertTrue(self._manager._get_config_drive_from_partition())
+        self._assert_extracted()
+
+    def test_get_config_drive_from_volume(self):
+        self._add_partitioned_device("vda", imageutils.create_fat_image)
+        self.assertTrue(self._manager._get_config_drive_from_volume())
+        self._assert_extracted()
+
+    def test_selective_extraction(self):
+        self._add_partitioned_device("vda", imageutils.create_iso_image)
+        self._manager.selective_extraction = True
+
+        self.assertTrue(self._manager._get_config_drive_from_partition())
+        self.assertEqual([], os.listdir(self._manager.target_path))
+        self.assertTrue(self._manager.extract_file(
+            "openstack/latest/meta_data.json"))
+        self.assertFalse(self._manager.extract_file("missing"))
+        self._assert_extracted()
+        self.assertEqual(["openstack"],
+                         os.listdir(self._manager.target_path))
+
+        device = self._manager._reader_device
+        self.assertIsNotNone(device.stream)
+        self._manager.release()
+        self.assertIsNone(device.stream)
+        self.assertFalse(self._manager.extract_file(
+            "openstack/latest/user_data"))
+
+    def test_cached_extraction(self):
+        image_path = self._add_device("vda")
+        imageutils.create_fat_image(image_path, FILES)
+        cache_path = os.path.join(self._tempdir, "cache")
+        self._manager.cache = cache.ConfigDriveCache(cache_path)
+
+        self.assertTrue(self._manager._get_config_drive_from_vfat())
+        self._assert_extracted()
+        cached_path = self._manager.target_path
+        self.assertEqual(cache_path, os.path.dirname(cached_path))
+
+        # The next boot uses the cached copy of the unchanged drive.
+        self._manager.release()
+        with mock.patch.object(fat.FATReader, "extract") as mock_extract:
+            self.assertTrue(self._manager._get_config_drive_from_vfat())
+        self.assertFalse(mock_extract.called)
+        self.assertEqual(cached_path, self._manager.target_path)
+
+        # A new drive gets extracted and replaces the cached copy.
+        self._manager.release()
+        imageutils.create_fat_image(image_path, FILES, label="CONFIG-2")
+        self.assertTrue(self._manager._get_config_drive_from_vfat())
+        self.assertNotEqual(cached_path, self._manager.target_path)
+        self.assertEqual([os.path.basename(self._manager.target_path)],
+                         os.listdir(cache_path))
+
+    def test_get_config_drive_from_unreadable_device(self):
+        self._add_device("vda")
+        with self.snatcher:
+            self.assertFalse(self._manager._get_config_drive_from_vfat())
+        self.assertEqual(1, len(self.snatcher.output))
+        self.assertIn("Config Drive extraction failed on",
+                      self.snatcher.output[0])
+
+    @mock.patch(MODULE_PATH + ".LinuxConfigDriveManager."
+                "_get_config_drive_from_volume")
+    @mock.patch(MODULE_PATH + ".LinuxConfigDriveManager."
+                "_get_config_drive_from_cdrom_drive")
+    def test_get_config_drive_files(self, mock_cdrom, mock_volume):
+        mock_cdrom.return_value = False
+        mock_volume.return_value = True
+
+        response = self._manager.get_config_drive_files(
+            ["iso", "vfat"], ["cdrom", "partition"])
+
+        self.assertTrue(response)
+        mock_cdrom.assert_called_once_with()
+        mock_volume.assert_called_once_with()
@@ -16,6 +16,7 @@
 import importlib
 import itertools
 import os
+import shutil
 import unittest
 
 try:
@@ -25,6 +26,7 @@ except ImportError:
 from oslo_config import cfg
 
 from cloudbaseinit import exception
+from cloudbaseinit.tests import imageutils
 from cloudbaseinit.tests import testutils
 
 
@@ -57,7 +59,7 @@ class TestWindowsConfigDriveManager(unittest.TestCase):
         self.mock_uuid4 = self.conf_module.uuid.uuid4
         self.mock_uuid4.return_value = "uuid"
         self._config_manager = self.conf_module.WindowsConfigDriveManager()
-        self.addCleanup(os.rmdir, self._config_manager.target_path)
+        self.addCleanup(shutil.rmtree, self._config_manager.target_path)
         self.osutils = mock.Mock()
         self._config_manager._osutils = self.osutils
         self.snatcher = testutils.LogSnatcher(module_path)
@@ -90,54 +92,41 @@ class TestWindowsConfigDriveManager(unittest.TestCase):
     def test_check_for_config_drive_wrong_label(self):
         self._test_check_for_config_drive(label="config-3", fail=True)
 
-    def _test_get_iso_file_size(self, fixed=True, small=False,
-                                found_iso=True):
+    @mock.patch('cloudbaseinit.utils.iso9660.read_header')
+    def _test_get_iso_header(self, mock_read_header, fixed=True, small=False):
         device = mock.Mock()
         device.fixed = fixed
-        device.size = (self.conf_module.OFFSET_BLOCK_SIZE +
-                       self.conf_module.PEEK_SIZE + int(not small))
-        iso_id = self.conf_module.ISO_ID
-        if not found_iso:
-            iso_id = b"pwned"
-        iso_off = self.conf_module.OFFSET_ISO_ID - 1
-        volume_off = self.conf_module.OFFSET_VOLUME_SIZE - 1
-        block_off = self.conf_module.OFFSET_BLOCK_SIZE - 1
-        volume_bytes = b'd\x00'      # 100
-        block_bytes = b'\x00\x02'    # 512
-        device.seek.side_effect = [iso_off, volume_off, block_off]
-        device.read.side_effect = [iso_id, volume_bytes, block_bytes]
-
-        response = self._config_manager._get_iso_file_size(device)
-        if not fixed or small or not found_iso:
+        device.size = self.conf_module.MIN_ISO_SIZE - int(small)
+
+        response = self._config_manager._get_iso_header(device)
+        if not fixed or small:
             self.assertIsNone(response)
+            self.assertFalse(mock_read_header.called)
             return
 
-        seek_calls = [
-            mock.call(self.conf_module.OFFSET_ISO_ID),
-            mock.call(self.conf_module.OFFSET_VOLUME_SIZE),
-            mock.call(self.conf_module.OFFSET_BLOCK_SIZE)]
-        read_calls = [
-            mock.call(len(iso_id),
-                      skip=self.conf_module.OFFSET_ISO_ID - iso_off),
-            mock.call(self.conf_module.PEEK_SIZE,
-                      skip=self.conf_module.OFFSET_VOLUME_SIZE - volume_off),
-            mock.call(self.conf_module.PEEK_SIZE,
-                      skip=self.conf_module.OFFSET_BLOCK_SIZE - block_off)]
-        device.seek.assert_has_calls(seek_calls)
-        device.read.assert_has_calls(read_calls)
-        self.assertEqual(100 * 512, response)
-
-    def test_get_iso_file_size_not_fixed(self):
-        self._test_get_iso_file_size(fixed=False)
-
-    def test_get_iso_file_size_small(self):
-        self._test_get_iso_file_size(small=True)
-
-    def test_get_iso_file_size_not_found(self):
-        self._test_get_iso_file_size(found_iso=False)
-
-    def test_get_iso_file_size(self):
-        self._test_get_iso_file_size()
+        mock_read_header.assert_called_once_with(device)
+        self.assertEqual(mock_read_header.return_value, response)
+
+    def test_get_iso_header_not_fixed(self):
+        self._test_get_iso_header(fixed=False)
+
+    def test_get_iso_header_small(self):
+        self._test_get_iso_header(small=True)
+
+    def test_get_iso_header(self):
+        self._test_get_iso_header()
+
+    def test_get_iso_header_image(self):
+        with testutils.create_tempdir() as tempdir:
+            iso_file_path = os.path.join(tempdir, "config.iso")
+            imageutils.create_iso_image(
+                iso_file_path, {"openstack/latest/meta_data.json": b"{}"})
+            with self.conf_module.partitions.FileDevice(
+                    iso_file_path) as device:
+                header = self._config_manager._get_iso_header(device)
+
+            self.assertEqual("config-2", header.label)
+            self.assertEqual(os.path.getsize(iso_file_path), header.size)
 
     @mock.patch("six.moves.builtins.open", new=OPEN)
     def test_write_iso_file(self):
@@ -192,36 +181,41 @@ class TestWindowsConfigDriveManager(unittest.TestCase):
     @mock.patch('cloudbaseinit.metadata.services.osconfigdrive.windows.'
                 'WindowsConfigDriveManager._write_iso_file')
     @mock.patch('cloudbaseinit.metadata.services.osconfigdrive.windows.'
-                'WindowsConfigDriveManager._get_iso_file_size')
-    def _test_extract_iso_from_devices(self, mock_get_iso_file_size,
+                'WindowsConfigDriveManager._get_iso_header')
+    def _test_extract_iso_from_devices(self, mock_get_iso_header,
                                        mock_write_iso_file,
                                        mock_extract_files_from_iso,
                                        found=True):
         # For every device (mock) in the list of available devices:
-        #   first - skip (no size)
+        #   first - skip (no header)
         #   second - error (throws Exception)
         #   third - extract (is ok)
         #   fourth - unreachable (already found ok device)
-        size = 100 * 512
+        header = mock.Mock(size=100 * 512)
         devices = [mock.MagicMock() for _ in range(4)]
-        devices[1].__enter__.side_effect = [Exception]
-        rest = [size] if found else [None]
-        mock_get_iso_file_size.side_effect = [None] + rest * 2
+        headers = [None] + [header if found else None] * 3
+        mock_get_iso_header.side_effect = (
+            lambda device: headers[devices.index(device)])
+        mock_write_iso_file.side_effect = [Exception, None]
         file_path = os.path.join("tempdir", "uuid.iso")
 
         with self.snatcher:
             response = self._config_manager._extract_iso_from_devices(devices)
         self.mock_gettempdir.assert_called_once_with()
-        mock_get_iso_file_size.assert_has_calls([
-            mock.call(devices[0]), mock.call(devices[2])])
-        expected_log = [
-            "ISO extraction failed on %(device)s with %(error)r" %
-            {"device": devices[1], "error": Exception()}]
+        self.assertEqual(len(devices), mock_get_iso_header.call_count)
+        expected_log = []
         if found:
-            mock_write_iso_file.assert_called_once_with(devices[2],
-                                                        file_path, size)
+            mock_write_iso_file.assert_has_calls([
+                mock.call(devices[1], file_path, header.size),
+                mock.call(devices[2], file_path, header.size)])
             mock_extract_files_from_iso.assert_called_once_with(file_path)
-            expected_log.append("ISO9660 disk found on %s" % devices[2])
+            expected_log = [
+                "ISO9660 disk found on %s" % devices[1],
+                "ISO extraction failed on %(device)s with %(error)r" %
+                {"device": devices[1], "error": Exception()},
+                "ISO9660 disk found on %s" % devices[2]]
+        else:
+            self.assertFalse(mock_write_iso_file.called)
         self.assertEqual(expected_log, self.snatcher.output)
         self.assertEqual(found, response)
 
@@ -231,6 +225,37 @@ class TestWindowsConfigDriveManager(unittest.TestCase):
     def test_extract_iso_from_devices(self):
         self._test_extract_iso_from_devices()
 
+    @mock.patch('shutil.copytree')
+    def test_copy_config_drive_selective(self, mock_copytree):
+        self._config_manager.selective_extraction = True
+
+        self._config_manager._copy_config_drive("D:\\")
+
+        self.assertFalse(mock_copytree.called)
+        self.assertIsInstance(self._config_manager._reader,
+                              self.conf_module.base.DirectoryReader)
+
+    def test_index_iso_file(self):
+        with testutils.create_tempdir() as tempdir:
+            iso_file_path = os.path.join(tempdir, "uuid.iso")
+            imageutils.create_iso_image(
+                iso_file_path, {"openstack/latest/meta_data.json": b"{}"})
+
+            self._config_manager._index_iso_file(iso_file_path)
+            self.assertTrue(self._config_manager.extract_file(
+                "openstack/latest/meta_data.json"))
+            self._config_manager.release()
+
+            self.assertFalse(os.path.exists(iso_file_path))
+        self.assertIsNone(self._config_manager._iso_file_path)
+
+    def test_index_iso_file_invalid(self):
+        with testutils.create_tempfile() as iso_file_path:
+            self.assertRaises(exception.CloudbaseInitException,
+                              self._config_manager._index_iso_file,
+                              iso_file_path)
+        self.assertIsNone(self._config_manager._reader)
+
     @mock.patch('cloudbaseinit.metadata.services.osconfigdrive.windows.'
                 'WindowsConfigDriveManager.'
                 '_check_for_config_drive')
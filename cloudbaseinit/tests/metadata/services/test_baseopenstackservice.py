@@ -187,11 +187,68 @@ class TestBaseOpenStackService(unittest.TestCase):
         self._test_get_client_auth_certs(
             meta_data={}, ret_value=base.NotExistingMetadataException)
 
+    @mock.patch(MODPATH +
+                ".BaseOpenStackService._get_cache_data")
+    def test_get_network_data(self, mock_get_cache_data):
+        response = self._service._get_network_data()
+        path = posixpath.join("openstack", "latest", "network_data.json")
+        mock_get_cache_data.assert_called_once_with(path, decode=True)
+        self.assertEqual(mock_get_cache_data.return_value, response)
+
+    @mock.patch("cloudbaseinit.utils.networkdata.parse")
+    @mock.patch(MODPATH +
+                ".BaseOpenStackService._get_meta_data")
+    @mock.patch(MODPATH +
+                ".BaseOpenStackService._get_network_data")
+    def test_get_network_details_network_data(self, mock_get_network_data,
+                                              mock_get_meta_data,
+                                              mock_parse):
+        ret = self._service.get_network_details()
+
+        mock_parse.assert_called_once_with(
+            mock_get_network_data.return_value)
+        self.assertEqual(mock_parse.return_value, ret)
+        self.assertFalse(mock_get_meta_data.called)
+
+    @mock.patch("cloudbaseinit.utils.debiface.parse")
+    @mock.patch("cloudbaseinit.utils.networkdata.parse")
+    @mock.patch(MODPATH +
+                ".BaseOpenStackService.get_content")
+    @mock.patch(MODPATH +
+                ".BaseOpenStackService._get_meta_data")
+    @mock.patch(MODPATH +
+                ".BaseOpenStackService._get_network_data")
+    def _test_get_network_details_network_data_empty(
+            self, mock_get_network_data, mock_get_meta_data,
+            mock_get_content, mock_networkdata_parse, mock_debiface_parse,
+            nics):
+        mock_networkdata_parse.return_value = nics
+        mock_get_meta_data.return_value = {
+            "network_config": {"content_path": "/content/0000"}}
+        mock_get_content.return_value = b"fake config"
+
+        ret = self._service.get_network_details()
+
+        mock_networkdata_parse.assert_called_once_with(
+            mock_get_network_data.return_value)
+        mock_get_content.assert_called_once_with("0000")
+        mock_debiface_parse.assert_called_once_with("fake config")
+        self.assertEqual(mock_debiface_parse.return_value, ret)
+
+    def test_get_network_details_network_data_empty(self):
+        self._test_get_network_details_network_data_empty(nics=[])
+
+    def test_get_network_details_network_data_invalid(self):
+        self._test_get_network_details_network_data_empty(nics=None)
+
     @mock.patch(MODPATH +
                 ".BaseOpenStackService.get_content")
     @mock.patch(MODPATH +
                 ".BaseOpenStackService._get_meta_data")
+    @mock.patch(MODPATH +
+                ".BaseOpenStackService._get_network_data")
     def _test_get_network_details(self,
+                                  mock_get_network_data,
                                   mock_get_meta_data,
                                   mock_get_content,
                                   network_config=None,
@@ -199,6 +256,8 @@ class TestBaseOpenStackService(unittest.TestCase):
                                   search_fail=False,
                                   no_path=False):
         # mock obtained data
+        mock_get_network_data.side_effect = (
+            base.NotExistingMetadataException)
         mock_get_meta_data().get.return_value = network_config
         mock_get_content.return_value = content
         # actual tests
@@ -106,6 +106,27 @@ class TestConfigDriveService(unittest.TestCase):
         self.assertEqual(expected_log, self.snatcher.output)
         self.assertTrue(response)
         self.assertEqual(fake_path, self._config_drive._metadata_path)
+        self.assertFalse(mock_manager.selective_extraction)
+
+    @mock.patch('cloudbaseinit.metadata.services.osconfigdrive.factory.'
+                'get_config_drive_manager')
+    def test_load_cached(self, mock_get_config_drive_manager):
+        mock_manager = mock_get_config_drive_manager.return_value
+        options = {
+            "config_drive_selective_extraction": True,
+            "config_drive_cache_path": "fake_cache_path",
+            "config_drive_cache_max_entries": 2,
+        }
+        contexts = [testutils.ConfPatcher(key, value)
+                    for key, value in options.items()]
+        with contexts[0], contexts[1], contexts[2]:
+            self._config_drive.load()
+
+        self.assertFalse(mock_manager.selective_extraction)
+        self.assertIsInstance(mock_manager.cache,
+                              self.configdrive_module.cache.ConfigDriveCache)
+        self.assertEqual("fake_cache_path", mock_manager.cache._path)
+        self.assertEqual(2, mock_manager.cache._max_entries)
 
     @mock.patch('os.path.normpath')
     @mock.patch('os.path.join')
@@ -119,6 +140,20 @@ class TestConfigDriveService(unittest.TestCase):
                 self._config_drive._metadata_path, fake_path)
             mock_normpath.assert_called_once_with(mock_join.return_value)
 
+    def test_get_data_selective(self):
+        mock_mgr = mock.Mock()
+        self._config_drive._mgr = mock_mgr
+        self._config_drive._selective = True
+        with testutils.create_tempdir() as tempdir:
+            self._config_drive._metadata_path = tempdir
+            with open(os.path.join(tempdir, 'fake_file'), 'wb') as stream:
+                stream.write(b'fake data')
+
+            response = self._config_drive._get_data('fake_file')
+
+        mock_mgr.extract_file.assert_called_once_with('fake_file')
+        self.assertEqual(b'fake data', response)
+
     @mock.patch('shutil.rmtree')
     def test_cleanup(self, mock_rmtree):
         fake_path = os.path.join('fake', 'path')
@@ -130,6 +165,7 @@ class TestConfigDriveService(unittest.TestCase):
             self._config_drive.cleanup()
         self.assertEqual(["Deleting metadata folder: %r" % fake_path],
                          self.snatcher.output)
+        mock_mgr.release.assert_called_once_with()
         mock_rmtree.assert_called_once_with(fake_path,
                                             ignore_errors=True)
         self.assertEqual(None, self._config_drive._metadata_path)
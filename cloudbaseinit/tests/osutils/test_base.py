@@ -12,7 +12,6 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import subprocess
 import sys
 import unittest
 
@@ -30,32 +29,32 @@ class BaseOSUtilsTests(unittest.TestCase):
         self._base = base.BaseOSUtils()
 
     @mock.patch('sys.stdout')
-    @mock.patch('subprocess.Popen')
-    @mock.patch('subprocess.PIPE')
-    def test_execute_process(self, mock_PIPE, mock_Popen, mock_stdout):
+    @mock.patch('cloudbaseinit.utils.process.execute')
+    def test_execute_process(self, mock_execute, mock_stdout):
         args = [mock.sentinel.fake_arg]
 
-        mock_p = mock.MagicMock()
         mock_out = mock.MagicMock()
         mock_err = mock.MagicMock()
-        mock_Popen.return_value = mock_p
-        mock_p.communicate.return_value = (mock_out, mock_err)
+        mock_execute.return_value = (mock_out, mock_err,
+                                     mock.sentinel.returncode)
 
         response = self._base.execute_process(args, shell=True,
-                                              decode_output=True)
+                                              decode_output=True,
+                                              name=mock.sentinel.name)
 
-        mock_Popen.assert_called_once_with(args, stdout=subprocess.PIPE,
-                                           stderr=subprocess.PIPE, shell=True)
-        mock_p.communicate.assert_called_once_with()
+        mock_execute.assert_called_once_with(args, shell=True,
+                                             name=mock.sentinel.name)
 
         if sys.version_info < (3, 0):
             mock_out.decode.assert_called_once_with(mock_stdout.encoding)
             mock_err.decode.assert_called_once_with(mock_stdout.encoding)
             self.assertEqual((mock_out.decode.return_value,
-                              mock_err.decode.return_value, mock_p.returncode),
+                              mock_err.decode.return_value,
+                              mock.sentinel.returncode),
                              response)
         else:
-            self.assertEqual((mock_out, mock_err, mock_p.returncode), response)
+            self.assertEqual((mock_out, mock_err, mock.sentinel.returncode),
+                             response)
 
     @mock.patch('os.urandom')
     def test_generate_random_password(self, mock_urandom):
@@ -64,3 +63,40 @@ class BaseOSUtilsTests(unittest.TestCase):
 
         mock_urandom.assert_called_once_with(256)
         self.assertEqual("dGVzdA==", response)
+
+    @mock.patch.object(base.BaseOSUtils, 'set_static_network_config_v6')
+    @mock.patch.object(base.BaseOSUtils, 'set_static_network_config')
+    def test_apply_network_config(self, mock_set_static_network_config,
+                                  mock_set_static_network_config_v6):
+        mock_set_static_network_config.side_effect = [False, True]
+        nic_configs = [
+            base.StaticNetworkConfig(
+                mock.sentinel.mac1, mock.sentinel.address,
+                mock.sentinel.netmask, mock.sentinel.broadcast,
+                mock.sentinel.gateway, mock.sentinel.dnsnameservers,
+                mock.sentinel.address6, mock.sentinel.netmask6,
+                mock.sentinel.gateway6),
+            base.StaticNetworkConfig(
+                mock.sentinel.mac2, None, None, None, None,
+                mock.sentinel.dnsnameservers, None, None, None),
+            base.StaticNetworkConfig(
+                mock.sentinel.mac3, None, None, None, None, None,
+                mock.sentinel.address6, mock.sentinel.netmask6, None),
+        ]
+
+        response = self._base.apply_network_config(nic_configs)
+
+        self.assertTrue(response)
+        self.assertEqual(
+            [mock.call(mock.sentinel.mac1, mock.sentinel.address,
+                       mock.sentinel.netmask, mock.sentinel.broadcast,
+                       mock.sentinel.gateway, mock.sentinel.dnsnameservers),
+             mock.call(mock.sentinel.mac2, None, None, None, None,
+                       mock.sentinel.dnsnameservers)],
+            mock_set_static_network_config.call_args_list)
+        self.assertEqual(
+            [mock.call(mock.sentinel.mac1, mock.sentinel.address6,
+                       mock.sentinel.netmask6, mock.sentinel.gateway6),
+             mock.call(mock.sentinel.mac3, mock.sentinel.address6,
+                       mock.sentinel.netmask6, None)],
+            mock_set_static_network_config_v6.call_args_list)
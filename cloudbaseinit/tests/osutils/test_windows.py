@@ -568,7 +568,8 @@ class TestWindowsUtils(testutils.CloudbaseInitTestBase):
 
         response = self._winutils.get_network_adapters()
         conn.return_value.query.assert_called_with(wql)
-        self.assertEqual([(mock_response.Name, mock_response.MACAddress)],
+        self.assertEqual([(mock_response.Name, mock_response.MACAddress,
+                           mock_response.NetConnectionID)],
                          response)
 
     def test_get_network_adapters(self):
@@ -746,6 +747,137 @@ class TestWindowsUtils(testutils.CloudbaseInitTestBase):
                                              gateway_val=ret_val2,
                                              dns_val=ret_val3)
 
+    def test_set_static_network_config_no_address(self):
+        conn = self._wmi_mock.WMI
+        adapter = mock.MagicMock()
+        adapter.__len__.return_value = 1
+        conn.return_value.query.return_value = adapter
+        adapter_config = adapter[0].associators.return_value[0]
+        adapter_config.SetDNSServerSearchOrder.return_value = (0,)
+
+        response = self._winutils.set_static_network_config(
+            '54:EE:75:19:F4:61', None, None, None, None, ['8.8.8.8'])
+
+        self.assertFalse(response)
+        self.assertFalse(adapter_config.EnableStatic.called)
+        self.assertFalse(adapter_config.SetGateways.called)
+        adapter_config.SetDNSServerSearchOrder.assert_called_once_with(
+            ['8.8.8.8'])
+
+    def _get_adapter_config(self, mac_address):
+        adapter_config = mock.Mock()
+        adapter_config.MACAddress = mac_address
+        adapter_config.EnableStatic.return_value = (1,)
+        adapter_config.SetGateways.return_value = (0,)
+        adapter_config.SetDNSServerSearchOrder.return_value = (0,)
+        return adapter_config
+
+    @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils'
+                '.check_os_version')
+    @mock.patch("cloudbaseinit.utils.windows.network"
+                ".get_adapter_addresses")
+    def _test_apply_network_config(self, mock_get_adapter_addresses,
+                                   mock_check_os_version, v6_support=True,
+                                   missing=False):
+        adapter_config1 = self._get_adapter_config('54:EE:75:19:F4:61')
+        adapter_config2 = self._get_adapter_config('54:ee:75:19:f4:62')
+        conn, conn6 = mock.Mock(), mock.MagicMock()
+        conn.query.return_value = [adapter_config1, adapter_config2]
+        self._wmi_mock.WMI.side_effect = lambda moniker: {
+            '//./root/cimv2': conn, '//./root/StandardCimv2': conn6}[moniker]
+        mock_check_os_version.return_value = v6_support
+        mock_get_adapter_addresses.return_value = [{
+            "mac_address": '54:EE:75:19:F4:62',
+            "friendly_name": "Ethernet1",
+            "interface_index": 5,
+        }]
+        nic_configs = [
+            self.windows_utils.base.StaticNetworkConfig(
+                '54:EE:75:19:F4:61', '10.0.0.5', self._NETMASK, None,
+                self._GATEWAY, ['8.8.8.8'], None, None, None),
+            self.windows_utils.base.StaticNetworkConfig(
+                '54:EE:75:19:F4:62', None, None, None, None, ['8.8.4.4'],
+                '2001:db8::3', '64', '2001:db8::1'),
+        ]
+        if missing:
+            nic_configs.append(nic_configs[0]._replace(
+                mac='54:EE:75:19:F4:63'))
+            self.assertRaises(exception.CloudbaseInitException,
+                              self._winutils.apply_network_config,
+                              nic_configs)
+            return
+
+        with self.snatcher:
+            response = self._winutils.apply_network_config(nic_configs)
+
+        self.assertTrue(response)
+        conn.query.assert_called_once_with(
+            "SELECT * FROM Win32_NetworkAdapterConfiguration "
+            "WHERE IPEnabled = True")
+        adapter_config1.EnableStatic.assert_called_once_with(
+            ['10.0.0.5'], [self._NETMASK])
+        adapter_config1.SetGateways.assert_called_once_with(
+            [self._GATEWAY], [1])
+        adapter_config1.SetDNSServerSearchOrder.assert_called_once_with(
+            ['8.8.8.8'])
+        self.assertFalse(adapter_config2.EnableStatic.called)
+        self.assertFalse(adapter_config2.SetGateways.called)
+        adapter_config2.SetDNSServerSearchOrder.assert_called_once_with(
+            ['8.8.4.4'])
+        if not v6_support:
+            self.assertEqual("Setting IPv6 info not available on this "
+                             "system", self.snatcher.output[-1])
+            self.assertFalse(conn6.query.called)
+            return
+        conn6.query.assert_called_once_with(
+            "SELECT * FROM MSFT_NetIPAddress")
+        netip = conn6.query.return_value[0]
+        self.assertEqual(1, netip.Create.call_count)
+        params = netip.Create.call_args[1]
+        self.assertEqual(
+            (5, "Ethernet1", '2001:db8::3', '64', '2001:db8::1'),
+            (params["InterfaceIndex"], params["InterfaceAlias"],
+             params["IPAddress"], params["PrefixLength"],
+             params["DefaultGateway"]))
+
+    def test_apply_network_config(self):
+        self._test_apply_network_config()
+
+    def test_apply_network_config_no_v6_support(self):
+        self._test_apply_network_config(v6_support=False)
+
+    def test_apply_network_config_missing_adapter(self):
+        self._test_apply_network_config(missing=True)
+
+    def test_apply_network_config_empty(self):
+        self.assertFalse(self._winutils.apply_network_config([]))
+        self.assertFalse(self._wmi_mock.WMI.called)
+
+    def test_get_network_adapters_config(self):
+        conn = self._wmi_mock.WMI
+        config = mock.Mock()
+        config.MACAddress = '54:EE:75:19:F4:61'
+        config.DHCPEnabled = False
+        config.IPAddress = ('10.0.0.5', 'fe80::1')
+        config.IPSubnet = ('255.255.255.0', '64')
+        config.DefaultIPGateway = ('10.0.0.1',)
+        config.DNSServerSearchOrder = None
+        no_mac_config = mock.Mock()
+        no_mac_config.MACAddress = None
+        conn.return_value.query.return_value = [config, no_mac_config]
+
+        response = self._winutils.get_network_adapters_config()
+
+        conn.return_value.query.assert_called_once_with(
+            "SELECT * FROM Win32_NetworkAdapterConfiguration "
+            "WHERE IPEnabled = True")
+        self.assertEqual(
+            [self.windows_utils.base.AdapterConfig(
+                '54:EE:75:19:F4:61', False,
+                [('10.0.0.5', '255.255.255.0'), ('fe80::1', '64')],
+                ['10.0.0.1'], [])],
+            response)
+
     def test_set_static_network_config_v6(self):
         self._test_set_static_network_config_v6()
 
@@ -1628,14 +1760,15 @@ class TestWindowsUtils(testutils.CloudbaseInitTestBase):
         args.append('fake_script_path')
 
         response = self._winutils.execute_powershell_script(
-            script_path='fake_script_path')
+            script_path='fake_script_path', name=mock.sentinel.name)
 
         if ret_val:
             mock_get_sysnative_dir.assert_called_once_with()
         else:
             mock_get_system32_dir.assert_called_once_with()
 
-        mock_execute_process.assert_called_with(args, shell=False)
+        mock_execute_process.assert_called_with(args, shell=False,
+                                                name=mock.sentinel.name)
         self.assertEqual(mock_execute_process.return_value, response)
 
     def test_execute_powershell_script_sysnative(self):
@@ -1790,6 +1923,29 @@ class TestWindowsUtils(testutils.CloudbaseInitTestBase):
             shell=True)
         self.assertEqual(mock.sentinel.execute_process, result)
 
+    @mock.patch('cloudbaseinit.osutils.windows.WindowsUtils.'
+                'execute_system32_process')
+    def _test_set_path_owner_only_acls(self, mock_execute_system32_process,
+                                       ret_val=0):
+        mock_execute_system32_process.return_value = (b"", b"fake err",
+                                                      ret_val)
+        if ret_val:
+            self.assertRaises(exception.CloudbaseInitException,
+                              self._winutils.set_path_owner_only_acls,
+                              "fake path")
+        else:
+            self._winutils.set_path_owner_only_acls("fake path")
+        mock_execute_system32_process.assert_called_once_with(
+            ["icacls.exe", "fake path", "/inheritance:r", "/grant:r",
+             "*S-1-3-4:(OI)(CI)F", "*S-1-5-18:(OI)(CI)F", "/T", "/Q"],
+            shell=False)
+
+    def test_set_path_owner_only_acls(self):
+        self._test_set_path_owner_only_acls()
+
+    def test_set_path_owner_only_acls_fails(self):
+        self._test_set_path_owner_only_acls(ret_val=1)
+
     def test_get_password_maximum_length(self):
         self.assertEqual(20, self._winutils.get_maximum_password_length())
 
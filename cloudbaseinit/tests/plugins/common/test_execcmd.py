@@ -25,6 +25,7 @@ except ImportError:
 from cloudbaseinit.plugins.common import base
 from cloudbaseinit.plugins.common import execcmd
 from cloudbaseinit.tests import testutils
+from cloudbaseinit.utils import process
 
 
 def _remove_file(filepath):
@@ -89,7 +90,9 @@ class TestExecCmd(unittest.TestCase):
 
             mock_osutils.execute_process.assert_called_once_with(
                 [command._target_path],
-                shell=command.shell)
+                shell=command.shell,
+                name=os.path.basename(tmp),
+                output_path=None, timeout=None)
 
             # test __call__ API.
             mock_osutils.execute_process.reset_mock()
@@ -97,7 +100,9 @@ class TestExecCmd(unittest.TestCase):
 
             mock_osutils.execute_process.assert_called_once_with(
                 [command._target_path],
-                shell=command.shell)
+                shell=command.shell,
+                name=os.path.basename(tmp),
+                output_path=None, timeout=None)
 
     def test_execute_powershell_command(self, mock_get_os_utils):
         mock_osutils = mock_get_os_utils()
@@ -107,7 +112,106 @@ class TestExecCmd(unittest.TestCase):
             command.execute()
 
             mock_osutils.execute_powershell_script.assert_called_once_with(
-                command._target_path, command.sysnative)
+                command._target_path, command.sysnative,
+                name=os.path.basename(tmp), output_path=None,
+                timeout=None)
+
+    def test_execute_options(self, _):
+        command = execcmd.BaseCommand(os.path.join('fake', 'script.ps1'))
+
+        with testutils.ConfPatcher('scripts_output_dir', 'logs'):
+            with testutils.ConfPatcher('script_timeout', 10):
+                self.assertEqual(
+                    {'name': 'script.ps1',
+                     'output_path': os.path.join('logs', 'script.ps1.log'),
+                     'timeout': 10},
+                    command.execute_options)
+
+    def _test_get_timeout(self, content, expected_timeout,
+                          script_timeout=0, stage_timeout=0):
+        command = execcmd.BaseCommand.from_data(content)
+        self.addCleanup(command._cleanup)
+
+        with testutils.ConfPatcher('script_timeout', script_timeout):
+            with execcmd.StageTimeout(stage_timeout):
+                timeout = command.get_timeout()
+        if isinstance(expected_timeout, float):
+            self.assertAlmostEqual(expected_timeout, timeout, places=0)
+        else:
+            self.assertEqual(expected_timeout, timeout)
+
+    @mock.patch('cloudbaseinit.plugins.common.execcmd.StageTimeout.'
+                'get_remaining')
+    def test_get_timeout_stage_used_up(self, mock_get_remaining, _):
+        mock_get_remaining.return_value = 0
+        command = execcmd.BaseCommand.from_data(b"echo 1")
+        self.addCleanup(command._cleanup)
+
+        # A used up stage doesn't leave the command unbounded.
+        self.assertRaises(execcmd.StageTimeoutException,
+                          command.get_timeout)
+
+    def test_get_timeout_none(self, _):
+        self._test_get_timeout(b"echo 1", None)
+
+    def test_get_timeout_conf(self, _):
+        self._test_get_timeout(b"echo 1", 10, script_timeout=10)
+
+    def test_get_timeout_directive(self, _):
+        self._test_get_timeout(b"#ps1\n# Cloudbase-Init: timeout=600\n",
+                               600, script_timeout=10)
+        self._test_get_timeout(b"rem cmd\r\nrem cloudbase-init: timeout=5",
+                               5)
+        self._test_get_timeout(b"echo cloudbase-init: timeout=5", None)
+
+    def test_get_timeout_stage(self, _):
+        self._test_get_timeout(b"echo 1", 10.0, stage_timeout=10)
+        self._test_get_timeout(b"echo 1", 5, script_timeout=5,
+                               stage_timeout=10)
+        self._test_get_timeout(b"echo 1", 10.0, script_timeout=20,
+                               stage_timeout=10)
+
+    def test_stage_timeout_nested(self, _):
+        self.assertIsNone(execcmd.StageTimeout.get_remaining())
+        with execcmd.StageTimeout(10):
+            with execcmd.StageTimeout(20):
+                self.assertLessEqual(execcmd.StageTimeout.get_remaining(),
+                                     10)
+            with execcmd.StageTimeout(0):
+                self.assertLessEqual(execcmd.StageTimeout.get_remaining(),
+                                     10)
+        self.assertIsNone(execcmd.StageTimeout.get_remaining())
+
+    def test_execute_timeout(self, mock_get_os_utils):
+        mock_osutils = mock_get_os_utils()
+        mock_osutils.execute_process.side_effect = (
+            process.ProcessTimeoutException(['fake'], 10, b'out', b'err'))
+        cleanup = mock.Mock()
+
+        with testutils.create_tempfile() as tmp:
+            command = execcmd.BaseCommand(tmp, cleanup=cleanup)
+            with testutils.LogSnatcher('cloudbaseinit.plugins.common.'
+                                       'execcmd') as snatcher:
+                response = command.execute()
+
+        self.assertEqual((b'out', b'err', execcmd.RET_TIMEOUT), response)
+        self.assertEqual(['%s timed out after 10 seconds' %
+                          os.path.basename(tmp)], snatcher.output)
+        cleanup.assert_called_once_with()
+
+    @mock.patch('cloudbaseinit.plugins.common.execcmd.StageTimeout.'
+                'get_remaining')
+    def test_execute_stage_timed_out(self, mock_get_remaining,
+                                     mock_get_os_utils):
+        mock_get_remaining.return_value = 0
+        mock_osutils = mock_get_os_utils()
+
+        with testutils.create_tempfile() as tmp:
+            command = execcmd.BaseCommand(tmp)
+            response = command.execute()
+
+        self.assertEqual((b"", b"", execcmd.RET_TIMEOUT), response)
+        self.assertFalse(mock_osutils.execute_process.called)
 
     def test_execute_cleanup(self, _):
         with testutils.create_tempfile() as tmp:
@@ -173,6 +277,15 @@ class TestExecCmd(unittest.TestCase):
             1001: (base.PLUGIN_EXECUTION_DONE, True),
             1002: (base.PLUGIN_EXECUTE_ON_NEXT_BOOT, False),
             1003: (base.PLUGIN_EXECUTE_ON_NEXT_BOOT, True),
+            1004: (base.PLUGIN_EXECUTION_DONE, False),
+            None: (base.PLUGIN_EXECUTION_DONE, False),
+            execcmd.RET_TIMEOUT: (base.PLUGIN_EXECUTION_TIMED_OUT, False),
         }
         for ret_val, expect in ret_val_map.items():
             self.assertEqual(expect, execcmd.get_plugin_return_value(ret_val))
+
+    def test_get_plugin_return_value_timeout(self, _):
+        # A timed out command isn't reported like a successful one.
+        self.assertNotEqual(
+            execcmd.get_plugin_return_value(0),
+            execcmd.get_plugin_return_value(execcmd.RET_TIMEOUT))
@@ -76,3 +76,15 @@ class TestFileExecutilsPlugin(unittest.TestCase):
         retval = fileexecutils.exec_file("fake.py")
         mock_execute.assert_called_once_with()
         self.assertEqual(0, retval)
+
+    @mock.patch('cloudbaseinit.plugins.common.execcmd.'
+                'BaseCommand.execute')
+    def test_exec_file_timed_out(self, mock_execute, _):
+        mock_execute.return_value = (b"", b"", execcmd.RET_TIMEOUT)
+
+        with testutils.LogSnatcher('cloudbaseinit.plugins.common.'
+                                   'fileexecutils') as snatcher:
+            retval = fileexecutils.exec_file("fake.py")
+
+        self.assertEqual(execcmd.RET_TIMEOUT, retval)
+        self.assertEqual([], snatcher.output)
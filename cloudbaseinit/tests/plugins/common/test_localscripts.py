@@ -21,6 +21,7 @@ except ImportError:
     import mock
 
 from cloudbaseinit.plugins.common import base
+from cloudbaseinit.plugins.common import execcmd
 from cloudbaseinit.plugins.common import localscripts
 from cloudbaseinit.tests import testutils
 
@@ -70,3 +71,111 @@ class LocalScriptsPluginTests(unittest.TestCase):
         mock_get_plugin_return_value.assert_any_call(1001)
         mock_get_plugin_return_value.assert_any_call(1002)
         self.assertEqual((base.PLUGIN_EXECUTE_ON_NEXT_BOOT, True), response)
+
+    def test_get_groups(self):
+        file_paths = ['05-a.ps1', '10-a.cmd', '10-b.sh', '100-a.py',
+                      'first.ps1', 'second.ps1']
+
+        groups = self._localscripts._get_groups(file_paths)
+
+        self.assertEqual([['05-a.ps1'], ['10-a.cmd', '10-b.sh'],
+                          ['100-a.py'], ['first.ps1'], ['second.ps1']],
+                         groups)
+
+    @testutils.ConfPatcher('local_scripts_max_workers', 4)
+    @mock.patch('cloudbaseinit.plugins.common.fileexecutils.exec_file')
+    def test_exec_group_parallel(self, mock_exec_file):
+        results = {'10-a.cmd': 1002, '10-b.sh': 0, '10-c.py': 1001}
+        mock_exec_file.side_effect = results.get
+
+        response = self._localscripts._exec_group(sorted(results))
+
+        self.assertEqual([(1002, base.PLUGIN_EXECUTE_ON_NEXT_BOOT, False),
+                          (0, base.PLUGIN_EXECUTION_DONE, False),
+                          (1001, base.PLUGIN_EXECUTION_DONE, True)],
+                         response)
+
+    def _write_scripts(self, path, scripts):
+        for name, content in scripts.items():
+            with open(os.path.join(path, name), 'w') as stream:
+                stream.write(content)
+
+    @mock.patch('cloudbaseinit.plugins.common.fileexecutils.exec_file')
+    def test_exec_group_sequential_reboot(self, mock_exec_file):
+        results = {'10-a.cmd': 0, '10-b.sh': 1001, '10-c.py': 0}
+        mock_exec_file.side_effect = (
+            lambda file_path: results[os.path.basename(file_path)])
+
+        response = self._localscripts._exec_group(sorted(results))
+
+        # The scripts following the one requesting a reboot are not run.
+        self.assertEqual([(0, base.PLUGIN_EXECUTION_DONE, False),
+                          (1001, base.PLUGIN_EXECUTION_DONE, True)],
+                         response)
+        self.assertEqual([mock.call('10-a.cmd'), mock.call('10-b.sh')],
+                         mock_exec_file.call_args_list)
+
+    @testutils.ConfPatcher('local_scripts_max_workers', 2)
+    @mock.patch('cloudbaseinit.plugins.common.fileexecutils.exec_file')
+    def test_execute_groups_reboot(self, mock_exec_file):
+        results = {'10-a.cmd': 1001, '10-b.sh': 1002, '20-a.ps1': 0}
+        mock_exec_file.side_effect = (
+            lambda file_path: results[os.path.basename(file_path)])
+
+        with testutils.create_tempdir() as tempdir:
+            self._write_scripts(tempdir, dict.fromkeys(results, 'echo 1'))
+            with testutils.ConfPatcher('local_scripts_path', tempdir):
+                response = self._localscripts.execute(mock.Mock(), None)
+
+        # The whole group is executed in parallel before rebooting.
+        self.assertEqual(['10-a.cmd', '10-b.sh'],
+                         sorted(os.path.basename(call[0][0])
+                                for call in mock_exec_file.call_args_list))
+        self.assertEqual((base.PLUGIN_EXECUTE_ON_NEXT_BOOT, True), response)
+
+    @mock.patch('cloudbaseinit.plugins.common.fileexecutils.exec_file')
+    def test_execute_timed_out(self, mock_exec_file):
+        results = {'10-timeout.cmd': execcmd.RET_TIMEOUT, '20-done.sh': 0}
+        mock_exec_file.side_effect = (
+            lambda file_path: results[os.path.basename(file_path)])
+
+        with testutils.create_tempdir() as tempdir:
+            self._write_scripts(tempdir, dict.fromkeys(results, 'echo 1'))
+            with testutils.ConfPatcher('local_scripts_path', tempdir):
+                response = self._localscripts.execute(mock.Mock(), None)
+
+        self.assertEqual(2, mock_exec_file.call_count)
+        self.assertEqual((base.PLUGIN_EXECUTION_TIMED_OUT, False), response)
+
+    @mock.patch('cloudbaseinit.plugins.common.fileexecutils.exec_file')
+    def test_execute_manifest(self, mock_exec_file):
+        # The timed out scripts have no exit code.
+        results = {'10-done.cmd': 0, '20-failed.sh': 1,
+                   '25-timeout.py': execcmd.RET_TIMEOUT, '30-reboot.ps1': 1001}
+        mock_exec_file.side_effect = (
+            lambda file_path: results[os.path.basename(file_path)])
+
+        with testutils.create_tempdir() as tempdir:
+            scripts_path = os.path.join(tempdir, 'scripts')
+            os.mkdir(scripts_path)
+            self._write_scripts(scripts_path, dict.fromkeys(results, 'echo'))
+            manifest_path = os.path.join(tempdir, 'manifest.json')
+
+            def execute():
+                mock_exec_file.reset_mock()
+                with testutils.ConfPatcher('local_scripts_path',
+                                           scripts_path):
+                    with testutils.ConfPatcher('local_scripts_manifest_path',
+                                               manifest_path):
+                        self._localscripts.execute(mock.Mock(), None)
+                return sorted(os.path.basename(call[0][0])
+                              for call in mock_exec_file.call_args_list)
+
+            self.assertEqual(sorted(results), execute())
+            # The scripts rebooting are done as well.
+            self.assertEqual(['20-failed.sh', '25-timeout.py'], execute())
+
+            # The changed scripts are executed again.
+            self._write_scripts(scripts_path, {'10-done.cmd': 'echo 2'})
+            self.assertEqual(['10-done.cmd', '20-failed.sh', '25-timeout.py'],
+                             execute())
@@ -31,7 +31,7 @@ class MTUPluginTests(unittest.TestCase):
     def setUp(self):
         self._mtu = mtu.MTUPlugin()
 
-    @mock.patch('cloudbaseinit.utils.dhcp.get_dhcp_options')
+    @mock.patch('cloudbaseinit.utils.dhcp.get_all_cached_dhcp_options')
     def _test_execute(self, mock_get_os_utils,
                       mock_get_dhcp_options,
                       dhcp_options=None):
@@ -40,14 +40,17 @@ class MTUPluginTests(unittest.TestCase):
             (mock.sentinel.mac_address1, mock.sentinel.dhcp_host1),
             (mock.sentinel.mac_address2, mock.sentinel.dhcp_host2),
         ]
-        mock_get_dhcp_options.return_value = dhcp_options
+        mock_get_dhcp_options.return_value = {
+            mock.sentinel.dhcp_host1: dhcp_options,
+            mock.sentinel.dhcp_host2: dhcp_options,
+        }
 
         return_value = self._mtu.execute(mock.sentinel.service,
                                          mock.sentinel.shared_data)
 
         expected_dhcp_calls = [
-            mock.call(mock.sentinel.dhcp_host1, [dhcp.OPTION_MTU]),
-            mock.call(mock.sentinel.dhcp_host2, [dhcp.OPTION_MTU]),
+            mock.call([mock.sentinel.dhcp_host1, mock.sentinel.dhcp_host2],
+                      [dhcp.OPTION_MTU]),
         ]
         expected_return_value = (base.PLUGIN_EXECUTE_ON_NEXT_BOOT, False)
         self.assertEqual(expected_dhcp_calls,
@@ -23,6 +23,7 @@ except ImportError:
 
 from cloudbaseinit import exception
 from cloudbaseinit.metadata.services import base as service_base
+from cloudbaseinit.osutils import base as osutils_base
 from cloudbaseinit.plugins.common import base as plugin_base
 from cloudbaseinit.plugins.common import networkconfig
 from cloudbaseinit.tests import testutils
@@ -47,7 +48,7 @@ class TestNetworkConfigPlugin(unittest.TestCase):
         mock_service.get_network_details.return_value = network_details
         mock_get_os_utils.return_value = mock_osutils
         mock_osutils.get_network_adapters.return_value = network_adapters
-        mock_osutils.set_static_network_config.return_value = True
+        mock_osutils.apply_network_config.return_value = True
         network_execute = functools.partial(
             self._network_plugin.execute,
             mock_service, mock_shared_data
@@ -66,40 +67,32 @@ class TestNetworkConfigPlugin(unittest.TestCase):
                                    'common.networkconfig'):
             ret = network_execute()
 
-        calls, calls6 = [], []
-        for adapter in set(network_adapters) - set(missed_adapters):
+        nic_configs = []
+        for adapter in network_adapters:
+            if adapter in missed_adapters:
+                continue
             nics = [nic for nic in (network_details +
                                     extra_network_details)
                     if nic.mac == adapter[1]]
             self.assertTrue(nics)    # missed_adapters should do the job
             nic = nics[0]
-            call = mock.call(
+            has_address6 = nic.address6 and nic.netmask6
+            nic_configs.append(osutils_base.StaticNetworkConfig(
                 nic.mac,
                 nic.address,
                 nic.netmask,
                 nic.broadcast,
                 nic.gateway,
-                nic.dnsnameservers
-            )
-            call6 = mock.call(
-                nic.mac,
-                nic.address6,
-                nic.netmask6,
-                nic.gateway6
-            )
-            calls.append(call)
-            if nic.address6 and nic.netmask6:
-                calls6.append(call6)
-        self.assertEqual(
-            len(calls),
-            mock_osutils.set_static_network_config.call_count)
-        self.assertEqual(
-            len(calls6),
-            mock_osutils.set_static_network_config_v6.call_count)
-        mock_osutils.set_static_network_config.assert_has_calls(
-            calls, any_order=True)
-        mock_osutils.set_static_network_config_v6.assert_has_calls(
-            calls6, any_order=True)
+                nic.dnsnameservers,
+                nic.address6 if has_address6 else None,
+                nic.netmask6 if has_address6 else None,
+                nic.gateway6 if has_address6 else None
+            ))
+        if nic_configs:
+            mock_osutils.apply_network_config.assert_called_once_with(
+                nic_configs)
+        else:
+            self.assertFalse(mock_osutils.apply_network_config.called)
         reboot = len(missed_adapters) != self._count
         self.assertEqual((plugin_base.PLUGIN_EXECUTION_DONE, reboot), ret)
 
@@ -199,7 +192,7 @@ class TestNetworkConfigPlugin(unittest.TestCase):
         self._partial_test_execute(invalid_details=True)
 
     def test_execute_invalid_network_details_name(self):
-        self._setUp(wrong_names=True, no_macs=True)
+        self._setUp(same_names=False, wrong_names=True, no_macs=True)
         self._partial_test_execute(invalid_details=True)
 
     def test_execute_single(self):
@@ -296,3 +289,180 @@ class TestNetworkConfigPlugin(unittest.TestCase):
 
     def test_execute_missing_gateway(self):
         self._test_execute_missing_smth(gateway=True)
+
+    def test_adapter_index(self):
+        network_adapters = [
+            ("vm eth1", "54:EE:75:19:F4:62", "Ethernet 2"),
+            ("vm eth0", "54:EE:75:19:F4:61", "Ethernet"),
+            ("Ethernet", "54:EE:75:19:F4:63"),
+        ]
+        nic = self._network_details[0]._replace(mac=None)
+        adapters = networkconfig._AdapterIndex(network_adapters)
+
+        self.assertEqual("54:EE:75:19:F4:61", adapters.get_mac(
+            nic._replace(mac="54-ee-75-19-f4-61")))
+        self.assertEqual("54:ee:75:19:f4:64", adapters.get_mac(
+            nic._replace(mac="54:ee:75:19:f4:64")))
+        self.assertEqual("54:EE:75:19:F4:62", adapters.get_mac(
+            nic._replace(name="Ethernet 2")))
+        # The names take precedence over the aliases.
+        self.assertEqual("54:EE:75:19:F4:63", adapters.get_mac(
+            nic._replace(name="Ethernet")))
+        # The adapters are sorted by name.
+        self.assertEqual("54:EE:75:19:F4:61", adapters.get_mac(
+            nic._replace(name="eth1")))
+        self.assertIsNone(adapters.get_mac(nic._replace(name="eth3")))
+
+    def test_preprocess_nics_summary(self):
+        incomplete = self._network_details[0]._replace(address=None,
+                                                       address6=None)
+        network_details = [incomplete] + self._network_details[1:]
+
+        with testutils.LogSnatcher('cloudbaseinit.plugins.'
+                                   'common.networkconfig') as snatcher:
+            nics = networkconfig._preprocess_nics(network_details,
+                                                  self._network_adapters)
+
+        self.assertEqual(self._network_details[1:], nics)
+        self.assertEqual(["Incomplete NetworkDetails objects: %s"
+                          % [incomplete]], snatcher.output)
+
+    @mock.patch("cloudbaseinit.osutils.factory.get_os_utils")
+    def test_execute_unmatched_summary(self, mock_get_os_utils):
+        mock_osutils = mock_get_os_utils.return_value
+        mock_service = mock.Mock()
+        extra_nic = self._network_details[0]._replace(
+            mac="54:EE:75:19:F4:64")
+        mock_service.get_network_details.return_value = (
+            self._network_details[1:] + [extra_nic])
+        mock_osutils.get_network_adapters.return_value = (
+            self._network_adapters)
+        mock_osutils.get_network_adapters_config.return_value = [
+            self._get_adapter_config(nic) for nic in self._network_details]
+
+        with testutils.LogSnatcher('cloudbaseinit.plugins.'
+                                   'common.networkconfig') as snatcher:
+            self._network_plugin.execute(mock_service, mock.Mock())
+
+        self.assertEqual(
+            ["Missing details for adapters: 54:EE:75:19:F4:61",
+             "Details not used for adapters: 54:EE:75:19:F4:64"],
+            [line for line in snatcher.output
+             if not line.endswith("is already configured")])
+
+    def _get_adapter_config(self, nic, dhcp_enabled=False):
+        return osutils_base.AdapterConfig(
+            nic.mac, dhcp_enabled,
+            [(nic.address, nic.netmask), (nic.address6, nic.netmask6)],
+            [nic.gateway, nic.gateway6], list(nic.dnsnameservers))
+
+    @mock.patch("cloudbaseinit.osutils.factory.get_os_utils")
+    def test_execute_no_changes(self, mock_get_os_utils):
+        mock_osutils = mock_get_os_utils.return_value
+        mock_service = mock.Mock()
+        mock_service.get_network_details.return_value = (
+            self._network_details)
+        mock_osutils.get_network_adapters.return_value = (
+            self._network_adapters)
+        mock_osutils.get_network_adapters_config.return_value = [
+            self._get_adapter_config(nic) for nic in self._network_details]
+
+        with testutils.LogSnatcher('cloudbaseinit.plugins.'
+                                   'common.networkconfig') as snatcher:
+            ret = self._network_plugin.execute(mock_service, mock.Mock())
+
+        self.assertEqual((plugin_base.PLUGIN_EXECUTION_DONE, False), ret)
+        self.assertFalse(mock_osutils.apply_network_config.called)
+        self.assertEqual(["Network adapter %s is already configured" % mac
+                          for _, mac in self._network_adapters],
+                         snatcher.output)
+
+    def test_get_adapters_config(self):
+        mock_osutils = mock.Mock()
+        config = self._get_adapter_config(self._network_details[0])
+        config = config._replace(mac=config.mac.lower())
+        mock_osutils.get_network_adapters_config.return_value = [config]
+
+        adapters_config = networkconfig._get_adapters_config(mock_osutils)
+
+        self.assertEqual({self._network_details[0].mac: config},
+                         adapters_config)
+
+    def test_get_adapters_config_not_implemented(self):
+        mock_osutils = mock.Mock()
+        mock_osutils.get_network_adapters_config.side_effect = (
+            NotImplementedError)
+
+        self.assertEqual({}, networkconfig._get_adapters_config(mock_osutils))
+
+    def test_get_changes_no_config(self):
+        changes = networkconfig._get_changes(self._network_details[0], None)
+
+        self.assertEqual([networkconfig.CHANGE_ADDRESS,
+                          networkconfig.CHANGE_GATEWAY,
+                          networkconfig.CHANGE_DNS,
+                          networkconfig.CHANGE_ADDRESS6], changes)
+
+    def test_get_changes_none(self):
+        nic = self._network_details[0]
+        config = self._get_adapter_config(nic)
+
+        self.assertEqual([], networkconfig._get_changes(nic, config))
+
+    def test_get_changes_dhcp_enabled(self):
+        nic = self._network_details[0]
+        config = self._get_adapter_config(nic, dhcp_enabled=True)
+
+        self.assertEqual([networkconfig.CHANGE_ADDRESS],
+                         networkconfig._get_changes(nic, config))
+
+    def test_get_changes_address6_only(self):
+        nic = self._network_details[0]._replace(
+            address=None, netmask=None, broadcast=None, gateway=None)
+        config = osutils_base.AdapterConfig(
+            nic.mac, True, [(nic.address6, nic.netmask6)], [nic.gateway6],
+            list(nic.dnsnameservers))
+
+        self.assertEqual([], networkconfig._get_changes(nic, config))
+
+    def test_get_changes(self):
+        nic = self._network_details[1]
+        config = self._get_adapter_config(self._network_details[0])
+        config = config._replace(
+            addresses=[(nic.address, nic.netmask)],
+            dnsnameservers=list(reversed(nic.dnsnameservers)))
+
+        self.assertEqual([networkconfig.CHANGE_GATEWAY,
+                          networkconfig.CHANGE_DNS,
+                          networkconfig.CHANGE_ADDRESS6],
+                         networkconfig._get_changes(nic, config))
+
+    def test_get_nic_config_address(self):
+        nic = self._network_details[0]
+
+        config = networkconfig._get_nic_config(
+            nic, [networkconfig.CHANGE_ADDRESS])
+
+        self.assertEqual(osutils_base.StaticNetworkConfig(
+            nic.mac, nic.address, nic.netmask, nic.broadcast, nic.gateway,
+            nic.dnsnameservers, None, None, None), config)
+
+    def test_get_nic_config_dns_address6(self):
+        nic = self._network_details[0]
+
+        config = networkconfig._get_nic_config(
+            nic, [networkconfig.CHANGE_DNS, networkconfig.CHANGE_ADDRESS6])
+
+        self.assertEqual(osutils_base.StaticNetworkConfig(
+            nic.mac, None, None, None, None, nic.dnsnameservers,
+            nic.address6, nic.netmask6, nic.gateway6), config)
+
+    def test_get_nic_config_gateway(self):
+        nic = self._network_details[0]
+
+        config = networkconfig._get_nic_config(
+            nic, [networkconfig.CHANGE_GATEWAY])
+
+        self.assertEqual(osutils_base.StaticNetworkConfig(
+            nic.mac, None, None, None, nic.gateway, None, None, None, None),
+            config)
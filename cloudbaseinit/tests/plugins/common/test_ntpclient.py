@@ -32,7 +32,7 @@ class NTPClientPluginTests(unittest.TestCase):
 
     @testutils.ConfPatcher('ntp_use_dhcp_config', True)
     @mock.patch('cloudbaseinit.osutils.factory.get_os_utils')
-    @mock.patch('cloudbaseinit.utils.dhcp.get_dhcp_options')
+    @mock.patch('cloudbaseinit.utils.dhcp.get_all_cached_dhcp_options')
     @mock.patch('cloudbaseinit.plugins.common.ntpclient.NTPClientPlugin.'
                 'verify_time_service')
     @mock.patch('cloudbaseinit.plugins.common.ntpclient.NTPClientPlugin.'
@@ -52,7 +52,8 @@ class NTPClientPluginTests(unittest.TestCase):
         mock_get_os_utils.return_value = mock_osutils
         mock_osutils.get_dhcp_hosts_in_use.return_value = [('fake mac address',
                                                             'fake dhcp host')]
-        mock_get_dhcp_options.return_value = mock_options_data
+        mock_get_dhcp_options.return_value = {
+            'fake dhcp host': mock_options_data}
         mock_options_data.get.return_value = ntp_data
 
         response = self._ntpclient.execute(service=mock_service,
@@ -60,7 +61,7 @@ class NTPClientPluginTests(unittest.TestCase):
 
         mock_osutils.get_dhcp_hosts_in_use.assert_called_once_with()
         mock_get_dhcp_options.assert_called_once_with(
-            'fake dhcp host', [dhcp.OPTION_NTP_SERVERS])
+            ['fake dhcp host'], [dhcp.OPTION_NTP_SERVERS])
         mock_options_data.get.assert_called_once_with(dhcp.OPTION_NTP_SERVERS)
         if ntp_data:
             mock_unpack_ntp_hosts.assert_called_once_with(ntp_data)
@@ -22,6 +22,7 @@ try:
     import unittest.mock as mock
 except ImportError:
     import mock
+import yaml
 
 from cloudbaseinit.metadata.services import base as metadata_services_base
 from cloudbaseinit.plugins.common import base
@@ -79,26 +80,23 @@ class UserDataPluginTest(unittest.TestCase):
     def test_execute_not_user_data(self):
         self._test_execute(ret_val=None)
 
-    @mock.patch('email.message_from_string')
-    @mock.patch('cloudbaseinit.utils.encoding.get_as_string')
-    def test_parse_mime(self, mock_get_as_string,
-                        mock_message_from_string):
-        fake_user_data = textwrap.dedent('''
-        -----BEGIN CERTIFICATE-----
-        MIIDGTCCAgGgAwIBAgIJAN5fj7R5dNrMMA0GCSqGSIb3DQEBCwUAMCExHzAdBgNV
-        BAMTFmNsb3VkYmFzZS1pbml0LWV4YW1wbGUwHhcNMTUwNDA4MTIyNDI1WhcNMjUw
-        ''')
-        expected_logging = ['User data content:\n%s' % fake_user_data]
-        mock_get_as_string.return_value = fake_user_data
+    @mock.patch('cloudbaseinit.utils.mime.iter_parts')
+    def test_parse_mime(self, mock_iter_parts):
+        fake_user_data = b'Content-Type: multipart/mixed'
+        mock_part = mock.Mock()
+        mock_part.get_content_type.return_value = 'text/x-shellscript'
+        mock_part.get_filename.return_value = 'script.sh'
+        mock_part.size = 42
+        mock_iter_parts.return_value = iter([mock_part])
+        expected_logging = [
+            'User data part: text/x-shellscript, script.sh, 42 bytes']
 
         with testutils.LogSnatcher('cloudbaseinit.plugins.common.'
                                    'userdata') as snatcher:
-            response = self._userdata._parse_mime(user_data=fake_user_data)
+            response = list(self._userdata._parse_mime(fake_user_data))
 
-        mock_get_as_string.assert_called_once_with(fake_user_data)
-        mock_message_from_string.assert_called_once_with(
-            mock_get_as_string.return_value)
-        self.assertEqual(response, mock_message_from_string().walk())
+        mock_iter_parts.assert_called_once_with(fake_user_data)
+        self.assertEqual([mock_part], response)
         self.assertEqual(expected_logging, snatcher.output)
 
     @mock.patch('cloudbaseinit.plugins.common.userdataplugins.factory.'
@@ -114,19 +112,37 @@ class UserDataPluginTest(unittest.TestCase):
     def _test_process_user_data(self, mock_process_non_multi_part,
                                 mock_end_part_process_event,
                                 mock_process_part, mock_parse_mime,
-                                mock_load_plugins, user_data, reboot):
+                                mock_load_plugins, user_data, reboot,
+                                status=base.PLUGIN_EXECUTION_DONE):
         mock_part = mock.MagicMock()
-        mock_parse_mime.return_value = [mock_part]
-        mock_process_part.return_value = (base.PLUGIN_EXECUTION_DONE, reboot)
+        mock_next_part = mock.MagicMock()
+        # The parts are generated while being parsed.
+        mock_parse_mime.return_value = (part for part in (mock_part,
+                                                          mock_next_part))
+        mock_process_part.side_effect = [
+            (status, reboot),
+            (base.PLUGIN_EXECUTION_DONE, False)]
 
         response = self._userdata._process_user_data(user_data=user_data)
 
         if user_data.startswith(b'Content-Type: multipart'):
             mock_load_plugins.assert_called_once_with()
             mock_parse_mime.assert_called_once_with(user_data)
-            mock_process_part.assert_called_once_with(mock_part,
-                                                      mock_load_plugins(), {})
-            self.assertEqual((base.PLUGIN_EXECUTION_DONE, reboot), response)
+            expected_calls = [mock.call(mock_part, mock_load_plugins(), {})]
+            if not reboot:
+                expected_calls.append(
+                    mock.call(mock_next_part, mock_load_plugins(), {}))
+            # Without a plan to record, nothing is parsed past the part
+            # requesting a reboot.
+            self.assertEqual(expected_calls,
+                             mock_process_part.call_args_list)
+            self.assertEqual(not reboot, mock_next_part.close.called)
+            mock_part.close.assert_called_once_with()
+            part_handler_plugin = mock_load_plugins.return_value.get(
+                self._userdata._PART_HANDLER_CONTENT_TYPE)
+            self.assertEqual(not reboot, part_handler_plugin.unload.called)
+            # A timeout isn't overridden by the following parts.
+            self.assertEqual((status, reboot), response)
         else:
             mock_process_non_multi_part.assert_called_once_with(user_data)
             self.assertEqual(mock_process_non_multi_part.return_value,
@@ -140,6 +156,88 @@ class UserDataPluginTest(unittest.TestCase):
         self._test_process_user_data(user_data=b'Content-Type: multipart',
                                      reboot=False)
 
+    def test_process_user_data_multipart_timed_out(self):
+        self._test_process_user_data(user_data=b'Content-Type: multipart',
+                                     reboot=False,
+                                     status=base.PLUGIN_EXECUTION_TIMED_OUT)
+
+    @mock.patch('cloudbaseinit.plugins.common.userdata.UserDataPlugin'
+                '._process_part')
+    def test_process_user_data_cached(self, mock_process_part):
+        user_data = (b'Content-Type: multipart/mixed; boundary="b"\n\n'
+                     b'--b\nContent-Type: text/x-shellscript\n\necho 1\n'
+                     b'--b\nContent-Type: text/x-shellscript\n\necho 2\n'
+                     b'--b--\n')
+        payloads = []
+        # Only the first run's second part requests a reboot.
+        results = [(base.PLUGIN_EXECUTION_DONE, False),
+                   (base.PLUGIN_EXECUTE_ON_NEXT_BOOT, True)]
+
+        def _process_part(part, *args):
+            payloads.append(part.get_payload())
+            if results:
+                return results.pop(0)
+            return base.PLUGIN_EXECUTION_DONE, False
+
+        mock_process_part.side_effect = _process_part
+
+        with testutils.create_tempdir() as tempdir:
+            with testutils.ConfPatcher('user_data_cache_path', tempdir):
+                # The reboot requested by the first script
+                # doesn't prevent caching the whole plan.
+                self.assertEqual(
+                    (base.PLUGIN_EXECUTE_ON_NEXT_BOOT, True),
+                    self._userdata._process_user_data(user_data))
+                with mock.patch.object(self._userdata,
+                                       '_parse_mime') as mock_parse_mime:
+                    self.assertEqual(
+                        (base.PLUGIN_EXECUTION_DONE, False),
+                        self._userdata._process_user_data(user_data))
+                self.assertFalse(mock_parse_mime.called)
+
+        self.assertEqual(['', 'echo 1', '', 'echo 1', 'echo 2'], payloads)
+
+    @mock.patch('cloudbaseinit.plugins.common.userdatainclude.'
+                'IncludeFetcher')
+    @mock.patch('cloudbaseinit.plugins.common.userdataplugins.factory.'
+                'load_plugins')
+    @mock.patch('cloudbaseinit.plugins.common.userdata.UserDataPlugin'
+                '._process_part')
+    def test_process_user_data_include(self, mock_process_part,
+                                       mock_load_plugins, mock_fetcher_class):
+        user_data = b'#include\nhttp://fake/first\nhttp://fake/second\n'
+        included_parts = [mock.Mock(), mock.Mock()]
+        mock_fetcher = mock_fetcher_class.return_value
+        mock_fetcher.expand.return_value = iter(included_parts)
+        mock_process_part.return_value = (base.PLUGIN_EXECUTION_DONE, False)
+
+        response = self._userdata._process_user_data(user_data)
+
+        (include_part, ), _ = mock_fetcher.expand.call_args
+        self.assertEqual('text/x-include-url',
+                         include_part.get_content_type())
+        self.assertEqual(
+            [mock.call(part, mock_load_plugins.return_value, {})
+             for part in included_parts],
+            mock_process_part.call_args_list)
+        for part in included_parts:
+            part.close.assert_called_once_with()
+        mock_fetcher.close.assert_called_once_with()
+        self.assertEqual((base.PLUGIN_EXECUTION_DONE, False), response)
+
+    @mock.patch('cloudbaseinit.plugins.common.userdatainclude.'
+                'IncludeFetcher')
+    @mock.patch('cloudbaseinit.plugins.common.userdataplugins.factory.'
+                'load_plugins')
+    def test_process_user_data_include_fails(self, mock_load_plugins,
+                                             mock_fetcher_class):
+        mock_fetcher = mock_fetcher_class.return_value
+        mock_fetcher.expand.side_effect = ValueError
+
+        self.assertRaises(ValueError, self._userdata._process_user_data,
+                          b'#include\nhttp://fake/first\n')
+        mock_fetcher.close.assert_called_once_with()
+
     def test_process_user_data_non_multipart(self):
         self._test_process_user_data(user_data=b'Content-Type: non-multipart',
                                      reboot=False)
@@ -287,18 +385,16 @@ class UserDataPluginTest(unittest.TestCase):
         self.assertFalse(reboot)
 
     @mock.patch('cloudbaseinit.plugins.common.userdataplugins.factory.'
-                'load_plugins')
-    def test_process_non_multi_part_cloud_config(self, mock_load_plugins):
+                'get_plugin')
+    def test_process_non_multi_part_cloud_config(self, mock_get_plugin):
         user_data = b'#cloud-config'
         mock_return_value = mock.sentinel.return_value
-        mock_cloud_config_plugin = mock.Mock()
+        mock_cloud_config_plugin = mock_get_plugin.return_value
         mock_cloud_config_plugin.process.return_value = mock_return_value
-        mock_load_plugins.return_value = {
-            'text/cloud-config': mock_cloud_config_plugin}
         status, reboot = self._userdata._process_non_multi_part(
             user_data=user_data)
 
-        mock_load_plugins.assert_called_once_with()
+        mock_get_plugin.assert_called_once_with('text/cloud-config')
         (mock_cloud_config_plugin
          .process_non_multipart
          .assert_called_once_with(user_data))
@@ -328,15 +424,11 @@ class TestCloudConfig(unittest.TestCase):
                                                    gzip_binary=gz_binary))
         with testutils.LogSnatcher('cloudbaseinit.plugins.'
                                    'common.userdataplugins.'
-                                   'cloudconfigplugins') as snatcher:
+                                   'cloudconfigplugins.'
+                                   'write_files') as snatcher:
             status, reboot = self.plugin.execute(service, {})
 
-        for path in (b64, b64_binary, gz, gz_binary):
-            self.assertTrue(os.path.exists(path),
-                            "Path {} should exist.".format(path))
-            with open(path) as stream:
-                self.assertEqual('42', stream.read())
-
+        self._assert_written_files(b64, b64_binary, gz, gz_binary)
         self.assertEqual(status, 1)
         self.assertFalse(reboot)
         expected_logging = [
@@ -345,4 +437,36 @@ class TestCloudConfig(unittest.TestCase):
             'Fail to process permissions None, assuming 420',
             'Fail to process permissions None, assuming 420'
         ]
-        self.assertEqual(expected_logging, snatcher.output)
+        self.assertEqual(expected_logging, snatcher.output[:4])
+        self.assertTrue(snatcher.output[-1].startswith(
+            'Wrote 4 of 4 files in'))
+
+    def _assert_written_files(self, *paths):
+        for path in paths:
+            self.assertTrue(os.path.exists(path),
+                            "Path {} should exist.".format(path))
+            with open(path) as stream:
+                self.assertEqual('42', stream.read())
+
+    @mock.patch('cloudbaseinit.plugins.common.userdataplugins.cloudconfig.'
+                'CloudConfigPluginExecutor._load_yaml')
+    def test_cloud_config_multipart_cached(self, mock_load_yaml):
+        paths = list(self.create_tempfiles(4))
+        service = FakeService(self.userdata.format(b64=paths[0],
+                                                   b64_binary=paths[1],
+                                                   gzip=paths[2],
+                                                   gzip_binary=paths[3]))
+        mock_load_yaml.side_effect = (
+            lambda stream: yaml.load(stream, Loader=yaml.SafeLoader))
+
+        with testutils.create_tempdir() as tempdir:
+            with testutils.ConfPatcher('user_data_cache_path', tempdir):
+                self.plugin.execute(service, {})
+                for path in paths:
+                    os.remove(path)
+                status, reboot = self.plugin.execute(service, {})
+
+        self._assert_written_files(*paths)
+        mock_load_yaml.assert_called_once_with(mock.ANY)
+        self.assertEqual(status, 1)
+        self.assertFalse(reboot)
@@ -0,0 +1,225 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+from cloudbaseinit.plugins.common import userdatacache
+from cloudbaseinit.tests import testutils
+from cloudbaseinit.utils import mime
+
+
+USER_DATA = b"""Content-Type: multipart/mixed; boundary="b"
+
+--b
+Content-Type: text/x-shellscript
+Content-Disposition: attachment; filename="script.sh"
+Content-Transfer-Encoding: base64
+
+ZWNobyA0Mg==
+--b
+Content-Type: text/cloud-config
+
+set_hostname: fake
+--b--
+"""
+
+
+class UserDataCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self._path = tempfile.mkdtemp(prefix="cloudbaseinit-tests")
+        self.addCleanup(shutil.rmtree, self._path)
+        self._cache = userdatacache.UserDataCache(self._path,
+                                                  max_entries=2)
+
+    def _record(self, user_data):
+        digest = userdatacache.get_digest(user_data)
+        recorder = self._cache.record_parts(digest)
+        for part in mime.iter_parts(user_data):
+            recorder.add(part)
+            part.close()
+        recorder.commit()
+        return digest
+
+    def test_get_parts(self):
+        digest = self._record(USER_DATA)
+
+        parts = self._cache.get_parts(digest)
+        self.assertEqual(["multipart/mixed", "text/x-shellscript",
+                          "text/cloud-config"],
+                         [part.get_content_type() for part in parts])
+        self.assertEqual("script.sh", parts[1].get_filename())
+        self.assertEqual(b"echo 42", parts[1].get_payload(decode=True))
+        self.assertEqual(7, parts[1].size)
+        self.assertEqual("set_hostname: fake", parts[2].get_payload())
+        for part in parts:
+            part.close()
+        self.assertEqual(0o700, os.stat(self._path).st_mode & 0o777)
+
+    @mock.patch('cloudbaseinit.utils.filesystem.restrict_access')
+    def test_restrict_access_once(self, mock_restrict_access):
+        self._cache.store_cloud_config("fake: 1", {"fake": 1})
+        self._cache.store_include("http://fake", b"fake")
+
+        mock_restrict_access.assert_called_once_with(self._path)
+
+    def test_get_parts_missing(self):
+        self.assertIsNone(self._cache.get_parts("missing"))
+
+    @mock.patch.object(userdatacache, 'PLAN_VERSION', 0)
+    def test_get_parts_other_version(self):
+        digest = self._record(USER_DATA)
+        with mock.patch.object(userdatacache, 'PLAN_VERSION', 1):
+            self.assertIsNone(self._cache.get_parts(digest))
+
+    def test_get_parts_invalid(self):
+        digest = self._record(USER_DATA)
+        os.remove(os.path.join(self._path, userdatacache.PLANS_FOLDER,
+                               digest, userdatacache.PLAN_FILE))
+        with testutils.LogSnatcher('cloudbaseinit.plugins.common.'
+                                   'userdatacache') as snatcher:
+            self.assertIsNone(self._cache.get_parts(digest))
+        self.assertEqual(1, len(snatcher.output))
+
+    def _test_get_parts_damaged(self, damage):
+        digest = self._record(USER_DATA)
+        entry_path = os.path.join(self._path, userdatacache.PLANS_FOLDER,
+                                  digest)
+        damage(entry_path)
+        opened = []
+        real_open = open
+
+        def fake_open(*args, **kwargs):
+            stream = real_open(*args, **kwargs)
+            opened.append(stream)
+            return stream
+
+        with mock.patch('cloudbaseinit.plugins.common.userdatacache.open',
+                        fake_open, create=True):
+            with testutils.LogSnatcher('cloudbaseinit.plugins.common.'
+                                       'userdatacache') as snatcher:
+                self.assertIsNone(self._cache.get_parts(digest))
+
+        self.assertEqual(1, len(snatcher.output))
+        # The payloads opened before the damaged one are closed.
+        self.assertTrue(all(stream.closed for stream in opened))
+
+    def test_get_parts_payload_deleted(self):
+        self._test_get_parts_damaged(
+            lambda entry_path: os.remove(os.path.join(entry_path, "1")))
+
+    def test_get_parts_payload_tampered(self):
+        def tamper(entry_path):
+            with open(os.path.join(entry_path, "1"), "wb") as stream:
+                stream.write(b"echo 0")
+
+        self._test_get_parts_damaged(tamper)
+
+    def test_get_parts_plan_incomplete(self):
+        def remove_parts(entry_path):
+            plan_path = os.path.join(entry_path, userdatacache.PLAN_FILE)
+            with open(plan_path, "w") as stream:
+                json.dump({"version": userdatacache.PLAN_VERSION}, stream)
+
+        self._test_get_parts_damaged(remove_parts)
+
+    def test_record_parts_failed(self):
+        digest = userdatacache.get_digest(USER_DATA)
+        recorder = self._cache.record_parts(digest)
+        part = mock.Mock()
+        part.open_payload.side_effect = IOError
+        with testutils.LogSnatcher('cloudbaseinit.plugins.common.'
+                                   'userdatacache') as snatcher:
+            recorder.add(part)
+            recorder.add(part)
+            recorder.commit()
+
+        self.assertEqual(1, len(snatcher.output))
+        self.assertIsNone(self._cache.get_parts(digest))
+        self.assertEqual([], os.listdir(os.path.join(
+            self._path, userdatacache.PLANS_FOLDER)))
+
+    def test_purge(self):
+        digests = [self._record(USER_DATA + b"\n" * index)
+                   for index in range(2)]
+        plans_path = os.path.join(self._path, userdatacache.PLANS_FOLDER)
+        # Mark the first entry as the oldest one.
+        os.utime(os.path.join(plans_path, digests[0]), (0, 0))
+        self._record(USER_DATA + b"\n" * 2)
+
+        self.assertEqual(2, len(os.listdir(plans_path)))
+        self.assertIsNone(self._cache.get_parts(digests[0]))
+        for part in self._cache.get_parts(digests[1]):
+            part.close()
+
+    def test_cloud_config(self):
+        payload = "write_files: []"
+        content = {"write_files": [{"content": b"\x00\xff",
+                                    "path": "fake"}]}
+        self.assertIsNone(self._cache.get_cloud_config(payload))
+
+        self._cache.store_cloud_config(payload, content)
+
+        self.assertEqual(content, self._cache.get_cloud_config(payload))
+        self.assertEqual(content,
+                         self._cache.get_cloud_config(payload.encode()))
+
+    def test_cloud_config_not_serializable(self):
+        payload = "fake: 2016-01-01"
+        self._cache.store_cloud_config(
+            payload, {"fake": datetime.date(2016, 1, 1)})
+
+        self.assertIsNone(self._cache.get_cloud_config(payload))
+        self.assertEqual([], os.listdir(os.path.join(
+            self._path, userdatacache.CLOUD_CONFIG_FOLDER)))
+
+    def test_include(self):
+        url = "http://fake/include.sh"
+        self.assertIsNone(self._cache.get_include(url))
+
+        self._cache.store_include(url, b"echo 42", "fake-etag")
+        self.assertEqual((b"echo 42", "fake-etag"),
+                         self._cache.get_include(url))
+
+    def test_include_corrupted(self):
+        url = "http://fake/include.sh"
+        self._cache.store_include(url, b"echo 42")
+        entry_path = os.path.join(self._path, userdatacache.INCLUDES_FOLDER,
+                                  userdatacache.get_digest(url))
+        with open(os.path.join(entry_path,
+                               userdatacache.INCLUDE_CONTENT_FILE),
+                  "wb") as stream:
+            stream.write(b"echo 0")
+
+        with testutils.LogSnatcher('cloudbaseinit.plugins.common.'
+                                   'userdatacache') as snatcher:
+            self.assertIsNone(self._cache.get_include(url))
+        self.assertEqual(["Corrupted cached include %r" % entry_path],
+                         snatcher.output)
+
+    def test_get_cache(self):
+        self.assertIsNone(userdatacache.get_cache())
+        with testutils.ConfPatcher('user_data_cache_path', self._path):
+            self.assertIsInstance(userdatacache.get_cache(),
+                                  userdatacache.UserDataCache)
@@ -0,0 +1,214 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+
+from cloudbaseinit.plugins.common import userdatacache
+from cloudbaseinit.plugins.common import userdatainclude
+from cloudbaseinit.tests import testutils
+
+
+MULTIPART = b"""Content-Type: multipart/mixed; boundary="b"
+
+--b
+Content-Type: text/x-shellscript
+Content-Disposition: attachment; filename="first.sh"
+
+echo 1
+--b
+Content-Type: text/x-include-url
+
+%(url)s/nested
+--b--
+"""
+
+
+class _Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        content = self.server.contents.get(self.path)
+        if content is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        # The first URLs are the slowest, for checking the order.
+        time.sleep(self.server.delays.get(self.path, 0))
+        etag = '"%s"' % userdatacache.get_digest(content)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class IncludeFetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self._server = _Server(('127.0.0.1', 0), _Handler)
+        self._server.requests = []
+        self._server.contents = {}
+        self._server.delays = {}
+        thread = threading.Thread(target=self._server.serve_forever,
+                                  kwargs={'poll_interval': 0.01})
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self._server.server_close)
+        self.addCleanup(self._server.shutdown)
+        self._url = 'http://127.0.0.1:%d' % self._server.server_address[1]
+
+        self._path = tempfile.mkdtemp(prefix='cloudbaseinit-tests')
+        self.addCleanup(shutil.rmtree, self._path)
+        self._cache = userdatacache.UserDataCache(self._path)
+        self._fetcher = userdatainclude.IncludeFetcher(
+            self._cache, timeout=5, max_size=1024, max_workers=4)
+        self.addCleanup(self._fetcher.close)
+
+    def _get_include_part(self, *paths):
+        return next(userdatainclude.iter_parts(
+            b'#include\n' + b''.join(
+                (self._url + path + '\n').encode() for path in paths)))
+
+    def test_get_urls(self):
+        urls = userdatainclude.get_urls(
+            '#include\n\n  http://fake/1  \n# comment\nhttp://fake/2\n')
+        self.assertEqual(['http://fake/1', 'http://fake/2'], urls)
+
+    def test_iter_parts(self):
+        part = next(userdatainclude.iter_parts(b'#include\nhttp://fake'))
+        self.assertEqual(userdatainclude.INCLUDE_CONTENT_TYPE,
+                         part.get_content_type())
+
+        part = next(userdatainclude.iter_parts(b'#cloud-config\n{}',
+                                               'fake.yaml'))
+        self.assertEqual('text/cloud-config', part.get_content_type())
+        self.assertEqual('fake.yaml', part.get_filename())
+        self.assertEqual(b'#cloud-config\n{}', part.get_payload(decode=True))
+
+        part = next(userdatainclude.iter_parts(b'#ps1\necho 1'))
+        self.assertEqual('text/x-shellscript', part.get_content_type())
+        self.assertEqual(userdatainclude.DEFAULT_FILE_NAME,
+                         part.get_filename())
+
+    @mock.patch('cloudbaseinit.utils.mime.iter_parts')
+    def test_iter_parts_multipart(self, mock_iter_parts):
+        response = userdatainclude.iter_parts(b'Content-Type: multipart')
+
+        mock_iter_parts.assert_called_once_with(b'Content-Type: multipart')
+        self.assertEqual(mock_iter_parts.return_value, response)
+
+    def test_expand_not_include(self):
+        part = mock.Mock()
+        self.assertEqual([part], list(self._fetcher.expand(part)))
+        self.assertEqual([], self._server.requests)
+
+    def test_expand(self):
+        self._server.contents = {
+            '/first.ps1': b'#ps1\necho 1',
+            '/multipart': MULTIPART % {b'url': self._url.encode()},
+            '/nested': b'#cloud-config\n{}',
+        }
+        self._server.delays = {'/first.ps1': 0.2}
+
+        parts = list(self._fetcher.expand(self._get_include_part(
+            '/first.ps1', '/missing', '/multipart')))
+
+        self.assertEqual(
+            [('text/x-shellscript', 'first.ps1'),
+             ('multipart/mixed', None),
+             ('text/x-shellscript', 'first.sh'),
+             ('text/cloud-config', 'nested')],
+            [(part.get_content_type(), part.get_filename())
+             for part in parts])
+        self.assertEqual(b'#ps1\necho 1', parts[0].get_payload(decode=True))
+        self.assertEqual(b'echo 1', parts[2].get_payload(decode=True))
+        self.assertEqual(['/first.ps1', '/missing', '/multipart'],
+                         sorted(self._server.requests[:3]))
+        self.assertEqual('/nested', self._server.requests[3])
+
+    def test_expand_too_deep(self):
+        self._server.contents = {
+            '/loop': ('#include\n%s/loop' % self._url).encode()}
+
+        with testutils.LogSnatcher('cloudbaseinit.plugins.common.'
+                                   'userdatainclude') as snatcher:
+            parts = list(self._fetcher.expand(
+                self._get_include_part('/loop')))
+
+        self.assertEqual([], parts)
+        self.assertEqual(userdatainclude.MAX_DEPTH,
+                         len(self._server.requests))
+        self.assertIn('Ignoring the includes nested more than 5 levels '
+                      'deep', snatcher.output)
+
+    def test_fetch_all_cached(self):
+        url = self._url + '/script.sh'
+        self._server.contents = {'/script.sh': b'echo 1'}
+        self.assertEqual([b'echo 1'], self._fetcher.fetch_all([url]))
+        self.assertEqual((b'echo 1', '"%s"' % userdatacache.get_digest(
+            b'echo 1')), self._cache.get_include(url))
+
+        # Not modified.
+        with testutils.LogSnatcher('cloudbaseinit.plugins.common.'
+                                   'userdatainclude') as snatcher:
+            self.assertEqual([b'echo 1'], self._fetcher.fetch_all([url]))
+        self.assertEqual(['The cached content of %s is not modified' % url],
+                         snatcher.output)
+
+        # Not available anymore.
+        self._server.contents = {}
+        self.assertEqual([b'echo 1'], self._fetcher.fetch_all([url]))
+
+    def test_fetch_all_too_large(self):
+        self._server.contents = {'/large': b'x' * 2048}
+
+        with testutils.LogSnatcher('cloudbaseinit.plugins.common.'
+                                   'userdatainclude') as snatcher:
+            contents = self._fetcher.fetch_all([self._url + '/large'])
+
+        self.assertEqual([None], contents)
+        self.assertIn('exceeds 1024 bytes', snatcher.output[0])
+
+    def test_fetch_all_streamed_too_large(self):
+        response = mock.MagicMock(status_code=200, headers={})
+        response.iter_content.return_value = [b'x' * 1000, b'x' * 1000]
+        self._fetcher._session = mock.Mock()
+        self._fetcher._session.get.return_value = response
+
+        self.assertEqual([None], self._fetcher.fetch_all(['http://fake']))
+        self._fetcher._session.get.assert_called_once_with(
+            'http://fake', headers={}, stream=True, timeout=5)
+        response.close.assert_called_once_with()
@@ -0,0 +1,57 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import unittest
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+from cloudbaseinit.plugins.common.userdataplugins.cloudconfigplugins import (
+    factory
+)
+
+
+class CloudConfigPluginsFactoryTests(unittest.TestCase):
+
+    def setUp(self):
+        factory.REGISTRY.clear()
+        self.addCleanup(factory.REGISTRY.clear)
+
+    @mock.patch('cloudbaseinit.utils.classloader.ClassLoader.load_class')
+    def test_get_plugin(self, mock_load_class):
+        method = factory.get_plugin('write_files')
+
+        self.assertEqual(mock_load_class.return_value.return_value.process,
+                         method)
+        factory.get_plugin('write_files')
+        mock_load_class.assert_called_once_with(factory.PLUGINS['write_files'])
+
+    @mock.patch('cloudbaseinit.utils.classloader.ClassLoader.load_class')
+    def test_get_plugin_unsupported(self, mock_load_class):
+        self.assertIsNone(factory.get_plugin('unsupported'))
+        self.assertFalse(mock_load_class.called)
+
+    def test_load_plugins(self):
+        plugins = factory.load_plugins()
+        self.assertTrue(set(factory.PLUGINS).issubset(plugins))
+
+    @mock.patch('cloudbaseinit.utils.classloader.ClassLoader.load_class')
+    def test_get_schema(self, mock_load_class):
+        schema = factory.get_schema('set_hostname')
+
+        self.assertEqual(mock_load_class.return_value.schema, schema)
+        self.assertFalse(mock_load_class.return_value.called)
+        self.assertIsNone(factory.get_schema('unsupported'))
@@ -12,7 +12,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import base64
+import gzip
+import io
 import os
+import shutil
 import sys
 import tempfile
 import textwrap
@@ -54,6 +58,12 @@ class WriteFilesPluginTests(unittest.TestCase):
         self.addCleanup(os.chmod, tmp, 0o666)
         return tmp
 
+    @staticmethod
+    def _list_dir(path):
+        dirname = os.path.dirname(path)
+        return [os.path.join(dirname, name) for name in os.listdir(dirname)
+                if os.path.basename(path) in name]
+
     def test_decode_steps(self):
         pairs = [
             ('gz', [write_files.GZIP_MIME]),
@@ -70,6 +80,58 @@ class WriteFilesPluginTests(unittest.TestCase):
         for param, expected in pairs:
             self.assertEqual(expected, write_files._decode_steps(param))
 
+    @mock.patch.object(write_files, 'CHUNK_SIZE', 7)
+    def test_iter_content(self):
+        content = ''.join('line %d\n' % index for index in range(100)).encode()
+        compressed = io.BytesIO()
+        with gzip.GzipFile(fileobj=compressed, mode='wb') as stream:
+            stream.write(content)
+        encoded = base64.b64encode(compressed.getvalue()).decode()
+        # The base64 content is usually wrapped.
+        encoded = '\n'.join(encoded[index:index + 60]
+                            for index in range(0, len(encoded), 60))
+
+        chunks = list(write_files._iter_content(encoded, 'gz+b64'))
+
+        self.assertEqual(content, b''.join(chunks))
+        self.assertLessEqual(max(len(chunk) for chunk in chunks), 7)
+
+    def test_iter_content_truncated_gzip(self):
+        compressed = io.BytesIO()
+        with gzip.GzipFile(fileobj=compressed, mode='wb') as stream:
+            stream.write(b'42' * 100)
+
+        chunks = write_files._iter_content(compressed.getvalue()[:-10], 'gz')
+
+        self.assertRaises(write_files._DecodingError, b''.join, chunks)
+
+    def test_write_file_failed(self):
+        tmp = self._get_tempfile()
+        with open(tmp, 'wb') as stream:
+            stream.write(b'fake content')
+
+        def _chunks():
+            yield b'partial'
+            raise IOError()
+
+        self.assertRaises(IOError, write_files._write_file, tmp, _chunks())
+
+        with open(tmp, 'rb') as stream:
+            self.assertEqual(b'fake content', stream.read())
+        self.assertEqual([tmp], self._list_dir(tmp))
+
+    def test_write_file(self):
+        tmp = self._get_tempfile()
+
+        self.assertTrue(write_files._write_file(tmp, iter([b'4', b'2']),
+                                                0o600))
+
+        with open(tmp, 'rb') as stream:
+            self.assertEqual(b'42', stream.read())
+        if sys.platform != 'win32':
+            self.assertEqual(0o600, os.stat(tmp).st_mode & 0o777)
+        self.assertEqual([tmp], self._list_dir(tmp))
+
     def test_process_permissions(self):
         for permissions in (0o644, '0644', '0o644', 420, 420.1):
             self.assertEqual(
@@ -142,17 +204,29 @@ class WriteFilesPluginTests(unittest.TestCase):
         -   c0ntent: NDI=
         """)
         expected_return = [
-            "Missing required keys from file "
-            "information {'c0ntent': 'NDI='}"
+            "Invalid cloud-config:\n"
+            "write_files[0]: missing required key 'path'\n"
+            "write_files[0]: missing required key 'content'"
         ]
 
         with testutils.LogSnatcher('cloudbaseinit.plugins.common.'
-                                   'userdataplugins.cloudconfigplugins.'
-                                   'write_files') as snatcher:
+                                   'userdataplugins.cloudconfig') as snatcher:
             self.plugin.process_non_multipart(code)
 
         self.assertEqual(expected_return, snatcher.output)
 
+    def test_prepare_item_missing_required_keys(self):
+        with testutils.LogSnatcher('cloudbaseinit.plugins.common.'
+                                   'userdataplugins.cloudconfigplugins.'
+                                   'write_files') as snatcher:
+            response = write_files.WriteFilesPlugin._prepare_item(
+                {'c0ntent': 'NDI='})
+
+        self.assertIsNone(response)
+        self.assertEqual(["Missing required keys from file "
+                          "information {'c0ntent': 'NDI='}"],
+                         snatcher.output)
+
     @mock.patch('cloudbaseinit.plugins.common.userdataplugins.'
                 'cloudconfigplugins.write_files.WriteFilesPlugin.process')
     def test_processing_plugin_failed(self, mock_write_files):
@@ -185,8 +259,11 @@ class WriteFilesPluginTests(unittest.TestCase):
                                    'write_files') as snatcher:
             self.plugin.process_non_multipart(code)
 
-        self.assertTrue(snatcher.output[0].startswith(
-            "Fail to decompress gzip content"))
+        # The content is decoded only when written, the file being kept.
+        self.assertTrue(snatcher.output[-2].startswith(
+            "Failed to write %s: Fail to decompress gzip content" % tmp))
+        self.assertEqual(0, os.path.getsize(tmp))
+        self.assertEqual([tmp], self._list_dir(tmp))
 
     def test_wrong_b64_content(self):
         tmp = self._get_tempfile()
@@ -201,8 +278,11 @@ class WriteFilesPluginTests(unittest.TestCase):
                                    'write_files') as snatcher:
             self.plugin.process_non_multipart(code)
 
-        self.assertTrue(snatcher.output[0].startswith(
-            "Fail to decode base64 content."))
+        # The content is decoded only when written, the file being kept.
+        self.assertTrue(snatcher.output[-2].startswith(
+            "Failed to write %s: Fail to decode base64 content." % tmp))
+        self.assertEqual(0, os.path.getsize(tmp))
+        self.assertEqual([tmp], self._list_dir(tmp))
 
     def test_unknown_encoding(self):
         tmp = self._get_tempfile()
@@ -222,8 +302,10 @@ class WriteFilesPluginTests(unittest.TestCase):
         with open(tmp) as stream:
             self.assertEqual('NDI=', stream.read())
 
-        self.assertEqual(["Unknown encoding, doing nothing."],
-                         snatcher.output)
+        self.assertEqual("Unknown encoding, doing nothing.",
+                         snatcher.output[0])
+        self.assertTrue(snatcher.output[-1].startswith(
+            "Wrote 1 of 1 files in"))
 
     def test_invalid_object_passed(self):
         with self.assertRaises(exception.CloudbaseInitException) as cm:
@@ -231,3 +313,81 @@ class WriteFilesPluginTests(unittest.TestCase):
 
         expected = "Can't process the type of data %r" % type(1)
         self.assertEqual(expected, str(cm.exception))
+
+    def _get_tempdir(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        return tmp
+
+    @mock.patch.object(write_files, '_create_dir',
+                       wraps=write_files._create_dir)
+    def test_write_files(self, mock_create_dir):
+        tmp = self._get_tempdir()
+        files = [
+            (os.path.join(tmp, 'first', 'file'), iter([b'1']), 0o644),
+            (os.path.join(tmp, 'second', 'file'), iter([b'2']), 0o644),
+            (os.path.join(tmp, 'first', 'other'), iter([b'3']), 0o644),
+            (os.path.join(tmp, 'first', 'file'), iter([b'4']), 0o644),
+        ]
+
+        results = write_files.write_files(files, max_workers=2,
+                                          fsync=write_files.FSYNC_NONE)
+
+        self.assertEqual([path for path, _, _ in files],
+                         [result.path for result in results])
+        self.assertTrue(all(result.success for result in results))
+        self.assertEqual(
+            [mock.call(os.path.join(tmp, 'first')),
+             mock.call(os.path.join(tmp, 'second'))],
+            mock_create_dir.call_args_list)
+        # The files with the same path are written in order.
+        with open(os.path.join(tmp, 'first', 'file'), 'rb') as stream:
+            self.assertEqual(b'4', stream.read())
+
+    def test_write_files_failed(self):
+        tmp = self._get_tempdir()
+        not_a_dir = os.path.join(tmp, 'file')
+        with open(not_a_dir, 'wb'):
+            pass
+        files = [
+            (os.path.join(not_a_dir, 'file'), iter([b'1']), 0o644),
+            (os.path.join(tmp, 'file'),
+             write_files._iter_content('l', 'b64'), 0o644),
+            (os.path.join(tmp, 'other'), iter([b'2']), 0o644),
+        ]
+
+        results = write_files.write_files(files, max_workers=2,
+                                          fsync=write_files.FSYNC_NONE)
+
+        self.assertEqual([False, False, True],
+                         [result.success for result in results])
+        self.assertIsInstance(results[0].error, OSError)
+        self.assertIsInstance(results[1].error, write_files._DecodingError)
+        self.assertIsNone(results[2].error)
+        self.assertEqual(0, results[0].duration)
+
+    @mock.patch.object(write_files, '_sync_files')
+    @mock.patch('os.fsync')
+    def _test_write_files_fsync(self, mock_fsync, mock_sync_files, fsync):
+        tmp = self._get_tempdir()
+        files = [(os.path.join(tmp, name), iter([b'1']), 0o644)
+                 for name in ('first', 'second')]
+
+        write_files.write_files(files, fsync=fsync)
+
+        self.assertEqual(2 if fsync == write_files.FSYNC_PER_FILE else 0,
+                         mock_fsync.call_count)
+        if fsync == write_files.FSYNC_BATCH:
+            mock_sync_files.assert_called_once_with(
+                [path for path, _, _ in files])
+        else:
+            self.assertFalse(mock_sync_files.called)
+
+    def test_write_files_fsync_none(self):
+        self._test_write_files_fsync(fsync=write_files.FSYNC_NONE)
+
+    def test_write_files_fsync_per_file(self):
+        self._test_write_files_fsync(fsync=write_files.FSYNC_PER_FILE)
+
+    def test_write_files_fsync_batch(self):
+        self._test_write_files_fsync(fsync=write_files.FSYNC_BATCH)
@@ -12,6 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import textwrap
 import unittest
 
 try:
@@ -75,3 +76,84 @@ class CloudConfigPluginTests(unittest.TestCase):
         expected = ["Invalid yaml stream provided.",
                     "Could not process the type %r" % set]
         self.assertEqual(expected, snatcher.output)
+
+    def test_executor_from_yaml_unsafe(self):
+        with testutils.LogSnatcher('cloudbaseinit.plugins.common.'
+                                   'userdataplugins.cloudconfig'):
+            self.assertRaises(
+                cloudconfig.CloudConfigError,
+                cloudconfig.CloudConfigPluginExecutor.from_yaml,
+                '!!python/object/apply:os.getcwd []')
+
+    def test_executor_from_yaml_invalid(self):
+        code = textwrap.dedent("""
+        write_files:
+        -   path: 1
+        -   path: fake
+            content: !!binary NDI=
+        set_hostname: [fake]
+        unsupported: 1
+        """)
+
+        with self.assertRaises(
+                cloudconfig.CloudConfigValidationError) as cm:
+            cloudconfig.CloudConfigPluginExecutor.from_yaml(code)
+
+        self.assertEqual(["set_hostname: expected string, got array",
+                          "write_files[0]: missing required key 'content'",
+                          "write_files[0].path: expected string, "
+                          "got integer"],
+                         cm.exception.problems)
+
+    @mock.patch('cloudbaseinit.plugins.common.userdatacache.get_cache')
+    def test_executor_from_yaml_cached(self, mock_get_cache):
+        cache = mock_get_cache.return_value
+        cache.get_cloud_config.return_value = None
+
+        executor = cloudconfig.CloudConfigPluginExecutor.from_yaml(
+            'set_hostname: fake')
+
+        self.assertEqual([('set_hostname', 'fake')],
+                         executor._expected_plugins)
+        cache.store_cloud_config.assert_called_once_with(
+            'set_hostname: fake', {'set_hostname': 'fake'})
+
+    @mock.patch('cloudbaseinit.plugins.common.userdatacache.get_cache')
+    def test_executor_from_yaml_cached_invalid(self, mock_get_cache):
+        cache = mock_get_cache.return_value
+        cache.get_cloud_config.return_value = {'set_hostname': ['fake']}
+
+        with self.assertRaises(
+                cloudconfig.CloudConfigValidationError) as cm:
+            cloudconfig.CloudConfigPluginExecutor.from_yaml(
+                'set_hostname: fake')
+
+        self.assertEqual(["set_hostname: expected string, got array"],
+                         cm.exception.problems)
+        self.assertFalse(cache.store_cloud_config.called)
+
+    def test_get_problems(self):
+        self.assertEqual([], cloudconfig.get_problems({}))
+        self.assertEqual(["<root>: expected object, got list"],
+                         cloudconfig.get_problems([]))
+        self.assertEqual(["1: expected a section name"],
+                         cloudconfig.get_problems({1: 'fake'}))
+
+    def test_check(self):
+        self.assertEqual([], cloudconfig.check('set_hostname: fake'))
+        self.assertEqual(["set_timezone: expected string, got integer"],
+                         cloudconfig.check('set_timezone: 1'))
+        with testutils.LogSnatcher('cloudbaseinit.plugins.common.'
+                                   'userdataplugins.cloudconfig'):
+            self.assertEqual(["Invalid yaml stream provided."],
+                             cloudconfig.check('{'))
+
+    def test_invalid_content(self):
+        with testutils.LogSnatcher('cloudbaseinit.plugins.common.'
+                                   'userdataplugins.cloudconfig') as snatcher:
+            response = self.plugin.process_non_multipart('set_hostname: []')
+
+        self.assertIsNone(response)
+        self.assertEqual(["Invalid cloud-config:\n"
+                          "set_hostname: expected string, got array"],
+                         snatcher.output)
@@ -18,13 +18,40 @@ try:
     import unittest.mock as mock
 except ImportError:
     import mock
+from oslo_config import cfg
 
 from cloudbaseinit.plugins.common.userdataplugins import factory
 
+CONF = cfg.CONF
+
 
 class UserDataPluginsFactoryTests(unittest.TestCase):
 
+    def setUp(self):
+        factory.REGISTRY.clear()
+        self.addCleanup(factory.REGISTRY.clear)
+
     @mock.patch('cloudbaseinit.utils.classloader.ClassLoader.load_class')
     def test_process(self, mock_load_class):
         response = factory.load_plugins()
         self.assertTrue(response is not None)
+
+    def test_load_plugins(self):
+        plugins = factory.load_plugins()
+
+        self.assertEqual(len(CONF.user_data_plugins), len(plugins))
+        self.assertIs(plugins['text/cloud-config'],
+                      factory.load_plugins()['text/cloud-config'])
+
+    @mock.patch('cloudbaseinit.utils.classloader.ClassLoader.load_class')
+    def test_get_plugin(self, mock_load_class):
+        plugins = [mock.Mock() for _ in CONF.user_data_plugins]
+        for index, plugin in enumerate(plugins):
+            plugin.return_value.get_mime_type.return_value = str(index)
+        mock_load_class.side_effect = plugins
+
+        self.assertEqual(plugins[1].return_value, factory.get_plugin("1"))
+
+        # The plugins enabled after the requested one are not loaded.
+        self.assertEqual(2, mock_load_class.call_count)
+        self.assertIsNone(factory.get_plugin("missing"))
@@ -12,7 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import os
+import sys
 import unittest
 
 try:
@@ -21,6 +21,20 @@ except ImportError:
     import mock
 
 from cloudbaseinit.plugins.common.userdataplugins import parthandler
+from cloudbaseinit.utils import classloader
+
+
+PART_HANDLER = """
+events = []
+
+
+def list_types():
+    return ["text/fake", "text/other"]
+
+
+def handle_part(data, content_type, filename, payload):
+    events.append(content_type)
+"""
 
 
 class PartHandlerPluginTests(unittest.TestCase):
@@ -28,28 +42,86 @@ class PartHandlerPluginTests(unittest.TestCase):
     def setUp(self):
         self._parthandler = parthandler.PartHandlerPlugin()
 
-    @mock.patch('cloudbaseinit.utils.encoding.write_file')
-    @mock.patch('tempfile.gettempdir')
-    @mock.patch('cloudbaseinit.utils.classloader.ClassLoader.load_module')
-    def test_process(self, mock_load_module, mock_gettempdir,
-                     mock_write_file):
+    @mock.patch('cloudbaseinit.utils.classloader.ClassLoader.load_source')
+    def test_process(self, mock_load_source):
         mock_part = mock.MagicMock()
         mock_part_handler = mock.MagicMock()
-        mock_part.get_filename.return_value = 'fake_name'
-        mock_gettempdir.return_value = 'fake_directory'
-        mock_load_module.return_value = mock_part_handler
+        mock_part.get_filename.return_value = 'fake-name.py'
+        mock_load_source.return_value = mock_part_handler
         mock_part_handler.list_types.return_value = ['fake part']
 
         response = self._parthandler.process(mock_part)
 
         mock_part.get_filename.assert_called_once_with()
-        part_handler_path = os.path.join(mock_gettempdir.return_value,
-                                         mock_part.get_filename.return_value)
-        mock_write_file.assert_called_once_with(
-            part_handler_path, mock_part.get_payload.return_value)
-
-        mock_load_module.assert_called_once_with(os.path.join(
-            'fake_directory', 'fake_name'))
+        mock_load_source.assert_called_once_with(
+            'fake_name', mock_part.get_payload.return_value)
         mock_part_handler.list_types.assert_called_once_with()
         self.assertEqual({'fake part': mock_part_handler.handle_part},
                          response)
+
+    def test_process_in_memory(self):
+        mock_part = mock.Mock()
+        mock_part.get_filename.return_value = None
+        mock_part.get_payload.return_value = PART_HANDLER
+
+        handlers = self._parthandler.process(mock_part)
+        handlers["text/fake"](None, "__begin__", None, None)
+
+        self.assertEqual(["text/fake", "text/other"], sorted(handlers))
+        part_handler = self._parthandler._part_handlers[0]
+        self.assertEqual("part_handler", part_handler.__name__)
+        self.assertEqual(["__begin__"], part_handler.events)
+        self.assertIs(part_handler, sys.modules["part_handler"])
+
+        self._parthandler.unload()
+        self.assertEqual([], self._parthandler._part_handlers)
+        self.assertNotIn("part_handler", sys.modules)
+        # The handlers still referenced keep working.
+        handlers["text/fake"](None, "__end__", None, None)
+        self.assertEqual(["__begin__", "__end__"], part_handler.events)
+
+    def test_process_invalid(self):
+        mock_part = mock.Mock()
+        mock_part.get_filename.return_value = "fake.py"
+        mock_part.get_payload.return_value = "events = []"
+
+        self.assertIsNone(self._parthandler.process(mock_part))
+        self.assertEqual([], self._parthandler._part_handlers)
+        self.assertNotIn("fake", sys.modules)
+
+    @mock.patch('six.moves.builtins.compile', wraps=compile)
+    def test_load_source_cached(self, mock_compile):
+        source = PART_HANDLER + "\n# %s" % id(self)
+        loader = classloader.ClassLoader()
+
+        first = loader.load_source("first", source)
+        second = loader.load_source("second", source.encode())
+
+        mock_compile.assert_called_once_with(mock.ANY, "first", "exec")
+        self.assertIsNot(first, second)
+        self.assertIsNot(first.events, second.events)
+
+    def test_load_source_cache_bounded(self):
+        loader = classloader.ClassLoader()
+        with mock.patch.object(classloader.ClassLoader, '_code_cache_size',
+                               2):
+            for index in range(3):
+                module = loader.load_source(
+                    "fake%d" % index, "value = %d # %s" % (index, id(self)))
+                loader.unload_module(module)
+
+            self.assertEqual(2, len(loader._code_cache))
+            self.assertNotIn("fake0", sys.modules)
+
+    def test_load_source_name_taken(self):
+        loader = classloader.ClassLoader()
+
+        module = loader.load_source("unittest", "value = 1")
+        loader.unload_module(module)
+
+        self.assertIs(unittest, sys.modules["unittest"])
+
+    def test_load_source_fails(self):
+        self.assertRaises(ValueError, classloader.ClassLoader().load_source,
+                          "fake_failing", "raise ValueError()")
+        self.assertNotIn("fake_failing", sys.modules)
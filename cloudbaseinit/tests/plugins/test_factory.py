@@ -56,6 +56,10 @@ STAGE = {
 
 class TestPluginFactory(unittest.TestCase):
 
+    def setUp(self):
+        factory.REGISTRY.clear()
+        self.addCleanup(factory.REGISTRY.clear)
+
     @mock.patch('cloudbaseinit.utils.classloader.ClassLoader.load_class')
     def _test_load_plugins(self, mock_load_class, stage=None):
         if stage:
@@ -123,3 +127,15 @@ class TestPluginFactory(unittest.TestCase):
         self.assertEqual(expected, snatcher.output)
         called = mock_load_class.mock_calls[0]
         self.assertEqual(expected_call, called)
+
+    @testutils.ConfPatcher('plugins', ['cloudbaseinit.plugins.common.mtu.'
+                                       'MTUPlugin'])
+    @mock.patch('cloudbaseinit.utils.classloader.ClassLoader.load_class')
+    def test_load_plugins_cached(self, mock_load_class):
+        mock_load_class.return_value.execution_stage = None
+
+        plugins = factory.load_plugins(None)
+        self.assertEqual(plugins, factory.load_plugins(None))
+
+        mock_load_class.assert_called_once_with(CONF.plugins[0])
+        mock_load_class.return_value.assert_called_once_with()
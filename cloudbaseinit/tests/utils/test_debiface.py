@@ -73,3 +73,77 @@ class TestInterfacesParser(unittest.TestCase):
 
     def test_parse(self):
         self._test_parse_nics()
+
+    def test_parse_interfaces(self):
+        data = """
+auto lo eth0
+iface lo inet loopback
+
+allow-hotplug eth1
+iface eth0 inet static
+    hwaddress fa:16:3e:2d:ec:cd
+    address 10.0.0.15/24
+    gateway 10.0.0.1
+    dns-nameservers 8.8.8.8 \\
+        8.8.4.4
+    up route add -net 192.168.0.0 netmask 255.255.0.0 gw 10.0.0.2
+    up route add -A inet6 default gw 2001:db8::1
+    post-up ip addr add 10.0.0.16/24 dev eth0
+    post-up ip route add 172.16.0.0/12 via 10.0.0.3 dev eth0
+iface eth0 inet6 static
+    address 2001:db8::3
+    netmask 64
+iface eth0 inet static
+    address 10.0.1.15
+    netmask 255.255.255.0
+
+iface eth1 inet dhcp
+"""
+
+        interfaces = debiface.parse_interfaces(data)
+
+        self.assertEqual([
+            service_base.Interface(
+                "lo", None, True, False,
+                [service_base.Address("inet", "loopback", None, None, None,
+                                      None)],
+                [], None),
+            service_base.Interface(
+                "eth0", "fa:16:3e:2d:ec:cd", True, False,
+                [service_base.Address("inet", "static", "10.0.0.15",
+                                      "255.255.255.0", None, "10.0.0.1"),
+                 service_base.Address("inet6", "static", "2001:db8::3",
+                                      "64", None, None),
+                 service_base.Address("inet", "static", "10.0.1.15",
+                                      "255.255.255.0", None, None),
+                 service_base.Address("inet", "static", "10.0.0.16",
+                                      "255.255.255.0", None, None)],
+                [service_base.Route("inet", "192.168.0.0", "255.255.0.0",
+                                    "10.0.0.2"),
+                 service_base.Route("inet6", "default", None,
+                                    "2001:db8::1"),
+                 service_base.Route("inet", "172.16.0.0", "255.240.0.0",
+                                    "10.0.0.3")],
+                ["8.8.8.8", "8.8.4.4"]),
+            service_base.Interface(
+                "eth1", None, False, True,
+                [service_base.Address("inet", "dhcp", None, None, None,
+                                      None)],
+                [], None),
+        ], interfaces)
+
+        nics = debiface.parse(data)
+        self.assertEqual([service_base.NetworkDetails(
+            "eth0", "FA:16:3E:2D:EC:CD", "10.0.0.15", "2001:db8::3",
+            "255.255.255.0", "64", None, "10.0.0.1", "2001:db8::1",
+            ["8.8.8.8", "8.8.4.4"])], nics)
+
+    def test_parse_interfaces_invalid_stanza(self):
+        with testutils.LogSnatcher('cloudbaseinit.utils.'
+                                   'debiface') as snatcher:
+            interfaces = debiface.parse_interfaces(
+                "iface eth0\naddress 10.0.0.1\n")
+
+        self.assertEqual([], interfaces)
+        self.assertEqual(["Ignoring invalid stanza: iface eth0"],
+                         snatcher.output)
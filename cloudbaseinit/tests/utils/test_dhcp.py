@@ -13,8 +13,11 @@
 #    under the License.
 
 import netifaces
+import os
 import socket
 import struct
+import threading
+import time
 import unittest
 
 try:
@@ -63,46 +66,111 @@ class DHCPUtilsTests(unittest.TestCase):
             requested_options=[100], vendor_id='fake id')
         self.assertEqual(data, response)
 
-    @mock.patch('struct.unpack')
-    def _test_parse_dhcp_reply(self, mock_unpack, message_type,
-                               id_reply, equals_cookie):
-        fake_data = 236 * b"1"
-        if equals_cookie:
-            fake_data += dhcp._DHCP_COOKIE + b'11'
-        else:
-            fake_data += b'111111'
-        fake_data += b'fake'
-        fake_data += dhcp._OPTION_END
-
-        mock_unpack.side_effect = [(message_type, None), (id_reply, None),
-                                   (100, None), (4, None)]
-
-        response = dhcp._parse_dhcp_reply(data=fake_data, id_req=9999)
-
-        if message_type != 2:
-            self.assertEqual((False, {}), response)
-        elif id_reply != 9999:
-            self.assertEqual((False, {}), response)
-        elif fake_data[236:240] != dhcp._DHCP_COOKIE:
-            self.assertEqual((False, {}), response)
-        else:
-            self.assertEqual((True, {100: b'fake'}), response)
+    def _get_reply(self, options=b'', message_type=2, id_reply=9999,
+                   cookie=dhcp._DHCP_COOKIE, sname=b'', file_name=b''):
+        data = struct.pack('!BBBBL', message_type, 1, 6, 0, id_reply)
+        data += b'\x00' * 36
+        data += sname.ljust(64, b'\x00')
+        data += file_name.ljust(128, b'\x00')
+        return data + cookie + options + dhcp._OPTION_END
 
     def test_parse_dhcp_reply(self):
-        self._test_parse_dhcp_reply(message_type=2, id_reply=9999,
-                                    equals_cookie=True)
+        data = self._get_reply(b'\x00\x00\x64\x04fake\xc8\x01\x01')
+
+        response = dhcp._parse_dhcp_reply(data=data, id_req=9999)
+
+        self.assertEqual((True, {100: b'fake', 200: b'\x01'}), response)
 
     def test_parse_dhcp_reply_other_message_type(self):
-        self._test_parse_dhcp_reply(message_type=3, id_reply=9999,
-                                    equals_cookie=True)
+        data = self._get_reply(message_type=3)
+        self.assertEqual((False, {}), dhcp._parse_dhcp_reply(data, 9999))
 
     def test_parse_dhcp_reply_other_reply(self):
-        self._test_parse_dhcp_reply(message_type=3, id_reply=111,
-                                    equals_cookie=True)
+        data = self._get_reply(id_reply=111)
+        self.assertEqual((False, {}), dhcp._parse_dhcp_reply(data, 9999))
 
     def test_parse_dhcp_reply_other_than_cookie(self):
-        self._test_parse_dhcp_reply(message_type=3, id_reply=111,
-                                    equals_cookie=False)
+        data = self._get_reply(cookie=b'1111')
+        self.assertEqual((False, {}), dhcp._parse_dhcp_reply(data, 9999))
+
+    def test_parse_dhcp_reply_truncated(self):
+        self.assertEqual((False, {}), dhcp._parse_dhcp_reply(b'\x02', 9999))
+        # The truncated options are kept as they are.
+        data = self._get_reply(b'\x64\x08fake')[:-1]
+        self.assertEqual((True, {100: b'fake'}),
+                         dhcp._parse_dhcp_reply(data, 9999))
+
+    def test_parse_dhcp_reply_overload(self):
+        data = self._get_reply(
+            b'\x34\x01\x03\x64\x01a', sname=b'\x64\x01c\xff',
+            file_name=b'\x64\x01b\x1a\x02\x05\xdc\xff')
+
+        response = dhcp._parse_dhcp_reply(data, 9999)
+
+        self.assertEqual((True, {100: b'abc', dhcp.OPTION_MTU: b'\x05\xdc'}),
+                         response)
+
+    def test_parse_dhcp_reply_no_overload(self):
+        data = self._get_reply(b'\x64\x01a', sname=b'\x64\x01c\xff')
+        self.assertEqual((True, {100: b'a'}),
+                         dhcp._parse_dhcp_reply(data, 9999))
+
+    def test_parse_dhcp_reply_long_options(self):
+        value = bytes(bytearray(range(256))) * 2
+        data = self._get_reply(
+            b''.join(b'\xc8' + struct.pack('B', len(chunk)) + chunk
+                     for chunk in (value[:255], value[255:510], value[510:])))
+
+        response = dhcp._parse_dhcp_reply(data, 9999)
+
+        self.assertEqual((True, {200: value}), response)
+
+    def test_get_dhcp_request_data_long_options(self):
+        data = dhcp._get_dhcp_request_data(
+            id_req=1, mac_address='01:02:03:04:05:06',
+            requested_options=[200, 121], vendor_id='x' * 300)
+
+        options = dhcp._parse_options(data)
+        self.assertEqual(b'x' * 300, options[dhcp.OPTION_VENDOR_CLASS_ID])
+        self.assertEqual(b'\xc8\x79',
+                         options[dhcp.OPTION_PARAMETER_REQUEST_LIST])
+        self.assertEqual(b'\x01\x01\x02\x03\x04\x05\x06',
+                         options[dhcp.OPTION_CLIENT_ID])
+
+    def test_decode_options(self):
+        options = {
+            dhcp.OPTION_MTU: b'\x05\xdc',
+            dhcp.OPTION_ROUTERS: b'\x0a\x00\x00\x01',
+            dhcp.OPTION_DNS_SERVERS: b'\x08\x08\x08\x08\x08\x08\x04',
+            dhcp.OPTION_NTP_SERVERS: b'\xc0\xa8<\x8c',
+            dhcp.OPTION_CLASSLESS_STATIC_ROUTES: (
+                b'\x00\x0a\x00\x00\x01'
+                b'\x18\xc0\xa8\x01\x0a\x00\x00\x02'
+                b'\x20\xa9\xfe\xa9\xfe\x0a\x00\x00\x03'),
+            100: b'fake',
+        }
+
+        response = dhcp.decode_options(options)
+
+        self.assertEqual({
+            dhcp.OPTION_MTU: 1500,
+            dhcp.OPTION_ROUTERS: ['10.0.0.1'],
+            dhcp.OPTION_DNS_SERVERS: ['8.8.8.8'],
+            dhcp.OPTION_NTP_SERVERS: ['192.168.60.140'],
+            dhcp.OPTION_CLASSLESS_STATIC_ROUTES: [
+                ('0.0.0.0/0', '10.0.0.1'),
+                ('192.168.1.0/24', '10.0.0.2'),
+                ('169.254.169.254/32', '10.0.0.3')],
+        }, response)
+
+    def test_decode_classless_static_routes_invalid(self):
+        with testutils.LogSnatcher('cloudbaseinit.utils.dhcp') as snatcher:
+            response = dhcp.decode_classless_static_routes(
+                b'\x00\x0a\x00\x00\x01\x21\x0a')
+
+        self.assertEqual([('0.0.0.0/0', '10.0.0.1')], response)
+        self.assertEqual(['Invalid classless static routes option'],
+                         snatcher.output)
 
     @mock.patch('netifaces.ifaddresses')
     @mock.patch('netifaces.interfaces')
@@ -122,44 +190,17 @@ class DHCPUtilsTests(unittest.TestCase):
         self.assertEqual(fake_addresses[netifaces.AF_LINK][0]['addr'],
                          response)
 
-    @mock.patch('random.randint')
-    @mock.patch('socket.socket')
-    @mock.patch('cloudbaseinit.utils.dhcp._get_mac_address_by_local_ip')
-    @mock.patch('cloudbaseinit.utils.dhcp._get_dhcp_request_data')
-    @mock.patch('cloudbaseinit.utils.dhcp._parse_dhcp_reply')
-    def test_get_dhcp_options(self, mock_parse_dhcp_reply,
-                              mock_get_dhcp_request_data,
-                              mock_get_mac_address_by_local_ip, mock_socket,
-                              mock_randint):
-        mock_randint.return_value = 'fake int'
-        mock_socket().getsockname.return_value = ['fake local ip']
-        mock_get_mac_address_by_local_ip.return_value = 'fake mac'
-        mock_get_dhcp_request_data.return_value = 'fake data'
-        mock_parse_dhcp_reply.return_value = (True, 'fake replied options')
+    @mock.patch('cloudbaseinit.utils.dhcp.get_all_dhcp_options')
+    def test_get_dhcp_options(self, mock_get_all_dhcp_options):
+        mock_get_all_dhcp_options.return_value = {
+            'fake host': mock.sentinel.options}
 
         response = dhcp.get_dhcp_options(
             dhcp_host='fake host', requested_options=['fake option'])
 
-        mock_randint.assert_called_once_with(0, 2 ** 32 - 1)
-        mock_socket.assert_called_with(socket.AF_INET, socket.SOCK_DGRAM)
-        mock_socket().setsockopt.assert_called_once_with(
-            socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        mock_socket().bind.assert_called_once_with(('', 68))
-        mock_socket().settimeout.assert_called_once_with(5)
-        mock_socket().connect.assert_called_once_with(('fake host', 67))
-        mock_socket().getsockname.assert_called_once_with()
-        mock_get_mac_address_by_local_ip.assert_called_once_with(
-            'fake local ip')
-        mock_get_dhcp_request_data.assert_called_once_with('fake int',
-                                                           'fake mac',
-                                                           ['fake option'],
-                                                           'cloudbase-init')
-        mock_socket().send.assert_called_once_with('fake data')
-        mock_socket().recv.assert_called_once_with(1024)
-        mock_parse_dhcp_reply.assert_called_once_with(mock_socket().recv(),
-                                                      'fake int')
-        mock_socket().close.assert_called_once_with()
-        self.assertEqual('fake replied options', response)
+        mock_get_all_dhcp_options.assert_called_once_with(
+            ['fake host'], ['fake option'], 5.0, 'cloudbase-init', 10, 3)
+        self.assertEqual(mock.sentinel.options, response)
 
     def test__bind_dhcp_client_socket_bind_succeeds(self):
         mock_socket = mock.Mock()
@@ -184,3 +225,178 @@ class DHCPUtilsTests(unittest.TestCase):
             1 for item in snatcher.output
             if item.startswith("Retrying to bind DHCP client port in "))
         self.assertEqual(3, expected_occurences)
+
+
+@mock.patch('cloudbaseinit.utils.dhcp.get_all_dhcp_options')
+class CachedDHCPOptionsTests(unittest.TestCase):
+
+    def setUp(self):
+        dhcp.clear_cache()
+        self.addCleanup(dhcp.clear_cache)
+        registered_options = dhcp._registered_options.copy()
+        self.addCleanup(setattr, dhcp, '_registered_options',
+                        registered_options)
+        dhcp._registered_options = set([dhcp.OPTION_NTP_SERVERS])
+
+    def _set_reply(self, mock_get_all_dhcp_options, options):
+        mock_get_all_dhcp_options.side_effect = (
+            lambda dhcp_hosts, requested_options: dict.fromkeys(dhcp_hosts,
+                                                                options))
+
+    def test_get_cached_dhcp_options(self, mock_get_all_dhcp_options):
+        options = {dhcp.OPTION_MTU: b'\x05\xdc'}
+        self._set_reply(mock_get_all_dhcp_options, options)
+
+        for requested_options in ([dhcp.OPTION_MTU],
+                                  [dhcp.OPTION_NTP_SERVERS], []):
+            response = dhcp.get_cached_dhcp_options('fake host',
+                                                    requested_options)
+            self.assertEqual(options, response)
+
+        mock_get_all_dhcp_options.assert_called_once_with(
+            ['fake host'], [dhcp.OPTION_MTU, dhcp.OPTION_NTP_SERVERS])
+
+    def test_get_cached_dhcp_options_no_reply(self,
+                                              mock_get_all_dhcp_options):
+        self._set_reply(mock_get_all_dhcp_options, None)
+
+        for _ in range(2):
+            self.assertIsNone(dhcp.get_cached_dhcp_options(
+                'fake host', [dhcp.OPTION_NTP_SERVERS]))
+
+        self.assertEqual(1, mock_get_all_dhcp_options.call_count)
+
+    def test_get_all_cached_dhcp_options(self, mock_get_all_dhcp_options):
+        self._set_reply(mock_get_all_dhcp_options, {})
+
+        dhcp.get_cached_dhcp_options('fake host')
+        response = dhcp.get_all_cached_dhcp_options(
+            ['fake host', 'other host'])
+        dhcp.get_all_cached_dhcp_options(['fake host', 'other host'], [100])
+
+        self.assertEqual({'fake host': {}, 'other host': {}}, response)
+        self.assertEqual(
+            [mock.call(['fake host'], [dhcp.OPTION_NTP_SERVERS]),
+             mock.call(['other host'], [dhcp.OPTION_NTP_SERVERS]),
+             mock.call(['fake host', 'other host'],
+                       [dhcp.OPTION_NTP_SERVERS, 100])],
+            mock_get_all_dhcp_options.call_args_list)
+
+    @mock.patch('time.time')
+    def test_get_cached_dhcp_options_lease_expired(
+            self, mock_time, mock_get_all_dhcp_options):
+        self._set_reply(mock_get_all_dhcp_options,
+                        {dhcp.OPTION_LEASE_TIME: struct.pack('!L', 60)})
+        mock_time.return_value = 1000
+
+        dhcp.get_cached_dhcp_options('fake host')
+        mock_time.return_value = 1059
+        dhcp.get_cached_dhcp_options('fake host')
+        self.assertEqual(1, mock_get_all_dhcp_options.call_count)
+
+        mock_time.return_value = 1060
+        dhcp.get_cached_dhcp_options('fake host')
+        self.assertEqual(2, mock_get_all_dhcp_options.call_count)
+
+
+class _DHCPServer(object):
+    """A stand-in DHCP server, replying to the sender of the requests.
+
+    It ignores the given number of requests and replies to the following
+    ones after the given delay.
+    """
+
+    def __init__(self, address, port, options, ignored_requests=0,
+                 delay=0):
+        self.requests = []
+        self._options = options
+        self._ignored_requests = ignored_requests
+        self._delay = delay
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((address, port))
+        self._socket.settimeout(0.05)
+        self.port = self._socket.getsockname()[1]
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _serve(self):
+        while not self._stopped.is_set():
+            try:
+                data, address = self._socket.recvfrom(dhcp.MAX_PACKET_SIZE)
+            except socket.timeout:
+                continue
+            self.requests.append(data)
+            if len(self.requests) <= self._ignored_requests:
+                continue
+            time.sleep(self._delay)
+            reply = bytearray(data[:240])
+            reply[0] = dhcp.BOOTREPLY
+            # A reply to another transaction, ignored by the client.
+            other_reply = bytearray(reply)
+            other_reply[4:8] = b'\x00\x00\x00\x00'
+            for xid_reply in (other_reply, reply):
+                self._socket.sendto(
+                    bytes(xid_reply) + self._options + dhcp._OPTION_END,
+                    address)
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self._socket.close()
+
+
+@unittest.skipIf(os.name == 'nt', 'loopback addresses besides 127.0.0.1')
+@mock.patch('cloudbaseinit.utils.dhcp._get_mac_address_by_local_ip',
+            mock.Mock(return_value='01:02:03:04:05:06'))
+@mock.patch('cloudbaseinit.utils.dhcp.RETRANSMIT_INTERVAL', 0.2)
+@mock.patch('cloudbaseinit.utils.dhcp.RETRANSMIT_JITTER', 0.05)
+class AllDHCPOptionsTests(unittest.TestCase):
+
+    def _start_server(self, address, port, options, **kwargs):
+        server = _DHCPServer(address, port, options, **kwargs)
+        self.addCleanup(server.stop)
+        return server
+
+    def test_get_all_dhcp_options(self):
+        # The servers share the port, on different loopback addresses.
+        fast = self._start_server('127.0.0.1', 0, b'\x1a\x02\x05\xdc')
+        delayed = self._start_server('127.0.0.2', fast.port,
+                                     b'\x1a\x02\x05\xb4', delay=0.1)
+        lossy = self._start_server('127.0.0.3', fast.port,
+                                   b'\x1a\x02\x02\x40',
+                                   ignored_requests=1)
+
+        start = time.time()
+        response = dhcp.get_all_dhcp_options(
+            ['127.0.0.1', '127.0.0.2', '127.0.0.3', '127.0.0.4'],
+            [dhcp.OPTION_MTU], timeout=1.5, client_port=0,
+            server_port=fast.port)
+        duration = time.time() - start
+
+        self.assertEqual({'127.0.0.1': {dhcp.OPTION_MTU: b'\x05\xdc'},
+                          '127.0.0.2': {dhcp.OPTION_MTU: b'\x05\xb4'},
+                          '127.0.0.3': {dhcp.OPTION_MTU: b'\x02\x40'},
+                          '127.0.0.4': None}, response)
+        # The hosts are queried together, up to the timeout.
+        self.assertGreaterEqual(duration, 1.5)
+        self.assertLess(duration, 2.5)
+        self.assertEqual(1, len(fast.requests))
+        self.assertEqual(1, len(delayed.requests))
+        self.assertEqual(2, len(lossy.requests))
+
+    def test_get_all_dhcp_options_all_replied(self):
+        server = self._start_server('127.0.0.1', 0, b'\x1a\x02\x05\xdc')
+
+        start = time.time()
+        response = dhcp.get_all_dhcp_options(
+            ['127.0.0.1'], timeout=5, client_port=0, server_port=server.port)
+
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual({'127.0.0.1': {dhcp.OPTION_MTU: b'\x05\xdc'}},
+                         response)
+        id_req = struct.unpack('!L', server.requests[0][4:8])[0]
+        self.assertEqual(dhcp._get_dhcp_request_data(
+            id_req, '01:02:03:04:05:06', [], 'cloudbase-init'),
+            server.requests[0])
@@ -0,0 +1,87 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloudbaseinit import exception
+from cloudbaseinit.tests import imageutils
+from cloudbaseinit.utils import fat
+from cloudbaseinit.utils import partitions
+
+
+FILES = {
+    "openstack/latest/meta_data.json": b'{"uuid": "fake"}',
+    "openstack/latest/user_data": b"x" * 5000,
+    "openstack/content/0000": b"",
+    "a-rather-long-file-name-spanning-entries.txt": b"long",
+}
+
+
+class TestFAT(unittest.TestCase):
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp(prefix="cloudbaseinit-tests")
+        self.addCleanup(shutil.rmtree, self._tempdir)
+        self._image_path = os.path.join(self._tempdir, "disk.img")
+        imageutils.create_fat_image(self._image_path, FILES)
+
+    def test_get_files(self):
+        with partitions.FileDevice(self._image_path) as device:
+            reader = fat.get_reader(device)
+
+            self.assertEqual("config-2", reader.label)
+            self.assertEqual(12, reader.fat_type)
+            self.assertEqual(sorted(FILES), sorted(reader.get_files()))
+            for path, content in FILES.items():
+                self.assertEqual(content, reader.read_file(path))
+
+    def test_read_file_missing(self):
+        with partitions.FileDevice(self._image_path) as device:
+            reader = fat.get_reader(device)
+            self.assertRaises(exception.ItemNotFoundException,
+                              reader.read_file, "missing")
+
+    def test_get_reader_no_fat(self):
+        imageutils.create_iso_image(self._image_path, FILES)
+        with partitions.FileDevice(self._image_path) as device:
+            self.assertIsNone(fat.get_reader(device))
+
+    def test_decode_short_name(self):
+        self.assertEqual("meta.JSO", fat._decode_short_name(
+            b"META    JSO", fat.CASE_LOWER_BASE))
+        self.assertEqual("README.txt", fat._decode_short_name(
+            b"README  TXT", fat.CASE_LOWER_EXT))
+        self.assertEqual("NOEXT", fat._decode_short_name(b"NOEXT      ", 0))
+
+    def test_fingerprint(self):
+        fingerprints = []
+        for files in (FILES, FILES, {"other": b""}):
+            imageutils.create_fat_image(self._image_path, files)
+            with partitions.FileDevice(self._image_path) as device:
+                fingerprints.append(fat.get_reader(device).fingerprint())
+
+        self.assertEqual(fingerprints[0], fingerprints[1])
+        self.assertNotEqual(fingerprints[0], fingerprints[2])
+
+    def test_extract(self):
+        target = os.path.join(self._tempdir, "target")
+        with partitions.FileDevice(self._image_path) as device:
+            fat.get_reader(device).extract(target)
+
+        for path, content in FILES.items():
+            with open(os.path.join(target, path), "rb") as stream:
+                self.assertEqual(content, stream.read())
@@ -0,0 +1,98 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import stat
+import unittest
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+from cloudbaseinit import exception
+from cloudbaseinit.tests import testutils
+from cloudbaseinit.utils import filesystem
+
+
+class FakeReader(filesystem.BaseReader):
+
+    def __init__(self, files):
+        self._files = files
+
+    def get_files(self):
+        return self._files
+
+    def read_file(self, path):
+        return self._files[path]
+
+
+class TestBaseReader(unittest.TestCase):
+
+    def setUp(self):
+        self._reader = FakeReader({"a/b": b"fake b", "c": b"fake c"})
+
+    def test_extract(self):
+        with testutils.create_tempdir() as target:
+            self._reader.extract(target)
+
+            for path, content in self._reader.get_files().items():
+                with open(os.path.join(target, *path.split("/")),
+                          "rb") as stream:
+                    self.assertEqual(content, stream.read())
+
+    def test_extract_paths(self):
+        with testutils.create_tempdir() as target:
+            self._reader.extract(target, ["c"])
+            self.assertEqual(["c"], os.listdir(target))
+
+    def test_extract_no_paths(self):
+        with testutils.create_tempdir() as target:
+            self._reader.extract(target, [])
+            self.assertEqual([], os.listdir(target))
+
+    def _test_extract_outside(self, path):
+        reader = FakeReader({path: b"fake"})
+        with testutils.create_tempdir() as target:
+            self.assertRaises(exception.CloudbaseInitException,
+                              reader.extract, os.path.join(target, "x"))
+            self.assertEqual([], os.listdir(target))
+
+    def test_extract_parent(self):
+        self._test_extract_outside("../evil")
+
+    def test_extract_nested_parent(self):
+        self._test_extract_outside("a/../../evil")
+
+    def test_extract_absolute(self):
+        self._test_extract_outside("/evil")
+
+
+class TestRestrictAccess(unittest.TestCase):
+
+    @mock.patch('os.name', 'posix')
+    def test_restrict_access(self):
+        with testutils.create_tempdir() as path:
+            os.chmod(path, 0o755)
+            filesystem.restrict_access(path)
+            self.assertEqual(0o700, stat.S_IMODE(os.stat(path).st_mode))
+
+    @mock.patch('os.name', 'nt')
+    @mock.patch('cloudbaseinit.osutils.factory.get_os_utils')
+    def test_restrict_access_windows(self, mock_get_os_utils):
+        filesystem.restrict_access(mock.sentinel.path)
+
+        osutils = mock_get_os_utils.return_value
+        osutils.set_path_owner_only_acls.assert_called_once_with(
+            mock.sentinel.path)
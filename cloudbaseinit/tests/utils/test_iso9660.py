@@ -0,0 +1,140 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+from cloudbaseinit import exception
+from cloudbaseinit.tests import imageutils
+from cloudbaseinit.utils import iso9660
+from cloudbaseinit.utils import partitions
+
+
+FILES = {
+    "openstack/latest/meta_data.json": b'{"uuid": "fake"}',
+    "openstack/latest/user_data": b"x" * 5000,
+    "ec2/latest/meta-data.json": b"",
+}
+
+
+class TestISO9660(unittest.TestCase):
+
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp(prefix="cloudbaseinit-tests")
+        self.addCleanup(shutil.rmtree, self._tempdir)
+        self._image_path = os.path.join(self._tempdir, "cd.iso")
+
+    def _test_get_files(self, expected_names, **kwargs):
+        imageutils.create_iso_image(self._image_path, FILES, **kwargs)
+        with partitions.FileDevice(self._image_path) as device:
+            reader = iso9660.get_reader(device)
+            files = reader.get_files()
+
+            self.assertEqual("config-2", reader.label)
+            self.assertEqual(os.path.getsize(self._image_path),
+                             reader.volume_size)
+            self.assertEqual(sorted(expected_names), sorted(files))
+            self.assertEqual(b"x" * 5000,
+                             reader.read_file("openstack/latest/user_data"))
+
+    def test_get_files_joliet(self):
+        self._test_get_files(FILES.keys())
+
+    def test_get_files_rock_ridge(self):
+        self._test_get_files(FILES.keys(), joliet=False, rock_ridge=True)
+
+    def test_get_files_plain(self):
+        self._test_get_files(["openstack/latest/meta_data.json",
+                              "openstack/latest/user_data",
+                              "ec2/latest/meta_data.json"], joliet=False)
+
+    def test_read_file_missing(self):
+        imageutils.create_iso_image(self._image_path, FILES)
+        with partitions.FileDevice(self._image_path) as device:
+            reader = iso9660.get_reader(device)
+            self.assertRaises(exception.ItemNotFoundException,
+                              reader.read_file, "missing")
+
+    def test_get_reader_no_iso(self):
+        imageutils.create_fat_image(self._image_path, FILES)
+        with partitions.FileDevice(self._image_path) as device:
+            self.assertIsNone(iso9660.get_reader(device))
+
+    def test_fingerprint(self):
+        fingerprints = []
+        for files in (FILES, FILES, {"other": b""}):
+            imageutils.create_iso_image(self._image_path, files)
+            with partitions.FileDevice(self._image_path) as device:
+                fingerprints.append(iso9660.get_reader(device).fingerprint())
+
+        self.assertEqual(fingerprints[0], fingerprints[1])
+        self.assertNotEqual(fingerprints[0], fingerprints[2])
+
+    def test_extract(self):
+        imageutils.create_iso_image(self._image_path, FILES)
+        target = os.path.join(self._tempdir, "target")
+        with partitions.FileDevice(self._image_path) as device:
+            iso9660.get_reader(device).extract(target)
+
+        for path, content in FILES.items():
+            with open(os.path.join(target, path), "rb") as stream:
+                self.assertEqual(content, stream.read())
+
+    def test_read_header(self):
+        imageutils.create_iso_image(self._image_path, FILES)
+        device = partitions.FileDevice(self._image_path)
+        with device:
+            with mock.patch.object(device, "read",
+                                   wraps=device.read) as mock_read:
+                header = iso9660.read_header(device)
+
+        mock_read.assert_called_once_with(iso9660.DESCRIPTOR_SIZE, skip=0)
+        self.assertEqual("config-2", header.label)
+        self.assertEqual(imageutils.ISO_BLOCK, header.block_size)
+        self.assertEqual(os.path.getsize(self._image_path), header.size)
+        self.assertEqual(iso9660.DESCRIPTOR_SIZE, len(header.descriptor))
+
+    def test_read_header_no_iso(self):
+        imageutils.create_fat_image(self._image_path, FILES)
+        with partitions.FileDevice(self._image_path) as device:
+            self.assertIsNone(iso9660.read_header(device))
+
+    def test_scan_devices(self):
+        paths = []
+        for index in range(3):
+            path = os.path.join(self._tempdir, "disk%d.img" % index)
+            if index == 1:
+                imageutils.create_fat_image(path, FILES)
+            else:
+                imageutils.create_iso_image(path, FILES,
+                                            label="label%d" % index)
+            paths.append(path)
+        paths.append(os.path.join(self._tempdir, "missing"))
+        devices = [partitions.FileDevice(path) for path in paths]
+
+        result = iso9660.scan_devices(devices)
+
+        self.assertEqual([devices[0], devices[2]],
+                         [device for device, _ in result])
+        self.assertEqual(["label0", "label2"],
+                         [header.label for _, header in result])
+        # The devices are closed once their headers are read.
+        self.assertTrue(all(device.stream is None for device in devices))
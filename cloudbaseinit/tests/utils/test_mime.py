@@ -0,0 +1,119 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import base64
+import io
+import unittest
+
+from cloudbaseinit.utils import mime
+
+
+MULTIPART = b"""Content-Type: multipart/mixed; boundary="outer"
+MIME-Version: 1.0
+
+This is the preamble.
+--outer
+Content-Type: text/x-shellscript
+Content-Disposition: attachment; filename="script.sh"
+
+#!/bin/bash
+echo 1
+
+--outer
+Content-Type: text/cloud-config
+Content-Transfer-Encoding: base64
+
+%(base64)s
+--outer
+Content-Type: multipart/alternative; boundary="inner"
+
+--inner
+Content-Type: text/plain
+Content-Transfer-Encoding: quoted-printable
+
+long =
+line=3D
+--inner--
+inner epilogue
+--outer--
+This is the epilogue.
+""" % {b"base64": base64.encodebytes(b"write_files: []\n" * 10)
+       if hasattr(base64, "encodebytes")
+       else base64.encodestring(b"write_files: []\n" * 10)}
+
+
+class TestMime(unittest.TestCase):
+
+    def test_iter_parts(self):
+        parts = list(mime.iter_parts(MULTIPART))
+
+        self.assertEqual(["multipart/mixed", "text/x-shellscript",
+                          "text/cloud-config", "multipart/alternative",
+                          "text/plain"],
+                         [part.get_content_type() for part in parts])
+        self.assertEqual("script.sh", parts[1].get_filename())
+        self.assertEqual(b"#!/bin/bash\necho 1\n",
+                         parts[1].get_payload(decode=True))
+        self.assertEqual("write_files: []\n" * 10, parts[2].get_payload())
+        self.assertEqual(b"long line=", parts[4].get_payload(decode=True))
+        self.assertEqual(0, parts[0].size)
+
+    def test_iter_parts_crlf(self):
+        data = MULTIPART.replace(b"\n", b"\r\n")
+        parts = list(mime.iter_parts(data))
+
+        self.assertEqual(b"#!/bin/bash\r\necho 1\r\n",
+                         parts[1].get_payload(decode=True))
+        self.assertEqual(b"long line=", parts[4].get_payload(decode=True))
+
+    def test_iter_parts_is_lazy(self):
+        stream = io.BytesIO(MULTIPART)
+        parts = mime.iter_parts(stream)
+
+        next(parts)
+        script = next(parts)
+        self.assertEqual("text/x-shellscript", script.get_content_type())
+        # Nothing after the delimiter ending the script was read.
+        delimiter_end = MULTIPART.index(b"--outer\n", 100) + 8
+        self.assertEqual(delimiter_end, stream.tell())
+        self.assertEqual(3, len(list(parts)))
+
+    def test_iter_parts_spooled(self):
+        payload = b"x" * 100
+        data = (b'Content-Type: multipart/mixed; boundary="b"\n\n'
+                b'--b\nContent-Type: text/plain\n\n' + payload + b'\n--b--\n')
+        part = list(mime.iter_parts(data, spool_size=10))[1]
+
+        self.assertTrue(part.open_payload()._rolled)
+        self.assertEqual(payload, part.get_payload(decode=True))
+        part.close()
+
+    def test_iter_parts_no_closing_delimiter(self):
+        data = (b'Content-Type: multipart/mixed; boundary="b"\n\n'
+                b'--b\nContent-Type: text/plain\n\nlast')
+        parts = list(mime.iter_parts(data))
+
+        self.assertEqual(b"last", parts[1].get_payload(decode=True))
+
+    def test_iter_parts_not_multipart(self):
+        parts = list(mime.iter_parts(b"Content-Type: text/plain\n\nfake"))
+
+        self.assertEqual(1, len(parts))
+        self.assertFalse(parts[0].is_multipart())
+        self.assertEqual("fake", parts[0].get_payload())
+
+    def test_base64_decoder_incomplete(self):
+        decoder = mime._Base64Decoder()
+        self.assertEqual(b"", decoder.decode(b"NDI"))
+        self.assertEqual(b"42", decoder.flush())
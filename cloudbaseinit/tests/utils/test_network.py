@@ -29,6 +29,10 @@ CONF = cfg.CONF
 
 class NetworkUtilsTest(unittest.TestCase):
 
+    def setUp(self):
+        network.clear_cache()
+        self.addCleanup(network.clear_cache)
+
     @mock.patch('sys.platform', new='win32')
     @mock.patch('cloudbaseinit.osutils.factory.get_os_utils')
     @mock.patch('six.moves.urllib.parse.urlparse')
@@ -60,7 +64,79 @@ class NetworkUtilsTest(unittest.TestCase):
         with testutils.LogSnatcher('cloudbaseinit.utils.network') as snatcher:
             self._test_check_metadata_ip_route(side_effect=ValueError)
 
-        self.assertIn('ValueError', snatcher.output[-1])
+        self.assertIn('ValueError', snatcher.output[-2])
+        self.assertTrue(snatcher.output[-1].startswith(
+            "Metadata route check for"))
+
+    @mock.patch('six.moves.urllib.request.urlopen')
+    def test_check_url(self, mock_urlopen):
+        mock_urlopen.side_effect = [Exception, None]
+
+        self.assertTrue(network.check_url(mock.sentinel.url, timeout=2))
+        self.assertEqual([mock.call(mock.sentinel.url, timeout=2)] * 2,
+                         mock_urlopen.call_args_list)
+
+    @mock.patch('six.moves.urllib.request.urlopen')
+    def test_check_url_fail(self, mock_urlopen):
+        mock_urlopen.side_effect = Exception
+
+        self.assertFalse(network.check_url(mock.sentinel.url,
+                                           retries_count=2))
+        self.assertEqual([mock.call(mock.sentinel.url)] * 2,
+                         mock_urlopen.call_args_list)
+
+    @mock.patch('sys.platform', new='win32')
+    @mock.patch('cloudbaseinit.utils.network.check_url')
+    @mock.patch('cloudbaseinit.osutils.factory.get_os_utils')
+    def _test_check_metadata_ip_route_cached(self, mock_get_os_utils,
+                                             mock_check_url,
+                                             route_exists=False,
+                                             reachable=False):
+        metadata_url = 'http://169.254.169.254/'
+        mock_utils = mock_get_os_utils.return_value
+        mock_utils.check_os_version.return_value = True
+        mock_utils.check_static_route_exists.return_value = route_exists
+        mock_utils.get_default_gateway.return_value = (1, '10.0.0.1')
+        mock_check_url.return_value = reachable
+
+        with testutils.ConfPatcher('metadata_route_probe_timeout', 0.5):
+            metadata_route = network.check_metadata_ip_route(metadata_url)
+            cached_route = network.check_metadata_ip_route(metadata_url)
+
+        route_added = not (route_exists or reachable)
+        self.assertIs(metadata_route, cached_route)
+        self.assertEqual('169.254.169.254', metadata_route.host)
+        self.assertEqual(route_added, metadata_route.route_added)
+        self.assertGreaterEqual(metadata_route.duration, 0)
+        if route_exists:
+            self.assertFalse(mock_check_url.called)
+        else:
+            mock_check_url.assert_called_once_with(metadata_url, timeout=0.5)
+        mock_utils.check_static_route_exists.assert_called_once_with(
+            '169.254.169.254')
+        if route_added:
+            mock_utils.add_static_route.assert_called_once_with(
+                '169.254.169.254', "255.255.255.255", '10.0.0.1', 1, 10)
+        else:
+            self.assertFalse(mock_utils.get_default_gateway.called)
+            self.assertFalse(mock_utils.add_static_route.called)
+
+    def test_check_metadata_ip_route_cached(self):
+        self._test_check_metadata_ip_route_cached()
+
+    def test_check_metadata_ip_route_exists(self):
+        self._test_check_metadata_ip_route_cached(route_exists=True)
+
+    def test_check_metadata_ip_route_reachable(self):
+        self._test_check_metadata_ip_route_cached(reachable=True)
+
+    @mock.patch('sys.platform', new='linux2')
+    @mock.patch('cloudbaseinit.osutils.factory.get_os_utils')
+    def test_check_metadata_ip_route_not_needed(self, mock_get_os_utils):
+        self.assertIsNone(network.check_metadata_ip_route(
+            'http://169.254.169.254/'))
+        self.assertFalse(mock_get_os_utils.return_value
+                         .check_static_route_exists.called)
 
     def test_address6_to_4_truncate(self):
         address_map = {
@@ -83,3 +159,23 @@ class NetworkUtilsTest(unittest.TestCase):
         }
         for v6, v4 in netmask_map.items():
             self.assertEqual(v4, network.netmask6_to_4_truncate(v6))
+
+    def test_prefix_to_netmask(self):
+        netmask_map = {
+            "32": "255.255.255.255",
+            "24": "255.255.255.0",
+            "0": "0.0.0.0",
+            "12": "255.240.0.0"
+        }
+        for prefix, netmask in netmask_map.items():
+            self.assertEqual(netmask, network.prefix_to_netmask(prefix))
+
+    def test_netmask6_to_prefix(self):
+        netmask_map = {
+            "ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff": "128",
+            "ffff:ffff:ffff::": "48",
+            "ffff:fe00::": "23",
+            "::": "0"
+        }
+        for netmask6, prefix in netmask_map.items():
+            self.assertEqual(prefix, network.netmask6_to_prefix(netmask6))
@@ -0,0 +1,138 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import unittest
+
+from cloudbaseinit.metadata.services import base as service_base
+from cloudbaseinit.tests import testutils
+from cloudbaseinit.utils import networkdata
+
+
+NETWORK_DATA = {
+    "links": [
+        {"id": "interface0", "type": "phy", "mtu": 9000,
+         "ethernet_mac_address": "FA-16-3E-71-0F-88"},
+        {"id": "interface1", "type": "vif",
+         "ethernet_mac_address": "fa:16:3e:71:0f:89"},
+        {"id": "bond0", "type": "bond",
+         "ethernet_mac_address": "fa:16:3e:71:0f:8a",
+         "bond_links": ["interface0", "interface1"],
+         "bond_mode": "802.1ad", "bond_miimon": 100,
+         "bond_xmit_hash_policy": "layer3+4"},
+        {"id": "vlan0", "type": "vlan", "vlan_id": 101,
+         "vlan_link": "bond0", "vlan_mac_address": "fa:16:3e:71:0f:8b"},
+    ],
+    "networks": [
+        {"id": "private-ipv4", "type": "ipv4", "link": "interface0",
+         "ip_address": "10.184.0.244", "netmask": "255.255.240.0",
+         "routes": [
+             {"network": "10.0.0.0", "netmask": "255.0.0.0",
+              "gateway": "11.0.0.1"},
+             {"network": "0.0.0.0", "netmask": "0.0.0.0",
+              "gateway": "10.184.0.1"}],
+         "dns_nameservers": ["10.184.0.2"]},
+        {"id": "private-ipv6", "type": "ipv6", "link": "interface0",
+         "ip_address": "2001:cdba::3257:9652/64",
+         "routes": [
+             {"network": "::", "netmask": "::", "gateway": "fd00::1"},
+             {"network": "fd01::", "netmask": "ffff:ffff:ffff::",
+              "gateway": "fd00::2"}]},
+        {"id": "second-ipv4", "type": "ipv4", "link": "interface0",
+         "ip_address": "10.185.0.244/24"},
+        {"id": "dhcp-ipv4", "type": "ipv4_dhcp", "link": "interface1"},
+        {"id": "public-ipv4", "type": "ipv4", "link": "vlan0",
+         "ip_address": "23.253.157.244", "netmask": "255.255.255.0"},
+        {"id": "unknown", "type": "ipv4", "link": "missing"},
+    ],
+    "services": [
+        {"type": "dns", "address": "8.8.8.8"},
+        {"type": "other", "address": "8.8.4.4"},
+    ],
+}
+
+
+class TestNetworkDataParser(unittest.TestCase):
+
+    def setUp(self):
+        self._data = json.dumps(NETWORK_DATA)
+
+    def test_parse_interfaces(self):
+        with testutils.LogSnatcher('cloudbaseinit.utils.'
+                                   'networkdata') as snatcher:
+            interfaces = networkdata.parse_interfaces(self._data)
+
+        self.assertEqual(["Ignoring network unknown of link missing"],
+                         snatcher.output)
+        self.assertEqual([
+            service_base.Interface(
+                "interface0", "fa:16:3e:71:0f:88", True, False,
+                [service_base.Address("inet", "static", "10.184.0.244",
+                                      "255.255.240.0", None, None),
+                 service_base.Address("inet6", "static",
+                                      "2001:cdba::3257:9652", "64", None,
+                                      None),
+                 service_base.Address("inet", "static", "10.185.0.244",
+                                      "255.255.255.0", None, None)],
+                [service_base.Route("inet", "10.0.0.0", "255.0.0.0",
+                                    "11.0.0.1"),
+                 service_base.Route("inet", "default", None, "10.184.0.1"),
+                 service_base.Route("inet6", "default", None, "fd00::1"),
+                 service_base.Route("inet6", "fd01::", "48", "fd00::2")],
+                ["10.184.0.2", "8.8.8.8"],
+                "phy", 9000, None, None),
+            service_base.Interface(
+                "interface1", "fa:16:3e:71:0f:89", True, False,
+                [service_base.Address("inet", "dhcp", None, None, None,
+                                      None)],
+                [], ["8.8.8.8"], "phy", None, None, None),
+            service_base.Interface(
+                "bond0", "fa:16:3e:71:0f:8a", True, False, [], [],
+                ["8.8.8.8"], "bond", None,
+                service_base.Bond(["interface0", "interface1"], "802.1ad",
+                                  100, "layer3+4"),
+                None),
+            service_base.Interface(
+                "vlan0", "fa:16:3e:71:0f:8b", True, False,
+                [service_base.Address("inet", "static", "23.253.157.244",
+                                      "255.255.255.0", None, None)],
+                [], ["8.8.8.8"], "vlan", None, None,
+                service_base.Vlan(101, "bond0")),
+        ], interfaces)
+
+    def test_parse(self):
+        nics = networkdata.parse(self._data)
+
+        self.assertEqual([service_base.NetworkDetails(
+            "interface0", "FA:16:3E:71:0F:88", "10.184.0.244",
+            "2001:cdba::3257:9652", "255.255.240.0", "64", None,
+            "10.184.0.1", "fd00::1", ["10.184.0.2", "8.8.8.8"])], nics)
+
+    def test_parse_no_data(self):
+        with testutils.LogSnatcher('cloudbaseinit.utils.'
+                                   'networkdata') as snatcher:
+            nics = networkdata.parse(None)
+
+        self.assertIsNone(nics)
+        self.assertEqual(["Invalid network data to parse:\nNone"],
+                         snatcher.output)
+
+    def test_parse_invalid_data(self):
+        with testutils.LogSnatcher('cloudbaseinit.utils.'
+                                   'networkdata') as snatcher:
+            nics = networkdata.parse('{"links": [{"type": "phy"}]}')
+
+        self.assertIsNone(nics)
+        self.assertEqual("Invalid network data to parse: 'id'",
+                         snatcher.output[-1])
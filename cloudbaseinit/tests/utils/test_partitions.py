@@ -0,0 +1,204 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+import uuid
+import zlib
+
+from cloudbaseinit import exception
+from cloudbaseinit.utils import partitions
+
+
+SECTOR = partitions.SECTOR_SIZE
+DISK_SECTORS = 4096
+BASIC_DATA_GUID = "ebd0a0a2-b9e5-4433-87c0-68b6b72699c7"
+
+
+def _mbr_entry(partition_type, first_lba, sectors, status=0):
+    return partitions.MBR_ENTRY.pack(status, b"\x00" * 3, partition_type,
+                                     b"\x00" * 3, first_lba, sectors)
+
+
+def _boot_record(entries):
+    sector = bytearray(SECTOR)
+    for index, entry in enumerate(entries):
+        start = partitions.MBR_ENTRIES_OFFSET + index * 16
+        sector[start:start + 16] = entry
+    sector[510:512] = partitions.MBR_SIGNATURE
+    return bytes(sector)
+
+
+def _gpt_header(current_lba, backup_lba, entries_lba, entries):
+    entries_crc = zlib.crc32(entries) & 0xFFFFFFFF
+    fields = [partitions.GPT_SIGNATURE, 0x10000, 92, 0, 0, current_lba,
+              backup_lba, 34, DISK_SECTORS - 34, b"\x01" * 16,
+              entries_lba, 128, 128, entries_crc]
+    header = partitions.GPT_HEADER.pack(*fields)
+    fields[3] = zlib.crc32(header) & 0xFFFFFFFF
+    header = partitions.GPT_HEADER.pack(*fields)
+    return header + b"\x00" * (SECTOR - len(header))
+
+
+def _gpt_entries():
+    entries = bytearray(128 * 128)
+    name = u"config-2".encode("utf-16-le")
+    entry = partitions.GPT_ENTRY.pack(
+        uuid.UUID(BASIC_DATA_GUID).bytes_le, uuid.uuid4().bytes_le,
+        100, 199, 0, name + b"\x00" * (72 - len(name)))
+    entries[:len(entry)] = entry
+    return bytes(entries)
+
+
+class TestPartitions(unittest.TestCase):
+
+    def setUp(self):
+        tempdir = tempfile.mkdtemp(prefix="cloudbaseinit-tests")
+        self.addCleanup(shutil.rmtree, tempdir)
+        self._image_path = os.path.join(tempdir, "disk")
+
+    def _write_image(self, chunks):
+        with open(self._image_path, "wb") as stream:
+            stream.truncate(DISK_SECTORS * SECTOR)
+            for lba, data in chunks:
+                stream.seek(lba * SECTOR)
+                stream.write(data)
+
+    def _get_partitions(self):
+        with partitions.FileDevice(self._image_path) as device:
+            return device, partitions.get_partitions(device)
+
+    def test_no_partition_table(self):
+        self._write_image([])
+        _, found = self._get_partitions()
+        self.assertEqual([], found)
+
+    def test_mbr_with_logical_partitions(self):
+        self._write_image([
+            (0, _boot_record([_mbr_entry(0x83, 8, 16, status=0x80),
+                              _mbr_entry(0x05, 100, 400)])),
+            # First EBR, describing a logical partition and the next EBR.
+            (100, _boot_record([_mbr_entry(0x0c, 4, 20),
+                                _mbr_entry(0x05, 50, 100)])),
+            (150, _boot_record([_mbr_entry(0x07, 2, 10)])),
+        ])
+        _, found = self._get_partitions()
+
+        self.assertEqual([1, 5, 6], [part.number for part in found])
+        self.assertEqual([8 * SECTOR, 104 * SECTOR, 152 * SECTOR],
+                         [part.offset for part in found])
+        self.assertEqual([16 * SECTOR, 20 * SECTOR, 10 * SECTOR],
+                         [part.size for part in found])
+        self.assertEqual([0x83, 0x0c, 0x07], [part.type for part in found])
+        self.assertTrue(found[0].bootable)
+
+    def test_mbr_ebr_loop(self):
+        self._write_image([
+            (0, _boot_record([_mbr_entry(0x05, 100, 400)])),
+            (100, _boot_record([_mbr_entry(0x0c, 4, 20),
+                                _mbr_entry(0x05, 0, 100)])),
+        ])
+        _, found = self._get_partitions()
+        self.assertEqual([5], [part.number for part in found])
+
+    def _get_gpt_image(self, corrupt_primary=False):
+        entries = _gpt_entries()
+        primary = _gpt_header(1, DISK_SECTORS - 1, 2, entries)
+        if corrupt_primary:
+            primary = primary[:40] + b"\xff" + primary[41:]
+        return [
+            (0, _boot_record([_mbr_entry(0xEE, 1, DISK_SECTORS - 1)])),
+            (1, primary),
+            (2, entries),
+            (DISK_SECTORS - 33, entries),
+            (DISK_SECTORS - 1, _gpt_header(DISK_SECTORS - 1, 1,
+                                           DISK_SECTORS - 33, entries)),
+        ]
+
+    def _test_gpt(self, corrupt_primary):
+        self._write_image(self._get_gpt_image(corrupt_primary))
+        _, found = self._get_partitions()
+
+        self.assertEqual(1, len(found))
+        self.assertEqual(partitions.SCHEME_GPT, found[0].scheme)
+        self.assertEqual(BASIC_DATA_GUID, found[0].type)
+        self.assertEqual(u"config-2", found[0].name)
+        self.assertEqual(100 * SECTOR, found[0].offset)
+        self.assertEqual(100 * SECTOR, found[0].size)
+
+    def test_gpt(self):
+        self._test_gpt(corrupt_primary=False)
+
+    def test_gpt_backup_header(self):
+        self._test_gpt(corrupt_primary=True)
+
+    def test_gpt_corrupted(self):
+        image = self._get_gpt_image(corrupt_primary=True)
+        image[-1] = (DISK_SECTORS - 1, b"\x00" * SECTOR)
+        self._write_image(image)
+        self.assertRaises(exception.CloudbaseInitException,
+                          self._get_partitions)
+
+    def test_partition_view_read(self):
+        self._write_image([
+            (0, _boot_record([_mbr_entry(0x83, 8, 1)])),
+            (8, b"a" * SECTOR),
+            (9, b"b" * SECTOR),
+        ])
+        with partitions.FileDevice(self._image_path) as device:
+            view = partitions.get_partitions(device)[0]
+            with view:
+                offset = view.seek(10)
+                self.assertEqual(b"aa", view.read(2, skip=10 - offset))
+                # Reads are bounded by the partition size.
+                offset = view.seek(SECTOR - 2)
+                self.assertEqual(b"aa", view.read(10))
+            self.assertIsNotNone(device.stream)
+            self.assertEqual(DISK_SECTORS * SECTOR, device.size)
+        self.assertIsNone(device.stream)
+
+    def test_partition_view_sequential_read(self):
+        self._write_image([
+            (0, _boot_record([_mbr_entry(0x83, 8, 1)])),
+            (8, b"ab" * (SECTOR // 2)),
+            (9, b"c" * SECTOR),
+        ])
+        with partitions.FileDevice(self._image_path) as device:
+            view = partitions.get_partitions(device)[0]
+            self.assertEqual(0, view.seek(-10))
+            chunks = [view.read(100) for _ in range(6)]
+            self.assertEqual(b"", view.read(1))
+
+        self.assertEqual(b"ab" * (SECTOR // 2), b"".join(chunks))
+        self.assertEqual([100] * 5 + [SECTOR - 500],
+                         [len(chunk) for chunk in chunks])
+
+    def test_file_device_mapped(self):
+        self._write_image([(0, b"a" * SECTOR), (1, b"b" * SECTOR)])
+        with partitions.FileDevice(self._image_path) as device:
+            self.assertIsNotNone(device._map)
+            self.assertEqual(SECTOR, device.seek(SECTOR))
+            self.assertEqual(b"bb", device.read(2))
+            self.assertEqual(b"b", device.read(1, skip=SECTOR - 3))
+            self.assertEqual(device.size, device.seek(device.size + SECTOR))
+            self.assertEqual(b"", device.read(1))
+            self.assertEqual(0, device.seek(-1))
+            self.assertEqual(b"a", device.read(1))
+        self.assertIsNone(device._map)
+
+    def test_open_missing_file(self):
+        device = partitions.FileDevice(self._image_path)
+        self.assertRaises(exception.CloudbaseInitException, device.open)
@@ -0,0 +1,192 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import sys
+import time
+import unittest
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+from cloudbaseinit.tests import testutils
+from cloudbaseinit.utils import process
+
+
+SCRIPT = """
+import sys
+for index in range(3):
+    sys.stdout.write("out %d\\n" % index)
+    sys.stdout.flush()
+sys.stderr.write("err\\n")
+sys.exit(3)
+"""
+
+# The grandchild ignores SIGTERM and keeps the output pipes open.
+TREE_SCRIPT = """
+import subprocess
+import sys
+child = subprocess.Popen([sys.executable, "-c",
+                          "import signal, time; "
+                          "signal.signal(signal.SIGTERM, signal.SIG_IGN); "
+                          "print('started'); "
+                          "time.sleep(60)"])
+child.wait()
+"""
+
+# The grandchild escapes the process group, keeping the pipes open.
+ESCAPED_TREE_SCRIPT = """
+import os
+import subprocess
+import sys
+subprocess.Popen([sys.executable, "-c",
+                  "import time; print('started'); time.sleep(%(sleep)s)"],
+                 preexec_fn=os.setsid)
+%(wait)s
+"""
+
+
+class TestOutputBuffer(unittest.TestCase):
+
+    def test_write(self):
+        buffer = process.OutputBuffer(head_size=4, tail_size=4)
+        for data in (b"ab", b"cdef", b"ghij", b"k"):
+            buffer.write(data)
+
+        self.assertEqual(3, buffer.dropped)
+        self.assertEqual(b"abcd\n[... 3 bytes omitted ...]\nhijk",
+                         buffer.getvalue())
+
+    def test_write_not_full(self):
+        buffer = process.OutputBuffer(head_size=4, tail_size=4)
+        buffer.write(b"abcdef")
+
+        self.assertEqual(0, buffer.dropped)
+        self.assertEqual(b"abcdef", buffer.getvalue())
+
+
+class TestProcess(unittest.TestCase):
+
+    def test_execute(self):
+        with testutils.LogSnatcher('cloudbaseinit.utils.process') as snatcher:
+            out, err, returncode = process.execute(
+                [sys.executable, "-c", SCRIPT], name="fake")
+
+        self.assertEqual(b"out 0\nout 1\nout 2\n", out.replace(b"\r", b""))
+        self.assertEqual(b"err\n", err.replace(b"\r", b""))
+        self.assertEqual(3, returncode)
+        self.assertEqual(["fake stderr: err", "fake stdout: out 0",
+                          "fake stdout: out 1", "fake stdout: out 2"],
+                         sorted(snatcher.output))
+
+    def test_execute_bounded(self):
+        script = "import sys; sys.stdout.write('x' * 100000)"
+
+        with testutils.LogSnatcher('cloudbaseinit.utils.process') as snatcher:
+            out, _, returncode = process.execute(
+                [sys.executable, "-c", script], head_size=10, tail_size=10)
+
+        self.assertEqual(0, returncode)
+        self.assertEqual(b"x" * 10 + b"\n[... 99980 bytes omitted ...]\n" +
+                         b"x" * 10, out)
+        args = [sys.executable, "-c", script]
+        self.assertEqual(["Dropped 99980 bytes from the stdout of %s" %
+                          (args, )], snatcher.output)
+
+    def test_execute_output_path(self):
+        with testutils.create_tempdir() as tempdir:
+            output_path = os.path.join(tempdir, "logs", "script.log")
+            with testutils.ConfPatcher('scripts_output_backups', 1):
+                for _ in range(3):
+                    process.execute([sys.executable, "-c", SCRIPT],
+                                    output_path=output_path)
+
+            with open(output_path, "rb") as stream:
+                output = stream.read().replace(b"\r", b"")
+            self.assertEqual(["script.log", "script.log.1"],
+                             sorted(os.listdir(os.path.dirname(output_path))))
+
+        self.assertEqual(sorted([b"out 0", b"out 1", b"out 2", b"err"]),
+                         sorted(output.splitlines()))
+
+    def test_get_output_path(self):
+        self.assertIsNone(process.get_output_path("script.ps1"))
+        with testutils.ConfPatcher('scripts_output_dir', 'logs'):
+            self.assertEqual(os.path.join('logs', 'script.ps1.log'),
+                             process.get_output_path('script.ps1'))
+
+    @unittest.skipIf(os.name == 'nt', 'POSIX process groups')
+    @mock.patch('cloudbaseinit.utils.process.KILL_GRACE_PERIOD', 0.5)
+    def test_execute_timeout(self):
+        args = [sys.executable, "-c", TREE_SCRIPT]
+        start = time.time()
+        with testutils.LogSnatcher('cloudbaseinit.utils.process') as snatcher:
+            with self.assertRaises(process.ProcessTimeoutException) as cm:
+                process.execute(args, timeout=1)
+
+        # Returning at all means the grandchild closed the pipes as well.
+        self.assertLess(time.time() - start, 10)
+        self.assertEqual(1, cm.exception.timeout)
+        self.assertEqual(b"started\n", cm.exception.out)
+        self.assertEqual(["Terminating %s after 1 seconds" % (args, )],
+                         snatcher.output)
+
+    @unittest.skipIf(os.name == 'nt', 'POSIX process groups')
+    @mock.patch('cloudbaseinit.utils.process.KILL_GRACE_PERIOD', 0.5)
+    @mock.patch('cloudbaseinit.utils.process.PIPE_DRAIN_TIMEOUT', 0.5)
+    def test_execute_timeout_escaped_pipes(self):
+        script = ESCAPED_TREE_SCRIPT % {"sleep": 5,
+                                        "wait": "import time; "
+                                                "time.sleep(60)"}
+        start = time.time()
+        with testutils.LogSnatcher('cloudbaseinit.utils.process'):
+            self.assertRaises(process.ProcessTimeoutException,
+                              process.execute, [sys.executable, "-c", script],
+                              timeout=1)
+
+        self.assertLess(time.time() - start, 4)
+
+    @unittest.skipIf(os.name == 'nt', 'POSIX process groups')
+    @mock.patch('cloudbaseinit.utils.process.PIPE_DRAIN_TIMEOUT', 0.5)
+    @mock.patch('cloudbaseinit.utils.process.kill_tree')
+    def test_execute_exited_escaped_pipes(self, mock_kill_tree):
+        script = ESCAPED_TREE_SCRIPT % {"sleep": 5, "wait": ""}
+        start = time.time()
+
+        _, _, returncode = process.execute([sys.executable, "-c", script],
+                                           timeout=1)
+
+        # The process exited in time, only its output was still read.
+        self.assertLess(time.time() - start, 4)
+        self.assertEqual(0, returncode)
+        self.assertFalse(mock_kill_tree.called)
+
+    def test_execute_timeout_not_expired(self):
+        out, _, returncode = process.execute(
+            [sys.executable, "-c", SCRIPT], timeout=30)
+
+        self.assertEqual(b"out 0\nout 1\nout 2\n", out.replace(b"\r", b""))
+        self.assertEqual(3, returncode)
+
+    @mock.patch('os.name', 'nt')
+    @mock.patch('subprocess.call')
+    def test_kill_tree_windows(self, mock_call):
+        mock_process = mock.Mock(pid=42)
+
+        process.kill_tree(mock_process)
+
+        self.assertEqual(['taskkill', '/F', '/T', '/PID', '42'],
+                         mock_call.call_args[0][0])
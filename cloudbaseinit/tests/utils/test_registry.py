@@ -0,0 +1,116 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import sys
+import unittest
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+from cloudbaseinit.tests import testutils
+from cloudbaseinit.utils import registry
+
+
+class FakePlugin(object):
+    pass
+
+
+FAKE_PLUGIN = 'cloudbaseinit.tests.utils.test_registry.FakePlugin'
+
+
+class TestRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self._entry_point = mock.Mock()
+        self._entry_point.name = 'entry'
+        self._entry_point.load.return_value = FakePlugin
+        patcher = mock.patch('cloudbaseinit.utils.registry.'
+                             '_iter_entry_points')
+        self._mock_iter_entry_points = patcher.start()
+        self._mock_iter_entry_points.return_value = [self._entry_point]
+        self.addCleanup(patcher.stop)
+
+        self._registry = registry.Registry('fake.group',
+                                           {'static': FAKE_PLUGIN})
+
+    def test_list_names(self):
+        self.assertEqual(['entry', 'static'], self._registry.list_names())
+        self._registry.list_names()
+        self._mock_iter_entry_points.assert_called_once_with('fake.group')
+
+    def test_list_names_duplicate_entry_point(self):
+        self._mock_iter_entry_points.return_value = [self._entry_point] * 2
+        with testutils.LogSnatcher('cloudbaseinit.utils.'
+                                   'registry') as snatcher:
+            self.assertEqual(['entry', 'static'],
+                             self._registry.list_names())
+        self.assertEqual(["Duplicate fake.group entry point 'entry'"],
+                         snatcher.output)
+
+    def test_contains(self):
+        self.assertIn('entry', self._registry)
+        self.assertIn('static', self._registry)
+        self.assertNotIn(FAKE_PLUGIN, self._registry)
+        self._mock_iter_entry_points.assert_called_once_with('fake.group')
+
+    def test_get_class(self):
+        self.assertIs(FakePlugin, self._registry.get_class('entry'))
+        self.assertIs(FakePlugin, self._registry.get_class('static'))
+        self.assertIs(FakePlugin, self._registry.get_class(FAKE_PLUGIN))
+        self._registry.get_class('entry')
+        self._entry_point.load.assert_called_once_with()
+
+    @mock.patch('cloudbaseinit.utils.classloader.ClassLoader.load_class')
+    def test_get_instance(self, mock_load_class):
+        instance = self._registry.get_instance('static')
+
+        self.assertIs(instance, self._registry.get_instance('static'))
+        mock_load_class.assert_called_once_with(FAKE_PLUGIN)
+        mock_load_class.return_value.assert_called_once_with()
+
+    def test_register(self):
+        instance = self._registry.get_instance('static')
+        self._registry.register('static', FAKE_PLUGIN)
+
+        self.assertIsNot(instance, self._registry.get_instance('static'))
+
+    def test_clear(self):
+        instance = self._registry.get_instance('entry')
+        self._registry.clear()
+
+        self.assertIsNot(instance, self._registry.get_instance('entry'))
+        self.assertEqual(2, self._mock_iter_entry_points.call_count)
+
+
+@unittest.skipIf(sys.version_info < (3, 8), 'importlib.metadata')
+class TestIterEntryPoints(unittest.TestCase):
+
+    @mock.patch('importlib.metadata.entry_points')
+    def test_iter_entry_points(self, mock_entry_points):
+        entry_points = mock_entry_points.return_value
+
+        result = registry._iter_entry_points('fake.group')
+
+        self.assertIs(entry_points.select.return_value, result)
+        entry_points.select.assert_called_once_with(group='fake.group')
+
+    @mock.patch('importlib.metadata.entry_points')
+    def test_iter_entry_points_by_group(self, mock_entry_points):
+        mock_entry_points.return_value = {'fake.group': ['fake entry']}
+
+        self.assertEqual(['fake entry'],
+                         registry._iter_entry_points('fake.group'))
+        self.assertEqual([], registry._iter_entry_points('other.group'))
@@ -0,0 +1,67 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import unittest
+
+from cloudbaseinit.utils import schema
+
+
+ITEM_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'name': {'type': 'string'},
+        'size': {'type': 'integer'},
+        'kind': {'enum': ['file', 'folder']},
+    },
+    'required': ['name'],
+}
+SCHEMA = dict(ITEM_SCHEMA, type=['object', 'array'], items=ITEM_SCHEMA)
+
+
+class TestSchema(unittest.TestCase):
+
+    def test_validate(self):
+        self.assertEqual([], schema.validate({'name': 'fake'}, SCHEMA))
+        self.assertEqual([], schema.validate(
+            [{'name': 'fake', 'size': 1, 'kind': 'file', 'other': 1}],
+            SCHEMA))
+        self.assertEqual([], schema.validate(None, {}))
+
+    def test_validate_all_problems(self):
+        value = [
+            {'name': 1, 'size': True},
+            'fake',
+            {'kind': 'link'},
+        ]
+
+        problems = schema.validate(value, SCHEMA, 'items')
+
+        self.assertEqual([
+            'items[0].name: expected string, got integer',
+            'items[0].size: expected integer, got boolean',
+            'items[1]: expected object, got string',
+            "items[2]: missing required key 'name'",
+            "items[2].kind: expected one of 'file', 'folder', got 'link'",
+        ], problems)
+
+    def test_validate_root(self):
+        self.assertEqual(['<root>: expected object or array, got number'],
+                         schema.validate(1.5, SCHEMA))
+
+    def test_validate_additional_properties(self):
+        strict = dict(ITEM_SCHEMA, additionalProperties=False)
+
+        self.assertEqual(['other: unexpected key'],
+                         schema.validate({'name': 'fake', 'other': 1},
+                                         strict))
@@ -12,17 +12,39 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import hashlib
 import imp
 import os
+import sys
+import types
 
 from oslo_log import log as oslo_logging
+import six
+
+try:
+    from importlib import util as importlib_util
+except ImportError:
+    importlib_util = None
 
 
 LOG = oslo_logging.getLogger(__name__)
 
 
+def _new_module(name):
+    if importlib_util and hasattr(importlib_util, 'module_from_spec'):
+        spec = importlib_util.spec_from_loader(name, loader=None)
+        return importlib_util.module_from_spec(spec)
+    return types.ModuleType(name)
+
+
 class ClassLoader(object):
 
+    # Compiled code objects, shared by all the loaders, by source digest.
+    # Only the most recently used ones are kept.
+    _code_cache = collections.OrderedDict()
+    _code_cache_size = 16
+
     def load_class(self, class_path):
         LOG.debug('Loading class \'%s\'' % class_path)
         parts = class_path.rsplit('.', 1)
@@ -38,3 +60,38 @@ class ClassLoader(object):
             module = imp.load_compiled(module_name, path)
 
         return module
+
+    def _compile(self, name, source):
+        digest = hashlib.sha256(source).hexdigest()
+        code = self._code_cache.pop(digest, None)
+        if code is None:
+            code = compile(source, name, 'exec')
+        self._code_cache[digest] = code
+        while len(self._code_cache) > self._code_cache_size:
+            self._code_cache.popitem(last=False)
+        return code
+
+    def load_source(self, name, source):
+        """Execute the given source into a new module.
+
+        Nothing is written to disk. The module is registered in
+        `sys.modules`, unless the name is already taken, until passed
+        to `unload_module`.
+        """
+        if isinstance(source, six.text_type):
+            source = source.encode('utf-8')
+        code = self._compile(name, source)
+
+        module = _new_module(name)
+        sys.modules.setdefault(name, module)
+        try:
+            six.exec_(code, module.__dict__)
+        except Exception:
+            self.unload_module(module)
+            raise
+        return module
+
+    def unload_module(self, module):
+        """Remove a module loaded by `load_source` from `sys.modules`."""
+        if sys.modules.get(module.__name__) is module:
+            del sys.modules[module.__name__]
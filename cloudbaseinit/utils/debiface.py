@@ -12,98 +12,314 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+"""Parser of the Debian interfaces(5) network configuration.
 
-import re
+The content is split in tokens in a single pass, each line being handled
+by the parser of its first keyword. The stanzas of the same interface
+are merged, every stanza and every `up ip addr add` command adding an
+address, while the `up route add` and `up ip route add` commands add
+routes.
+"""
+
+import collections
 
 from oslo_log import log as oslo_logging
 import six
 
 from cloudbaseinit.metadata.services import base as service_base
+from cloudbaseinit.utils import network
 
 
 LOG = oslo_logging.getLogger(__name__)
 
-NAME = "name"
-MAC = "mac"
-ADDRESS = "address"
-ADDRESS6 = "address6"
-NETMASK = "netmask"
-NETMASK6 = "netmask6"
-BROADCAST = "broadcast"
-GATEWAY = "gateway"
-GATEWAY6 = "gateway6"
-DNSNS = "dnsnameservers"
-# Fields of interest by regexps.
-FIELDS = {
-    NAME: re.compile(r"iface\s+(?P<{}>\S+)"
-                     r"\s+inet6?\s+static".format(NAME)),
-    MAC: re.compile(r"hwaddress\s+ether\s+"
-                    r"(?P<{}>\S+)".format(MAC)),
-    ADDRESS: re.compile(r"address\s+"
-                        r"(?P<{}>\S+)".format(ADDRESS)),
-    ADDRESS6: re.compile(r"post-up ip -6 addr add (?P<{}>[^/]+)/"
-                         r"(\d+) dev".format(ADDRESS6)),
-    NETMASK: re.compile(r"netmask\s+"
-                        r"(?P<{}>\S+)".format(NETMASK)),
-    NETMASK6: re.compile(r"post-up ip -6 addr add ([^/]+)/"
-                         r"(?P<{}>\d+) dev".format(NETMASK6)),
-    BROADCAST: re.compile(r"broadcast\s+"
-                          r"(?P<{}>\S+)".format(BROADCAST)),
-    GATEWAY: re.compile(r"gateway\s+"
-                        r"(?P<{}>\S+)".format(GATEWAY)),
-    GATEWAY6: re.compile(r"post-up ip -6 route add default via "
-                         r"(?P<{}>.+) dev".format(GATEWAY6)),
-    DNSNS: re.compile(r"dns-nameservers\s+(?P<{}>.+)".format(DNSNS))
-}
-IFACE_TEMPLATE = dict.fromkeys(FIELDS.keys())
-# Map IPv6 availability by value index under `NetworkDetails`.
-V6_PROXY = {
-    ADDRESS: ADDRESS6,
-    NETMASK: NETMASK6,
-    GATEWAY: GATEWAY6
-}
-DETAIL_PREPROCESS = {
-    MAC: lambda value: value.upper(),
-    DNSNS: lambda value: value.strip().split()
-}
-
-
-def _get_iface_blocks(data):
-    """"Yield interface blocks as pairs of v4 and v6 halves."""
-    lines, lines6 = [], []
-    crt_lines = lines
+INET = "inet"
+INET6 = "inet6"
+STATIC = "static"
+DEFAULT_ROUTE = "default"
+COMMAND_KEYWORDS = ("up", "post-up", "pre-up")
+
+
+def _get_value(value):
+    # The absent values are rendered as "None" by some templates.
+    return None if value == "None" else value
+
+
+def _get_netmask(family, prefix):
+    if family == INET6 or not prefix.isdigit():
+        return prefix
+    return network.prefix_to_netmask(prefix)
+
+
+def _split_cidr(family, value):
+    """Split an address in the CIDR notation in address and netmask."""
+    address, _, prefix = value.partition("/")
+    return address, _get_netmask(family, prefix) if prefix else None
+
+
+def _get_family(address, family=None):
+    if family:
+        return family
+    return INET6 if ":" in address else INET
+
+
+def _iter_lines(data):
+    """Yield the tokens of each line, joining the continued lines."""
+    continued = []
     for line in data.splitlines():
-        line = line.strip()
-        if not line or line.startswith("#"):
+        tokens = line.split()
+        if not tokens or tokens[0].startswith("#"):
+            continue
+        if tokens[-1] == "\\":
+            continued.extend(tokens[:-1])
             continue
-        if "iface" in line:
-            if "inet6" in line:
-                crt_lines = lines6
-                continue
-            if lines:
-                yield lines, lines6
-            lines[:] = []
-            lines6[:] = []
-            crt_lines = lines
-        crt_lines.append(line)
-    if lines:
-        yield lines, lines6
-
-
-def _get_field(line):
-    for field, regex in FIELDS.items():
-        match = regex.match(line)
-        if match:
-            yield field, match.group(field)
-
-
-def _add_nic(iface, nics):
-    if not iface or iface == IFACE_TEMPLATE:
-        return    # no information gathered
-    LOG.debug("Found new interface: %s", iface)
-    # Each missing detail is marked as None.
-    nic = service_base.NetworkDetails(**iface)
-    nics.append(nic)
+        yield continued + tokens
+        continued = []
+    if continued:
+        yield continued
+
+
+class _Stanza(object):
+
+    def __init__(self, family, method):
+        self.family = family
+        self.method = method
+        self.address = None
+        self.netmask = None
+        self.broadcast = None
+        self.gateway = None
+
+    def get_address(self):
+        return service_base.Address(self.family, self.method, self.address,
+                                    self.netmask, self.broadcast,
+                                    self.gateway)
+
+
+class _Interface(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.mac = None
+        self.stanzas = []
+        # The addresses and the routes added by commands.
+        self.addresses = []
+        self.routes = []
+        self.dnsnameservers = []
+
+    def get_interface(self, auto, hotplug):
+        addresses = [stanza.get_address() for stanza in self.stanzas]
+        return service_base.Interface(
+            self.name, self.mac, self.name in auto, self.name in hotplug,
+            addresses + self.addresses, self.routes,
+            self.dnsnameservers or None)
+
+
+class _Parser(object):
+    """Build the interfaces from the tokens of each line."""
+
+    def __init__(self):
+        self._interfaces = collections.OrderedDict()
+        self._auto = set()
+        self._hotplug = set()
+        self._iface = None
+        self._stanza = None
+        self._handlers = {
+            "auto": self._parse_auto,
+            "allow-auto": self._parse_auto,
+            "allow-hotplug": self._parse_hotplug,
+            "iface": self._parse_iface,
+            "mapping": self._end_stanza,
+            "source": self._end_stanza,
+            "source-directory": self._end_stanza,
+            "hwaddress": self._parse_hwaddress,
+            "address": self._parse_address,
+            "netmask": self._parse_netmask,
+            "broadcast": self._parse_broadcast,
+            "gateway": self._parse_gateway,
+            "dns-nameservers": self._parse_dnsnameservers,
+        }
+        for keyword in COMMAND_KEYWORDS:
+            self._handlers[keyword] = self._parse_command
+
+    def parse(self, data):
+        handlers = self._handlers
+        for tokens in _iter_lines(data):
+            handler = handlers.get(tokens[0])
+            if handler:
+                handler(tokens)
+        return [iface.get_interface(self._auto, self._hotplug)
+                for iface in self._interfaces.values()]
+
+    def _parse_auto(self, tokens):
+        self._end_stanza(tokens)
+        self._auto.update(tokens[1:])
+
+    def _parse_hotplug(self, tokens):
+        self._end_stanza(tokens)
+        self._hotplug.update(tokens[1:])
+
+    def _end_stanza(self, tokens):
+        self._iface = self._stanza = None
+
+    def _parse_iface(self, tokens):
+        if len(tokens) < 4:
+            LOG.warning("Ignoring invalid stanza: %s", " ".join(tokens))
+            self._end_stanza(tokens)
+            return
+        name, family, method = tokens[1:4]
+
+        iface = self._interfaces.get(name)
+        follows_inet = self._stanza and self._stanza.family == INET
+        if iface is None and family == INET6 and follows_inet:
+            # The legacy Nova layout follows the IPv4 stanza with an IPv6
+            # stanza named after another interface, both describing the
+            # same interface.
+            iface = self._iface
+        elif iface is None:
+            iface = self._interfaces[name] = _Interface(name)
+
+        self._iface = iface
+        self._stanza = _Stanza(family, method)
+        iface.stanzas.append(self._stanza)
+
+    def _parse_hwaddress(self, tokens):
+        if self._iface and len(tokens) > 1:
+            self._iface.mac = _get_value(tokens[-1])
+
+    def _parse_address(self, tokens):
+        if self._stanza and len(tokens) > 1:
+            value = _get_value(tokens[1])
+            if value and "/" in value:
+                value, netmask = _split_cidr(self._stanza.family, value)
+                self._stanza.netmask = netmask
+            self._stanza.address = value
+
+    def _parse_netmask(self, tokens):
+        if self._stanza and len(tokens) > 1:
+            value = _get_value(tokens[1])
+            if value:
+                value = _get_netmask(self._stanza.family, value)
+            self._stanza.netmask = value
+
+    def _parse_broadcast(self, tokens):
+        if self._stanza and len(tokens) > 1:
+            self._stanza.broadcast = _get_value(tokens[1])
+
+    def _parse_gateway(self, tokens):
+        if self._stanza and len(tokens) > 1:
+            self._stanza.gateway = _get_value(tokens[1])
+
+    def _parse_dnsnameservers(self, tokens):
+        if self._iface:
+            self._iface.dnsnameservers.extend(
+                value for value in tokens[1:] if _get_value(value))
+
+    def _parse_command(self, tokens):
+        if not self._iface or len(tokens) < 2:
+            return
+        command = tokens[1:]
+        if command[0] == "ip":
+            self._parse_ip_command(command[1:])
+        elif command[0] == "route":
+            self._parse_route_command(command[1:])
+
+    def _parse_ip_command(self, args):
+        family = None
+        while args and args[0].startswith("-"):
+            if args[0] == "-6":
+                family = INET6
+            elif args[0] == "-4":
+                family = INET
+            args = args[1:]
+        if len(args) < 3 or args[1] != "add":
+            return
+
+        if args[0] in ("addr", "address", "a"):
+            family = _get_family(args[2], family)
+            address, netmask = _split_cidr(family, args[2])
+            self._iface.addresses.append(service_base.Address(
+                family, STATIC, address, netmask, None, None))
+        elif args[0] in ("route", "r"):
+            network, netmask = args[2], None
+            if network != DEFAULT_ROUTE:
+                family = _get_family(network, family)
+                network, netmask = _split_cidr(family, network)
+            gateway = _get_option(args, "via")
+            if gateway:
+                family = _get_family(gateway, family)
+            self._iface.routes.append(service_base.Route(
+                family or INET, network, netmask, gateway))
+
+    def _parse_route_command(self, args):
+        family = INET
+        if "-A" in args:
+            # The address family can either precede or follow the command.
+            index = args.index("-A")
+            if _get_option(args, "-A") == INET6:
+                family = INET6
+            args = args[:index] + args[index + 2:]
+        if "add" not in args:
+            return
+        args = args[args.index("add") + 1:]
+        if args and args[0] in ("-net", "-host"):
+            args = args[1:]
+        if not args:
+            return
+
+        network, netmask = args[0], _get_option(args, "netmask")
+        if network != DEFAULT_ROUTE and "/" in network:
+            network, netmask = _split_cidr(family, network)
+        self._iface.routes.append(service_base.Route(
+            family, network, netmask,
+            _get_option(args, "gw") or _get_option(args, "gateway")))
+
+
+def _get_option(args, name):
+    """Return the value following the given option, if any."""
+    try:
+        return args[args.index(name) + 1]
+    except (ValueError, IndexError):
+        return None
+
+
+def parse_interfaces(data):
+    """Parse the content, returning a list of `Interface` objects."""
+    return _Parser().parse(data)
+
+
+def _get_details(iface, family):
+    """Return the first static address of the family and its gateway."""
+    addresses = [address for address in iface.addresses
+                 if address.family == family and address.method == STATIC]
+    if not addresses:
+        return None, None
+
+    gateway = addresses[0].gateway
+    if not gateway:
+        gateways = [route.gateway for route in iface.routes
+                    if (route.family, route.network) == (family,
+                                                         DEFAULT_ROUTE)]
+        gateway = gateways[0] if gateways else None
+    return addresses[0], gateway
+
+
+def get_network_details(iface):
+    """Return the `NetworkDetails` of a statically configured interface."""
+    address, gateway = _get_details(iface, INET)
+    address6, gateway6 = _get_details(iface, INET6)
+    if not address and not address6:
+        return None
+    return service_base.NetworkDetails(
+        iface.name,
+        iface.mac.upper() if iface.mac else None,
+        address and address.address,
+        address6 and address6.address,
+        address and address.netmask,
+        address6 and address6.netmask,
+        address and address.broadcast,
+        gateway,
+        gateway6,
+        iface.dnsnameservers,
+    )
 
 
 def parse(data):
@@ -114,17 +330,9 @@ def parse(data):
 
     LOG.info("Parsing Debian config...\n%s", data)
     nics = []    # list of NetworkDetails objects
-    for lines_pair in _get_iface_blocks(data):
-        iface = IFACE_TEMPLATE.copy()
-        for lines, use_proxy in zip(lines_pair, (False, True)):
-            for line in lines:
-                for field, value in _get_field(line):
-                    if use_proxy:
-                        field = V6_PROXY.get(field)
-                        if not field:
-                            continue
-                    func = DETAIL_PREPROCESS.get(field, lambda value: value)
-                    iface[field] = func(value) if value != "None" else None
-        _add_nic(iface, nics)
-
+    for iface in parse_interfaces(data):
+        nic = get_network_details(iface)
+        if nic:
+            LOG.debug("Found new interface: %s", nic)
+            nics.append(nic)
     return nics
@@ -12,102 +12,246 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import datetime
 import netifaces
 import random
+import select
 import socket
 import struct
+import threading
 import time
 
 from oslo_log import log as oslo_logging
+import six
 
 
 _DHCP_COOKIE = b'\x63\x82\x53\x63'
 _OPTION_END = b'\xff'
 
+OPTION_PAD = 0
+OPTION_ROUTERS = 3
+OPTION_DNS_SERVERS = 6
 OPTION_MTU = 26
 OPTION_NTP_SERVERS = 42
+OPTION_LEASE_TIME = 51
+OPTION_OVERLOAD = 52
+OPTION_MESSAGE_TYPE = 53
+OPTION_PARAMETER_REQUEST_LIST = 55
+OPTION_VENDOR_CLASS_ID = 60
+OPTION_CLIENT_ID = 61
+OPTION_CLASSLESS_STATIC_ROUTES = 121
+OPTION_END = 255
+
+BOOTREQUEST = 1
+BOOTREPLY = 2
+DHCPDISCOVER = 1
+HTYPE_ETHERNET = 1
+MAX_PACKET_SIZE = 4096
+MAX_OPTION_LENGTH = 255
+# The seconds before the first retransmission, the maximum delay and
+# the randomization of the delays.
+RETRANSMIT_INTERVAL = 4
+MAX_RETRANSMIT_INTERVAL = 64
+RETRANSMIT_JITTER = 1
+
+# See: http://www.ietf.org/rfc/rfc2131.txt
+_HEADER = struct.Struct('!BBBBL')
+_HEADER_SIZE = 240
+_CHADDR_OFFSET = 28
+_SNAME_OFFSET = 44
+_FILE_OFFSET = 108
+_COOKIE_OFFSET = 236
+# The fields holding options as well, by the option overload value.
+_OVERLOAD_FIELDS = {
+    1: ((_FILE_OFFSET, _COOKIE_OFFSET), ),
+    2: ((_SNAME_OFFSET, _FILE_OFFSET), ),
+    3: ((_FILE_OFFSET, _COOKIE_OFFSET), (_SNAME_OFFSET, _FILE_OFFSET)),
+}
+
+_OPTION_HEADER = struct.Struct('BB')
+_CHADDR_SIZE = 16
+_CLIENT_ID_TYPE = b'\x01'
+# The fixed fields of a request around the hardware address.
+_ADDRESSES_PADDING = b'\x00' * (_CHADDR_OFFSET - _HEADER.size)
+_REQUEST_SUFFIX = b''.join([
+    b'\x00' * (_COOKIE_OFFSET - _SNAME_OFFSET), _DHCP_COOKIE,
+    struct.pack('BBB', OPTION_MESSAGE_TYPE, 1, DHCPDISCOVER)])
+# Indexing a byte string gives integers only on Python 3.
+_get_octets = bytes if six.PY3 else bytearray
+_monotonic = getattr(time, 'monotonic', time.time)
 
 LOG = oslo_logging.getLogger(__name__)
 
+# The options requested by every query, registered by their consumers.
+_registered_options = set()
+# The parsed replies, by DHCP host: (requested options, options, expiry).
+_replies = {}
+_replies_lock = threading.Lock()
 
-def _get_dhcp_request_data(id_req, mac_address, requested_options,
-                           vendor_id):
-
-    mac_address_b = bytearray.fromhex(mac_address.replace(':', ''))
-    # See: http://www.ietf.org/rfc/rfc2131.txt
-    data = b'\x01'
-    data += b'\x01'
-    data += b'\x06'
-    data += b'\x00'
-    data += struct.pack('!L', id_req)
-    data += b'\x00\x00'
-    data += b'\x00\x00'
-    data += b'\x00\x00\x00\x00'
-    data += b'\x00\x00\x00\x00'
-    data += b'\x00\x00\x00\x00'
-    data += b'\x00\x00\x00\x00'
-    data += mac_address_b
-    data += b'\x00' * 10
-    data += b'\x00' * 64
-    data += b'\x00' * 128
-    data += _DHCP_COOKIE
-    data += b'\x35\x01\x01'
-
-    if vendor_id:
-        vendor_id_b = vendor_id.encode('ascii')
-        data += b'\x3c' + struct.pack('b', len(vendor_id_b)) + vendor_id_b
 
-    data += b'\x3d\x07\x01' + mac_address_b
-    data += b'\x37' + struct.pack('b', len(requested_options))
+def _pack_option(code, value):
+    # The values longer than 255 bytes are split (RFC 3396).
+    if len(value) <= MAX_OPTION_LENGTH:
+        return _OPTION_HEADER.pack(code, len(value)) + value
+    return b''.join(
+        _pack_option(code, value[start:start + MAX_OPTION_LENGTH])
+        for start in range(0, len(value), MAX_OPTION_LENGTH))
 
-    for option in requested_options:
-        data += struct.pack('b', option)
 
-    data += _OPTION_END
-    return data
+def _get_dhcp_request_data(id_req, mac_address, requested_options,
+                           vendor_id):
+    mac_address_b = bytes(bytearray.fromhex(mac_address.replace(':', '')))
+
+    # The fields are joined once, instead of being concatenated.
+    data = [_HEADER.pack(BOOTREQUEST, HTYPE_ETHERNET, len(mac_address_b), 0,
+                         id_req),
+            _ADDRESSES_PADDING,
+            mac_address_b.ljust(_CHADDR_SIZE, b'\x00'),
+            _REQUEST_SUFFIX]
+    if vendor_id:
+        data.append(_pack_option(OPTION_VENDOR_CLASS_ID,
+                                 vendor_id.encode('ascii')))
+    data.append(_pack_option(OPTION_CLIENT_ID,
+                             _CLIENT_ID_TYPE + mac_address_b))
+    data.append(_pack_option(OPTION_PARAMETER_REQUEST_LIST,
+                             bytes(bytearray(requested_options))))
+    data.append(_OPTION_END)
+    return b''.join(data)
+
+
+def _parse_field(data, start, end, values, parts):
+    """Collect the options of a packet field."""
+    i = start
+    while i < end:
+        code = data[i]
+        if code == OPTION_PAD:
+            i += 1
+            continue
+        if code == OPTION_END or i + 1 >= end:
+            return
+        value_end = i + 2 + data[i + 1]
+        value = data[i + 2:value_end if value_end < end else end]
+        if code in values:
+            # The options split in multiple parts (RFC 3396).
+            parts.setdefault(code, [values[code]]).append(value)
+        else:
+            values[code] = value
+        i = value_end
+
+
+def _parse_options(data):
+    """Return the options of a reply, as a dict of byte strings.
+
+    The options found in the overloaded file and sname fields (RFC 2132)
+    and the options split in multiple parts (RFC 3396) are concatenated
+    in this order.
+    """
+    data = _get_octets(data)
+    values = {}
+    parts = {}
+    _parse_field(data, _HEADER_SIZE, len(data), values, parts)
+
+    overload = values.pop(OPTION_OVERLOAD, None)
+    parts.pop(OPTION_OVERLOAD, None)
+    if overload is not None and len(overload) == 1:
+        for start, end in _OVERLOAD_FIELDS.get(overload[0], ()):
+            _parse_field(data, start, end, values, parts)
+
+    for code, chunks in parts.items():
+        values[code] = b''.join(chunks)
+    if not six.PY3:
+        values = dict((code, bytes(value)) for code, value in values.items())
+    return values
 
 
 def _parse_dhcp_reply(data, id_req):
-    message_type = struct.unpack('b', data[0:1])[0]
+    if len(data) < _HEADER_SIZE:
+        return False, {}
 
-    if message_type != 2:
+    message_type, _, _, _, id_reply = _HEADER.unpack_from(data)
+    if message_type != BOOTREPLY:
         return False, {}
 
-    id_reply = struct.unpack('!L', data[4:8])[0]
     if id_reply != id_req:
         return False, {}
 
-    if data[236:240] != _DHCP_COOKIE:
+    if data[_COOKIE_OFFSET:_HEADER_SIZE] != _DHCP_COOKIE:
         return False, {}
 
-    options = {}
+    return True, _parse_options(data)
+
+
+def decode_mtu(data):
+    return struct.unpack('!H', data[:2])[0]
+
+
+def decode_ip_addresses(data):
+    """Decode a list of IPv4 addresses, like the routers or NTP servers."""
+    return [socket.inet_ntoa(data[index:index + 4])
+            for index in range(0, len(data) - len(data) % 4, 4)]
+
+
+def decode_classless_static_routes(data):
+    """Decode the classless static routes (RFC 3442).
+
+    Return a list of (destination, gateway) tuples, the destinations
+    being in the CIDR notation.
+    """
+    routes = []
+    i = 0
+    while i < len(data):
+        prefix_length = six.indexbytes(data, i)
+        significant = -(-prefix_length // 8)
+        if prefix_length > 32 or i + 1 + significant + 4 > len(data):
+            LOG.warning('Invalid classless static routes option')
+            break
+        destination = data[i + 1:i + 1 + significant].ljust(4, b'\x00')
+        gateway = data[i + 1 + significant:i + 5 + significant]
+        routes.append(('%s/%d' % (socket.inet_ntoa(destination),
+                                  prefix_length),
+                       socket.inet_ntoa(gateway)))
+        i += 5 + significant
+    return routes
+
+
+DECODERS = {
+    OPTION_ROUTERS: decode_ip_addresses,
+    OPTION_DNS_SERVERS: decode_ip_addresses,
+    OPTION_MTU: decode_mtu,
+    OPTION_NTP_SERVERS: decode_ip_addresses,
+    OPTION_CLASSLESS_STATIC_ROUTES: decode_classless_static_routes,
+}
 
-    i = 240
-    data_len = len(data)
-    while i < data_len and data[i:i + 1] != _OPTION_END:
-        id_option = struct.unpack('b', data[i:i + 1])[0]
-        option_data_len = struct.unpack('b', data[i + 1:i + 2])[0]
-        i += 2
-        options[id_option] = data[i: i + option_data_len]
-        i += option_data_len
 
-    return True, options
+def decode_options(options):
+    """Return the options having a known type, decoded."""
+    return dict((code, DECODERS[code](value))
+                for code, value in options.items() if code in DECODERS)
 
 
 def _get_mac_address_by_local_ip(ip_addr):
     for iface in netifaces.interfaces():
         addrs = netifaces.ifaddresses(iface)
-        for addr in addrs[netifaces.AF_INET]:
+        for addr in addrs.get(netifaces.AF_INET, []):
             if addr['addr'] == ip_addr:
                 return addrs[netifaces.AF_LINK][0]['addr']
 
 
-def _bind_dhcp_client_socket(s, max_bind_attempts, bind_retry_interval):
+def _get_local_ip_addr(dhcp_host, server_port):
+    """Return the local address routed to the DHCP host."""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.connect((dhcp_host, server_port))
+        return s.getsockname()[0]
+    finally:
+        s.close()
+
+
+def _bind_dhcp_client_socket(s, max_bind_attempts, bind_retry_interval,
+                             port=68):
     bind_attempts = 1
     while True:
         try:
-            s.bind(('', 68))
+            s.bind(('', port))
             break
         except socket.error as ex:
             if (bind_attempts >= max_bind_attempts or
@@ -120,38 +264,174 @@ def _bind_dhcp_client_socket(s, max_bind_attempts, bind_retry_interval):
             time.sleep(bind_retry_interval)
 
 
-def get_dhcp_options(dhcp_host, requested_options=[], timeout=5.0,
-                     vendor_id='cloudbase-init', max_bind_attempts=10,
-                     bind_retry_interval=3):
-    id_req = random.randint(0, 2 ** 32 - 1)
-    options = None
+class _Query(object):
+    """A request sent to a DHCP host, retransmitted until replied."""
+
+    def __init__(self, dhcp_host, data, now):
+        self.dhcp_host = dhcp_host
+        self.data = data
+        self.next_send = now
+        self.interval = RETRANSMIT_INTERVAL
 
+    def send(self, s, server_port, now):
+        s.sendto(self.data, (self.dhcp_host, server_port))
+        # The delay is doubled after each retransmission, randomized by
+        # one second (RFC 2131, section 4.1).
+        self.next_send = now + self.interval + random.uniform(
+            -RETRANSMIT_JITTER, RETRANSMIT_JITTER)
+        self.interval = min(self.interval * 2, MAX_RETRANSMIT_INTERVAL)
+
+
+def _create_queries(dhcp_hosts, requested_options, vendor_id, server_port,
+                    now):
+    queries = {}
+    for dhcp_host in sorted(set(dhcp_hosts)):
+        try:
+            mac_address = _get_mac_address_by_local_ip(
+                _get_local_ip_addr(dhcp_host, server_port))
+        except socket.error as ex:
+            LOG.warning('Cannot reach the DHCP host %(host)s: %(error)s',
+                        {'host': dhcp_host, 'error': ex})
+            continue
+        if not mac_address:
+            LOG.warning('No interface found for the DHCP host %s', dhcp_host)
+            continue
+
+        id_req = random.randint(0, 2 ** 32 - 1)
+        while id_req in queries:
+            id_req = random.randint(0, 2 ** 32 - 1)
+        queries[id_req] = _Query(
+            dhcp_host, _get_dhcp_request_data(id_req, mac_address,
+                                              requested_options, vendor_id),
+            now)
+    return queries
+
+
+def get_all_dhcp_options(dhcp_hosts, requested_options=[], timeout=5.0,
+                         vendor_id='cloudbase-init', max_bind_attempts=10,
+                         bind_retry_interval=3, client_port=68,
+                         server_port=67):
+    """Query the DHCP hosts concurrently, returning the options by host.
+
+    A request is sent to every host through a single socket, the replies
+    being matched by their transaction id. The requests not replied yet
+    are retransmitted until the timeout, so the query takes as long as
+    the slowest host. The hosts which did not reply get None.
+    """
+    options = dict.fromkeys(dhcp_hosts)
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     try:
-        _bind_dhcp_client_socket(s, max_bind_attempts, bind_retry_interval)
-
-        s.settimeout(timeout)
-        s.connect((dhcp_host, 67))
-
-        local_ip_addr = s.getsockname()[0]
-        mac_address = _get_mac_address_by_local_ip(local_ip_addr)
-
-        data = _get_dhcp_request_data(id_req, mac_address, requested_options,
-                                      vendor_id)
-        s.send(data)
-
-        start = datetime.datetime.now()
-        now = start
-        replied = False
-        while (not replied and
-                now - start < datetime.timedelta(seconds=timeout)):
-            data = s.recv(1024)
-            (replied, options) = _parse_dhcp_reply(data, id_req)
-            now = datetime.datetime.now()
-    except socket.timeout:
-        pass
+        _bind_dhcp_client_socket(s, max_bind_attempts, bind_retry_interval,
+                                 client_port)
+        now = _monotonic()
+        deadline = now + timeout
+        queries = _create_queries(dhcp_hosts, requested_options, vendor_id,
+                                  server_port, now)
+
+        while queries and now < deadline:
+            for id_req, query in list(queries.items()):
+                if query.next_send <= now:
+                    try:
+                        query.send(s, server_port, now)
+                    except socket.error as ex:
+                        LOG.warning('Cannot send the DHCP request to '
+                                    '%(host)s: %(error)s',
+                                    {'host': query.dhcp_host, 'error': ex})
+                        del queries[id_req]
+            if not queries:
+                break
+
+            wait = min([deadline] + [query.next_send
+                                     for query in queries.values()]) - now
+            if select.select([s], [], [], max(wait, 0))[0]:
+                try:
+                    data = s.recv(MAX_PACKET_SIZE)
+                except socket.error as ex:
+                    # An ICMP error for one of the requests, on Windows.
+                    LOG.debug('Ignoring DHCP socket error: %s', ex)
+                    data = b''
+                if len(data) >= _HEADER.size:
+                    id_reply = _HEADER.unpack(data[:_HEADER.size])[4]
+                    query = queries.get(id_reply)
+                    if query:
+                        replied, reply_options = _parse_dhcp_reply(
+                            data, id_reply)
+                        if replied:
+                            options[query.dhcp_host] = reply_options
+                            del queries[id_reply]
+            now = _monotonic()
     finally:
         s.close()
 
     return options
+
+
+def get_dhcp_options(dhcp_host, requested_options=[], timeout=5.0,
+                     vendor_id='cloudbase-init', max_bind_attempts=10,
+                     bind_retry_interval=3):
+    return get_all_dhcp_options(
+        [dhcp_host], requested_options, timeout, vendor_id,
+        max_bind_attempts, bind_retry_interval)[dhcp_host]
+
+
+def register_options(options):
+    """Request the given options in every cached DHCP query.
+
+    The consumers register their options when imported, so that a single
+    query per DHCP host serves all of them.
+    """
+    _registered_options.update(options)
+
+
+def clear_cache():
+    with _replies_lock:
+        _replies.clear()
+
+
+def _get_expiry(options):
+    lease_time = options and options.get(OPTION_LEASE_TIME)
+    if not lease_time or len(lease_time) != 4:
+        return None
+    return time.time() + struct.unpack('!L', lease_time)[0]
+
+
+def get_all_cached_dhcp_options(dhcp_hosts, requested_options=[]):
+    """Return the DHCP options by host, querying each host once per boot.
+
+    The hosts are queried together, for the given options and the
+    registered ones. Their replies, or the lack of them, are reused for
+    the following calls until the lease expires, if the reply has a
+    lease time.
+    """
+    with _replies_lock:
+        now = time.time()
+        options = {}
+        for dhcp_host in dhcp_hosts:
+            reply = _replies.get(dhcp_host)
+            if reply:
+                options_requested, host_options, expiry = reply
+                expired = expiry is not None and now >= expiry
+                missing = set(requested_options) - options_requested
+                if not missing and not expired:
+                    LOG.debug('Using the cached DHCP options of %s',
+                              dhcp_host)
+                    options[dhcp_host] = host_options
+
+        missing_hosts = [dhcp_host for dhcp_host in dhcp_hosts
+                         if dhcp_host not in options]
+        if missing_hosts:
+            options_requested = _registered_options | set(requested_options)
+            replies = get_all_dhcp_options(missing_hosts,
+                                           sorted(options_requested))
+            for dhcp_host, host_options in replies.items():
+                _replies[dhcp_host] = (options_requested, host_options,
+                                       _get_expiry(host_options))
+                options[dhcp_host] = host_options
+        return options
+
+
+def get_cached_dhcp_options(dhcp_host, requested_options=[]):
+    """Return the DHCP options of the host, querying it once per boot."""
+    return get_all_cached_dhcp_options([dhcp_host],
+                                       requested_options)[dhcp_host]
@@ -0,0 +1,294 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Read-only FAT12/16/32 filesystem access, without mounting.
+
+Long file names (VFAT) are supported, which is what the configuration
+drive relies on.
+"""
+
+import hashlib
+import struct
+
+from oslo_log import log as oslo_logging
+
+from cloudbaseinit import exception
+from cloudbaseinit.utils import filesystem
+
+
+LOG = oslo_logging.getLogger(__name__)
+
+BOOT_SECTOR_SIZE = 512
+BOOT_SIGNATURE = b"\x55\xaa"
+BPB = struct.Struct("<3s8sHBHBHHBHHHIIIHHI")
+EXTENDED_BOOT_SIGNATURES = (0x28, 0x29)
+OFFSET_EXTENDED_BPB = 36
+OFFSET_EXTENDED_BPB32 = 64
+# Offset of the volume label relative to the extended BPB.
+OFFSET_LABEL = 7
+LABEL_SIZE = 11
+
+MAX_CLUSTERS_FAT12 = 4085
+MAX_CLUSTERS_FAT16 = 65525
+
+DIR_ENTRY = struct.Struct("<11sBB7xH4xHI")
+DIR_ENTRY_SIZE = 32
+ENTRY_END = 0x00
+ENTRY_DELETED = 0xE5
+ATTR_VOLUME_ID = 0x08
+ATTR_DIRECTORY = 0x10
+ATTR_LONG_NAME = 0x0F
+LFN_LAST = 0x40
+LFN_SEQUENCE_MASK = 0x1F
+# Name case flags kept by Windows and Linux for 8.3 names.
+CASE_LOWER_BASE = 0x08
+CASE_LOWER_EXT = 0x10
+
+
+def _read_at(device, offset, size):
+    real_offset = device.seek(offset)
+    return device.read(size, skip=offset - real_offset)
+
+
+def _short_name_checksum(short_name):
+    checksum = 0
+    for char in bytearray(short_name):
+        checksum = (((checksum & 1) << 7) + (checksum >> 1) + char) & 0xFF
+    return checksum
+
+
+def _decode_short_name(raw, case):
+    base = raw[:8].decode("ascii", "replace").rstrip()
+    ext = raw[8:].decode("ascii", "replace").rstrip()
+    if case & CASE_LOWER_BASE:
+        base = base.lower()
+    if case & CASE_LOWER_EXT:
+        ext = ext.lower()
+    return base + "." + ext if ext else base
+
+
+def _decode_long_name(entry):
+    raw = entry[1:11] + entry[14:26] + entry[28:32]
+    name = raw.decode("utf-16-le", "replace")
+    return name.split(u"\x00", 1)[0]
+
+
+def _parse_entries(data):
+    """Yield (name, attributes, first cluster, size) for directory data."""
+    long_parts = {}
+    long_checksum = None
+    for index in range(0, len(data) - DIR_ENTRY_SIZE + 1, DIR_ENTRY_SIZE):
+        entry = data[index:index + DIR_ENTRY_SIZE]
+        first = bytearray(entry[0:1])[0]
+        if first == ENTRY_END:
+            break
+        if first == ENTRY_DELETED:
+            long_parts = {}
+            continue
+
+        attributes = bytearray(entry[11:12])[0]
+        if attributes == ATTR_LONG_NAME:
+            if first & LFN_LAST:
+                long_parts = {}
+                long_checksum = bytearray(entry[13:14])[0]
+            long_parts[first & LFN_SEQUENCE_MASK] = _decode_long_name(entry)
+            continue
+
+        (short_name, _, case, cluster_high, cluster_low,
+         size) = DIR_ENTRY.unpack(entry)
+        name = None
+        if long_parts and long_checksum == _short_name_checksum(short_name):
+            name = u"".join(long_parts[seq] for seq in sorted(long_parts))
+        long_parts = {}
+
+        if attributes & ATTR_VOLUME_ID or short_name[:1] == b".":
+            continue
+        if not name:
+            name = _decode_short_name(short_name, case)
+        yield name, attributes, (cluster_high << 16) | cluster_low, size
+
+
+class FATReader(filesystem.BaseReader):
+    """Give access to the files of a FAT filesystem.
+
+    The reader works over an opened device providing the `seek`/`read`
+    interface used by :mod:`cloudbaseinit.utils.partitions`.
+    """
+
+    def __init__(self, device, label, bpb, boot_sector=b""):
+        (_, _, sector_size, sectors_per_cluster, reserved_sectors,
+         fat_count, root_entries, total_sectors16, _, fat_size16,
+         _, _, _, total_sectors32, fat_size32, _, _,
+         root_cluster) = bpb
+        fat_size = fat_size16 or fat_size32
+        total_sectors = total_sectors16 or total_sectors32
+        root_sectors = ((root_entries * DIR_ENTRY_SIZE + sector_size - 1) //
+                        sector_size)
+
+        self._device = device
+        self._boot_sector = boot_sector
+        self._cluster_size = sector_size * sectors_per_cluster
+        self._fat_offset = reserved_sectors * sector_size
+        self._fat_size = fat_size * sector_size
+        self._root_offset = (reserved_sectors + fat_count * fat_size) * \
+            sector_size
+        self._root_size = root_sectors * sector_size
+        self._data_offset = self._root_offset + self._root_size
+        self._fat = None
+        self._files = None
+
+        clusters = ((total_sectors - reserved_sectors -
+                     fat_count * fat_size - root_sectors) //
+                    sectors_per_cluster)
+        if clusters < MAX_CLUSTERS_FAT12:
+            self.fat_type = 12
+        elif clusters < MAX_CLUSTERS_FAT16:
+            self.fat_type = 16
+        else:
+            self.fat_type = 32
+        self._root_cluster = root_cluster if self.fat_type == 32 else None
+        self._max_cluster = clusters + 1
+        self.label = label
+
+    def __repr__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self._device)
+
+    def _get_fat(self):
+        if self._fat is None:
+            self._fat = _read_at(self._device, self._fat_offset,
+                                 self._fat_size)
+        return self._fat
+
+    def _next_cluster(self, cluster):
+        fat = self._get_fat()
+        if self.fat_type == 12:
+            value = struct.unpack_from("<H", fat, cluster + cluster // 2)[0]
+            return value >> 4 if cluster & 1 else value & 0x0FFF
+        if self.fat_type == 16:
+            return struct.unpack_from("<H", fat, cluster * 2)[0]
+        return struct.unpack_from("<I", fat, cluster * 4)[0] & 0x0FFFFFFF
+
+    def _get_chain(self, cluster):
+        chain = []
+        while 2 <= cluster <= self._max_cluster:
+            if len(chain) > self._max_cluster:
+                raise exception.CloudbaseInitException(
+                    "Cluster chain loop found on %s" % self._device)
+            chain.append(cluster)
+            cluster = self._next_cluster(cluster)
+        return chain
+
+    def _read_chain(self, cluster, size=None):
+        chunks = []
+        remaining = size
+        for cluster in self._get_chain(cluster):
+            to_read = self._cluster_size
+            if remaining is not None:
+                if remaining <= 0:
+                    break
+                to_read = min(to_read, remaining)
+                remaining -= to_read
+            offset = self._data_offset + (cluster - 2) * self._cluster_size
+            chunks.append(_read_at(self._device, offset, to_read))
+        return b"".join(chunks)
+
+    def _walk(self, data, prefix, files, visited):
+        for name, attributes, cluster, size in _parse_entries(data):
+            path = prefix + name
+            if attributes & ATTR_DIRECTORY:
+                if cluster in visited:
+                    continue
+                visited.add(cluster)
+                self._walk(self._read_chain(cluster), path + "/",
+                           files, visited)
+            else:
+                files[path] = (cluster, size)
+
+    def _read_root(self):
+        if self._root_cluster:
+            return self._read_chain(self._root_cluster)
+        return _read_at(self._device, self._root_offset, self._root_size)
+
+    def fingerprint(self):
+        """Return a digest identifying the volume content.
+
+        It covers the boot sector, holding the volume serial number
+        generated when the filesystem was created, and the root directory.
+        """
+        digest = hashlib.sha256(self._boot_sector)
+        digest.update(self._read_root())
+        return digest.hexdigest()
+
+    def get_files(self):
+        """Return a mapping between file paths and their location.
+
+        The paths are relative to the filesystem root and use forward
+        slashes. The directory tree is walked only once.
+        """
+        if self._files is None:
+            files = {}
+            self._walk(self._read_root(), "", files, set())
+            self._files = files
+        return self._files
+
+    def read_file(self, path):
+        try:
+            cluster, size = self.get_files()[path]
+        except KeyError:
+            raise exception.ItemNotFoundException(
+                "File %r not found on %s" % (path, self._device))
+        if not size:
+            return b""
+        return self._read_chain(cluster, size)
+
+
+def _get_label(sector, extended_offset):
+    signature = bytearray(sector[extended_offset + 2:
+                                 extended_offset + 3])[0]
+    if signature not in EXTENDED_BOOT_SIGNATURES:
+        return None
+    start = extended_offset + OFFSET_LABEL
+    label = sector[start:start + LABEL_SIZE]
+    return label.decode("ascii", "replace").strip()
+
+
+def get_reader(device):
+    """Return a `FATReader` for the device if it holds a FAT filesystem.
+
+    Only the boot sector is read here, the directory tree being
+    walked on demand.
+    """
+    sector = _read_at(device, 0, BOOT_SECTOR_SIZE)
+    if len(sector) < BOOT_SECTOR_SIZE or sector[510:512] != BOOT_SIGNATURE:
+        return None
+
+    bpb = BPB.unpack_from(sector)
+    (jump, _, sector_size, sectors_per_cluster, reserved_sectors,
+     fat_count, _, total_sectors16, _, fat_size16, _, _, _,
+     total_sectors32, fat_size32, _, _, _) = bpb
+    if (bytearray(jump[0:1])[0] not in (0xEB, 0xE9) or
+            sector_size not in (512, 1024, 2048, 4096) or
+            not sectors_per_cluster or
+            sectors_per_cluster & (sectors_per_cluster - 1) or
+            not reserved_sectors or not fat_count or
+            not (total_sectors16 or total_sectors32)):
+        return None
+
+    if fat_size16:
+        label = _get_label(sector, OFFSET_EXTENDED_BPB)
+    else:
+        if not fat_size32:
+            return None
+        label = _get_label(sector, OFFSET_EXTENDED_BPB32)
+    return FATReader(device, label, bpb, boot_sector=sector)
@@ -0,0 +1,78 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import abc
+import os
+
+import six
+
+from cloudbaseinit import exception
+from cloudbaseinit.osutils import factory as osutils_factory
+
+
+def restrict_access(path):
+    """Allow only the owner of the path, and SYSTEM on Windows, to use it.
+
+    On Windows, the inherited ACLs of the whole tree are replaced, as the
+    permission bits are ignored there.
+    """
+    if os.name == 'nt':
+        osutils = osutils_factory.get_os_utils()
+        osutils.set_path_owner_only_acls(path)
+    else:
+        os.chmod(path, 0o700)
+
+
+@six.add_metaclass(abc.ABCMeta)
+class BaseReader(object):
+    """Base class of the readers giving access to a tree of files.
+
+    The files are identified by their path relative to the root of the
+    tree, using "/" as separator.
+    """
+
+    @abc.abstractmethod
+    def get_files(self):
+        """Return a mapping having the paths of the files as keys."""
+
+    @abc.abstractmethod
+    def read_file(self, path):
+        """Return the content of the file found at the given path."""
+
+    def _write_file(self, path, file_path):
+        with open(file_path, "wb") as stream:
+            stream.write(self.read_file(path))
+
+    def extract(self, target_path, paths=None):
+        """Write the given files, or all of them, under `target_path`.
+
+        Absolute paths and paths resolving outside `target_path` are
+        rejected.
+        """
+        if paths is None:
+            paths = self.get_files()
+        target_path = os.path.abspath(target_path)
+        for path in sorted(paths):
+            file_path = os.path.abspath(
+                os.path.join(target_path, *path.split("/")))
+            inside = file_path.startswith(os.path.join(target_path, ""))
+            if os.path.isabs(path) or not inside:
+                raise exception.CloudbaseInitException(
+                    "Refusing to extract %r outside of %r" %
+                    (path, target_path))
+
+            file_dir = os.path.dirname(file_path)
+            if not os.path.isdir(file_dir):
+                os.makedirs(file_dir)
+            self._write_file(path, file_path)
@@ -0,0 +1,307 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Read-only ISO9660 filesystem access, without mounting.
+
+Names are taken from the Joliet supplementary volume descriptor when
+one exists, from the Rock Ridge alternate names otherwise, falling
+back to the plain ISO9660 ones.
+"""
+
+import collections
+import hashlib
+from multiprocessing import pool
+import struct
+
+from oslo_log import log as oslo_logging
+
+from cloudbaseinit import exception
+from cloudbaseinit.utils import filesystem
+
+
+LOG = oslo_logging.getLogger(__name__)
+
+ISO_ID = b"CD001"
+# The volume descriptors set starts after the 32KB system area.
+OFFSET_DESCRIPTORS = 0x8000
+DESCRIPTOR_SIZE = 2048
+MAX_DESCRIPTORS = 32
+
+VD_PRIMARY = 1
+VD_SUPPLEMENTARY = 2
+VD_TERMINATOR = 255
+JOLIET_ESCAPES = (b"%/@", b"%/C", b"%/E")
+
+OFFSET_VOLUME_ID = 40
+VOLUME_ID_SIZE = 32
+OFFSET_VOLUME_SIZE = 80
+OFFSET_ESCAPES = 88
+OFFSET_BLOCK_SIZE = 128
+OFFSET_ROOT_RECORD = 156
+OFFSET_CREATION_TIME = 813
+CREATION_TIME_SIZE = 17
+
+MAX_SCAN_WORKERS = 8
+
+RECORD_HEADER = struct.Struct("<BBI4xI4x7sBBB4xB")
+FLAG_DIRECTORY = 0x02
+FLAG_MULTI_EXTENT = 0x80
+ROCK_RIDGE_NM = b"NM"
+ROCK_RIDGE_CONTINUE = 0x01
+
+
+ISOHeader = collections.namedtuple(
+    "ISOHeader", ["label", "block_size", "volume_size", "size",
+                  "creation_time", "descriptor"])
+
+
+def _read_at(device, offset, size):
+    real_offset = device.seek(offset)
+    return device.read(size, skip=offset - real_offset)
+
+
+def _decode_record_name(raw, joliet):
+    if joliet:
+        name = raw.decode("utf-16-be", "replace")
+    else:
+        name = raw.decode("ascii", "replace").lower()
+    # Strip the file version and the dot of extensionless names.
+    name = name.split(";", 1)[0]
+    if name.endswith("."):
+        name = name[:-1]
+    return name
+
+
+def _get_rock_ridge_name(system_use):
+    """Return the alternate name from the Rock Ridge NM entries."""
+    parts = []
+    index = 0
+    while index + 4 <= len(system_use):
+        signature = system_use[index:index + 2]
+        length = bytearray(system_use[index + 2:index + 3])[0]
+        if length < 4:
+            break
+        if signature == ROCK_RIDGE_NM:
+            flags = bytearray(system_use[index + 4:index + 5])[0]
+            parts.append(system_use[index + 5:index + length])
+            if not flags & ROCK_RIDGE_CONTINUE:
+                break
+        index += length
+    if parts:
+        return b"".join(parts).decode("utf-8", "replace")
+    return None
+
+
+def _parse_records(data, joliet):
+    """Yield (name, extent, size, flags) for a directory content."""
+    index = 0
+    while index < len(data):
+        length = bytearray(data[index:index + 1])[0]
+        if not length:
+            # Records never cross a logical sector, the rest is padding.
+            index = (index // DESCRIPTOR_SIZE + 1) * DESCRIPTOR_SIZE
+            continue
+        record = data[index:index + length]
+        index += length
+        if len(record) < RECORD_HEADER.size:
+            break
+
+        (_, _, extent, size, _, flags, _, _,
+         name_length) = RECORD_HEADER.unpack_from(record)
+        raw_name = record[RECORD_HEADER.size:RECORD_HEADER.size +
+                          name_length]
+        if raw_name in (b"\x00", b"\x01"):
+            continue    # the current and the parent directory
+
+        name = None
+        if not joliet:
+            # The system use area starts after the padded name.
+            system_use = record[RECORD_HEADER.size + name_length +
+                                (1 - name_length % 2):]
+            name = _get_rock_ridge_name(system_use)
+        if not name:
+            name = _decode_record_name(raw_name, joliet)
+        yield name, extent, size, flags
+
+
+class ISO9660Reader(filesystem.BaseReader):
+    """Give access to the files of an ISO9660 filesystem.
+
+    The reader works over an opened device providing the `seek`/`read`
+    interface used by :mod:`cloudbaseinit.utils.partitions`.
+    """
+
+    def __init__(self, device, label, block_size, volume_size,
+                 root_record, joliet=False, descriptor=b""):
+        self._device = device
+        self._descriptor = descriptor
+        self._block_size = block_size
+        self._root_record = root_record
+        self._joliet = joliet
+        self._files = None
+
+        self.label = label
+        self.volume_size = volume_size
+
+    def __repr__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self._device)
+
+    def _read_directory(self, extent, size):
+        return _read_at(self._device, extent * self._block_size, size)
+
+    def _walk(self, extent, size, prefix, files, visited):
+        if extent in visited:
+            return
+        visited.add(extent)
+        data = self._read_directory(extent, size)
+        for name, child_extent, child_size, flags in _parse_records(
+                data, self._joliet):
+            path = prefix + name
+            if flags & FLAG_DIRECTORY:
+                self._walk(child_extent, child_size, path + "/",
+                           files, visited)
+            elif flags & FLAG_MULTI_EXTENT:
+                LOG.warning("Multi extent file %s is not supported", path)
+            else:
+                files[path] = (child_extent * self._block_size, child_size)
+
+    def fingerprint(self):
+        """Return a digest identifying the volume content.
+
+        It covers the primary volume descriptor, which holds the volume
+        size and its creation time, and the root directory extent, so it
+        is computed with only a couple of reads.
+        """
+        (_, _, extent, size, _, _, _, _,
+         _) = RECORD_HEADER.unpack_from(self._root_record)
+        digest = hashlib.sha256(self._descriptor)
+        digest.update(self._read_directory(extent, size))
+        return digest.hexdigest()
+
+    def get_files(self):
+        """Return a mapping between file paths and (offset, size) pairs.
+
+        The paths are relative to the filesystem root and use forward
+        slashes. The directory tree is walked only once.
+        """
+        if self._files is None:
+            (_, _, extent, size, _, _, _, _,
+             _) = RECORD_HEADER.unpack_from(self._root_record)
+            files = {}
+            self._walk(extent, size, "", files, set())
+            self._files = files
+        return self._files
+
+    def read_file(self, path):
+        try:
+            offset, size = self.get_files()[path]
+        except KeyError:
+            raise exception.ItemNotFoundException(
+                "File %r not found on %s" % (path, self._device))
+        return _read_at(self._device, offset, size)
+
+
+def _is_joliet(descriptor):
+    escapes = descriptor[OFFSET_ESCAPES:OFFSET_ESCAPES + 3]
+    return escapes in JOLIET_ESCAPES
+
+
+def _parse_header(descriptor):
+    label = descriptor[OFFSET_VOLUME_ID:OFFSET_VOLUME_ID + VOLUME_ID_SIZE]
+    label = label.decode("ascii", "replace").strip()
+    volume_size = struct.unpack_from("<I", descriptor, OFFSET_VOLUME_SIZE)[0]
+    block_size = struct.unpack_from("<H", descriptor, OFFSET_BLOCK_SIZE)[0]
+    creation_time = descriptor[OFFSET_CREATION_TIME:
+                               OFFSET_CREATION_TIME + CREATION_TIME_SIZE]
+    return ISOHeader(label, block_size, volume_size,
+                     volume_size * block_size,
+                     creation_time.decode("ascii", "replace"), descriptor)
+
+
+def read_header(device):
+    """Return the `ISOHeader` of the device's primary volume descriptor.
+
+    The whole descriptor sector is fetched with a single aligned read
+    and all the fields are parsed from it. None is returned when the
+    device doesn't start with an ISO9660 primary volume descriptor.
+    """
+    descriptor = _read_at(device, OFFSET_DESCRIPTORS, DESCRIPTOR_SIZE)
+    if (len(descriptor) < DESCRIPTOR_SIZE or
+            descriptor[1:6] != ISO_ID or
+            bytearray(descriptor[0:1])[0] != VD_PRIMARY):
+        return None
+    return _parse_header(descriptor)
+
+
+def scan_devices(devices, read_header=read_header,
+                 max_workers=MAX_SCAN_WORKERS):
+    """Read the ISO9660 headers of the given devices in parallel.
+
+    Every device is opened only for the time needed to read its header.
+    Returns the (device, header) pairs of the ISO9660 devices, in the
+    order they were given, so the callers keep their preference order.
+    """
+    def scan(device):
+        try:
+            with device:
+                return read_header(device)
+        except Exception as exc:
+            LOG.warning("ISO9660 header scan failed on %(device)s with "
+                        "%(error)r", {"device": device, "error": exc})
+
+    devices = list(devices)
+    if len(devices) > 1:
+        workers = pool.ThreadPool(min(len(devices), max_workers))
+        try:
+            headers = workers.map(scan, devices)
+        finally:
+            workers.close()
+            workers.join()
+    else:
+        headers = [scan(device) for device in devices]
+    return [(device, header) for device, header in zip(devices, headers)
+            if header]
+
+
+def get_reader(device):
+    """Return an `ISO9660Reader` for the device if it holds an ISO9660.
+
+    Only the volume descriptors are read here, the directory tree
+    being walked on demand.
+    """
+    primary = joliet = None
+    for index in range(MAX_DESCRIPTORS):
+        descriptor = _read_at(device,
+                              OFFSET_DESCRIPTORS + index * DESCRIPTOR_SIZE,
+                              DESCRIPTOR_SIZE)
+        if (len(descriptor) < DESCRIPTOR_SIZE or
+                descriptor[1:6] != ISO_ID):
+            break
+        vd_type = bytearray(descriptor[0:1])[0]
+        if vd_type == VD_TERMINATOR:
+            break
+        if vd_type == VD_PRIMARY and primary is None:
+            primary = descriptor
+        elif vd_type == VD_SUPPLEMENTARY and _is_joliet(descriptor):
+            joliet = descriptor
+
+    if primary is None:
+        return None
+
+    header = _parse_header(primary)
+    descriptor = joliet if joliet is not None else primary
+    root_record = descriptor[OFFSET_ROOT_RECORD:OFFSET_ROOT_RECORD + 34]
+    return ISO9660Reader(device, header.label, header.block_size,
+                         header.size, root_record,
+                         joliet=joliet is not None, descriptor=primary)
@@ -0,0 +1,265 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Streaming MIME multipart parsing.
+
+The parts are yielded one by one while the input is read line by line,
+so the first parts can be processed before the following ones are even
+parsed. Only the headers go through the email feed parser, the bodies
+being decoded incrementally into spooled temporary files, which move to
+disk once they exceed the spool size.
+"""
+
+import binascii
+from email import feedparser
+import io
+import tempfile
+
+from oslo_log import log as oslo_logging
+
+from cloudbaseinit.utils import encoding
+
+
+LOG = oslo_logging.getLogger(__name__)
+
+SPOOL_SIZE = 1024 * 1024
+
+_FeedParser = getattr(feedparser, "BytesFeedParser", feedparser.FeedParser)
+
+
+class _IdentityDecoder(object):
+
+    def decode(self, data):
+        return data
+
+    def flush(self):
+        return b""
+
+
+class _Base64Decoder(object):
+
+    def __init__(self):
+        self._pending = b""
+
+    def decode(self, data):
+        data = self._pending + b"".join(data.split())
+        length = len(data) // 4 * 4
+        self._pending = data[length:]
+        return binascii.a2b_base64(data[:length]) if length else b""
+
+    def flush(self):
+        pending, self._pending = self._pending, b""
+        if not pending:
+            return b""
+        LOG.warning("Incomplete base64 content, padding it")
+        return binascii.a2b_base64(pending + b"=" * (-len(pending) % 4))
+
+
+class _QuotedPrintableDecoder(object):
+    # Only complete lines are decoded, for handling the soft line breaks.
+
+    def __init__(self):
+        self._pending = b""
+
+    def decode(self, data):
+        data = self._pending + data
+        index = data.rfind(b"\n") + 1
+        self._pending = data[index:]
+        return binascii.a2b_qp(data[:index]) if index else b""
+
+    def flush(self):
+        pending, self._pending = self._pending, b""
+        return binascii.a2b_qp(pending) if pending else b""
+
+
+DECODERS = {
+    "base64": _Base64Decoder,
+    "quoted-printable": _QuotedPrintableDecoder,
+}
+
+
+class MimePart(object):
+    """A MIME entity whose payload is kept in a spooled temporary file.
+
+    It provides the subset of the `email.message.Message` interface used
+    by the user data plugins, the payload being already decoded from its
+    content transfer encoding.
+    """
+
+    def __init__(self, headers, spool_size=SPOOL_SIZE, payload=None):
+        self._headers = headers
+        self.size = 0
+        if payload is None:
+            payload = tempfile.SpooledTemporaryFile(max_size=spool_size)
+        else:
+            # An already decoded payload, like a cached one.
+            payload.seek(0, io.SEEK_END)
+            self.size = payload.tell()
+        self._payload = payload
+
+    def __repr__(self):
+        return "<{}: {} {!r}>".format(self.__class__.__name__,
+                                      self.get_content_type(),
+                                      self.get_filename())
+
+    @property
+    def headers(self):
+        return self._headers
+
+    def __getitem__(self, name):
+        return self._headers[name]
+
+    def get(self, name, failobj=None):
+        return self._headers.get(name, failobj)
+
+    def get_content_type(self):
+        return self._headers.get_content_type()
+
+    def get_content_maintype(self):
+        return self._headers.get_content_maintype()
+
+    def get_filename(self, failobj=None):
+        return self._headers.get_filename(failobj)
+
+    def get_param(self, param, failobj=None):
+        return self._headers.get_param(param, failobj)
+
+    def get_boundary(self, failobj=None):
+        return self._headers.get_boundary(failobj)
+
+    def is_multipart(self):
+        return self.get_content_maintype() == "multipart"
+
+    def write(self, data):
+        self._payload.write(data)
+        self.size += len(data)
+
+    def open_payload(self):
+        """Return the decoded payload as a binary file object."""
+        self._payload.seek(0)
+        return self._payload
+
+    def get_payload(self, decode=False):
+        """Return the decoded payload, as bytes when `decode` is set."""
+        payload = self.open_payload().read()
+        if decode:
+            return payload
+        return encoding.get_as_string(payload)
+
+    def close(self):
+        self._payload.close()
+
+
+class MultipartParser(object):
+    """Iterate over the MIME entities read from a binary stream.
+
+    The entities are yielded depth first, the multipart containers
+    before their parts, the same way `email.message.Message.walk` does.
+    Every part is complete when yielded, but the content following
+    it is not read until the iteration is resumed.
+    """
+
+    def __init__(self, stream, spool_size=SPOOL_SIZE):
+        self._stream = stream
+        self._spool_size = spool_size
+        # The boundary delimiter ending the last body, with its kind.
+        self._boundary = None
+        self._closing = False
+
+    def _readline(self):
+        return self._stream.readline()
+
+    def _read_headers(self):
+        parser = _FeedParser()
+        while True:
+            line = self._readline()
+            if not line:
+                break
+            parser.feed(line)
+            if not line.strip():
+                break
+        return parser.close()
+
+    def _match_boundary(self, line, boundaries):
+        if not line.startswith(b"--"):
+            return False
+        delimiter = line.rstrip()[2:]
+        # The innermost boundary is checked first.
+        for boundary in reversed(boundaries):
+            if delimiter == boundary:
+                self._boundary, self._closing = boundary, False
+                return True
+            if delimiter == boundary + b"--":
+                self._boundary, self._closing = boundary, True
+                return True
+        return False
+
+    def _read_body(self, boundaries, part=None, decoder=None):
+        """Read lines until a delimiter of the given boundaries."""
+        self._boundary = None
+        # The line break preceding a delimiter belongs to the delimiter.
+        line_break = b""
+        while True:
+            line = self._readline()
+            if not line or self._match_boundary(line, boundaries):
+                break
+            if part is None:
+                continue
+
+            content = line.rstrip(b"\r\n")
+            part.write(decoder.decode(line_break + content))
+            line_break = line[len(content):]
+
+        if part is not None:
+            part.write(decoder.flush())
+
+    def _get_boundary(self, headers):
+        boundary = headers.get_boundary()
+        if boundary is None:
+            return None
+        return boundary.encode("ascii", "replace")
+
+    def _parse_entity(self, headers, boundaries):
+        part = MimePart(headers, self._spool_size)
+        boundary = self._get_boundary(headers) if part.is_multipart() else None
+
+        if boundary is None:
+            transfer_encoding = headers.get("Content-Transfer-Encoding", "")
+            decoder_class = DECODERS.get(transfer_encoding.strip().lower(),
+                                         _IdentityDecoder)
+            self._read_body(boundaries, part, decoder_class())
+            yield part
+            return
+
+        yield part
+        inner_boundaries = boundaries + [boundary]
+        # The preamble is discarded.
+        self._read_body(inner_boundaries)
+        while self._boundary == boundary and not self._closing:
+            for subpart in self._parse_entity(self._read_headers(),
+                                              inner_boundaries):
+                yield subpart
+        if self._boundary == boundary:
+            # The epilogue is discarded as well.
+            self._read_body(boundaries)
+
+    def __iter__(self):
+        return self._parse_entity(self._read_headers(), [])
+
+
+def iter_parts(data, spool_size=SPOOL_SIZE):
+    """Yield the MIME entities of the given bytes or binary stream."""
+    if isinstance(data, bytes):
+        data = io.BytesIO(data)
+    return iter(MultipartParser(data, spool_size))
@@ -14,10 +14,14 @@
 
 
 import binascii
+import collections
 import socket
 import struct
 import sys
+import threading
+import time
 
+from oslo_config import cfg
 from oslo_log import log as oslo_logging
 from six.moves.urllib import parse
 from six.moves.urllib import request
@@ -25,22 +29,84 @@ from six.moves.urllib import request
 from cloudbaseinit.osutils import factory as osutils_factory
 
 
+opts = [
+    cfg.FloatOpt('metadata_route_probe_timeout', default=2.0,
+                 help='The timeout in seconds of each attempt to reach the '
+                      'metadata URL, before adding a route for it'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
+
 LOG = oslo_logging.getLogger(__name__)
 MAX_URL_CHECK_RETRIES = 3
 
+# The outcome of the route check of a metadata host.
+MetadataRoute = collections.namedtuple(
+    "MetadataRoute",
+    [
+        "host",
+        "route_added",
+        "duration",
+    ]
+)
+
+# The metadata hosts are checked once per process, the services sharing
+# the same host waiting for the first check.
+_metadata_routes = {}
+_metadata_routes_lock = threading.Lock()
 
-def check_url(url, retries_count=MAX_URL_CHECK_RETRIES):
-    for i in range(0, MAX_URL_CHECK_RETRIES):
+
+def check_url(url, retries_count=MAX_URL_CHECK_RETRIES, timeout=None):
+    for i in range(0, retries_count):
         try:
             LOG.debug("Testing url: %s" % url)
-            request.urlopen(url)
+            if timeout:
+                request.urlopen(url, timeout=timeout)
+            else:
+                request.urlopen(url)
             return True
         except Exception:
             pass
     return False
 
 
+def clear_cache():
+    """Forget the metadata routes checked so far."""
+    with _metadata_routes_lock:
+        _metadata_routes.clear()
+
+
+def _add_metadata_ip_route(osutils, metadata_url, metadata_host):
+    if osutils.check_static_route_exists(metadata_host):
+        return False
+    # The URL is probed only when no route exists for its host.
+    if check_url(metadata_url, timeout=CONF.metadata_route_probe_timeout):
+        return False
+
+    (interface_index, gateway) = osutils.get_default_gateway()
+    if not gateway:
+        return False
+    try:
+        LOG.debug('Setting gateway for host: %s', metadata_host)
+        osutils.add_static_route(metadata_host,
+                                 "255.255.255.255",
+                                 gateway,
+                                 interface_index,
+                                 10)
+        return True
+    except Exception as ex:
+        # Ignore it
+        LOG.exception(ex)
+        return False
+
+
 def check_metadata_ip_route(metadata_url):
+    """Add a route for the metadata host, if it is not reachable.
+
+    Return the `MetadataRoute` of the host, or None when no route is
+    needed on this system.
+    """
     # Workaround for: https://bugs.launchpad.net/quantum/+bug/1174657
     osutils = osutils_factory.get_os_utils()
 
@@ -51,21 +117,22 @@ def check_metadata_ip_route(metadata_url):
         metadata_host = metadata_netloc.split(':')[0]
 
         if metadata_host.startswith("169.254."):
-            if (not osutils.check_static_route_exists(metadata_host) and
-                    not check_url(metadata_url)):
-                (interface_index, gateway) = osutils.get_default_gateway()
-                if gateway:
-                    try:
-                        LOG.debug('Setting gateway for host: %s',
-                                  metadata_host)
-                        osutils.add_static_route(metadata_host,
-                                                 "255.255.255.255",
-                                                 gateway,
-                                                 interface_index,
-                                                 10)
-                    except Exception as ex:
-                        # Ignore it
-                        LOG.exception(ex)
+            with _metadata_routes_lock:
+                metadata_route = _metadata_routes.get(metadata_host)
+                if metadata_route:
+                    return metadata_route
+
+                start = time.time()
+                route_added = _add_metadata_ip_route(
+                    osutils, metadata_url, metadata_host)
+                metadata_route = MetadataRoute(
+                    metadata_host, route_added, time.time() - start)
+                LOG.info("Metadata route check for %(host)s took "
+                         "%(duration).3f seconds",
+                         {"host": metadata_host,
+                          "duration": metadata_route.duration})
+                _metadata_routes[metadata_host] = metadata_route
+                return metadata_route
 
 
 def address6_to_4_truncate(address6):
@@ -83,3 +150,17 @@ def netmask6_to_4_truncate(netmask6):
     mask = "1" * length + "0" * (32 - length)
     network_address = struct.pack("!L", int(mask, 2))
     return socket.inet_ntoa(network_address)
+
+
+def prefix_to_netmask(prefix):
+    """Get the IPv4 netmask of the given prefix length."""
+    mask = (0xffffffff << (32 - int(prefix))) & 0xffffffff
+    return socket.inet_ntoa(struct.pack("!L", mask))
+
+
+def netmask6_to_prefix(netmask6):
+    """Get the prefix length of an IPv6 netmask, like `ffff:ffff::`."""
+    head, _, tail = netmask6.partition("::")
+    groups = [group for group in head.split(":") + tail.split(":")
+              if group]
+    return str(sum(bin(int(group, 16)).count("1") for group in groups))
@@ -0,0 +1,162 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Parser of the OpenStack network_data.json network configuration.
+
+The links are turned into interfaces, to which the networks and their
+routes are attached by the id of their link, in a single pass over the
+loaded content. The DNS services apply to all the interfaces.
+"""
+
+import collections
+import json
+
+from oslo_log import log as oslo_logging
+import six
+
+from cloudbaseinit.metadata.services import base as service_base
+from cloudbaseinit.utils import debiface
+from cloudbaseinit.utils import network
+
+
+LOG = oslo_logging.getLogger(__name__)
+
+DNS_SERVICE = "dns"
+# The address family and the configuration method of each network type.
+NETWORK_TYPES = {
+    "ipv4": (debiface.INET, debiface.STATIC),
+    "ipv4_dhcp": (debiface.INET, "dhcp"),
+    "ipv6": (debiface.INET6, debiface.STATIC),
+    "ipv6_dhcp": (debiface.INET6, "dhcp"),
+    "ipv6_dhcpv6-stateful": (debiface.INET6, "dhcp"),
+    "ipv6_dhcpv6-stateless": (debiface.INET6, "auto"),
+    "ipv6_slaac": (debiface.INET6, "auto"),
+}
+DEFAULT_NETWORKS = ("0.0.0.0", "::")
+DEFAULT_NETMASKS = (None, "0", "0.0.0.0", "::")
+
+
+def _get_mac(mac):
+    return mac.replace("-", ":").lower() if mac else None
+
+
+def _get_netmask(family, netmask):
+    """Return the IPv4 netmasks dotted and the IPv6 ones as prefixes."""
+    netmask = str(netmask)
+    if family == debiface.INET and netmask.isdigit():
+        return network.prefix_to_netmask(netmask)
+    if family == debiface.INET6 and ":" in netmask:
+        return network.netmask6_to_prefix(netmask)
+    return netmask
+
+
+def _split_address(family, address, netmask):
+    address, _, prefix = address.partition("/")
+    netmask = prefix or netmask
+    return address, _get_netmask(family, netmask) if netmask else None
+
+
+def _get_route(family, route):
+    network_address, netmask = _split_address(
+        family, route.get("network", ""), route.get("netmask"))
+    is_default = netmask in DEFAULT_NETMASKS
+    if is_default and network_address in DEFAULT_NETWORKS:
+        network_address, netmask = debiface.DEFAULT_ROUTE, None
+    return service_base.Route(family, network_address, netmask,
+                              route.get("gateway"))
+
+
+def _get_interface(link):
+    link_type = link.get("type")
+    bond = vlan = None
+    mac = link.get("ethernet_mac_address")
+    if link_type == service_base.LINK_TYPE_BOND:
+        bond = service_base.Bond(
+            link.get("bond_links", []), link.get("bond_mode"),
+            link.get("bond_miimon"), link.get("bond_xmit_hash_policy"))
+    elif link_type == service_base.LINK_TYPE_VLAN:
+        vlan = service_base.Vlan(link.get("vlan_id"), link.get("vlan_link"))
+        mac = link.get("vlan_mac_address") or mac
+    else:
+        # The physical, virtual and bridged links alike.
+        link_type = service_base.LINK_TYPE_PHYSICAL
+
+    return service_base.Interface(
+        link["id"], _get_mac(mac), True, False, [], [], [],
+        link_type, link.get("mtu"), bond, vlan)
+
+
+def _add_network(iface, net):
+    family, method = NETWORK_TYPES[net["type"]]
+    address = netmask = None
+    if "ip_address" in net:
+        address, netmask = _split_address(family, net["ip_address"],
+                                          net.get("netmask"))
+    iface.addresses.append(service_base.Address(
+        family, method, address, netmask, None, None))
+    iface.routes.extend(_get_route(family, route)
+                        for route in net.get("routes", []))
+    iface.dnsnameservers.extend(net.get("dns_nameservers", []))
+
+
+def parse_interfaces(data):
+    """Parse the content, returning a list of `Interface` objects."""
+    network_data = json.loads(data)
+
+    interfaces = collections.OrderedDict(
+        (link["id"], _get_interface(link))
+        for link in network_data.get("links", []))
+    for net in network_data.get("networks", []):
+        iface = interfaces.get(net.get("link"))
+        if iface is None or net.get("type") not in NETWORK_TYPES:
+            LOG.warning("Ignoring network %s of link %s",
+                        net.get("id"), net.get("link"))
+            continue
+        _add_network(iface, net)
+
+    dnsnameservers = [service["address"]
+                      for service in network_data.get("services", [])
+                      if service.get("type") == DNS_SERVICE]
+    return [iface._replace(
+        dnsnameservers=iface.dnsnameservers + dnsnameservers or None)
+        for iface in interfaces.values()]
+
+
+def parse(data):
+    """Parse the received content and obtain network details.
+
+    Only the physical interfaces are returned, as the bonds and the
+    VLANs can't be described by `NetworkDetails`.
+    """
+    if not data or not isinstance(data, six.string_types):
+        LOG.error("Invalid network data to parse:\n%s", data)
+        return
+
+    LOG.info("Parsing network data...\n%s", data)
+    try:
+        interfaces = parse_interfaces(data)
+    except (ValueError, KeyError, TypeError, AttributeError) as ex:
+        LOG.error("Invalid network data to parse: %s", ex)
+        return
+
+    nics = []    # list of NetworkDetails objects
+    for iface in interfaces:
+        if iface.type != service_base.LINK_TYPE_PHYSICAL:
+            LOG.debug("Skipping %s interface: %s", iface.type, iface.name)
+            continue
+        nic = debiface.get_network_details(iface)
+        if nic:
+            LOG.debug("Found new interface: %s", nic)
+            nics.append(nic)
+    return nics
@@ -0,0 +1,380 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Platform independent MBR and GPT partition table parsing.
+
+Works with any device object exposing the `seek`/`read` interface of
+:class:`cloudbaseinit.utils.windows.disk.BaseDevice`, including the
+:class:`FileDevice` defined here, which handles raw block devices and
+disk image files alike.
+"""
+
+import mmap
+import os
+import stat
+import struct
+import uuid
+import zlib
+
+from oslo_log import log as oslo_logging
+
+from cloudbaseinit import exception
+
+
+LOG = oslo_logging.getLogger(__name__)
+
+SECTOR_SIZE = 512
+
+SCHEME_MBR = "mbr"
+SCHEME_GPT = "gpt"
+
+# Master Boot Record layout.
+MBR_SIGNATURE = b"\x55\xaa"
+MBR_SIGNATURE_OFFSET = 510
+MBR_ENTRIES_OFFSET = 446
+MBR_ENTRY_COUNT = 4
+MBR_ENTRY = struct.Struct("<B3sB3sII")
+MBR_TYPE_UNUSED = 0x00
+MBR_TYPE_GPT_PROTECTIVE = 0xEE
+MBR_TYPES_EXTENDED = (0x05, 0x0F, 0x85)
+# Logical partitions are numbered after the primary slots.
+MBR_FIRST_LOGICAL = 5
+MAX_LOGICAL_PARTITIONS = 128
+
+# GUID Partition Table layout.
+GPT_SIGNATURE = b"EFI PART"
+GPT_HEADER = struct.Struct("<8sIIIIQQQQ16sQIII")
+GPT_ENTRY = struct.Struct("<16s16sQQQ72s")
+GPT_MAX_ENTRIES_SIZE = 1024 * 1024
+GPT_TYPE_UNUSED = b"\x00" * 16
+
+
+def _read_at(device, offset, size):
+    """Read `size` bytes from the absolute `offset` of the device."""
+    real_offset = device.seek(offset)
+    return device.read(size, skip=offset - real_offset)
+
+
+def _crc32(data):
+    return zlib.crc32(data) & 0xFFFFFFFF
+
+
+def _sector_size(device):
+    return getattr(device, "sector_size", None) or SECTOR_SIZE
+
+
+class FileDevice(object):
+    """Seekable device backed by a block device node or an image file.
+
+    It mirrors the read-only interface of the Windows `BaseDevice`, so
+    the same discovery code can run against either of them. Regular
+    image files are memory mapped, so reads don't need system calls.
+    """
+
+    def __init__(self, path, sector_size=SECTOR_SIZE):
+        self._path = path
+        self._sector_size = sector_size
+
+        self._stream = None
+        self._map = None
+        self._size = None
+        self.fixed = True
+
+    def __repr__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self._path)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def stream(self):
+        """The underlying file object, available while opened."""
+        return self._stream
+
+    def open(self):
+        try:
+            self._stream = open(self._path, "rb")
+        except (IOError, OSError) as exc:
+            raise exception.CloudbaseInitException(
+                "Cannot open file %r: %s" % (self._path, exc))
+        # Block devices report a null size through stat, so the
+        # end of the stream is used instead.
+        self._stream.seek(0, os.SEEK_END)
+        self._size = self._stream.tell()
+        self._stream.seek(0)
+
+        if stat.S_ISREG(os.fstat(self._stream.fileno()).st_mode) and \
+                self._size:
+            self._map = mmap.mmap(self._stream.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self._map:
+            self._map.close()
+            self._map = None
+        if self._stream:
+            self._stream.close()
+            self._stream = None
+
+    @property
+    def _reader(self):
+        # Both objects provide the same seek/read interface.
+        return self._map or self._stream
+
+    def seek(self, offset):
+        # Seeking past either end is clamped to the device bounds.
+        offset = max(0, min(offset, self._size))
+        self._reader.seek(offset)
+        return offset
+
+    def read(self, size, skip=0):
+        if skip:
+            self._reader.seek(skip, os.SEEK_CUR)
+        return self._reader.read(size)
+
+    @property
+    def sector_size(self):
+        return self._sector_size
+
+    @property
+    def size(self):
+        return self._size
+
+
+class PartitionView(object):
+    """Offset bounded view over a partition of a parent device.
+
+    The view shares the parent's handle instead of opening a new device
+    path, so the parent has to be kept opened while the view is in use.
+    Opening and closing the view itself does nothing.
+    """
+
+    def __init__(self, device, number, offset, size, scheme,
+                 partition_type, name=None, bootable=False):
+        self._device = device
+        self._offset = offset
+        self._size = size
+        self._position = 0
+
+        self.number = number
+        self.scheme = scheme
+        self.type = partition_type
+        self.name = name
+        self.bootable = bootable
+
+    def __repr__(self):
+        return "<{}: {} #{}>".format(self.__class__.__name__,
+                                     self._device, self.number)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    @property
+    def device(self):
+        return self._device
+
+    @property
+    def offset(self):
+        return self._offset
+
+    @property
+    def fixed(self):
+        return self._device.fixed
+
+    @property
+    def sector_size(self):
+        return _sector_size(self._device)
+
+    @property
+    def size(self):
+        return self._size
+
+    def seek(self, offset):
+        offset = max(0, min(offset, self._size))
+        real_offset = self._device.seek(self._offset + offset)
+        self._position = real_offset - self._offset
+        return self._position
+
+    def read(self, size, skip=0):
+        # Never return bytes belonging to whatever follows the partition.
+        available = max(0, self._size - self._position - skip)
+        content = self._device.read(min(size, available), skip=skip)
+        self._position += skip + len(content)
+        return content
+
+
+def _parse_mbr_entries(sector):
+    entries = []
+    for index in range(MBR_ENTRY_COUNT):
+        start = MBR_ENTRIES_OFFSET + index * MBR_ENTRY.size
+        (status, _, partition_type, _, first_lba,
+         sectors) = MBR_ENTRY.unpack_from(sector, start)
+        entries.append((index + 1, status, partition_type,
+                        first_lba, sectors))
+    return entries
+
+
+def _get_logical_partitions(device, extended_lba, sector_size):
+    """Walk the chain of extended boot records."""
+    partitions = []
+    ebr_lba = extended_lba
+    visited = set()
+    number = MBR_FIRST_LOGICAL
+    while ebr_lba not in visited and len(visited) < MAX_LOGICAL_PARTITIONS:
+        visited.add(ebr_lba)
+        sector = _read_at(device, ebr_lba * sector_size, sector_size)
+        if (len(sector) < sector_size or
+                sector[MBR_SIGNATURE_OFFSET:MBR_SIGNATURE_OFFSET + 2] !=
+                MBR_SIGNATURE):
+            LOG.warning("Invalid extended boot record at LBA %s on %s",
+                        ebr_lba, device)
+            break
+
+        entries = _parse_mbr_entries(sector)
+        _, status, partition_type, first_lba, sectors = entries[0]
+        if partition_type != MBR_TYPE_UNUSED and sectors:
+            # The logical partition is relative to its own EBR.
+            partitions.append(PartitionView(
+                device, number, (ebr_lba + first_lba) * sector_size,
+                sectors * sector_size, SCHEME_MBR, partition_type,
+                bootable=status == 0x80))
+            number += 1
+
+        _, _, next_type, next_lba, _ = entries[1]
+        if next_type not in MBR_TYPES_EXTENDED or not next_lba:
+            break
+        # The link to the next EBR is relative to the extended partition.
+        ebr_lba = extended_lba + next_lba
+    return partitions
+
+
+def _get_mbr_partitions(device, entries, sector_size):
+    partitions = []
+    for number, status, partition_type, first_lba, sectors in entries:
+        if partition_type == MBR_TYPE_UNUSED or not sectors:
+            continue
+        if partition_type in MBR_TYPES_EXTENDED:
+            partitions.extend(
+                _get_logical_partitions(device, first_lba, sector_size))
+            continue
+        partitions.append(PartitionView(
+            device, number, first_lba * sector_size, sectors * sector_size,
+            SCHEME_MBR, partition_type, bootable=status == 0x80))
+    return partitions
+
+
+def _get_gpt_header(device, lba, sector_size):
+    """Return the parsed GPT header found at the given LBA, if valid."""
+    sector = _read_at(device, lba * sector_size, sector_size)
+    if len(sector) < GPT_HEADER.size:
+        return None
+    header = GPT_HEADER.unpack_from(sector)
+    (signature, _, header_size, header_crc, _, current_lba, _,
+     _, _, _, entries_lba, entries_count, entry_size, _) = header
+    if signature != GPT_SIGNATURE:
+        return None
+    if not GPT_HEADER.size <= header_size <= sector_size:
+        return None
+
+    # The header checksum is computed with its own field zeroed.
+    raw = sector[:16] + b"\x00" * 4 + sector[20:header_size]
+    if _crc32(raw) != header_crc or current_lba != lba:
+        LOG.warning("Invalid GPT header checksum at LBA %s on %s",
+                    lba, device)
+        return None
+    if (entry_size < GPT_ENTRY.size or entry_size % 8 or
+            entries_count * entry_size > GPT_MAX_ENTRIES_SIZE):
+        return None
+    return header
+
+
+def _get_gpt_entries(device, header, sector_size):
+    (_, _, _, _, _, _, _, _, _, _, entries_lba, entries_count,
+     entry_size, entries_crc) = header
+    raw = _read_at(device, entries_lba * sector_size,
+                   entries_count * entry_size)
+    if len(raw) != entries_count * entry_size or _crc32(raw) != entries_crc:
+        LOG.warning("Invalid GPT partition entries checksum on %s", device)
+        return None
+
+    partitions = []
+    for index in range(entries_count):
+        (type_guid, _, first_lba, last_lba, _,
+         name) = GPT_ENTRY.unpack_from(raw, index * entry_size)
+        if type_guid == GPT_TYPE_UNUSED or last_lba < first_lba:
+            continue
+        name = name.decode("utf-16-le", "replace").split("\x00", 1)[0]
+        partitions.append(PartitionView(
+            device, index + 1, first_lba * sector_size,
+            (last_lba - first_lba + 1) * sector_size, SCHEME_GPT,
+            str(uuid.UUID(bytes_le=type_guid)), name=name))
+    return partitions
+
+
+def _get_gpt_partitions(device, sector_size):
+    # Fall back to the backup header from the last sector when
+    # the primary one or its partition entries are corrupted.
+    candidate_lbas = [1]
+    if device.size:
+        candidate_lbas.append(device.size // sector_size - 1)
+
+    for lba in candidate_lbas:
+        header = _get_gpt_header(device, lba, sector_size)
+        if not header:
+            continue
+        partitions = _get_gpt_entries(device, header, sector_size)
+        if partitions is not None:
+            return partitions
+
+    raise exception.CloudbaseInitException(
+        "No valid GPT found on %s" % device)
+
+
+def get_partitions(device):
+    """Return the partitions of an opened device as `PartitionView` objects.
+
+    Both MBR (including logical partitions from the extended one)
+    and GPT layouts are recognized. A device without a partition
+    table yields an empty list.
+    """
+    sector_size = _sector_size(device)
+    sector = _read_at(device, 0, sector_size)
+    if (len(sector) < sector_size or
+            sector[MBR_SIGNATURE_OFFSET:MBR_SIGNATURE_OFFSET + 2] !=
+            MBR_SIGNATURE):
+        LOG.debug("No partition table found on %s", device)
+        return []
+
+    entries = _parse_mbr_entries(sector)
+    if any(entry[2] == MBR_TYPE_GPT_PROTECTIVE for entry in entries):
+        return _get_gpt_partitions(device, sector_size)
+    return _get_mbr_partitions(device, entries, sector_size)
@@ -0,0 +1,301 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Process execution with a streamed and bounded output capture.
+
+The output of the process is read line by line while it runs, by a
+thread for each of its pipes. Each line can be logged as soon as it's
+read and written to an output file, while only the beginning and the
+end of the output are kept in memory.
+
+A process executed with a timeout gets its own process group, so that
+the whole process tree can be terminated once the timeout expires.
+"""
+
+import collections
+import os
+import signal
+import subprocess
+import threading
+import time
+
+from oslo_config import cfg
+from oslo_log import log as oslo_logging
+import six
+
+from cloudbaseinit import exception
+
+
+opts = [
+    cfg.IntOpt('process_output_head_size', default=1024 * 1024,
+               help='The number of bytes kept in memory from the '
+                    'beginning of the stdout and of the stderr of the '
+                    'executed processes.'),
+    cfg.IntOpt('process_output_tail_size', default=1024 * 1024,
+               help='The number of bytes kept in memory from the end of '
+                    'the stdout and of the stderr of the executed '
+                    'processes. The output in between is dropped.'),
+    cfg.StrOpt('scripts_output_dir', default=None,
+               help='Folder where the whole output of each executed user '
+                    'script is written, in a file named after the script. '
+                    'The output files are not written if not set.'),
+    cfg.IntOpt('scripts_output_backups', default=3,
+               help='The number of previous output files kept for each '
+                    'user script.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
+
+LOG = oslo_logging.getLogger(__name__)
+
+# The longer lines are read, and logged, in multiple pieces.
+LINE_SIZE = 64 * 1024
+OUTPUT_EXTENSION = '.log'
+# The seconds a terminated process group has for exiting before being
+# killed, on POSIX.
+KILL_GRACE_PERIOD = 5
+# The seconds the output is still read for, past the timeout, from the
+# pipes kept open by descendants which escaped the process tree.
+PIPE_DRAIN_TIMEOUT = 5
+
+
+class ProcessTimeoutException(exception.CloudbaseInitException):
+
+    def __init__(self, args, timeout, out, err):
+        super(ProcessTimeoutException, self).__init__(
+            "%(args)s did not finish in %(timeout)s seconds" %
+            {"args": args, "timeout": timeout})
+        self.timeout = timeout
+        self.out = out
+        self.err = err
+
+
+class OutputBuffer(object):
+    """Keep the head and the tail of an output, dropping its middle."""
+
+    def __init__(self, head_size, tail_size):
+        self._head_size = head_size
+        self._tail_size = tail_size
+        self._head = []
+        self._head_length = 0
+        self._tail = collections.deque()
+        self._tail_length = 0
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def write(self, data):
+        # The pipes might still be read while the value is retrieved.
+        with self._lock:
+            self._write(data)
+
+    def _write(self, data):
+        room = self._head_size - self._head_length
+        if room > 0:
+            self._head.append(data[:room])
+            self._head_length += len(self._head[-1])
+            data = data[room:]
+        if not data:
+            return
+
+        self._tail.append(data)
+        self._tail_length += len(data)
+        while self._tail_length > self._tail_size:
+            excess = self._tail_length - self._tail_size
+            first = self._tail.popleft()
+            if len(first) > excess:
+                self._tail.appendleft(first[excess:])
+            dropped = min(len(first), excess)
+            self._tail_length -= dropped
+            self.dropped += dropped
+
+    def getvalue(self):
+        with self._lock:
+            chunks = self._head[:]
+            if self.dropped:
+                chunks.append(('\n[... %d bytes omitted ...]\n' %
+                               self.dropped).encode())
+            chunks.extend(self._tail)
+        return b''.join(chunks)
+
+
+class _OutputFile(object):
+    """The output file shared by the pipes of a process."""
+
+    def __init__(self, path, backups):
+        _rotate(path, backups)
+        self._stream = open(path, 'wb')
+        self._lock = threading.Lock()
+
+    def write(self, data):
+        with self._lock:
+            self._stream.write(data)
+
+    def close(self):
+        self._stream.close()
+
+
+def _rotate(path, backups):
+    names = [path] + ['%s.%d' % (path, index)
+                      for index in range(1, backups + 1)]
+    if os.path.exists(names[-1]):
+        os.remove(names[-1])
+    for index in range(len(names) - 2, -1, -1):
+        if os.path.exists(names[index]):
+            os.rename(names[index], names[index + 1])
+
+
+def get_output_path(name):
+    """Return the path of the output file of a script, if enabled."""
+    if not CONF.scripts_output_dir:
+        return None
+    return os.path.join(CONF.scripts_output_dir, name + OUTPUT_EXTENSION)
+
+
+def _get_group_options():
+    """Return the Popen options starting a new process group."""
+    if os.name == 'nt':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    if six.PY3:
+        return {'start_new_session': True}
+    return {'preexec_fn': os.setsid}
+
+
+def kill_tree(process):
+    """Terminate the process along with all its descendants.
+
+    The process has to be the leader of a new process group on POSIX.
+    """
+    if os.name == 'nt':
+        with open(os.devnull, 'wb') as devnull:
+            subprocess.call(['taskkill', '/F', '/T', '/PID',
+                             str(process.pid)],
+                            stdout=devnull, stderr=devnull)
+        return
+
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        deadline = time.time() + KILL_GRACE_PERIOD
+        while process.poll() is None and time.time() < deadline:
+            time.sleep(0.1)
+        # The descendants might still run even if the leader exited.
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        # The whole group already exited.
+        pass
+
+
+def _pump(stream, buffer, output_file, name, stream_name):
+    try:
+        for line in iter(lambda: stream.readline(LINE_SIZE), b''):
+            buffer.write(line)
+            if output_file:
+                output_file.write(line)
+            if name:
+                LOG.debug('%(name)s %(stream)s: %(line)s',
+                          {'name': name, 'stream': stream_name,
+                           'line': line.rstrip(b'\r\n').decode(
+                               'utf-8', 'replace')})
+    finally:
+        stream.close()
+
+
+def execute(args, shell=False, name=None, output_path=None,
+            head_size=None, tail_size=None, timeout=None):
+    """Execute a process, returning its bounded output and exit code.
+
+    When a name is given, each line of the output is logged under it as
+    soon as it's read. The whole output is written as well to the given
+    output path, whose previous versions are rotated. When the timeout
+    expires, the process tree is terminated and a
+    `ProcessTimeoutException` is raised, holding the output read so far.
+    With a timeout, the output is read for at most `PIPE_DRAIN_TIMEOUT`
+    seconds past it, even if descendants which escaped the process tree
+    keep the pipes open.
+    """
+    if head_size is None:
+        head_size = CONF.process_output_head_size
+    if tail_size is None:
+        tail_size = CONF.process_output_tail_size
+    buffers = (OutputBuffer(head_size, tail_size),
+               OutputBuffer(head_size, tail_size))
+
+    output_file = None
+    if output_path:
+        output_dir = os.path.dirname(output_path)
+        if output_dir and not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        output_file = _OutputFile(output_path, CONF.scripts_output_backups)
+
+    timer = None
+    expired = threading.Event()
+    try:
+        start = time.time()
+        process = subprocess.Popen(args,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   shell=shell,
+                                   **(_get_group_options() if timeout
+                                      else {}))
+        if timeout:
+            def expire():
+                if process.poll() is not None:
+                    # Only the pipes are still being read.
+                    return
+                expired.set()
+                LOG.warning('Terminating %(args)s after %(timeout)s '
+                            'seconds', {'args': args, 'timeout': timeout})
+                kill_tree(process)
+
+            timer = threading.Timer(timeout, expire)
+            timer.daemon = True
+            timer.start()
+
+        threads = []
+        for stream, buffer, stream_name in ((process.stdout, buffers[0],
+                                             'stdout'),
+                                            (process.stderr, buffers[1],
+                                             'stderr')):
+            thread = threading.Thread(
+                target=_pump,
+                args=(stream, buffer, output_file, name, stream_name))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        returncode = process.wait()
+        if timeout:
+            # The pumps still blocked afterwards are left behind, they
+            # end along with the descendants holding their pipes.
+            deadline = max(start + timeout, time.time()) + PIPE_DRAIN_TIMEOUT
+            for thread in threads:
+                thread.join(max(0, deadline - time.time()))
+        else:
+            for thread in threads:
+                thread.join()
+    finally:
+        if timer:
+            timer.cancel()
+        if output_file:
+            output_file.close()
+
+    for buffer, stream_name in zip(buffers, ('stdout', 'stderr')):
+        if buffer.dropped:
+            LOG.debug('Dropped %(dropped)d bytes from the %(stream)s of '
+                      '%(args)s', {'dropped': buffer.dropped,
+                                   'stream': stream_name, 'args': args})
+    if expired.is_set():
+        raise ProcessTimeoutException(args, timeout, buffers[0].getvalue(),
+                                      buffers[1].getvalue())
+    return buffers[0].getvalue(), buffers[1].getvalue(), returncode
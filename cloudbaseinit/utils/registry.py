@@ -0,0 +1,112 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Per process registry of plugin classes and instances.
+
+A plugin is looked up by name, which is either the name of an entry
+point from the registry's group, a name registered explicitly, or the
+plugin's class path. Classes are imported and instantiated only when
+first requested and are kept for the rest of the process lifetime.
+"""
+
+from oslo_log import log as oslo_logging
+
+from cloudbaseinit.utils import classloader
+
+
+LOG = oslo_logging.getLogger(__name__)
+
+
+def _iter_entry_points(group):
+    try:
+        from importlib import metadata
+    except ImportError:
+        # Python 2 and the Python 3 versions before 3.8.
+        try:
+            import pkg_resources
+        except ImportError:
+            return []
+        return pkg_resources.iter_entry_points(group)
+
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        return entry_points.select(group=group)
+    # Python 3.8 and 3.9 return the entry points mapped by group.
+    return entry_points.get(group, [])
+
+
+class Registry(object):
+
+    def __init__(self, group, classes=None):
+        self._group = group
+        self._class_paths = dict(classes or {})
+        self._entry_points = None
+        self._classes = {}
+        self._instances = {}
+
+    def _get_entry_points(self):
+        if self._entry_points is None:
+            entry_points = {}
+            for entry_point in _iter_entry_points(self._group):
+                if entry_point.name in entry_points:
+                    LOG.warning("Duplicate %(group)s entry point %(name)r",
+                                {"group": self._group,
+                                 "name": entry_point.name})
+                    continue
+                entry_points[entry_point.name] = entry_point
+            self._entry_points = entry_points
+        return self._entry_points
+
+    def register(self, name, class_path):
+        self._class_paths[name] = class_path
+        self._classes.pop(name, None)
+        self._instances.pop(name, None)
+
+    def __contains__(self, name):
+        """Check if the plugin name is known, without listing the names."""
+        return name in self._class_paths or name in self._get_entry_points()
+
+    def list_names(self):
+        """Return the names of the known plugins, sorted.
+
+        Plugins referenced only by their class paths are not listed.
+        """
+        return sorted(set(self._class_paths) | set(self._get_entry_points()))
+
+    def get_class(self, name):
+        plugin_class = self._classes.get(name)
+        if plugin_class is None:
+            entry_point = self._get_entry_points().get(name)
+            if entry_point is not None:
+                LOG.debug("Loading %(group)s entry point %(name)r",
+                          {"group": self._group, "name": name})
+                plugin_class = entry_point.load()
+            else:
+                plugin_class = classloader.ClassLoader().load_class(
+                    self._class_paths.get(name, name))
+            self._classes[name] = plugin_class
+        return plugin_class
+
+    def get_instance(self, name):
+        instance = self._instances.get(name)
+        if instance is None:
+            instance = self.get_class(name)()
+            self._instances[name] = instance
+        return instance
+
+    def clear(self):
+        """Forget the loaded classes, the instances and the entry points."""
+        self._entry_points = None
+        self._classes.clear()
+        self._instances.clear()
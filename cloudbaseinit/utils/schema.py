@@ -0,0 +1,93 @@
+# Copyright 2016 Cloudbase Solutions Srl
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Validation of loaded documents against simple schemas.
+
+The schemas are dicts using a subset of the JSON Schema keywords:
+`type`, a type name or a list of type names, `properties`, `required`,
+`additionalProperties`, `items` and `enum`. The `properties` and the
+`required` keywords apply only to mappings, and `items` only to lists,
+so a schema can describe a mapping or a list of such mappings at once.
+"""
+
+import six
+
+
+TYPES = {
+    'array': (list,),
+    'binary': (six.binary_type,),
+    'boolean': (bool,),
+    'integer': six.integer_types,
+    'null': (type(None),),
+    'number': six.integer_types + (float,),
+    'object': (dict,),
+    'string': six.string_types,
+}
+
+
+def _is_type(value, type_name):
+    if isinstance(value, bool) and type_name in ('integer', 'number'):
+        return False
+    return isinstance(value, TYPES[type_name])
+
+
+def _get_type_name(value):
+    for type_name in sorted(TYPES):
+        if _is_type(value, type_name):
+            return type_name
+    return type(value).__name__
+
+
+def _join(path, key):
+    if isinstance(key, int):
+        return '%s[%d]' % (path, key)
+    return '%s.%s' % (path, key) if path else str(key)
+
+
+def validate(value, schema, path=''):
+    """Return the problems of the value, an empty list if it's valid.
+
+    All the problems are returned, each of them prefixed by the path of
+    the invalid item, like `write_files[1].path`.
+    """
+    types = schema.get('type')
+    if types is not None:
+        if isinstance(types, six.string_types):
+            types = [types]
+        if not any(_is_type(value, type_name) for type_name in types):
+            return ['%s: expected %s, got %s' % (
+                path or '<root>', ' or '.join(types), _get_type_name(value))]
+
+    if 'enum' in schema and value not in schema['enum']:
+        return ['%s: expected one of %s, got %r' % (
+            path or '<root>', ', '.join(map(repr, schema['enum'])), value)]
+
+    problems = []
+    if isinstance(value, dict):
+        properties = schema.get('properties', {})
+        for key in schema.get('required', []):
+            if key not in value:
+                problems.append('%s: missing required key %r' % (
+                    path or '<root>', key))
+        for key, item in sorted(value.items(), key=lambda item: str(item[0])):
+            if key in properties:
+                problems.extend(validate(item, properties[key],
+                                         _join(path, key)))
+            elif schema.get('additionalProperties', True) is False:
+                problems.append('%s: unexpected key' % _join(path, key))
+    elif isinstance(value, list) and 'items' in schema:
+        for index, item in enumerate(value):
+            problems.extend(validate(item, schema['items'],
+                                     _join(path, index)))
+    return problems
@@ -266,6 +266,10 @@ class BaseDevice(object):
         content = self._read(safe_size)
         return content[skip:total]
 
+    @property
+    def sector_size(self):
+        return self._sector_size
+
     @abc.abstractmethod
     def size(self):
         """Returns the size in bytes of the actual opened device."""